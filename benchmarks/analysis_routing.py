@@ -0,0 +1,167 @@
+"""
+Benchmark: enrutado del análisis (analysis_routing.py) frente a un único modelo y max_tokens
+
+Genera un conjunto mixto de transcripciones sintéticas: notas de voz de 5 a 60 s, grabaciones
+vacías, llamadas de 3 a 10 minutos y reuniones de 30 a 90 minutos, a ~150 palabras por minuto.
+Las analiza con lambda-audio-process contra AnthropicStub dos veces: con ANALYSIS_ROUTING_ENABLED
+y ROUTING_TEMPLATE_ENABLED (--no-template para medir el enrutado sin la ruta de plantilla, la
+configuración por defecto) y sin enrutado (todas con ANALYSIS_MODEL y ANALYSIS_MAX_TOKENS, como
+antes del enrutado). Reporta llamadas al LLM, tokens, coste estimado y latencia por modo, y los
+contadores de cada ruta.
+
+Sin la ruta de plantilla las grabaciones vacías terminan en ERROR ("No se obtuvo texto de la
+transcripción") y no se analizan.
+
+Uso:
+    python benchmarks/analysis_routing.py --voice-notes 40 --empty 5 --calls 30 --meetings 10
+    python benchmarks/analysis_routing.py --long-model claude-3-5-haiku-20241022
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from local_services import AnthropicStub, LocalAWS  # noqa: E402
+from end_to_end import distribution, fmt, load_lambda  # noqa: E402
+
+VOCABULARY = ("presupuesto proyecto reunión cliente entrega equipo propuesta contrato factura calendario "
+              "revisión riesgo plazo informe pedido llamada semana mañana acuerdo pendiente").split()
+
+def synthetic_transcription(kind, rng):
+    """Transcripción con el formato de format_transcript para una grabación del tipo `kind`"""
+    seconds = {
+        "nota": lambda: rng.uniform(5, 60),
+        "vacia": lambda: rng.uniform(2, 20),
+        "llamada": lambda: rng.uniform(180, 600),
+        "reunion": lambda: rng.uniform(1800, 5400)
+    }[kind]()
+    # Las notas de voz tienen más silencio: entre el 30% y el 100% de ~150 palabras por minuto
+    density = 0 if kind == "vacia" else rng.uniform(0.3, 1.0) if kind == "nota" else rng.uniform(0.8, 1.0)
+    remaining = int(seconds * 2.5 * density)
+    speakers = "A" if kind == "nota" else "AB" if kind == "llamada" else "ABCD"
+
+    utterances, t = [], 0
+    while remaining > 0:
+        count = min(remaining, rng.randint(5, 40))
+        duration = count * 400
+        utterances.append({"speaker": rng.choice(speakers), "start": t, "end": t + duration,
+                           "text": " ".join(rng.choice(VOCABULARY) for _ in range(count)) + "."})
+        t += duration + rng.randint(200, 1500)
+        remaining -= count
+    text = " ".join(utterance['text'] for utterance in utterances)
+    return {"text": text, "utterances": utterances, "audio_duration": round(seconds), "data": {"text": text}}
+
+def make_corpus(args):
+    rng = random.Random(args.seed)
+    kinds = (["nota"] * args.voice_notes + ["vacia"] * args.empty
+             + ["llamada"] * args.calls + ["reunion"] * args.meetings)
+    rng.shuffle(kinds)
+    return [synthetic_transcription(kind, rng) for kind in kinds]
+
+def run_mode(module, corpus, concurrency, routed):
+    """Analizar el conjunto con el módulo dado; devuelve latencias y consumo total"""
+    analysis_routing = module.analysis_routing
+
+    def analyze(transcription):
+        # Sin la ruta de plantilla, persist_results termina las transcripciones vacías en ERROR
+        if not transcription['text'] and not (routed and module.ROUTING_TEMPLATE_ENABLED):
+            return None
+        start = time.perf_counter()
+        if routed:
+            analysis = module.route_and_analyze(transcription)
+            summary = analysis['enrutado']
+            return (time.perf_counter() - start) * 1000, summary['llamadas_llm'], summary['tokens_entrada'], \
+                summary['tokens_salida'], summary['coste_estimado_usd'] or 0.0
+        usage = analysis_routing.AnalysisUsage(module.MODEL_PRICES_PER_MTOK)
+        module.call_with_secret_refresh(
+            lambda key: module.analyze_transcription(transcription, key, None, usage), key_index=1
+        )
+        return (time.perf_counter() - start) * 1000, usage.calls, usage.input_tokens, usage.output_tokens, usage.cost_usd
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(analyze, corpus))
+    done = [result for result in results if result is not None]
+    return {
+        "analizadas": len(done),
+        "errores": len(results) - len(done),
+        "latencia": distribution([result[0] for result in done]),
+        "llamadas": sum(result[1] for result in done),
+        "tokens_entrada": sum(result[2] for result in done),
+        "tokens_salida": sum(result[3] for result in done),
+        "coste": sum(result[4] for result in done)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--voice-notes', type=int, default=40, help='notas de voz de 5 a 60 s')
+    parser.add_argument('--empty', type=int, default=5, help='grabaciones sin voz')
+    parser.add_argument('--calls', type=int, default=30, help='llamadas de 3 a 10 minutos')
+    parser.add_argument('--meetings', type=int, default=10, help='reuniones de 30 a 90 minutos')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--no-template', action='store_true', help='enrutado sin ROUTING_TEMPLATE_ENABLED')
+    parser.add_argument('--short-model', help='ROUTING_SHORT_MODEL (por defecto ANALYSIS_MODEL)')
+    parser.add_argument('--long-model', help='ROUTING_LONG_MODEL (por defecto ANALYSIS_MODEL)')
+    parser.add_argument('--anthropic-latency-ms', type=float, default=400.0, help='latencia base por llamada')
+    parser.add_argument('--ms-per-output-token', type=float, default=5.0)
+    parser.add_argument('--output-tokens', type=int, default=350, help='tokens de cada respuesta del stub (acotados por max_tokens)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    aws = LocalAWS(0, seed=args.seed).start()
+    anthropic = AnthropicStub(latency_ms=args.anthropic_latency_ms, output_tokens=args.output_tokens,
+                              ms_per_output_token=args.ms_per_output_token, seed=args.seed).start()
+    os.environ.update({
+        'AWS_ENDPOINT_URL_SECRETS_MANAGER': aws.url,
+        'AWS_ENDPOINT_URL_S3': aws.url,
+        'ANTHROPIC_BASE_URL': anthropic.url,
+        'ANTHROPIC_RATE_PER_SECOND': '1000',
+        'ANTHROPIC_BURST': '1000',
+        'METRICS_SINK': 'memory',
+        'AWS_EC2_METADATA_DISABLED': 'true',
+    })
+    for name, value in (('AWS_DEFAULT_REGION', 'us-east-1'), ('AWS_ACCESS_KEY_ID', 'benchmark'),
+                        ('AWS_SECRET_ACCESS_KEY', 'benchmark')):
+        os.environ.setdefault(name, value)
+    os.environ['ROUTING_TEMPLATE_ENABLED'] = 'false' if args.no_template else 'true'
+    for name, value in (('ROUTING_SHORT_MODEL', args.short_model), ('ROUTING_LONG_MODEL', args.long_model)):
+        if value:
+            os.environ[name] = value
+
+    # El módulo lee la configuración al importarse: una copia por modo
+    modules = {}
+    for label, enabled in (("un modelo", "false"), ("enrutado", "true")):
+        os.environ['ANALYSIS_ROUTING_ENABLED'] = enabled
+        modules[label] = load_lambda(f"audio_process_{enabled}", "lambda-audio-process")
+        aws.secrets[modules[label].SECRET_NAME] = {"ASSEMBLYAI_API_KEY": "local", "ANTHROPIC_API_KEY": "local"}
+        modules[label].lazy_import('anthropic')
+
+    corpus = make_corpus(args)
+    words = sum(len(transcription['text'].split()) for transcription in corpus)
+    print(f"{len(corpus)} transcripciones ({args.voice_notes} notas de voz, {args.empty} vacías, {args.calls} llamadas, "
+          f"{args.meetings} reuniones; {words} palabras), {args.concurrency} en paralelo")
+
+    print("\n| modo | analizadas | errores | llamadas LLM | tokens entrada | tokens salida | coste (USD) | p50 (ms) | p95 (ms) |")
+    print("|------|-----------:|--------:|-------------:|---------------:|--------------:|------------:|---------:|---------:|")
+    for label, module in modules.items():
+        stats = run_mode(module, corpus, args.concurrency, routed=label == "enrutado")
+        print(f"| {label} | {stats['analizadas']} | {stats['errores']} | {stats['llamadas']} | {stats['tokens_entrada']} "
+              f"| {stats['tokens_salida']} | {stats['coste']:.4f} | {fmt(stats['latencia']['p50'])} "
+              f"| {fmt(stats['latencia']['p95'])} |")
+
+    routed = modules["enrutado"]
+    print("\n| ruta | modelo | max_tokens | análisis | llamadas LLM | tokens entrada | tokens salida | latencia media (ms) | coste (USD) |")
+    print("|------|--------|-----------:|---------:|-------------:|---------------:|--------------:|--------------------:|------------:|")
+    for name, counters in sorted(routed._analysis_router.snapshot().items()):
+        route = routed.ANALYSIS_ROUTES.get(name, {"modelo": "-", "max_tokens": 0})
+        print(f"| {name} | {route['modelo']} | {route['max_tokens']} | {counters['analisis']} | {counters['llamadas_llm']} "
+              f"| {counters['tokens_entrada']} | {counters['tokens_salida']} "
+              f"| {counters['latencia_ms'] / counters['analisis']:.1f} | {counters['coste_estimado_usd']:.4f} |")
+
+    for service in (aws, anthropic):
+        service.stop()
+
+if __name__ == '__main__':
+    main()
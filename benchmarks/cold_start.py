@@ -0,0 +1,169 @@
+"""
+Benchmark: arranque en frío de las Lambdas (tiempo de importación y primera invocación)
+
+Cada medición se ejecuta en un proceso nuevo, como un contenedor recién creado: importa
+lambda_function de la carpeta de la Lambda, cuenta los módulos cargados y mide la primera y la
+segunda invocación con un evento que no depende de servicios externos. Las llamadas a S3 de
+lambda-get-status se responden en local con un hook de botocore (404, sin estado todavía).
+lambda-audio-process se mide también con AWS_LAMBDA_INITIALIZATION_TYPE=provisioned-concurrency,
+donde pre-inicializa los SDKs durante el init.
+
+Uso:
+    python benchmarks/cold_start.py --runs 5 --importtime 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ENVIRONMENT = {
+    'METRICS_SINK': 'none',
+    'BUCKET_NAME': 'benchmark-bucket',
+    'S3_BUCKET_NAME': 'benchmark-bucket',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+}
+
+# (nombre, carpeta, variables de entorno adicionales)
+SCENARIOS = [
+    ("audio-process", "lambda-audio-process", {}),
+    ("audio-process (aprovisionada)", "lambda-audio-process", {'AWS_LAMBDA_INITIALIZATION_TYPE': 'provisioned-concurrency'}),
+    ("create-upload-link", "lambda-create-upload-link", {}),
+    ("get-status", "lambda-get-status", {}),
+]
+
+class Context:
+    aws_request_id = "benchmark-request"
+    function_name = "benchmark"
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+def make_event(folder):
+    if folder == "lambda-audio-process":
+        # Clave fuera de uploads/: recorre el handler sin llamar a AssemblyAI ni a Anthropic
+        return {"Records": [{"s3": {"bucket": {"name": "benchmark-bucket"}, "object": {"key": "otros/x.mp3"}}}]}
+    if folder == "lambda-create-upload-link":
+        return {"body": json.dumps({"file_name": "grabacion.mp3", "content_type": "audio/mpeg", "file_size": 5 * 1024 * 1024})}
+    return {"pathParameters": {"fileKey": "uploads/grabacion.mp3"}}
+
+def stub_s3_not_found(module):
+    """Responder 404 NoSuchKey a toda petición de botocore, sin red"""
+    import boto3
+    from botocore.awsrequest import AWSResponse
+
+    body = b'<?xml version="1.0" encoding="UTF-8"?><Error><Code>NoSuchKey</Code><Message>no existe</Message></Error>'
+
+    class Raw:
+        def stream(self, **kwargs):
+            yield body
+
+    def not_found(request, **kwargs):
+        return AWSResponse(request.url, 404, {'Content-Type': 'application/xml'}, Raw())
+
+    emitters = [getattr(module, name).meta.events for name in dir(module) if name.endswith('_client')
+                and hasattr(getattr(module, name), 'meta')]
+    if boto3.DEFAULT_SESSION is not None:
+        emitters.append(boto3.DEFAULT_SESSION.events)
+    for emitter in emitters:
+        emitter.register('before-send', not_found)
+
+def worker(folder):
+    """Proceso de medición: imprime un JSON con los tiempos de este arranque"""
+    sys.path.insert(0, os.path.join(ROOT, folder))
+    modules_before = len(sys.modules)
+    start = time.perf_counter()
+    import lambda_function
+    import_ms = (time.perf_counter() - start) * 1000
+    modules_loaded = len(sys.modules) - modules_before
+
+    if folder == "lambda-get-status":
+        stub_s3_not_found(lambda_function)
+
+    event = make_event(folder)
+    invocations = []
+    for _ in range(2):
+        start = time.perf_counter()
+        response = lambda_function.lambda_handler(event, Context())
+        invocations.append((time.perf_counter() - start) * 1000)
+        assert response.get('statusCode') in (200, 404), response
+
+    # Lo que pagará la primera invocación que llegue a transcribir (0 si se pre-inicializó)
+    start = time.perf_counter()
+    if hasattr(lambda_function, 'lazy_import'):
+        for module_name in ('assemblyai', 'anthropic'):
+            lambda_function.lazy_import(module_name)
+    deferred_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({"import_ms": import_ms, "modules": modules_loaded, "first_ms": invocations[0],
+                      "second_ms": invocations[1], "deferred_ms": deferred_ms}))
+
+def run_worker(folder, extra_env, importtime=False):
+    env = dict(os.environ, **ENVIRONMENT, **extra_env)
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += [os.path.abspath(__file__), '--worker', folder]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+def slowest_imports(stderr, count):
+    """Módulos importados directamente por lambda_function con mayor tiempo acumulado según -X importtime"""
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if not parts[1].strip().isdigit():
+            continue
+        # Un espacio para el nivel superior y dos más por nivel; los hijos se listan antes que su padre
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(parts[1]) / 1000, name.strip()))
+        elif depth == 0:
+            if name.strip() == 'lambda_function':
+                break
+            children = []
+    return sorted(children, reverse=True)[:count]
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='arranques por escenario (se reporta la mediana)')
+    parser.add_argument('--importtime', type=int, default=0, help='mostrar los N módulos más lentos de importar')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker)
+        return
+
+    print("| Lambda | importación (ms) | módulos | 1ª invocación (ms) | 2ª invocación (ms) | init + 1ª (ms) | SDKs diferidos (ms) |")
+    print("|--------|-----------------:|--------:|-------------------:|-------------------:|---------------:|--------------------:|")
+    for name, folder, extra_env in SCENARIOS:
+        samples = [run_worker(folder, extra_env)[0] for _ in range(args.runs)]
+        import_ms = median([sample['import_ms'] for sample in samples])
+        first_ms = median([sample['first_ms'] for sample in samples])
+        print(f"| {name} | {import_ms:.1f} | {samples[0]['modules']} | {first_ms:.1f} "
+              f"| {median([sample['second_ms'] for sample in samples]):.2f} "
+              f"| {median([sample['import_ms'] + sample['first_ms'] for sample in samples]):.1f} "
+              f"| {median([sample['deferred_ms'] for sample in samples]):.1f} |")
+
+    if args.importtime:
+        for name, folder, extra_env in SCENARIOS:
+            _, stderr = run_worker(folder, extra_env, importtime=True)
+            print(f"\n{name}:")
+            for total_ms, module in slowest_imports(stderr, args.importtime):
+                print(f"  {total_ms:8.1f} ms  {module}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: métricas de conversación (conversation_analytics.py) sobre transcripciones largas
+
+Genera transcripciones sintéticas con el formato de json_response de AssemblyAI (palabras con
+start, end, confidence y speaker; tres hablantes, ~150 palabras por minuto, pausas, solapes y
+tramos de baja confianza) y mide por separado la carga de las palabras en arrays de NumPy y el
+cálculo vectorizado. Como referencia se calculan las métricas principales con un bucle de Python
+palabra a palabra, y se comprueba que ambos coinciden.
+
+Uso:
+    python benchmarks/conversation_analytics.py --minutes 15 60 120 240 --runs 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda-audio-process'))
+import conversation_analytics  # noqa: E402
+
+VOCABULARY = "presupuesto proyecto reunión cliente entrega equipo propuesta contrato factura calendario".split()
+
+def synthetic_transcription(minutes, seed):
+    """Transcripción con turnos de 1 a 40 palabras; un 8% de los cambios de turno se solapan"""
+    rng = random.Random(seed)
+    words, t, speaker = [], 0, 'A'
+    duration_ms = int(minutes * 60000)
+    while t < duration_ms:
+        for index in range(rng.randint(1, 40)):
+            length = rng.randint(150, 450)
+            low = rng.random() < 0.03
+            text = rng.choice(VOCABULARY)
+            words.append({"text": text, "start": t, "end": t + length,
+                          "confidence": rng.uniform(0.2, 0.5) if low else rng.uniform(0.8, 1.0), "speaker": speaker})
+            t += length + rng.randint(0, 120)
+        if rng.random() < 0.6:
+            words[-1]['text'] += '.'
+        speaker = rng.choice([s for s in 'ABC' if s != speaker])
+        t += -rng.randint(50, 400) if rng.random() < 0.08 else rng.randint(100, 1500 if rng.random() < 0.9 else 4000)
+    return {"data": {"words": words}, "utterances": [], "audio_duration": minutes * 60}
+
+def reference_metrics(transcription, interruption_gap_ms=200):
+    """Cálculo palabra a palabra de las métricas principales, para comparar"""
+    words = sorted(transcription['data']['words'], key=lambda word: word['start'])
+    talk, turns, counts = {}, {}, {}
+    overlaps = interruptions = 0
+    speech, covered_start, covered_end = 0, words[0]['start'], words[0]['end']
+    turn_start, previous = words[0]['start'], words[0]
+    counts[previous['speaker']] = 1
+    for word in words[1:]:
+        if word['start'] > covered_end:
+            speech += covered_end - covered_start
+            covered_start = word['start']
+        covered_end = max(covered_end, word['end'])
+        counts[word['speaker']] = counts.get(word['speaker'], 0) + 1
+        if word['speaker'] != previous['speaker']:
+            talk[previous['speaker']] = talk.get(previous['speaker'], 0) + previous['end'] - turn_start
+            turns[previous['speaker']] = turns.get(previous['speaker'], 0) + 1
+            gap = word['start'] - previous['end']
+            overlaps += gap < 0
+            interruptions += gap < interruption_gap_ms and not previous['text'].endswith(('.', '?', '!', '…'))
+            turn_start = word['start']
+        previous = word
+    talk[previous['speaker']] = talk.get(previous['speaker'], 0) + previous['end'] - turn_start
+    turns[previous['speaker']] = turns.get(previous['speaker'], 0) + 1
+    speech += covered_end - covered_start
+    return {"tiempo_voz_ms": speech, "solapamientos": overlaps, "interrupciones": interruptions,
+            "hablantes": {speaker: (talk[speaker], turns[speaker], counts[speaker]) for speaker in talk}}
+
+def matches(metrics, reference):
+    speakers = {speaker: (stats['tiempo_habla_ms'], stats['turnos'], stats['palabras'])
+                for speaker, stats in metrics['hablantes'].items()}
+    return all(metrics[name] == reference[name] for name in ('tiempo_voz_ms', 'solapamientos', 'interrupciones')) \
+        and speakers == reference['hablantes']
+
+def median_ms(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples)[len(samples) // 2], result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, nargs='+', default=[15, 60, 120, 240])
+    parser.add_argument('--runs', type=int, default=5, help='repeticiones por tamaño (se reporta la mediana)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print("| minutos | palabras | carga (ms) | métricas (ms) | total (ms) | µs/palabra | bucle Python (ms) | coincide |")
+    print("|--------:|---------:|-----------:|--------------:|-----------:|-----------:|------------------:|----------|")
+    for minutes in args.minutes:
+        transcription = synthetic_transcription(minutes, args.seed)
+        word_count = len(transcription['data']['words'])
+        load_ms, words = median_ms(lambda: conversation_analytics.load_words(transcription), args.runs)
+        metrics_ms, metrics = median_ms(lambda: conversation_analytics.metrics_from_words(
+            words, audio_duration_ms=transcription['audio_duration'] * 1000), args.runs)
+        reference_ms, reference = median_ms(lambda: reference_metrics(transcription), args.runs)
+        total_ms = load_ms + metrics_ms
+        print(f"| {minutes:g} | {word_count} | {load_ms:.1f} | {metrics_ms:.1f} | {total_ms:.1f} "
+              f"| {total_ms * 1000 / word_count:.2f} | {reference_ms:.1f} | {'sí' if matches(metrics, reference) else 'NO'} |")
+
+if __name__ == '__main__':
+    main()
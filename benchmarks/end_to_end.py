@@ -0,0 +1,423 @@
+"""
+Benchmark: carga de extremo a extremo de las tres Lambdas contra sustitutos locales
+
+Ejecuta en proceso lambda-create-upload-link, lambda-audio-process y lambda-get-status. S3,
+Secrets Manager, AssemblyAI y Anthropic se sustituyen por los servicios de local_services.py, a
+los que llegan los SDKs reales por HTTP local. Cada archivo simulado sigue el flujo del cliente:
+pide la URL de subida, sube el audio con el POST prefirmado, la notificación de S3 invoca
+lambda-audio-process (hasta --concurrency a la vez, como un contenedor con hilos) y el cliente
+consulta el estado hasta COMPLETED o ERROR.
+
+Los archivos llegan en ráfagas de --burst-size cada --burst-interval segundos. Se reportan
+p50/p95/p99 de extremo a extremo, de cada invocación y de cada etapa (spans de las Lambdas), el
+throughput y las peticiones a S3 por etapa. El resultado se guarda en JSON para comparar
+ejecuciones con --compare.
+
+Uso:
+    python benchmarks/end_to_end.py --uploads 30 --burst-size 10 --burst-interval 5
+    python benchmarks/end_to_end.py --anthropic-rate-limit 0.5 --compare benchmarks/results/anterior.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import unquote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from local_services import AnthropicStub, AssemblyAIStub, LocalAWS  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BUCKET = 'benchmark-bucket'
+NO_STAGE = '(sin etapa)'
+
+# Escala de cada Lambda en el reporte y en el archivo de resultados
+LAMBDAS = (
+    ("create-upload-link", "lambda-create-upload-link"),
+    ("audio-process", "lambda-audio-process"),
+    ("get-status", "lambda-get-status"),
+)
+
+class Context:
+    def __init__(self, timeout_seconds=900):
+        self.aws_request_id = str(uuid.uuid4())
+        self.function_name = "benchmark"
+        self.deadline = time.time() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.time()) * 1000)
+
+class Recorder:
+    """Latencias por invocación, peticiones a S3 por etapa y resultado de cada archivo"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.invocations = defaultdict(list)
+        self.responses = defaultdict(Counter)
+        self.s3_calls = Counter()
+        self.uploads = []
+        self.stage = threading.local()
+
+    def current_stage(self):
+        return getattr(self.stage, 'name', None) or NO_STAGE
+
+    def invoke(self, label, module, event):
+        start = time.perf_counter()
+        response = module.lambda_handler(event, Context())
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.invocations[label].append(elapsed)
+            self.responses[label][str(response.get('statusCode'))] += 1
+        return response
+
+    def track(self, label, module):
+        """Anotar la etapa activa (span) del hilo y contar las llamadas a S3 de los clientes del módulo"""
+        recorder = self
+        original_span = module.span
+
+        @contextmanager
+        def tracked_span(stage):
+            previous = getattr(recorder.stage, 'name', None)
+            recorder.stage.name = stage
+            try:
+                with original_span(stage):
+                    yield
+            finally:
+                recorder.stage.name = previous
+
+        def count_call(model, **kwargs):
+            with recorder.lock:
+                recorder.s3_calls[(label, recorder.current_stage(), model.name)] += 1
+
+        module.span = tracked_span
+        emitters = [client.meta.events for name, client in vars(module).items()
+                    if name.endswith('_client') and hasattr(client, 'meta')]
+        if hasattr(module, '_boto_session'):
+            # lambda-audio-process crea sus clientes en el primer uso a partir de esta sesión
+            emitters.append(module._boto_session.events)
+        for emitter in emitters:
+            emitter.register('before-call.s3', count_call)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def distribution(values):
+    return {
+        "n": len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None
+    }
+
+def load_lambda(name, folder):
+    """Importar lambda_function de la carpeta con un nombre de módulo propio"""
+    path = os.path.join(ROOT, folder)
+    sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(path, 'lambda_function.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def post_form(url, fields, data, file_name):
+    """Subir un archivo con los campos de un POST prefirmado, como el navegador"""
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+        for name, value in fields.items()
+    ]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8') + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    request = urllib.request.Request(url, data=b''.join(parts), method='POST',
+                                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
+def configure(args, aws, assemblyai, anthropic):
+    """Variables de entorno que dirigen las Lambdas a los servicios locales (antes de importarlas)"""
+    os.environ.update({
+        'AWS_ENDPOINT_URL_S3': aws.url,
+        'AWS_ENDPOINT_URL_SECRETS_MANAGER': aws.url,
+        'ASSEMBLYAI_BASE_URL': assemblyai.url,
+        'ANTHROPIC_BASE_URL': anthropic.url,
+        'METRICS_SINK': 'memory',
+        'BUCKET_NAME': BUCKET,
+        'S3_BUCKET_NAME': BUCKET,
+        'AWS_EC2_METADATA_DISABLED': 'true',
+    })
+    for name, value in (('AWS_DEFAULT_REGION', 'us-east-1'), ('AWS_ACCESS_KEY_ID', 'benchmark'),
+                        ('AWS_SECRET_ACCESS_KEY', 'benchmark')):
+        os.environ.setdefault(name, value)
+
+def run_upload(index, args, modules, recorder, durations, payloads, rng):
+    """Flujo de un archivo: URL de subida, POST a S3 y consultas de estado hasta terminar"""
+    start = time.perf_counter()
+    file_name = f"grabacion_{index:04d}.mp3"
+    data, seconds = payloads[index]
+
+    response = recorder.invoke("create-upload-link", modules["create-upload-link"], {"body": json.dumps({
+        "file_name": file_name, "content_type": "audio/mpeg", "file_size": len(data)
+    })})
+    upload = json.loads(response['body'])
+    durations[upload['file_key']] = seconds
+    post_form(upload['upload_url'], upload['fields'], data, file_name)
+
+    etag, since, polls = None, None, 0
+    status = {"status": "PENDING"}
+    deadline = time.time() + args.timeout
+    while status.get('status') not in ('COMPLETED', 'ERROR') and time.time() < deadline:
+        event = {"pathParameters": {"fileKey": upload['file_key']}, "headers": {}}
+        if etag:
+            event['headers']['If-None-Match'] = etag
+        if args.long_poll:
+            event['queryStringParameters'] = {"wait": str(args.long_poll), **({"since": since} if since else {})}
+        else:
+            time.sleep(args.poll_interval * rng.uniform(0.8, 1.2))
+        response = recorder.invoke("get-status", modules["get-status"], event)
+        polls += 1
+        if response['statusCode'] == 200:
+            status = json.loads(response['body'])
+            etag = response['headers'].get('ETag')
+            since = status.get('timestamp')
+
+    return {
+        "file_key": upload['file_key'],
+        "status": status.get('status', 'TIMEOUT') if status.get('status') in ('COMPLETED', 'ERROR') else 'TIMEOUT',
+        "e2e_ms": (time.perf_counter() - start) * 1000,
+        "finished_at": time.perf_counter(),
+        "started_at": start,
+        "polls": polls,
+        "cache_hit": bool(status.get('cache_hit'))
+    }
+
+def make_payloads(args, rng):
+    """Contenido y duración de cada archivo; una fracción repite un archivo anterior (caché por contenido)"""
+    payloads = []
+    for index in range(args.uploads):
+        if payloads and rng.random() < args.duplicate_ratio:
+            payloads.append(rng.choice(payloads))
+        else:
+            seconds = args.audio_seconds * rng.uniform(0.5, 1.5)
+            payloads.append((rng.randbytes(args.upload_kb * 1024), seconds))
+    return payloads
+
+def stage_metrics(modules, recorder):
+    """Latencias de los spans de cada Lambda (METRICS_SINK=memory) junto a sus peticiones a S3"""
+    stages = {}
+    for label, module in modules.items():
+        latencies = defaultdict(list)
+        for record in module.collected_metrics:
+            # Las líneas EMF de las rutas de análisis (dimensión Route) no son spans
+            if 'Stage' in record:
+                latencies[record['Stage']].append(record['StageLatency'])
+        names = set(latencies) | {stage for (owner, stage, _) in recorder.s3_calls if owner == label}
+        for stage in sorted(names):
+            operations = {operation: count for (owner, name, operation), count in recorder.s3_calls.items()
+                          if owner == label and name == stage}
+            stages[f"{label}/{stage}"] = {**distribution(latencies.get(stage, [])), "s3": operations}
+    return stages
+
+def summarize(args, recorder, modules, services, elapsed):
+    uploads = recorder.uploads
+    completed = [upload for upload in uploads if upload['status'] == 'COMPLETED']
+    window = (max(u['finished_at'] for u in uploads) - min(u['started_at'] for u in uploads)) if uploads else 0
+    s3_total = sum(services['s3'].requests.values())
+    return {
+        "fecha": datetime.now().isoformat(timespec='seconds'),
+        "parametros": {name: value for name, value in vars(args).items() if name not in ('output', 'compare')},
+        "resumen": {
+            "archivos": len(uploads),
+            "completados": len(completed),
+            "errores": len([u for u in uploads if u['status'] == 'ERROR']),
+            "sin_terminar": len([u for u in uploads if u['status'] == 'TIMEOUT']),
+            "aciertos_cache": len([u for u in completed if u['cache_hit']]),
+            "duracion_s": elapsed,
+            "archivos_por_minuto": len(completed) / window * 60 if window else 0,
+            "extremo_a_extremo_ms": distribution([u['e2e_ms'] for u in completed]),
+            "consultas_por_archivo": sum(u['polls'] for u in uploads) / len(uploads) if uploads else 0,
+            "peticiones_s3_por_archivo": s3_total / len(uploads) if uploads else 0
+        },
+        "invocaciones": {
+            label: {**distribution(recorder.invocations[label]), "respuestas": dict(recorder.responses[label])}
+            for label, _ in LAMBDAS
+        },
+        "etapas": stage_metrics(modules, recorder),
+        "servicios": {name: dict(service.requests) for name, service in services.items()}
+    }
+
+def fmt(value, digits=1):
+    return '-' if value is None else f"{value:.{digits}f}"
+
+def print_report(results):
+    summary = results['resumen']
+    e2e = summary['extremo_a_extremo_ms']
+    print("\n| archivos | completados | errores | caché | archivos/min | e2e p50 (s) | e2e p95 (s) | e2e p99 (s) | consultas/archivo | S3/archivo |")
+    print("|---------:|------------:|--------:|------:|-------------:|------------:|------------:|------------:|------------------:|-----------:|")
+    print(f"| {summary['archivos']} | {summary['completados']} | {summary['errores'] + summary['sin_terminar']} "
+          f"| {summary['aciertos_cache']} | {summary['archivos_por_minuto']:.1f} "
+          f"| {fmt(e2e['p50'] and e2e['p50'] / 1000, 2)} | {fmt(e2e['p95'] and e2e['p95'] / 1000, 2)} "
+          f"| {fmt(e2e['p99'] and e2e['p99'] / 1000, 2)} | {summary['consultas_por_archivo']:.1f} "
+          f"| {summary['peticiones_s3_por_archivo']:.1f} |")
+
+    print("\n| Lambda | invocaciones | p50 (ms) | p95 (ms) | p99 (ms) | máx (ms) | respuestas |")
+    print("|--------|-------------:|---------:|---------:|---------:|---------:|------------|")
+    for label, stats in results['invocaciones'].items():
+        responses = ', '.join(f"{code}: {count}" for code, count in sorted(stats['respuestas'].items()))
+        print(f"| {label} | {stats['n']} | {fmt(stats['p50'])} | {fmt(stats['p95'])} | {fmt(stats['p99'])} "
+              f"| {fmt(stats['max'])} | {responses} |")
+
+    print("\n| etapa | n | p50 (ms) | p95 (ms) | p99 (ms) | peticiones S3 |")
+    print("|-------|--:|---------:|---------:|---------:|---------------|")
+    for name, stats in results['etapas'].items():
+        s3 = ', '.join(f"{operation} {count}" for operation, count in sorted(stats['s3'].items()))
+        print(f"| {name} | {stats['n']} | {fmt(stats['p50'])} | {fmt(stats['p95'])} | {fmt(stats['p99'])} | {s3} |")
+
+    print("\n| servicio | peticiones |")
+    print("|----------|------------|")
+    for name, counts in results['servicios'].items():
+        print(f"| {name} | {', '.join(f'{key} {value}' for key, value in sorted(counts.items()))} |")
+
+def headline_metrics(results):
+    """Métricas comparables entre ejecuciones"""
+    summary = results['resumen']
+    metrics = {f"e2e {name} (ms)": summary['extremo_a_extremo_ms'][name] for name in ('p50', 'p95', 'p99')}
+    metrics["archivos/min"] = summary['archivos_por_minuto']
+    metrics["S3/archivo"] = summary['peticiones_s3_por_archivo']
+    for label, stats in results['invocaciones'].items():
+        for name in ('p50', 'p95', 'p99'):
+            metrics[f"{label} {name} (ms)"] = stats[name]
+    return metrics
+
+def print_comparison(previous, current, previous_path):
+    print(f"\nComparación con {previous_path} ({previous['fecha']}):\n")
+    print("| métrica | anterior | actual | cambio |")
+    print("|---------|---------:|-------:|-------:|")
+    before = headline_metrics(previous)
+    for name, value in headline_metrics(current).items():
+        old = before.get(name)
+        change = f"{(value - old) / old * 100:+.1f}%" if old and value is not None else '-'
+        print(f"| {name} | {fmt(old)} | {fmt(value)} | {change} |")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=30)
+    parser.add_argument('--burst-size', type=int, default=10, help='archivos que llegan a la vez')
+    parser.add_argument('--burst-interval', type=float, default=5.0, help='segundos entre ráfagas')
+    parser.add_argument('--concurrency', type=int, default=10, help='invocaciones simultáneas de lambda-audio-process')
+    parser.add_argument('--audio-seconds', type=float, default=300.0, help='duración media del audio (±50%%)')
+    parser.add_argument('--upload-kb', type=int, default=64, help='tamaño del contenido subido')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0, help='fracción de archivos que repiten contenido')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='segundos entre consultas de estado')
+    parser.add_argument('--long-poll', type=int, default=0, help='usar ?wait=<segundos> en lugar de consultas periódicas')
+    parser.add_argument('--timeout', type=float, default=300.0, help='segundos máximos por archivo')
+    parser.add_argument('--s3-latency-ms', type=float, default=15.0)
+    parser.add_argument('--assemblyai-latency-ms', type=float, default=150.0)
+    parser.add_argument('--assemblyai-queue-seconds', type=float, default=2.0)
+    parser.add_argument('--assemblyai-rtf', type=float, default=0.05, help='segundos de procesamiento por segundo de audio')
+    parser.add_argument('--assemblyai-error-rate', type=float, default=0.0, help='fracción de respuestas 500')
+    parser.add_argument('--assemblyai-rate-limit', type=float, default=0.0, help='peticiones/s antes de responder 429 (0: sin límite)')
+    parser.add_argument('--transcript-poll-seconds', type=float, help='intervalo de consulta del SDK de AssemblyAI (por defecto el del SDK)')
+    parser.add_argument('--anthropic-latency-ms', type=float, default=2000.0)
+    parser.add_argument('--anthropic-error-rate', type=float, default=0.0, help='fracción de respuestas 500')
+    parser.add_argument('--anthropic-rate-limit', type=float, default=0.0, help='peticiones/s antes de responder 429 (0: sin límite)')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After de las respuestas 429')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='archivo JSON de resultados (por defecto benchmarks/results/end_to_end_<fecha>.json)')
+    parser.add_argument('--compare', help='archivo JSON de una ejecución anterior')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    durations = {}
+
+    def duration_for(audio_url):
+        key = unquote(urlsplit(audio_url).path).lstrip('/').partition('/')[2]
+        return durations.get(key, args.audio_seconds)
+
+    aws = LocalAWS(args.s3_latency_ms, seed=args.seed).start()
+    assemblyai = AssemblyAIStub(
+        duration_for, args.assemblyai_queue_seconds, args.assemblyai_rtf,
+        latency_ms=args.assemblyai_latency_ms, error_rate=args.assemblyai_error_rate,
+        rate_limit=args.assemblyai_rate_limit, retry_after=args.retry_after, seed=args.seed
+    ).start()
+    anthropic = AnthropicStub(
+        latency_ms=args.anthropic_latency_ms, error_rate=args.anthropic_error_rate,
+        rate_limit=args.anthropic_rate_limit, burst=2, retry_after=args.retry_after, seed=args.seed
+    ).start()
+    services = {"s3": aws, "assemblyai": assemblyai, "anthropic": anthropic}
+    configure(args, aws, assemblyai, anthropic)
+
+    modules = {label: load_lambda(label.replace('-', '_'), folder) for label, folder in LAMBDAS}
+    for label, module in modules.items():
+        recorder.track(label, module)
+    audio = modules["audio-process"]
+    aws.secrets[audio.SECRET_NAME] = {"ASSEMBLYAI_API_KEY": "local", "ANTHROPIC_API_KEY": "local"}
+
+    # El arranque en frío se mide con cold_start.py; aquí los SDKs se importan antes de empezar
+    aai = audio.lazy_import('assemblyai')
+    audio.lazy_import('anthropic')
+    if args.transcript_poll_seconds is not None:
+        aai.settings.polling_interval = args.transcript_poll_seconds
+    audio.collected_metrics.clear()
+
+    # Notificación de S3: cada objeto nuevo en uploads/ invoca lambda-audio-process
+    process_pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="audio-process")
+
+    def on_object_created(bucket, key, size, etag):
+        if key.startswith('uploads/'):
+            event = {"Records": [{"eventSource": "aws:s3", "eventName": "ObjectCreated:Post", "s3": {
+                "bucket": {"name": bucket}, "object": {"key": key, "size": size, "eTag": etag}
+            }}]}
+            process_pool.submit(recorder.invoke, "audio-process", audio, event)
+
+    aws.on_object_created = on_object_created
+    payloads = make_payloads(args, rng)
+
+    print(f"{args.uploads} archivos en ráfagas de {args.burst_size} cada {args.burst_interval:g}s, "
+          f"{args.concurrency} invocaciones simultáneas de lambda-audio-process")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.uploads), thread_name_prefix="cliente") as clients:
+        futures = []
+        for index in range(args.uploads):
+            delay = start + (index // max(1, args.burst_size)) * args.burst_interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(clients.submit(run_upload, index, args, modules, recorder, durations, payloads,
+                                          random.Random(args.seed + index)))
+        recorder.uploads = [future.result() for future in futures]
+    process_pool.shutdown(wait=True)
+    elapsed = time.perf_counter() - start
+
+    results = summarize(args, recorder, modules, services, elapsed)
+    print_report(results)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"end_to_end_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), results, args.compare)
+
+    for service in services.values():
+        service.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark: historial de trabajos (lambda-job-history) frente a listar y leer los estados uno a uno
+
+Genera registros de trabajos terminados con job_manifest.py (COMPLETED con un 5% de ERROR,
+repartidos uniformemente en los últimos días) y los deja en jobs/pending/ del emulador de S3,
+junto con el processing/<nombre>_status.json de cada trabajo. La compactación los funde en
+archivos diarios (días cerrados) y segmentos horarios (hoy); después llegan registros nuevos
+de la hora en curso, que las consultas leen todavía como pendientes.
+
+Cada consulta se mide con caché fría (contenedor nuevo) y caliente, contra la alternativa sin
+manifiesto: listar processing/ y leer todos los estados para filtrar por fecha.
+
+Uso:
+    python benchmarks/job_history.py --days 7 --jobs-per-hour 100 --s3-latency-ms 15
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda-audio-process'))
+from local_services import LatencyModel, LocalAWS  # noqa: E402
+from end_to_end import distribution, fmt, load_lambda  # noqa: E402
+import job_manifest  # noqa: E402
+
+BUCKET = "job-history-benchmark"
+
+def make_job(rng, index, finished_at):
+    """Estado final de un trabajo y su registro en el manifiesto"""
+    file_key = f"{'live' if rng.random() < 0.2 else 'uploads'}/grabacion_{index:07d}.mp3"
+    failed = rng.random() < 0.05
+    status_data = {
+        "file_key": file_key,
+        "status": "ERROR" if failed else "COMPLETED",
+        "message": "Error: La transcripción falló" if failed else "Procesamiento completado exitosamente",
+        "timestamp": datetime.fromtimestamp(finished_at, tz=timezone.utc).isoformat(),
+        "tiempo_total": round(rng.lognormvariate(3.5, 0.5), 2),
+        "cache_hit": rng.random() < 0.1,
+        "resultado_key": None if failed else f"results/grabacion_{index:07d}_resultado.json"
+    }
+    return status_data, job_manifest.build_job_record(file_key, status_data, finished_at)
+
+def seed_jobs(aws, rng, start, end, count, first_index, with_status=True):
+    for offset in range(count):
+        finished_at = rng.uniform(start, end)
+        status_data, record = make_job(rng, first_index + offset, finished_at)
+        aws.store(BUCKET, job_manifest.pending_key(record), job_manifest.encode_record(record).encode('utf-8'),
+                  'application/json', {})
+        if with_status:
+            base_name = os.path.splitext(os.path.basename(status_data['file_key']))[0]
+            aws.store(BUCKET, f"processing/{base_name}_status.json", json.dumps(status_data).encode('utf-8'),
+                      'application/json', {})
+
+def naive_query(module, start_ms, end_ms, status=None):
+    """Sin manifiesto: listar todos los estados, leerlos y filtrar por fecha"""
+    keys = [key for key in module.list_keys('processing/') if key.endswith('_status.json')]
+
+    def read(key):
+        return json.loads(module.s3_client.get_object(Bucket=module.BUCKET_NAME, Key=key)['Body'].read())
+
+    with ThreadPoolExecutor(max_workers=module.QUERY_MAX_WORKERS) as executor:
+        states = list(executor.map(read, keys))
+    return [state for state in states
+            if start_ms <= datetime.fromisoformat(state['timestamp']).timestamp() * 1000 < end_ms
+            and (not status or state['status'] == status)]
+
+def reset_caches(module):
+    for cache in (module._manifest_cache, module._segment_cache, module._pending_cache):
+        cache.clear()
+
+def measure(aws, func, runs):
+    latencies, requests = [], 0
+    for _ in range(runs):
+        before = sum(aws.requests.values())
+        start = time.perf_counter()
+        result = func()
+        latencies.append((time.perf_counter() - start) * 1000)
+        requests += sum(aws.requests.values()) - before
+    return distribution(latencies), requests / runs, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=7, help='días de historial, incluido hoy')
+    parser.add_argument('--jobs-per-hour', type=int, default=100)
+    parser.add_argument('--fresh-jobs', type=int, default=50, help='registros de la hora en curso sin compactar')
+    parser.add_argument('--runs', type=int, default=5, help='repeticiones por consulta')
+    parser.add_argument('--s3-latency-ms', type=float, default=15.0, help='latencia modelada por petición a S3')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    aws = LocalAWS(0, seed=args.seed).start()
+    os.environ.update({
+        'AWS_ENDPOINT_URL_S3': aws.url,
+        'BUCKET_NAME': BUCKET,
+        'METRICS_SINK': 'none',
+        'AWS_EC2_METADATA_DISABLED': 'true',
+    })
+    for name, value in (('AWS_DEFAULT_REGION', 'us-east-1'), ('AWS_ACCESS_KEY_ID', 'benchmark'),
+                        ('AWS_SECRET_ACCESS_KEY', 'benchmark')):
+        os.environ.setdefault(name, value)
+    module = load_lambda("job_history", "lambda-job-history")
+
+    rng = random.Random(args.seed)
+    now = time.time()
+    total = args.days * 24 * args.jobs_per_hour
+    seed_jobs(aws, rng, now - args.days * 86400, now - 60, total, 0)
+    print(f"{total} trabajos en {args.days} días ({args.jobs_per_hour}/hora)")
+
+    start = time.perf_counter()
+    runs = []
+    while True:
+        summary = module.compact_jobs()
+        if not summary['compacted']:
+            break
+        runs.append(summary)
+    manifest, _ = module.load_manifest()
+    print(f"Compactación: {sum(run['compacted'] for run in runs)} registros en {len(runs)} ejecuciones, "
+          f"{time.perf_counter() - start:.1f}s; {len(manifest['days'])} archivos diarios, "
+          f"{len(manifest['hours'])} segmentos horarios")
+
+    seed_jobs(aws, rng, now - 600, now - 1, args.fresh_jobs, total, with_status=False)
+
+    end_ms = int(time.time() * 1000)
+    day_start = datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    queries = [
+        ("últimas 24 h", {'desde': str((end_ms - 86400000) / 1000), 'hasta': str(end_ms / 1000)},
+         (end_ms - 86400000, end_ms, None)),
+        (f"últimos {args.days} días", {'desde': str((end_ms - args.days * 86400000) / 1000), 'hasta': str(end_ms / 1000)},
+         (end_ms - args.days * 86400000, end_ms, None)),
+        ("errores de hoy", {'desde': day_start.isoformat(), 'hasta': str(end_ms / 1000), 'status': 'ERROR'},
+         (int(day_start.timestamp() * 1000), end_ms, 'ERROR')),
+    ]
+
+    def history(params):
+        response = module.lambda_handler({'queryStringParameters': params}, None)
+        assert response['statusCode'] == 200, response['body']
+        return json.loads(response['body'])
+
+    aws.latency = LatencyModel(args.s3_latency_ms)
+    print("\n| consulta | modo | trabajos | p50 (ms) | p95 (ms) | peticiones S3 |")
+    print("|----------|------|---------:|---------:|---------:|--------------:|")
+    for label, params, naive_args in queries:
+        cold, cold_requests, result = measure(aws, lambda: (reset_caches(module), history(params))[1], args.runs)
+        warm, warm_requests, _ = measure(aws, lambda: history(params), args.runs)
+        naive, naive_requests, naive_result = measure(aws, lambda: naive_query(module, *naive_args), 1)
+        # Los registros frescos no tienen estado en processing/: la alternativa los omite
+        for mode, stats, requests, count in (("manifiesto, caché fría", cold, cold_requests, result['total']),
+                                             ("manifiesto, caché caliente", warm, warm_requests, result['total']),
+                                             ("listar estados", naive, naive_requests, len(naive_result))):
+            print(f"| {label} | {mode} | {count} | {fmt(stats['p50'])} | {fmt(stats['p95'])} | {requests:.0f} |")
+
+    aws.stop()
+
+if __name__ == '__main__':
+    main()
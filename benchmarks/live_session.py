@@ -0,0 +1,203 @@
+"""
+Benchmark: sesiones de transcripción en vivo contra sustitutos locales
+
+Cada sesión sigue el flujo del cliente: pide la sesión a lambda-create-upload-link
+(action=live_init), sube fragmentos PCM de --chunk-seconds con el POST prefirmado al ritmo de la
+grabación (acelerado --speed veces) y termina con el marcador "end". El primer fragmento invoca
+lambda-audio-process, que los envía a AssemblyAIStreamingStub (WebSocket v3) mientras llegan.
+Un hilo por sesión consulta lambda-get-status cada --poll-interval segundos.
+
+Se reporta cuánto tarda cada intervención en aparecer en el estado desde que se subió el
+fragmento con su último audio, cuándo aparece el primer texto, las actualizaciones del análisis
+parcial y el tiempo desde el marcador de fin hasta COMPLETED. Al terminar se comprueba que
+resultado.json mantiene el esquema {metadata, transcripcion, analisis}.
+
+Uso:
+    python benchmarks/live_session.py --sessions 3 --audio-seconds 60 --speed 4
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from local_services import AnthropicStub, AssemblyAIStreamingStub, LocalAWS  # noqa: E402
+from end_to_end import BUCKET, Recorder, configure, distribution, fmt, load_lambda, post_form  # noqa: E402
+
+RESULT_SCHEMA = {"metadata", "transcripcion", "analisis"}
+
+def run_session(index, args, modules, recorder, aws):
+    """Flujo de una sesión: live_init, fragmentos al ritmo de la grabación, marcador de fin y consultas de estado"""
+    response = recorder.invoke("create-upload-link", modules["create-upload-link"], {"body": json.dumps({"action": "live_init"})})
+    session = json.loads(response['body'])
+    sample_rate = session['audio_format']['sample_rate']
+    chunk_ms = int(args.chunk_seconds * 1000)
+    chunk_count = int(args.audio_seconds // args.chunk_seconds)
+    rng = random.Random(args.seed + index)
+
+    uploaded_at = {}
+    state = {"end_at": None, "done": False}
+    observed = {"utterances": {}, "first_text_ms": None, "analyses": set(), "status": {}, "polls": 0}
+
+    def poll():
+        start = time.perf_counter()
+        while not state['done']:
+            time.sleep(args.poll_interval)
+            response = recorder.invoke("get-status", modules["get-status"], {
+                "pathParameters": {"fileKey": session['file_key']}, "headers": {}
+            })
+            observed['polls'] += 1
+            if response['statusCode'] != 200:
+                continue
+            status = json.loads(response['body'])
+            observed['status'] = status
+            now = time.perf_counter()
+            if observed['first_text_ms'] is None and (status.get('parcial') or status.get('utterances_total')):
+                observed['first_text_ms'] = (now - start) * 1000
+            for offset, utterance in enumerate(status.get('utterances_recientes') or []):
+                position = status['utterances_desde'] + offset
+                if position not in observed['utterances']:
+                    # Fragmento que contiene el final de la intervención
+                    chunk = min(max(0, (utterance['end'] - 1) // chunk_ms), chunk_count - 1)
+                    observed['utterances'][position] = (now - uploaded_at[chunk]) * 1000 if chunk in uploaded_at else None
+            if status.get('analisis_parcial'):
+                observed['analyses'].add(status['analisis_parcial'].get('timestamp_analisis'))
+            if status.get('status') in ('COMPLETED', 'ERROR'):
+                state['done'] = True
+                observed['completed_at'] = now
+
+    poller = threading.Thread(target=poll, daemon=True)
+    poller.start()
+
+    # Grabación: un fragmento cada chunk_seconds / speed
+    start = time.perf_counter()
+    for seq in range(chunk_count):
+        delay = start + (seq + 1) * args.chunk_seconds / args.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        data = bytes(rng.getrandbits(8) for _ in range(16)) * (sample_rate * 2 * chunk_ms // 1000 // 16)
+        post_form(session['upload_url'], session['fields'], data, f"{seq:06d}.pcm")
+        uploaded_at[seq] = time.perf_counter()
+    post_form(session['upload_url'], session['fields'], b"", session['end_marker'])
+    state['end_at'] = time.perf_counter()
+
+    poller.join(args.timeout)
+    state['done'] = True
+    status = observed['status']
+
+    schema_ok = None
+    if status.get('status') == 'COMPLETED':
+        entry = aws.objects.get((BUCKET, status['resultado_key']))
+        result = json.loads(entry['data']) if entry else {}
+        schema_ok = set(result) == RESULT_SCHEMA and result['transcripcion']['data'].get('modo') == 'live'
+        final_utterances = len(result.get('transcripcion', {}).get('utterances', []))
+    else:
+        final_utterances = 0
+
+    return {
+        "file_key": session['file_key'],
+        "status": status.get('status', 'TIMEOUT'),
+        "utterance_ms": [latency for latency in observed['utterances'].values() if latency is not None],
+        "utterances_seen": len(observed['utterances']),
+        "utterances_final": final_utterances,
+        "first_text_ms": observed['first_text_ms'],
+        "partial_analyses": len(observed['analyses']),
+        "finalize_ms": (observed['completed_at'] - state['end_at']) * 1000 if 'completed_at' in observed else None,
+        "polls": observed['polls'],
+        "schema_ok": schema_ok
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=3, help='sesiones simultáneas')
+    parser.add_argument('--audio-seconds', type=float, default=60.0, help='duración de cada grabación')
+    parser.add_argument('--chunk-seconds', type=float, default=1.0, help='audio por fragmento subido')
+    parser.add_argument('--speed', type=float, default=4.0, help='múltiplo del tiempo real al que se graba y se envía')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='segundos entre consultas de estado')
+    parser.add_argument('--status-interval', type=float, default=1.0, help='LIVE_STATUS_INTERVAL_SECONDS')
+    parser.add_argument('--analysis-interval', type=float, default=5.0, help='LIVE_ANALYSIS_INTERVAL_SECONDS')
+    parser.add_argument('--turn-seconds', type=float, default=5.0, help='audio por intervención en el stub')
+    parser.add_argument('--timeout', type=float, default=300.0, help='segundos máximos por sesión tras el marcador de fin')
+    parser.add_argument('--s3-latency-ms', type=float, default=15.0)
+    parser.add_argument('--streaming-latency-ms', type=float, default=50.0)
+    parser.add_argument('--anthropic-latency-ms', type=float, default=1500.0)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    aws = LocalAWS(args.s3_latency_ms, seed=args.seed).start()
+    streaming = AssemblyAIStreamingStub(args.turn_seconds, latency_ms=args.streaming_latency_ms,
+                                        max_speed=args.speed * 1.5, seed=args.seed).start()
+    anthropic = AnthropicStub(latency_ms=args.anthropic_latency_ms, seed=args.seed).start()
+    configure(args, aws, streaming, anthropic)
+    os.environ.pop('ASSEMBLYAI_BASE_URL')
+    os.environ.update({
+        'ASSEMBLYAI_STREAMING_HOST': streaming.url,
+        'LIVE_MAX_SEND_SPEED': str(args.speed * 1.2),
+        'LIVE_STATUS_INTERVAL_SECONDS': str(args.status_interval),
+        'LIVE_ANALYSIS_INTERVAL_SECONDS': str(args.analysis_interval),
+        'LIVE_CHUNK_POLL_SECONDS': str(min(0.25, args.chunk_seconds / args.speed / 2)),
+    })
+
+    modules = {label: load_lambda(label.replace('-', '_'), folder) for label, folder in (
+        ("create-upload-link", "lambda-create-upload-link"),
+        ("audio-process", "lambda-audio-process"),
+        ("get-status", "lambda-get-status"),
+    )}
+    for label, module in modules.items():
+        recorder.track(label, module)
+    audio = modules["audio-process"]
+    aws.secrets[audio.SECRET_NAME] = {"ASSEMBLYAI_API_KEY": "local", "ANTHROPIC_API_KEY": "local"}
+    audio.lazy_import('assemblyai.streaming.v3')
+    audio.lazy_import('anthropic')
+    audio.collected_metrics.clear()
+
+    # Notificación de S3 filtrada como en el despliegue: prefijo live/, sufijo /000000.pcm
+    process_pool = ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="audio-process")
+
+    def on_object_created(bucket, key, size, etag):
+        if key.startswith('live/') and key.endswith('/000000.pcm'):
+            event = {"Records": [{"eventSource": "aws:s3", "eventName": "ObjectCreated:Post", "s3": {
+                "bucket": {"name": bucket}, "object": {"key": key, "size": size, "eTag": etag}
+            }}]}
+            process_pool.submit(recorder.invoke, "audio-process", audio, event)
+
+    aws.on_object_created = on_object_created
+
+    print(f"{args.sessions} sesiones de {args.audio_seconds:g}s de audio en fragmentos de {args.chunk_seconds:g}s, "
+          f"grabadas a {args.speed:g}x tiempo real")
+    with ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="cliente") as clients:
+        sessions = list(clients.map(lambda index: run_session(index, args, modules, recorder, aws), range(args.sessions)))
+    process_pool.shutdown(wait=True)
+
+    utterance = distribution([latency for s in sessions for latency in s['utterance_ms']])
+    first_text = distribution([s['first_text_ms'] for s in sessions if s['first_text_ms'] is not None])
+    finalize = distribution([s['finalize_ms'] for s in sessions if s['finalize_ms'] is not None])
+
+    print("\n| sesiones | completadas | esquema OK | intervenciones vistas / finales | análisis parciales | consultas/sesión |")
+    print("|---------:|------------:|-----------:|--------------------------------:|-------------------:|-----------------:|")
+    print(f"| {len(sessions)} | {len([s for s in sessions if s['status'] == 'COMPLETED'])} "
+          f"| {len([s for s in sessions if s['schema_ok']])} "
+          f"| {sum(s['utterances_seen'] for s in sessions)} / {sum(s['utterances_final'] for s in sessions)} "
+          f"| {sum(s['partial_analyses'] for s in sessions)} | {sum(s['polls'] for s in sessions) / len(sessions):.1f} |")
+
+    print("\n| latencia | n | p50 (ms) | p95 (ms) | máx (ms) |")
+    print("|----------|--:|---------:|---------:|---------:|")
+    for name, stats in (("intervención visible en el estado", utterance), ("primer texto", first_text),
+                        ("marcador de fin hasta COMPLETED", finalize)):
+        print(f"| {name} | {stats['n']} | {fmt(stats['p50'])} | {fmt(stats['p95'])} | {fmt(stats['max'])} |")
+
+    print("\n| servicio | peticiones |")
+    print("|----------|------------|")
+    for name, service in (("s3", aws), ("assemblyai-streaming", streaming), ("anthropic", anthropic)):
+        print(f"| {name} | {', '.join(f'{key} {value}' for key, value in sorted(service.requests.items()))} |")
+
+    for service in (aws, streaming, anthropic):
+        service.stop()
+
+if __name__ == '__main__':
+    main()
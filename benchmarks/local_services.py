@@ -0,0 +1,659 @@
+"""
+Sustitutos locales de los servicios externos para benchmarks sin red ni credenciales
+
+- LocalAWS: emulador en memoria de S3 (API REST con direcciones path-style) y de
+  GetSecretValue de Secrets Manager. Los clientes boto3 llegan a él con AWS_ENDPOINT_URL_S3 y
+  AWS_ENDPOINT_URL_SECRETS_MANAGER.
+- AssemblyAIStub: POST /v2/transcript y GET /v2/transcript/<id>, con tiempo en cola y factor de
+  tiempo real (ASSEMBLYAI_BASE_URL).
+- AnthropicStub: POST /v1/messages, con respuesta de texto JSON o tool_use según la petición
+  (ANTHROPIC_BASE_URL).
+- AssemblyAIStreamingStub: WebSocket /v3/ws de AssemblyAI Streaming (ASSEMBLYAI_STREAMING_HOST),
+  con turnos parciales y finales generados a partir del audio recibido. Usa websockets, que
+  instala el SDK de AssemblyAI.
+
+Cada servicio escucha en 127.0.0.1 en un puerto libre y cuenta sus peticiones. Los stubs de
+proveedores admiten latencia, tasa de errores 5xx y un límite de peticiones por segundo por
+encima del cual responden 429 con Retry-After.
+"""
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+S3_XML_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+VOCABULARY = (
+    "presupuesto proyecto reunión cliente entrega equipo propuesta contrato factura calendario "
+    "revisión objetivo trimestre ventas marketing producto lanzamiento campaña informe datos "
+    "plataforma servidor despliegue pruebas diseño usuarios soporte incidencia prioridad riesgo"
+).split()
+
+class LatencyModel:
+    """Latencia media en milisegundos con variación uniforme de ±jitter (fracción de la media)"""
+
+    def __init__(self, mean_ms, jitter=0.25):
+        self.mean_ms = mean_ms
+        self.jitter = jitter
+
+    def sample(self, rng):
+        return max(0.0, self.mean_ms * rng.uniform(1 - self.jitter, 1 + self.jitter)) / 1000
+
+class Throttle:
+    """Token bucket del stub: sin tokens, la petición se rechaza con 429"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+class LocalService:
+    """Servidor HTTP local en un hilo; las subclases implementan handle(request)"""
+
+    def __init__(self, latency_ms=0.0, seed=0):
+        self.latency = LatencyModel(latency_ms)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.requests = Counter()
+        self.counter_lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self.counter_lock:
+            self.requests[name] += 1
+
+    def random(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+    def delay(self, model=None):
+        with self.rng_lock:
+            seconds = (model or self.latency).sample(self.rng)
+        if seconds:
+            time.sleep(seconds)
+
+    def start(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def read_body(self):
+                if 'chunked' in self.headers.get('Transfer-Encoding', ''):
+                    return decode_chunked(self.rfile)
+                return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+            def dispatch(self):
+                body = self.read_body()
+                status, headers, payload = service.handle(self, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if 'Content-Length' not in headers:
+                    self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if self.command != 'HEAD' and status not in (204, 304):
+                    self.wfile.write(payload)
+
+            do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = dispatch
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+def decode_chunked(stream):
+    """Cuerpo con Transfer-Encoding: chunked"""
+    data = bytearray()
+    while True:
+        size = int(stream.readline().split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            while stream.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            return bytes(data)
+        data += stream.read(size)
+        stream.readline()
+
+def decode_aws_chunked(body):
+    """Cuerpo con Content-Encoding: aws-chunked (checksums en trailer de botocore)"""
+    data = bytearray()
+    position = 0
+    while True:
+        line_end = body.index(b'\r\n', position)
+        size = int(body[position:line_end].split(b';')[0], 16)
+        position = line_end + 2
+        if size == 0:
+            return bytes(data)
+        data += body[position:position + size]
+        position += size + 2
+
+def json_response(status, data, content_type='application/json', headers=None):
+    return status, {'Content-Type': content_type, **(headers or {})}, json.dumps(data).encode('utf-8')
+
+# =============================================================================
+# S3 Y SECRETS MANAGER
+# =============================================================================
+class LocalAWS(LocalService):
+    """
+    Emulador de S3 en memoria: PutObject/GetObject/HeadObject/DeleteObject (con Range e
+    If-Match/If-None-Match), ListObjectsV2, DeleteObjects y subidas con POST prefirmado.
+    on_object_created(bucket, key, size, etag) emula la notificación de evento de S3
+    """
+
+    def __init__(self, latency_ms=0.0, secrets=None, on_object_created=None, seed=0):
+        super().__init__(latency_ms, seed)
+        self.objects = {}
+        self.objects_lock = threading.Lock()
+        self.secrets = secrets or {}
+        self.on_object_created = on_object_created
+
+    def handle(self, request, body):
+        target = request.headers.get('X-Amz-Target', '')
+        if target.startswith('secretsmanager.'):
+            return self.handle_secrets(target.split('.', 1)[1], body)
+
+        parts = urlsplit(request.path)
+        query = parse_qs(parts.query, keep_blank_values=True)
+        bucket, _, key = unquote(parts.path).lstrip('/').partition('/')
+        if 'aws-chunked' in request.headers.get('Content-Encoding', ''):
+            body = decode_aws_chunked(body)
+
+        method = request.command
+        if not key:
+            if method == 'GET' and query.get('list-type') == ['2']:
+                return self.timed('ListObjectsV2', self.list_objects, bucket, query)
+            if method == 'POST' and 'delete' in query:
+                return self.timed('DeleteObjects', self.delete_objects, bucket, body)
+            if method == 'POST' and request.headers.get('Content-Type', '').startswith('multipart/form-data'):
+                return self.timed('PostObject', self.post_object, bucket, request.headers['Content-Type'], body)
+        elif not any(name in query for name in ('uploads', 'uploadId', 'partNumber')):
+            if method == 'PUT':
+                return self.timed('PutObject', self.put_object, bucket, key, request.headers, body)
+            if method in ('GET', 'HEAD'):
+                return self.timed('GetObject' if method == 'GET' else 'HeadObject',
+                                  self.get_object, bucket, key, request.headers, method == 'HEAD')
+            if method == 'DELETE':
+                return self.timed('DeleteObject', self.delete_object, bucket, key)
+
+        self.count('NotImplemented')
+        return self.error(501, 'NotImplemented', f"{method} {request.path}")
+
+    def timed(self, operation, func, *args):
+        self.count(operation)
+        self.delay()
+        return func(*args)
+
+    def error(self, status, code, message, key=''):
+        payload = (f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code>'
+                   f'<Message>{escape(message)}</Message><Key>{escape(key)}</Key></Error>')
+        return status, {'Content-Type': 'application/xml'}, payload.encode('utf-8')
+
+    def store(self, bucket, key, data, content_type, metadata):
+        entry = {
+            "data": data,
+            "etag": f'"{hashlib.md5(data).hexdigest()}"',
+            "content_type": content_type or 'binary/octet-stream',
+            "metadata": metadata,
+            "last_modified": time.time()
+        }
+        self.objects[(bucket, key)] = entry
+        return entry
+
+    def notify(self, bucket, key, entry):
+        if self.on_object_created:
+            self.on_object_created(bucket, key, len(entry['data']), entry['etag'].strip('"'))
+
+    def put_object(self, bucket, key, headers, body):
+        metadata = {name: value for name, value in headers.items() if name.lower().startswith('x-amz-meta-')}
+        with self.objects_lock:
+            current = self.objects.get((bucket, key))
+            if headers.get('If-None-Match') == '*' and current is not None:
+                return self.error(412, 'PreconditionFailed', 'El objeto ya existe', key)
+            if headers.get('If-Match'):
+                if current is None:
+                    return self.error(404, 'NoSuchKey', 'No existe', key)
+                if headers['If-Match'] != current['etag']:
+                    return self.error(412, 'PreconditionFailed', 'ETag distinto', key)
+            entry = self.store(bucket, key, body, headers.get('Content-Type'), metadata)
+        self.notify(bucket, key, entry)
+        return 200, {'ETag': entry['etag']}, b''
+
+    def post_object(self, bucket, content_type, body):
+        """Subida de formulario con los campos de generate_presigned_post"""
+        boundary = content_type.split('boundary=', 1)[1].strip('"').encode('utf-8')
+        fields, data, file_name = {}, b'', ''
+        for part in body.split(b'--' + boundary)[1:-1]:
+            head, _, value = part[2:-2].partition(b'\r\n\r\n')
+            name = re.search(rb'name="([^"]*)"', head).group(1).decode('utf-8')
+            if name == 'file':
+                data = value
+                match = re.search(rb'filename="([^"]*)"', head)
+                file_name = match.group(1).decode('utf-8') if match else ''
+            else:
+                fields[name] = value.decode('utf-8')
+        key = fields.get('key', '').replace('${filename}', file_name)
+        if not key:
+            return self.error(400, 'InvalidArgument', 'Falta el campo key')
+        with self.objects_lock:
+            entry = self.store(bucket, key, data, fields.get('Content-Type'), {})
+        self.notify(bucket, key, entry)
+        return 204, {'ETag': entry['etag'], 'Location': f"/{bucket}/{key}"}, b''
+
+    def get_object(self, bucket, key, headers, head_only):
+        entry = self.objects.get((bucket, key))
+        if entry is None:
+            return self.error(404, 'NoSuchKey', 'No existe', key)
+        if headers.get('If-Match') and headers['If-Match'] != entry['etag']:
+            return self.error(412, 'PreconditionFailed', 'ETag distinto', key)
+        response_headers = {
+            'ETag': entry['etag'],
+            'Content-Type': entry['content_type'],
+            'Last-Modified': formatdate(entry['last_modified'], usegmt=True),
+            'Accept-Ranges': 'bytes',
+            **entry['metadata']
+        }
+        if headers.get('If-None-Match') == entry['etag']:
+            return 304, response_headers, b''
+
+        data = entry['data']
+        status = 200
+        match = re.match(r'bytes=(\d*)-(\d*)', headers.get('Range') or '')
+        if match:
+            start = int(match.group(1) or 0)
+            end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+            response_headers['Content-Range'] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+            status = 206
+        response_headers['Content-Length'] = str(len(data))
+        return status, response_headers, data
+
+    def delete_object(self, bucket, key):
+        with self.objects_lock:
+            self.objects.pop((bucket, key), None)
+        return 204, {}, b''
+
+    def list_objects(self, bucket, query):
+        prefix = query.get('prefix', [''])[0]
+        max_keys = int(query.get('max-keys', ['1000'])[0])
+        start_after = query.get('continuation-token', query.get('start-after', ['']))[0]
+        keys = sorted(key for (name, key) in list(self.objects) if name == bucket and key.startswith(prefix) and key > start_after)
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+
+        contents = []
+        for key in page:
+            entry = self.objects.get((bucket, key))
+            if entry is None:
+                continue
+            modified = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(entry['last_modified']))
+            contents.append(f"<Contents><Key>{escape(key)}</Key><LastModified>{modified}</LastModified>"
+                            f"<ETag>{escape(entry['etag'])}</ETag><Size>{len(entry['data'])}</Size>"
+                            f"<StorageClass>STANDARD</StorageClass></Contents>")
+        next_token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ''
+        payload = (f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="{S3_XML_NAMESPACE}">'
+                   f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(contents)}</KeyCount>"
+                   f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"
+                   f"{''.join(contents)}{next_token}</ListBucketResult>")
+        return 200, {'Content-Type': 'application/xml'}, payload.encode('utf-8')
+
+    def delete_objects(self, bucket, body):
+        keys = [element.text for element in ElementTree.fromstring(body).iter() if element.tag.endswith('Key')]
+        with self.objects_lock:
+            for key in keys:
+                self.objects.pop((bucket, key), None)
+        deleted = ''.join(f"<Deleted><Key>{escape(key)}</Key></Deleted>" for key in keys)
+        payload = f'<?xml version="1.0" encoding="UTF-8"?><DeleteResult xmlns="{S3_XML_NAMESPACE}">{deleted}</DeleteResult>'
+        return 200, {'Content-Type': 'application/xml'}, payload.encode('utf-8')
+
+    def handle_secrets(self, operation, body):
+        self.count(operation)
+        self.delay()
+        secret_id = json.loads(body or b'{}').get('SecretId', '')
+        if operation != 'GetSecretValue' or secret_id not in self.secrets:
+            return json_response(400, {"__type": "ResourceNotFoundException", "Message": f"Secret {secret_id} no encontrado"},
+                                 'application/x-amz-json-1.1')
+        return json_response(200, {
+            "ARN": f"arn:aws:secretsmanager:us-east-1:000000000000:secret:{secret_id}",
+            "Name": secret_id,
+            "VersionId": "local",
+            "SecretString": json.dumps(self.secrets[secret_id])
+        }, 'application/x-amz-json-1.1')
+
+# =============================================================================
+# PROVEEDORES
+# =============================================================================
+class ProviderStub(LocalService):
+    """Base de los stubs de proveedores: latencia, errores 5xx y 429 por encima del límite"""
+
+    def __init__(self, latency_ms=100.0, error_rate=0.0, rate_limit=0.0, burst=10, retry_after=1.0, seed=0):
+        super().__init__(latency_ms, seed)
+        self.error_rate = error_rate
+        self.throttle = Throttle(rate_limit, burst)
+        self.retry_after = retry_after
+
+    def reject(self):
+        """Respuesta 429/5xx simulada, o None si la petición sigue"""
+        if not self.throttle.allow():
+            self.count('throttled')
+            return self.error_response(429, "Too many requests", {'Retry-After': f"{self.retry_after:g}"})
+        if self.error_rate and self.random() < self.error_rate:
+            self.count('errors')
+            return self.error_response(500, "Internal server error")
+        return None
+
+    def error_response(self, status, message, headers=None):
+        return json_response(status, {"error": message}, headers=headers)
+
+class AssemblyAIStub(ProviderStub):
+    """
+    Transcripciones simuladas: cada trabajo pasa queue_seconds en cola y audio_seconds * rtf
+    procesándose. duration_for(audio_url) devuelve la duración del audio en segundos
+    """
+
+    def __init__(self, duration_for, queue_seconds=2.0, rtf=0.05, job_error_rate=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.duration_for = duration_for
+        self.queue_seconds = queue_seconds
+        self.rtf = rtf
+        self.job_error_rate = job_error_rate
+        self.jobs = {}
+
+    def handle(self, request, body):
+        path = urlsplit(request.path).path
+        if request.command == 'POST' and path == '/v2/transcript':
+            operation = 'submit'
+        elif request.command == 'GET' and path.startswith('/v2/transcript/'):
+            operation = 'get'
+        else:
+            self.count('NotImplemented')
+            return self.error_response(404, f"Ruta no soportada: {request.command} {path}")
+
+        self.count(operation)
+        self.delay()
+        rejected = self.reject()
+        if rejected:
+            return rejected
+        if operation == 'submit':
+            return json_response(200, self.submit(json.loads(body)))
+
+        job = self.jobs.get(path.rsplit('/', 1)[-1])
+        if job is None:
+            return self.error_response(404, "Transcript not found")
+        return json_response(200, self.job_state(job))
+
+    def submit(self, params):
+        duration = float(self.duration_for(params['audio_url']))
+        now = time.time()
+        job = {
+            "id": str(uuid.uuid4()),
+            "params": params,
+            "duration": duration,
+            "queued_until": now + self.queue_seconds,
+            "done_at": now + self.queue_seconds + duration * self.rtf,
+            "failed": bool(self.job_error_rate) and self.random() < self.job_error_rate
+        }
+        self.jobs[job['id']] = job
+        return self.job_state(job)
+
+    def job_state(self, job):
+        now = time.time()
+        state = {**job['params'], "id": job['id'], "status": "queued", "error": None, "text": None,
+                 "utterances": None, "audio_duration": None}
+        if now >= job['done_at']:
+            if job['failed']:
+                state.update({"status": "error", "error": "Transcoding failed (simulado)"})
+            else:
+                state.update(self.transcript(job))
+        elif now >= job['queued_until']:
+            state['status'] = "processing"
+        return state
+
+    def transcript(self, job):
+        """Transcripción sintética: ~150 palabras por minuto en utterances de 15 s entre tres hablantes"""
+        if 'result' not in job:
+            rng = random.Random(job['id'])
+            utterances = []
+            duration_ms = int(job['duration'] * 1000)
+            for index, start in enumerate(range(0, duration_ms, 15000)):
+                end = min(start + 15000, duration_ms)
+                words = rng.choices(VOCABULARY, k=max(1, (end - start) * 150 // 60000))
+                utterances.append({
+                    "speaker": "ABC"[index % 3] if rng.random() < 0.8 else rng.choice("ABC"),
+                    "text": ' '.join(words).capitalize() + '.',
+                    "start": start, "end": end, "confidence": 0.92, "words": []
+                })
+            job['result'] = {
+                "status": "completed",
+                "text": ' '.join(utterance['text'] for utterance in utterances),
+                "utterances": utterances,
+                "audio_duration": int(job['duration']),
+                "confidence": 0.92
+            }
+        return job['result']
+
+class AnthropicStub(ProviderStub):
+    """
+    Mensajes simulados: latencia base más ms_per_1k_input por cada 1000 tokens de entrada y
+    ms_per_output_token por token generado. La respuesta tiene output_tokens tokens, o max_tokens
+    si la petición pide menos
+    """
+
+    def __init__(self, ms_per_1k_input=20.0, output_tokens=120, ms_per_output_token=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.ms_per_1k_input = ms_per_1k_input
+        self.output_tokens = output_tokens
+        self.ms_per_output_token = ms_per_output_token
+        self.ids = itertools.count(1)
+
+    def error_response(self, status, message, headers=None):
+        error_type = {429: "rate_limit_error", 529: "overloaded_error"}.get(status, "api_error")
+        return json_response(status, {"type": "error", "error": {"type": error_type, "message": message}}, headers=headers)
+
+    def handle(self, request, body):
+        path = urlsplit(request.path).path
+        if request.command != 'POST' or path != '/v1/messages':
+            self.count('NotImplemented')
+            return self.error_response(404, f"Ruta no soportada: {request.command} {path}")
+
+        self.count('messages')
+        params = json.loads(body)
+        text = json.dumps(params.get('system', '')) + json.dumps(params.get('messages', []))
+        input_tokens = len(text) // 4 + 1
+        output_tokens = min(self.output_tokens, params.get('max_tokens') or self.output_tokens)
+        self.delay(LatencyModel(
+            self.latency.mean_ms + self.ms_per_1k_input * input_tokens / 1000 + self.ms_per_output_token * output_tokens,
+            self.latency.jitter
+        ))
+        rejected = self.reject()
+        if rejected:
+            return rejected
+
+        analysis = {
+            "resumen": "Reunión de seguimiento del proyecto (análisis simulado).",
+            "puntos_destacados": ["Revisión del presupuesto", "Calendario de entregas", "Riesgos abiertos"],
+            "temas_principales": ["Presupuesto", "Calendario"],
+            "duracion_estimada": "No determinada",
+            "tono_general": "Neutral"
+        }
+        if params.get('tools'):
+            content = [{"type": "tool_use", "id": f"toolu_{next(self.ids)}", "name": params['tools'][0]['name'], "input": analysis}]
+        else:
+            content = [{"type": "text", "text": json.dumps(analysis, ensure_ascii=False)}]
+        return json_response(200, {
+            "id": f"msg_{next(self.ids)}",
+            "type": "message",
+            "role": "assistant",
+            "model": params.get('model'),
+            "content": content,
+            "stop_reason": "tool_use" if params.get('tools') else "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                      "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        })
+
+class AssemblyAIStreamingStub:
+    """
+    Sesiones de streaming simuladas (protocolo v3): Begin al conectar, un Turn parcial por cada
+    partial_ms de audio recibido, el Turn final (sin formato y formateado si format_turns=true)
+    cada turn_seconds de audio, y Termination tras el mensaje Terminate. Las palabras salen a
+    ~150 por minuto de audio; los turnos alternan hablantes si la sesión pide speaker_labels
+    """
+
+    def __init__(self, turn_seconds=5.0, partial_ms=1000, latency_ms=50.0, max_speed=1.5, seed=0):
+        self.turn_ms = int(turn_seconds * 1000)
+        self.partial_ms = partial_ms
+        self.latency = LatencyModel(latency_ms)
+        self.max_speed = max_speed
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.requests = Counter()
+        self.counter_lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.socket.getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    def count(self, name, amount=1):
+        with self.counter_lock:
+            self.requests[name] += amount
+
+    def start(self):
+        from websockets.sync.server import serve
+
+        def authorize(connection, request):
+            if not request.headers.get('Authorization'):
+                self.count('unauthorized')
+                return connection.respond(401, "Unauthorized")
+            return None
+
+        self.server = serve(self.session, '127.0.0.1', 0, process_request=authorize)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+
+    def send_delayed(self, connection, message):
+        with self.rng_lock:
+            seconds = self.latency.sample(self.rng)
+        if seconds:
+            time.sleep(seconds)
+        connection.send(json.dumps(message))
+
+    def session(self, connection):
+        from websockets.exceptions import ConnectionClosed
+
+        query = parse_qs(urlsplit(connection.request.path).query)
+        sample_rate = int(query.get('sample_rate', ['16000'])[0])
+        format_turns = query.get('format_turns', ['false'])[0].lower() == 'true'
+        speaker_labels = query.get('speaker_labels', ['false'])[0].lower() == 'true'
+        session_id = str(uuid.uuid4())
+        rng = random.Random(session_id)
+        self.count('sessions')
+
+        started = time.monotonic()
+        state = {"audio_ms": 0, "turn_order": 0, "turn_start": 0, "partials": 0}
+        connection.send(json.dumps({"type": "Begin", "id": session_id, "expires_at": int(time.time()) + 3600}))
+
+        def words_until(end_ms):
+            """Palabras del turno en curso hasta end_ms (las mismas en parciales y en el final)"""
+            turn_rng = random.Random(f"{session_id}-{state['turn_order']}")
+            count = (end_ms - state['turn_start']) * 150 // 60000
+            step = 60000 // 150
+            words = []
+            for index in range(count):
+                start = state['turn_start'] + index * step
+                words.append({"start": start, "end": start + step - 40, "confidence": 0.9,
+                              "text": turn_rng.choice(VOCABULARY), "word_is_final": True})
+            return words
+
+        def send_turn(end_of_turn, formatted):
+            words = words_until(state['audio_ms'])
+            if not words:
+                return
+            transcript = ' '.join(word['text'] for word in words)
+            if formatted:
+                transcript = transcript.capitalize() + '.'
+            message = {"type": "Turn", "turn_order": state['turn_order'], "turn_is_formatted": formatted,
+                       "end_of_turn": end_of_turn, "transcript": transcript,
+                       "end_of_turn_confidence": 0.9 if end_of_turn else 0.1, "words": words}
+            if speaker_labels:
+                message["speaker_label"] = "AB"[state['turn_order'] % 2] if rng.random() < 0.8 else rng.choice("AB")
+            self.count('turns_final' if end_of_turn else 'turns_partial')
+            self.send_delayed(connection, message)
+
+        def end_turn():
+            send_turn(True, False)
+            if format_turns:
+                send_turn(True, True)
+            state['turn_order'] += 1
+            state['turn_start'] = state['audio_ms']
+            state['partials'] = 0
+
+        try:
+            for message in connection:
+                if isinstance(message, bytes):
+                    self.count('audio_messages')
+                    state['audio_ms'] += len(message) * 1000 // (sample_rate * 2)
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    if self.max_speed and state['audio_ms'] > elapsed_ms * self.max_speed + 2000:
+                        self.count('too_fast')
+                    turn_ms = state['audio_ms'] - state['turn_start']
+                    if turn_ms >= self.turn_ms:
+                        end_turn()
+                    elif turn_ms // self.partial_ms > state['partials']:
+                        state['partials'] = turn_ms // self.partial_ms
+                        send_turn(False, False)
+                    continue
+
+                if json.loads(message).get('type') == 'Terminate':
+                    self.count('terminate')
+                    end_turn()
+                    connection.send(json.dumps({
+                        "type": "Termination",
+                        "audio_duration_seconds": state['audio_ms'] // 1000,
+                        "session_duration_seconds": int(time.monotonic() - started)
+                    }))
+                    connection.close()
+                    return
+        except ConnectionClosed:
+            self.count('closed_without_terminate')
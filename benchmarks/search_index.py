@@ -0,0 +1,191 @@
+"""
+Benchmark: latencia de consultas de lambda-search sobre decenas de miles de transcripciones
+
+Genera transcripciones sintéticas (vocabulario con distribución de Zipf, varios hablantes),
+construye los deltas con search_index.build_index_delta de lambda-audio-process, los fusiona con
+merge_index y mide consultas en frío (cachés del contenedor vacías) y en caliente. S3 se simula en
+memoria y cada petición suma una latencia modelada (--s3-latency-ms).
+
+Uso:
+    python benchmarks/search_index.py --docs 20000 --queries 50 --s3-latency-ms 15
+"""
+import argparse
+import gzip
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambda-audio-process'))
+sys.path.insert(0, os.path.join(ROOT, 'lambda-search'))
+os.environ.setdefault('METRICS_SINK', 'none')
+os.environ.setdefault('BUCKET_NAME', 'benchmark-bucket')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+import search_index  # noqa: E402
+import lambda_function  # noqa: E402
+
+class FakeS3:
+    """Sustituto en memoria de las llamadas a S3 que usa lambda-search"""
+
+    class NoSuchKey(Exception):
+        pass
+
+    def __init__(self, latency_ms):
+        self.objects = {}
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.exceptions = self
+
+    def _request(self):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _etag(self, key):
+        return f'"{id(self.objects[key])}"'
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None):
+        self._request()
+        if Key not in self.objects:
+            raise self.NoSuchKey(Key)
+        if IfNoneMatch and IfNoneMatch == self._etag(Key):
+            from botocore.exceptions import ClientError
+            raise ClientError({'Error': {'Code': '304'}}, 'GetObject')
+        data = self.objects[Key]
+        if Range:
+            start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+            data = data[start:end + 1]
+        return {'Body': io.BytesIO(data), 'ETag': self._etag(Key)}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._request()
+        self.objects[Key] = Body if isinstance(Body, bytes) else Body.encode('utf-8')
+
+    def download_file(self, Bucket, Key, Filename):
+        self._request()
+        with open(Filename, 'wb') as f:
+            f.write(self.objects[Key])
+
+    def delete_objects(self, Bucket, Delete):
+        self._request()
+        for item in Delete['Objects']:
+            self.objects.pop(item['Key'], None)
+
+    def get_paginator(self, operation):
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(key for key in fake.objects if key.startswith(Prefix))
+                for offset in range(0, max(len(keys), 1), 1000):
+                    fake._request()
+                    yield {'Contents': [{'Key': key} for key in keys[offset:offset + 1000]]}
+
+        return Paginator()
+
+def make_vocabulary(size, rng):
+    syllables = ["ra", "to", "me", "sa", "li", "ca", "ven", "pre", "dos", "mar", "ta", "ne", "con", "pu", "es", "tri"]
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def make_result(rng, vocabulary, cum_weights, utterances):
+    items = []
+    start = 0
+    for _ in range(utterances):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(6, 20))
+        end = start + len(words) * 400
+        items.append({"speaker": rng.choice("ABC"), "text": ' '.join(words), "start": start, "end": end})
+        start = end + rng.randint(200, 2000)
+    return {
+        "transcripcion": {"text": ' '.join(item['text'] for item in items), "utterances": items},
+        "analisis": {"temas_principales": rng.choices(vocabulary[:200], k=3)}
+    }
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def reset_caches():
+    for cache in (lambda_function._segment_cache, lambda_function._postings_cache,
+                  lambda_function._delta_cache, lambda_function._current_versions_cache,
+                  lambda_function._manifest_cache):
+        cache.clear()
+    lambda_function._postings_cache_bytes[0] = 0
+
+def run_queries(queries, cold):
+    latencies = []
+    for params in queries:
+        if cold:
+            reset_caches()
+        start = time.perf_counter()
+        response = lambda_function.lambda_handler({'queryStringParameters': params}, None)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response['statusCode'] == 200, response['body']
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--utterances', type=int, default=60, help='utterances por transcripción')
+    parser.add_argument('--vocabulary', type=int, default=30000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--s3-latency-ms', type=float, default=15.0, help='latencia modelada por petición a S3')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    fake = FakeS3(0)
+    lambda_function.s3_client = fake
+    lambda_function.INDEX_MERGE_BATCH = args.docs
+
+    start = time.perf_counter()
+    for index in range(args.docs):
+        result = make_result(rng, vocabulary, cum_weights, args.utterances)
+        delta = search_index.build_index_delta(f"uploads/grabacion_{index:06d}.mp3", f"results/{index}_resultado.json",
+                                               f"results/{index}_transcripcion.json", result)
+        key = f"{lambda_function.PENDING_PREFIX}{index:013d}_grabacion_{index:06d}.json.gz"
+        fake.objects[key] = gzip.compress(json.dumps(delta, separators=(',', ':')).encode('utf-8'))
+    print(f"Deltas generados: {args.docs} en {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    summary = lambda_function.merge_index()
+    index_bytes = sum(len(data) for key, data in fake.objects.items() if key.startswith(lambda_function.SHARDS_PREFIX))
+    print(f"Fusión: {summary['merged']} documentos en {time.perf_counter() - start:.1f}s, índice de {index_bytes / 1e6:.1f} MB")
+
+    # Consultas de una y dos palabras frecuentes y poco frecuentes, algunas con filtro de hablante y tiempo
+    queries = []
+    for _ in range(args.queries):
+        params = {'q': ' '.join(rng.choices(vocabulary[:5000], k=rng.choice((1, 2))))}
+        if rng.random() < 0.3:
+            params.update({'speaker': rng.choice("ABC"), 'desde': '0', 'hasta': '600'})
+        queries.append(params)
+
+    fake.latency = args.s3_latency_ms / 1000
+    print("\n| caché | consultas | p50 (ms) | p95 (ms) | máx (ms) | peticiones S3 |")
+    print("|-------|----------:|---------:|---------:|---------:|--------------:|")
+    for label, cold in (("fría", True), ("caliente", False)):
+        fake.requests = 0
+        if not cold:
+            run_queries(queries, cold=False)
+            fake.requests = 0
+        latencies = run_queries(queries, cold)
+        print(f"| {label} | {len(latencies)} | {percentile(latencies, 0.5):.1f} | {percentile(latencies, 0.95):.1f} "
+              f"| {max(latencies):.1f} | {fake.requests / len(latencies):.1f} |")
+
+if __name__ == '__main__':
+    main()
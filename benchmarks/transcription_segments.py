@@ -0,0 +1,131 @@
+"""
+Benchmark: latencia de transcripción en serie frente a transcripción por segmentos en paralelo
+
+La parte local (energía por ventana, elección de cortes y unión de resultados) se ejecuta con
+el código real de lambda-audio-process. La transcripción de AssemblyAI se simula con un modelo
+de latencia (cola + factor de tiempo real por segundo de audio), escalado con --time-scale.
+
+Uso:
+    python benchmarks/transcription_segments.py --minutes 5 15 30 60 --segments 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda-audio-process'))
+os.environ.setdefault('METRICS_SINK', 'none')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import audio_preprocessing  # noqa: E402
+import lambda_function  # noqa: E402
+
+SAMPLE_RATE = 16000
+WORD_MS = 400
+
+def write_synthetic_audio(target, minutes, seed=0):
+    """WAV mono 16kHz con ráfagas de 'voz' y pausas de duración aleatoria, escrito por bloques"""
+    rng = np.random.default_rng(seed)
+    total = int(minutes * 60 * SAMPLE_RATE)
+    target.write(audio_preprocessing.wav_header(SAMPLE_RATE, total))
+    written = 0
+    while written < total:
+        speech = rng.integers(2, 15) * SAMPLE_RATE // 2
+        pause = rng.integers(2, 20) * SAMPLE_RATE // 10
+        block = np.concatenate([0.3 * rng.standard_normal(speech), 0.002 * rng.standard_normal(pause)])
+        block = block[:total - written]
+        target.write((np.clip(block, -1, 1) * 32767).astype('<i2').tobytes())
+        written += len(block)
+    target.seek(0)
+
+def fake_transcript(start_ms, end_ms):
+    """Transcript con una palabra cada WORD_MS y dos hablantes alternos"""
+    words = [
+        {"text": f"w{t}", "start": t - start_ms, "end": t - start_ms + WORD_MS - 50,
+         "speaker": "A" if (t // 10000) % 2 == 0 else "B", "confidence": 0.9}
+        for t in range(start_ms - start_ms % WORD_MS, end_ms - WORD_MS, WORD_MS) if t >= start_ms
+    ]
+    utterances = []
+    for word in words:
+        if utterances and utterances[-1]["speaker"] == word["speaker"]:
+            utterances[-1]["words"].append(word)
+        else:
+            utterances.append({"speaker": word["speaker"], "confidence": 0.9, "words": [word]})
+    for utterance in utterances:
+        utterance.update(
+            text=" ".join(w["text"] for w in utterance["words"]),
+            start=utterance["words"][0]["start"],
+            end=utterance["words"][-1]["end"]
+        )
+    return {"id": f"t{start_ms}", "data": {"words": words, "utterances": utterances}, "file_name": "bench"}
+
+def modeled_seconds(duration_ms, args):
+    return args.queue_seconds + args.rtf * duration_ms / 1000
+
+def run(args):
+    print(f"Modelo: cola {args.queue_seconds}s + {args.rtf} s/s de audio; "
+          f"hasta {args.segments} segmentos de al menos {args.min_segment_seconds}s, solapamiento {args.overlap_ms}ms\n")
+    print(f"{'minutos':>8} {'segmentos':>10} {'serie (s)':>10} {'paralelo (s)':>13} {'aceleración':>12} {'corte (ms)':>11} {'unión (ms)':>11}")
+
+    for minutes in args.minutes:
+        with tempfile.TemporaryFile() as audio:
+            write_synthetic_audio(audio, minutes)
+            duration_ms = int(minutes * 60 * 1000)
+
+            start = time.perf_counter()
+            energy = audio_preprocessing.window_energy(audio, SAMPLE_RATE)
+            segments = audio_preprocessing.plan_segments(
+                energy, args.segments, args.min_segment_seconds * 1000, args.overlap_ms
+            )
+            split_ms = (time.perf_counter() - start) * 1000
+
+        serial = modeled_seconds(duration_ms, args)
+        if not segments:
+            print(f"{minutes:>8} {1:>10} {serial:>10.1f} {serial:>13.1f} {1:>12.2f} {split_ms:>11.1f} {0:>11.1f}")
+            continue
+
+        for index, segment in enumerate(segments):
+            segment['key'] = str(index)
+
+        # AssemblyAI simulado: cada segmento tarda según su duración
+        def transcribe(url, key):
+            segment = segments[int(url)]
+            time.sleep(modeled_seconds(segment['fin_ms'] - segment['inicio_ms'], args) * args.time_scale)
+            return fake_transcript(segment['inicio_ms'], segment['fin_ms'])
+
+        lambda_function.transcribe_audio = transcribe
+        lambda_function.generate_presigned_url = lambda bucket, key, expiration=900: key
+        merge = lambda_function.merge_segment_transcripts
+        merge_ms = []
+
+        def timed_merge(transcripts, segs):
+            start = time.perf_counter()
+            result = merge(transcripts, segs)
+            merge_ms.append((time.perf_counter() - start) * 1000)
+            return result
+        lambda_function.merge_segment_transcripts = timed_merge
+
+        start = time.perf_counter()
+        lambda_function.transcribe_segments('bench', segments, 'key')
+        elapsed = time.perf_counter() - start
+        lambda_function.merge_segment_transcripts = merge
+
+        parallel = (elapsed - merge_ms[0] / 1000) / args.time_scale + merge_ms[0] / 1000 + split_ms / 1000
+        print(f"{minutes:>8} {len(segments):>10} {serial:>10.1f} {parallel:>13.1f} {serial / parallel:>12.2f} "
+              f"{split_ms:>11.1f} {merge_ms[0]:>11.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, nargs='+', default=[5, 15, 30, 60, 120])
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--min-segment-seconds', type=int, default=300)
+    parser.add_argument('--overlap-ms', type=int, default=3000)
+    parser.add_argument('--queue-seconds', type=float, default=5.0)
+    parser.add_argument('--rtf', type=float, default=0.15, help='segundos de procesamiento por segundo de audio')
+    parser.add_argument('--time-scale', type=float, default=0.001, help='fracción del tiempo simulado que se duerme')
+    run(parser.parse_args())
+
+if __name__ == '__main__':
+    main()
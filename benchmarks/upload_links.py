@@ -0,0 +1,79 @@
+"""
+Benchmark: emisión de URLs de subida, una petición por archivo frente a peticiones por lote
+
+Ejecuta lambda_handler de lambda-create-upload-link en proceso (la firma de URLs es local, no
+requiere red) y suma un tiempo de ida y vuelta por invocación (--rtt-ms) que modela API Gateway
+más el overhead de invocar la Lambda.
+
+Uso:
+    python benchmarks/upload_links.py --files 200 --rtt-ms 60
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda-create-upload-link'))
+os.environ.setdefault('METRICS_SINK', 'none')
+os.environ.setdefault('S3_BUCKET_NAME', 'benchmark-bucket')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+import lambda_function  # noqa: E402
+
+def make_files(count):
+    return [
+        {"file_name": f"grabacion_{index:04d}.mp3", "content_type": "audio/mpeg", "file_size": 5 * 1024 * 1024}
+        for index in range(count)
+    ]
+
+def invoke(body):
+    response = lambda_function.lambda_handler({"body": json.dumps(body)}, None)
+    assert response['statusCode'] == 200, response['body']
+    return json.loads(response['body'])
+
+def run_single(files):
+    start = time.perf_counter()
+    for item in files:
+        invoke(item)
+    return time.perf_counter() - start, len(files)
+
+def run_batch(files, batch_size):
+    start = time.perf_counter()
+    invocations = 0
+    for offset in range(0, len(files), batch_size):
+        result = invoke({"files": files[offset:offset + batch_size]})
+        assert result['failed'] == 0
+        invocations += 1
+    return time.perf_counter() - start, invocations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=lambda_function.MAX_BATCH_ITEMS)
+    parser.add_argument('--rtt-ms', type=float, default=60.0, help='ida y vuelta por invocación (API Gateway + Lambda)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    files = make_files(args.files)
+    invoke(files[0])  # Calentar el cliente y los imports
+
+    rows = []
+    for name, runner in (("un archivo por petición", lambda: run_single(files)),
+                         (f"lote de {args.batch_size}", lambda: run_batch(files, args.batch_size))):
+        elapsed, invocations = min(runner() for _ in range(args.repeat))
+        total = elapsed + invocations * args.rtt_ms / 1000
+        rows.append((name, invocations, elapsed * 1000, total, args.files / total))
+
+    print(f"{args.files} archivos, RTT modelado {args.rtt_ms}ms por invocación (mejor de {args.repeat})\n")
+    print(f"{'modo':<26} {'invocaciones':>12} {'cómputo (ms)':>13} {'total (s)':>10} {'archivos/s':>11}")
+    for name, invocations, compute_ms, total, throughput in rows:
+        print(f"{name:<26} {invocations:>12} {compute_ms:>13.1f} {total:>10.2f} {throughput:>11.1f}")
+    print(f"\nAceleración del lote: {rows[0][3] / rows[1][3]:.1f}x "
+          f"({math.ceil(args.files / args.batch_size)} invocaciones en lugar de {args.files})")
+
+if __name__ == '__main__':
+    main()
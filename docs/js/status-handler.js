@@ -8,13 +8,19 @@
 // ========================================
 const API_CONFIG = {
     // URL base del API Gateway para consultar estado
-    STATUS_API_URL: 'https://wdinnh5fgb.execute-api.us-east-1.amazonaws.com/v1/status'
+    STATUS_API_URL: 'https://wdinnh5fgb.execute-api.us-east-1.amazonaws.com/v1/status',
+    // URL del API WebSocket de estado (lambda-status-stream). Vacío = usar solo consultas HTTP
+    STATUS_WS_URL: '',
+    // Segundos que cada consulta HTTP espera un cambio de estado (long-poll). 0 = polling clásico
+    LONG_POLL_SECONDS: 20
 };
 // ========================================
 
 class StatusHandler {
     constructor() {
         this.apiBaseUrl = API_CONFIG.STATUS_API_URL;
+        this.wsUrl = API_CONFIG.STATUS_WS_URL;
+        this.longPollSeconds = API_CONFIG.LONG_POLL_SECONDS;
         this.pollingInterval = 3000; // 3 segundos
         this.maxPollingTime = 300000; // 5 minutos máximo
         this.maxConsecutiveErrors = 5; // Máximo 5 errores consecutivos
@@ -23,6 +29,8 @@ class StatusHandler {
         
         console.log('[StatusHandler] Inicializado');
         console.log('[StatusHandler] Configuración:');
+        console.log('  - Canal WebSocket:', this.wsUrl || 'deshabilitado');
+        console.log('  - Long-poll:', this.longPollSeconds, 'segundos');
         console.log('  - Intervalo de polling:', this.pollingInterval / 1000, 'segundos');
         console.log('  - Tiempo máximo:', this.maxPollingTime / 1000, 'segundos');
         console.log('  - Errores consecutivos máximos:', this.maxConsecutiveErrors);
@@ -58,68 +66,214 @@ class StatusHandler {
         this.activePollings.set(fullFileKey, {
             startTime,
             intervalId: null,
+            socket: null,
+            lastTimestamp: null,
+            lastEtag: null,
             consecutiveErrors: 0,
             totalErrors: 0,
             lastSuccessTime: Date.now()
         });
 
+        // Preferir el canal WebSocket; si no está configurado o falla, consultar por HTTP
+        if (this.wsUrl && 'WebSocket' in window) {
+            this.startStreaming(fullFileKey);
+        } else {
+            await this.startPolling(fullFileKey);
+        }
+    }
+
+    /**
+     * Recibe los cambios de estado por WebSocket (push desde lambda-status-stream)
+     * @param {string} fileKey - Clave del archivo
+     */
+    startStreaming(fileKey) {
+        const pollingInfo = this.activePollings.get(fileKey);
+        const socket = new WebSocket(this.wsUrl);
+        pollingInfo.socket = socket;
+
+        socket.onopen = () => {
+            console.log('[StatusHandler] WebSocket conectado, suscribiendo a', fileKey);
+            socket.send(JSON.stringify({ action: 'subscribe', file_key: fileKey }));
+        };
+
+        socket.onmessage = (event) => {
+            const statusData = JSON.parse(event.data);
+            const info = this.activePollings.get(fileKey);
+            if (info) {
+                info.consecutiveErrors = 0;
+                info.lastSuccessTime = Date.now();
+                info.lastTimestamp = statusData.timestamp;
+            }
+            console.log('[StatusHandler] Estado recibido por WebSocket:', statusData.status);
+            this.processStatusResponse(fileKey, statusData);
+        };
+
+        socket.onclose = () => {
+            const info = this.activePollings.get(fileKey);
+            // Si el monitoreo sigue activo, el cierre fue inesperado: volver a HTTP
+            if (info && info.socket === socket) {
+                console.warn('[StatusHandler] WebSocket cerrado, continuando con consultas HTTP');
+                info.socket = null;
+                this.startPolling(fileKey);
+            }
+        };
+
+        socket.onerror = (error) => {
+            console.error('[StatusHandler] Error en WebSocket:', error);
+        };
+    }
+
+    /**
+     * Consulta el estado por HTTP: long-poll si está habilitado, si no polling por intervalo
+     * @param {string} fileKey - Clave del archivo
+     */
+    async startPolling(fileKey) {
+        if (this.longPollSeconds > 0) {
+            this.longPoll(fileKey);
+            return;
+        }
+
+        const { startTime } = this.activePollings.get(fileKey);
+
         // Primera consulta inmediata
-        await this.checkStatus(fullFileKey);
+        await this.checkStatus(fileKey);
         
         // Configurar polling
         const intervalId = setInterval(async () => {
-            const elapsedTime = Date.now() - startTime;
-            const pollingInfo = this.activePollings.get(fullFileKey);
-            
-            // Verificar timeout
-            if (elapsedTime > this.maxPollingTime) {
-                console.warn('[StatusHandler] Timeout alcanzado, deteniendo polling');
-                this.stopMonitoring(fullFileKey, 'TIMEOUT');
+            if (this.shouldStopPolling(fileKey, startTime)) {
                 return;
             }
             
-            // Verificar límites de error
-            if (pollingInfo && pollingInfo.consecutiveErrors >= this.maxConsecutiveErrors) {
-                console.error('[StatusHandler] ❌ Demasiados errores consecutivos, deteniendo polling');
-                this.stopMonitoring(fullFileKey, 'TOO_MANY_CONSECUTIVE_ERRORS');
+            await this.checkStatus(fileKey);
+        }, this.pollingInterval);
+        
+        // Actualizar referencia del interval (el monitoreo pudo terminar en la primera consulta)
+        const pollingInfo = this.activePollings.get(fileKey);
+        if (pollingInfo) {
+            pollingInfo.intervalId = intervalId;
+        } else {
+            clearInterval(intervalId);
+        }
+        
+        console.log('[StatusHandler] Polling iniciado cada', this.pollingInterval / 1000, 'segundos');
+    }
+
+    /**
+     * Long-poll: cada consulta espera en el servidor hasta que el estado cambie
+     * @param {string} fileKey - Clave del archivo
+     */
+    async longPoll(fileKey) {
+        const { startTime } = this.activePollings.get(fileKey);
+        console.log('[StatusHandler] Long-poll iniciado, espera máxima', this.longPollSeconds, 'segundos por consulta');
+
+        while (this.activePollings.has(fileKey)) {
+            if (this.shouldStopPolling(fileKey, startTime)) {
                 return;
             }
-            
-            if (pollingInfo && pollingInfo.totalErrors >= this.maxTotalErrors) {
-                console.error('[StatusHandler] ❌ Demasiados errores totales, deteniendo polling');
-                this.stopMonitoring(fullFileKey, 'TOO_MANY_TOTAL_ERRORS');
+
+            const pollingInfo = this.activePollings.get(fileKey);
+            const errorsBefore = pollingInfo.totalErrors;
+            const timestampBefore = pollingInfo.lastTimestamp;
+            const requestStart = Date.now();
+            await this.checkStatus(fileKey, true);
+
+            const info = this.activePollings.get(fileKey);
+            if (!info) {
                 return;
             }
-            
-            await this.checkStatus(fullFileKey);
-        }, this.pollingInterval);
+
+            if (info.totalErrors > errorsBefore) {
+                // Tras un error esperar antes de reintentar con backoff exponencial
+                const backoffDelay = Math.min(this.pollingInterval * Math.pow(1.5, info.consecutiveErrors), 30000);
+                await new Promise(resolve => setTimeout(resolve, backoffDelay));
+            } else if (info.lastTimestamp === timestampBefore) {
+                // Respuesta sin cambios antes de tiempo (servidor sin long-poll): no saturar el API
+                const remaining = this.pollingInterval - (Date.now() - requestStart);
+                if (remaining > 0) {
+                    await new Promise(resolve => setTimeout(resolve, remaining));
+                }
+            }
+        }
+    }
+
+    /**
+     * Verifica timeout y límites de error; detiene el monitoreo si se alcanzaron
+     * @param {string} fileKey - Clave del archivo
+     * @param {number} startTime - Inicio del monitoreo
+     * @returns {boolean} true si el monitoreo se detuvo
+     */
+    shouldStopPolling(fileKey, startTime) {
+        const elapsedTime = Date.now() - startTime;
+        const pollingInfo = this.activePollings.get(fileKey);
+        
+        // Verificar timeout
+        if (elapsedTime > this.maxPollingTime) {
+            console.warn('[StatusHandler] Timeout alcanzado, deteniendo polling');
+            this.stopMonitoring(fileKey, 'TIMEOUT');
+            return true;
+        }
         
-        // Actualizar referencia del interval
-        this.activePollings.get(fullFileKey).intervalId = intervalId;
+        // Verificar límites de error
+        if (pollingInfo && pollingInfo.consecutiveErrors >= this.maxConsecutiveErrors) {
+            console.error('[StatusHandler] ❌ Demasiados errores consecutivos, deteniendo polling');
+            this.stopMonitoring(fileKey, 'TOO_MANY_CONSECUTIVE_ERRORS');
+            return true;
+        }
         
-        console.log('[StatusHandler] Polling iniciado cada', this.pollingInterval / 1000, 'segundos');
+        if (pollingInfo && pollingInfo.totalErrors >= this.maxTotalErrors) {
+            console.error('[StatusHandler] ❌ Demasiados errores totales, deteniendo polling');
+            this.stopMonitoring(fileKey, 'TOO_MANY_TOTAL_ERRORS');
+            return true;
+        }
+
+        return false;
     }
 
     /**
      * Consulta el estado actual del procesamiento
      * @param {string} fileKey - Clave del archivo
+     * @param {boolean} longPoll - Esperar en el servidor hasta que el estado cambie
      */
-    async checkStatus(fileKey) {
+    async checkStatus(fileKey, longPoll = false) {
         try {
             // No codificar el fileKey completo para mantener las barras / en la URL
-            const url = `${this.apiBaseUrl}/${fileKey}`;
+            let url = `${this.apiBaseUrl}/${fileKey}`;
+            if (longPoll) {
+                const pollingInfo = this.activePollings.get(fileKey);
+                const params = new URLSearchParams({ wait: this.longPollSeconds });
+                if (pollingInfo && pollingInfo.lastTimestamp) {
+                    params.set('since', pollingInfo.lastTimestamp);
+                }
+                url += `?${params.toString()}`;
+            }
             
             console.log('[StatusHandler] Consultando estado...');
             console.log('[StatusHandler] URL:', url);
             
+            // Enviar el ETag del último estado recibido: si no cambió el API responde 304 sin cuerpo
+            const headers = {
+                'Accept': 'application/json',
+                'Content-Type': 'application/json'
+            };
+            const currentInfo = this.activePollings.get(fileKey);
+            if (currentInfo && currentInfo.lastEtag) {
+                headers['If-None-Match'] = currentInfo.lastEtag;
+            }
+
             const response = await fetch(url, {
                 method: 'GET',
-                headers: {
-                    'Accept': 'application/json',
-                    'Content-Type': 'application/json'
-                }
+                headers
             });
 
+            if (response.status === 304) {
+                console.log('[StatusHandler] Estado sin cambios (304)');
+                if (currentInfo) {
+                    currentInfo.consecutiveErrors = 0;
+                    currentInfo.lastSuccessTime = Date.now();
+                }
+                return;
+            }
+
             if (!response.ok) {
                 throw new Error(`HTTP ${response.status}: ${response.statusText}`);
             }
@@ -131,6 +285,9 @@ class StatusHandler {
             if (pollingInfo) {
                 pollingInfo.consecutiveErrors = 0;
                 pollingInfo.lastSuccessTime = Date.now();
+                // PENDING no viene de un archivo de estado: su timestamp no sirve como referencia
+                pollingInfo.lastTimestamp = statusData.status === 'PENDING' ? null : statusData.timestamp;
+                pollingInfo.lastEtag = response.headers.get('ETag');
             }
             
             console.log('[StatusHandler] Estado recibido:', {
@@ -216,6 +373,16 @@ class StatusHandler {
                 }
                 break;
                 
+            case 'QUEUED':
+                console.log('[StatusHandler] Archivo en cola de procesamiento', {
+                    posicion: statusData.posicion_cola,
+                    esperaEstimada: statusData.espera_estimada_segundos
+                });
+                if (window.processingStages) {
+                    window.processingStages.completeStage('trigger');
+                }
+                break;
+                
             case 'STARTING':
                 console.log('[StatusHandler] Procesamiento iniciado...');
                 if (window.processingStages) {
@@ -408,6 +575,11 @@ class StatusHandler {
         }
         
         this.activePollings.delete(fileKey);
+
+        if (pollingInfo && pollingInfo.socket) {
+            pollingInfo.socket.close();
+            console.log('[StatusHandler] WebSocket cerrado para:', fileKey);
+        }
     }
 
     /**
@@ -420,6 +592,9 @@ class StatusHandler {
             if (pollingInfo.intervalId) {
                 clearInterval(pollingInfo.intervalId);
             }
+            if (pollingInfo.socket) {
+                pollingInfo.socket.close();
+            }
         }
         
         this.activePollings.clear();
@@ -437,7 +612,7 @@ class StatusHandler {
             active.push({
                 fileKey,
                 elapsedTime: Math.round((now - pollingInfo.startTime) / 1000),
-                isActive: !!pollingInfo.intervalId
+                isActive: !!pollingInfo.intervalId || !!pollingInfo.socket || this.longPollSeconds > 0
             });
         }
         
@@ -15,7 +15,10 @@ const API_CONFIG = {
 class UploadHandler {
     constructor() {
         this.apiUrl = API_CONFIG.UPLOAD_API_URL;
-        this.maxFileSize = 20 * 1024 * 1024; // 20MB
+        this.maxFileSize = 20 * 1024 * 1024; // 20MB con una sola subida POST
+        this.maxMultipartFileSize = 500 * 1024 * 1024; // 500MB en subida multiparte
+        this.partConcurrency = 4; // Partes subidas en paralelo
+        this.partRetries = 3;
         this.allowedTypes = [
             'audio/mpeg', 'audio/mp3', 'audio/wav', 'audio/vnd.wave',
             'audio/mp4', 'audio/aac', 'audio/ogg', 'audio/flac'
@@ -200,18 +203,25 @@ class UploadHandler {
                 console.log('[UploadHandler] Usando nombre procesado:', fileName);
             }
 
-            // Paso 2: Obtener URL de subida
-            console.log('[UploadHandler] PASO 2: Obteniendo URL de subida...');
-            const uploadData = await this.getUploadUrl({
-                name: fileName,
-                type: file.type,
-                size: file.size
-            });
-            console.log('[UploadHandler] URL de subida obtenida');
+            let result;
+            if (file.size > this.maxFileSize) {
+                // Archivos grandes: subida multiparte reanudable
+                console.log('[UploadHandler] PASO 2-3: Subida multiparte...');
+                result = await this.uploadMultipart(file, fileName, onProgress);
+            } else {
+                // Paso 2: Obtener URL de subida
+                console.log('[UploadHandler] PASO 2: Obteniendo URL de subida...');
+                const uploadData = await this.getUploadUrl({
+                    name: fileName,
+                    type: file.type,
+                    size: file.size
+                });
+                console.log('[UploadHandler] URL de subida obtenida');
 
-            // Paso 3: Subir archivo a S3
-            console.log('[UploadHandler] PASO 3: Subiendo archivo a S3...');
-            const result = await this.uploadToS3(file, uploadData, onProgress);
+                // Paso 3: Subir archivo a S3
+                console.log('[UploadHandler] PASO 3: Subiendo archivo a S3...');
+                result = await this.uploadToS3(file, uploadData, onProgress);
+            }
             console.log('[UploadHandler] Archivo subido a S3');
 
             const finalResult = {
@@ -236,6 +246,144 @@ class UploadHandler {
         }
     }
 
+    /**
+     * Llamada JSON al API de subida (acciones multiparte)
+     * @param {Object} requestBody - Cuerpo de la petición
+     * @returns {Promise<Object>} - Respuesta del API
+     */
+    async postApi(requestBody) {
+        const response = await fetch(this.apiUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(requestBody)
+        });
+        const data = await response.json();
+
+        if (!response.ok || !data.success) {
+            const error = new Error(data.error || `Error ${response.status}: ${response.statusText}`);
+            error.status = response.status;
+            throw error;
+        }
+        return data;
+    }
+
+    /**
+     * Subida multiparte: partes en paralelo, reanudable si la página se recarga o la red falla
+     * @param {File} file - Archivo a subir
+     * @param {string} fileName - Nombre validado del archivo
+     * @param {Function} onProgress - Callback para progreso
+     * @returns {Promise<Object>} - Resultado de la subida
+     */
+    async uploadMultipart(file, fileName, onProgress = null) {
+        const resumeKey = `multipart:${fileName}:${file.size}:${file.lastModified}`;
+        let upload = null;
+
+        // Reanudar una subida anterior del mismo archivo si S3 aún la conserva
+        const saved = JSON.parse(localStorage.getItem(resumeKey) || 'null');
+        if (saved) {
+            try {
+                upload = await this.postApi({ action: 'multipart_parts', ...saved });
+                console.log(`[UploadHandler] Reanudando subida: ${upload.uploaded_parts.length} de ${upload.part_count} partes ya subidas`);
+            } catch (error) {
+                console.warn('[UploadHandler] No se pudo reanudar la subida, se inicia una nueva:', error.message);
+                localStorage.removeItem(resumeKey);
+            }
+        }
+
+        if (!upload) {
+            upload = await this.postApi({
+                action: 'multipart_init',
+                file_name: fileName,
+                content_type: file.type,
+                file_size: file.size
+            });
+            upload.uploaded_parts = [];
+            localStorage.setItem(resumeKey, JSON.stringify({
+                file_key: upload.file_key,
+                upload_id: upload.upload_id,
+                part_count: upload.part_count,
+                file_size: file.size
+            }));
+        }
+
+        // Progreso por bytes: partes ya subidas + bytes en curso de cada parte
+        const loaded = {};
+        upload.uploaded_parts.forEach(part => { loaded[part.part_number] = part.size; });
+        const reportProgress = () => {
+            if (onProgress) {
+                const total = Object.values(loaded).reduce((sum, bytes) => sum + bytes, 0);
+                onProgress(Math.min(100, (total / file.size) * 100));
+            }
+        };
+        reportProgress();
+
+        const queue = [...upload.parts];
+        const worker = async () => {
+            while (queue.length > 0) {
+                const part = queue.shift();
+                const start = (part.part_number - 1) * upload.part_size;
+                const blob = file.slice(start, Math.min(start + upload.part_size, file.size));
+                await this.uploadPart(part, blob, (bytes) => {
+                    loaded[part.part_number] = bytes;
+                    reportProgress();
+                });
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(this.partConcurrency, queue.length) }, worker));
+
+        const result = await this.postApi({
+            action: 'multipart_complete',
+            file_key: upload.file_key,
+            upload_id: upload.upload_id,
+            part_count: upload.part_count
+        });
+        localStorage.removeItem(resumeKey);
+
+        return {
+            success: true,
+            fileKey: result.file_key,
+            message: 'Archivo subido exitosamente'
+        };
+    }
+
+    /**
+     * Sube una parte con PUT a su URL prefirmada, con reintentos
+     * @param {Object} part - {part_number, upload_url}
+     * @param {Blob} blob - Contenido de la parte
+     * @param {Function} onBytes - Callback con los bytes enviados de esta parte
+     */
+    async uploadPart(part, blob, onBytes) {
+        for (let attempt = 1; ; attempt++) {
+            try {
+                await new Promise((resolve, reject) => {
+                    const xhr = new XMLHttpRequest();
+                    xhr.upload.addEventListener('progress', (event) => onBytes(event.loaded));
+                    xhr.addEventListener('load', () => {
+                        if (xhr.status === 200) {
+                            onBytes(blob.size);
+                            resolve();
+                        } else {
+                            reject(new Error(`Error subiendo parte ${part.part_number}: ${xhr.status}`));
+                        }
+                    });
+                    xhr.addEventListener('error', () => reject(new Error(`Error de red en parte ${part.part_number}`)));
+                    xhr.open('PUT', part.upload_url);
+                    xhr.send(blob);
+                });
+                return;
+            } catch (error) {
+                onBytes(0);
+                if (attempt >= this.partRetries) {
+                    throw error;
+                }
+                console.warn(`[UploadHandler] ${error.message}, reintento ${attempt}`);
+                await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+            }
+        }
+    }
+
     /**
      * Cancela subida en progreso (si es posible)
      * @param {XMLHttpRequest} xhr - Request a cancelar
@@ -335,16 +483,16 @@ class UploadHandler {
             return { valid: false, error: 'El archivo está vacío' };
         }
 
-        if (file.size > this.maxFileSize) {
+        if (file.size > this.maxMultipartFileSize) {
             console.error('[UploadHandler] Validación: Archivo muy grande', {
                 fileSize: file.size,
-                maxSize: this.maxFileSize,
+                maxSize: this.maxMultipartFileSize,
                 fileSizeFormatted: this.formatFileSize(file.size),
-                maxSizeFormatted: this.formatFileSize(this.maxFileSize)
+                maxSizeFormatted: this.formatFileSize(this.maxMultipartFileSize)
             });
             return { 
                 valid: false, 
-                error: `El archivo es muy grande. Máximo permitido: ${this.formatFileSize(this.maxFileSize)}` 
+                error: `El archivo es muy grande. Máximo permitido: ${this.formatFileSize(this.maxMultipartFileSize)}` 
             };
         }
 
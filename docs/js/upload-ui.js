@@ -178,7 +178,7 @@ class UploadUI {
                     <div class="file-requirements">
                         <small>
                             • Formatos permitidos: MP3, WAV, MP4, AAC, OGG, FLAC<br>
-                            • Tamaño máximo: 20MB<br>
+                            • Tamaño máximo: 500MB<br>
                             • Solo caracteres alfanuméricos, espacios, puntos, guiones y paréntesis en el nombre
                         </small>
                     </div>
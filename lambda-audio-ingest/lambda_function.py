@@ -0,0 +1,214 @@
+import boto3
+import hashlib
+import json
+import math
+import os
+import time
+import logging
+from datetime import datetime
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3_client = boto3.client('s3')
+sqs_client = boto3.client('sqs')
+
+# Cola consumida por lambda-audio-process (trigger SQS con ReportBatchItemFailures)
+PROCESSING_QUEUE_URL = os.environ.get('PROCESSING_QUEUE_URL')
+PROCESSING_PREFIX = 'processing/'
+
+# Almacén de estados: "s3" (JSON en processing/, por defecto) o "dynamodb" (mismo que lambda-audio-process)
+STATUS_STORE = os.environ.get('STATUS_STORE', 's3')
+STATUS_TABLE_NAME = os.environ.get('STATUS_TABLE_NAME', '')
+dynamodb_client = boto3.client('dynamodb') if STATUS_STORE == 'dynamodb' else None
+
+# Estimación de espera: trabajos por delante / consumidores en paralelo * duración media
+AVG_PROCESSING_SECONDS = int(os.environ.get('AVG_PROCESSING_SECONDS', '120'))
+QUEUE_CONSUMER_CONCURRENCY = int(os.environ.get('QUEUE_CONSUMER_CONCURRENCY', '5'))
+SQS_BATCH_SIZE = 10
+SQS_SEND_ATTEMPTS = 3
+SQS_RETRY_BASE_SECONDS = 0.2
+
+def get_status_key(file_key):
+    """Clave del archivo de estado (mismo criterio que lambda-audio-process)"""
+    base_name = file_key.replace('uploads/', '').split('.')[0]
+    return f"{PROCESSING_PREFIX}{base_name}_status.json"
+
+def queue_depth():
+    """Mensajes esperando en la cola (aproximado, según SQS)"""
+    response = sqs_client.get_queue_attributes(
+        QueueUrl=PROCESSING_QUEUE_URL,
+        AttributeNames=['ApproximateNumberOfMessages']
+    )
+    return int(response['Attributes'].get('ApproximateNumberOfMessages', 0))
+
+def estimate_wait_seconds(position):
+    """Segundos estimados hasta que el trabajo en `position` empiece a procesarse"""
+    rounds_ahead = math.ceil(position / max(QUEUE_CONSUMER_CONCURRENCY, 1)) - 1
+    return rounds_ahead * AVG_PROCESSING_SECONDS
+
+def get_idempotency_token(bucket, file_key):
+    """Token de idempotencia de la subida (mismo criterio que lambda-audio-process)"""
+    head = s3_client.head_object(Bucket=bucket, Key=file_key)
+    identity = f"{bucket}/{file_key}/{head['ETag']}/{head.get('VersionId', '')}/{head['LastModified'].isoformat()}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+def load_status(bucket, status_key):
+    """Estado actual y su revisión (ETag en S3, version en DynamoDB) para reemplazarlo con una escritura condicional"""
+    if STATUS_STORE == 'dynamodb':
+        response = dynamodb_client.get_item(
+            TableName=STATUS_TABLE_NAME,
+            Key={"status_key": {"S": status_key}},
+            ProjectionExpression="#status, idempotency_token, version",
+            ExpressionAttributeNames={"#status": "status"},
+            ConsistentRead=True
+        )
+        if 'Item' not in response:
+            return None, None
+        deserializer = TypeDeserializer()
+        item = {k: deserializer.deserialize(v) for k, v in response['Item'].items()}
+        return item, item.get('version')
+    
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=status_key)
+    except s3_client.exceptions.NoSuchKey:
+        return None, None
+    return json.loads(response['Body'].read().decode('utf-8')), response['ETag']
+
+def write_queued_status(bucket, status_key, status_data, exists, revision):
+    """Escribir QUEUED solo si el estado no cambió desde que se leyó (False si otra escritura llegó antes)"""
+    if STATUS_STORE == 'dynamodb':
+        # Mismo esquema que lambda-audio-process: version se incrementa en cada escritura
+        serializer = TypeSerializer()
+        names = {f"#f{i}": field for i, field in enumerate(status_data)}
+        values = {f":v{i}": serializer.serialize(value) for i, value in enumerate(status_data.values())}
+        values[":one"] = {"N": "1"}
+        if not exists:
+            condition = "attribute_not_exists(status_key)"
+        elif revision is None:
+            condition = "attribute_not_exists(version)"
+        else:
+            condition = "version = :version"
+            values[":version"] = serializer.serialize(revision)
+        try:
+            dynamodb_client.update_item(
+                TableName=STATUS_TABLE_NAME,
+                Key={"status_key": {"S": status_key}},
+                UpdateExpression=f"SET {', '.join(f'#f{i} = :v{i}' for i in range(len(status_data)))} ADD version :one",
+                ConditionExpression=condition,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+        except dynamodb_client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+    
+    try:
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=status_key,
+            Body=json.dumps(status_data, ensure_ascii=False, indent=2).encode('utf-8'),
+            ContentType='application/json',
+            ServerSideEncryption='AES256',
+            **({'IfMatch': revision} if exists else {'IfNoneMatch': '*'})
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            return False
+        raise
+    return True
+
+def save_queued_status(bucket, file_key, position):
+    """
+    Registrar el estado QUEUED con la posición estimada en la cola. Una entrega repetida de la
+    misma subida (mismo token) no reemplaza su estado, ya sea QUEUED, en curso o COMPLETED;
+    el estado de una subida anterior del mismo archivo sí se reemplaza. None si no se escribió
+    """
+    token = get_idempotency_token(bucket, file_key)
+    status_key = get_status_key(file_key)
+    current, revision = load_status(bucket, status_key)
+    if current and current.get('idempotency_token') == token:
+        logger.info(f"Entrega repetida de {file_key}: se conserva su estado {current.get('status')}")
+        return None
+    
+    wait_seconds = estimate_wait_seconds(position)
+    status_data = {
+        "file_key": file_key,
+        "status": "QUEUED",
+        "message": f"En cola para procesamiento (posición {position})",
+        "progress": 5,
+        "posicion_cola": position,
+        "espera_estimada_segundos": wait_seconds,
+        "idempotency_token": token,
+        "timestamp": datetime.now().isoformat()
+    }
+    if not write_queued_status(bucket, status_key, status_data, current is not None, revision):
+        logger.info(f"Estado de {file_key} modificado durante la ingesta, se conserva")
+        return None
+    
+    logger.info(f"{file_key} en cola: posición {position}, espera estimada {wait_seconds}s")
+    return status_data
+
+def enqueue_records(records):
+    """
+    Enviar cada notificación S3 como un mensaje (mismo formato que una notificación S3 -> SQS).
+    Solo se reenvían las entradas rechazadas de cada lote; devuelve las claves que no se pudieron encolar
+    """
+    failed = []
+    for offset in range(0, len(records), SQS_BATCH_SIZE):
+        pending = dict(enumerate(records[offset:offset + SQS_BATCH_SIZE]))
+        for attempt in range(SQS_SEND_ATTEMPTS):
+            if attempt:
+                time.sleep(SQS_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            response = sqs_client.send_message_batch(
+                QueueUrl=PROCESSING_QUEUE_URL,
+                Entries=[
+                    {"Id": str(index), "MessageBody": json.dumps({"Records": [record]})}
+                    for index, record in pending.items()
+                ]
+            )
+            rejected = response.get('Failed', [])
+            # Los errores del remitente (mensaje inválido) no se resuelven reintentando
+            failed.extend(pending[int(entry['Id'])]['s3']['object']['key'] for entry in rejected if entry.get('SenderFault'))
+            pending = {int(entry['Id']): pending[int(entry['Id'])] for entry in rejected if not entry.get('SenderFault')}
+            if not pending:
+                break
+            logger.warning(f"SQS rechazó {len(pending)} mensajes en el intento {attempt + 1} de {SQS_SEND_ATTEMPTS}")
+        failed.extend(record['s3']['object']['key'] for record in pending.values())
+    return failed
+
+def lambda_handler(event, context):
+    """Trigger S3 de uploads/: registra QUEUED con posición y encola el trabajo"""
+    records = [
+        record for record in event.get('Records', [])
+        if record.get('s3', {}).get('object', {}).get('key', '').startswith('uploads/')
+    ]
+    if not records:
+        logger.info("Evento sin archivos en uploads/, ignorando")
+        return {'statusCode': 200, 'body': json.dumps({'message': 'Sin archivos para encolar'})}
+    
+    if not PROCESSING_QUEUE_URL:
+        raise ValueError("PROCESSING_QUEUE_URL no configurado")
+    
+    # El estado se escribe antes de encolar: el consumidor siempre lo sobrescribe después. Los
+    # registros se encolan aunque su estado ya exista: si S3 reintenta el evento tras un fallo al
+    # encolar, lambda-audio-process descarta las entregas duplicadas por su token
+    waiting = queue_depth()
+    for index, record in enumerate(records):
+        try:
+            save_queued_status(record['s3']['bucket']['name'], record['s3']['object']['key'], waiting + index + 1)
+        except Exception as e:
+            # El estado es informativo: un fallo al escribirlo no impide encolar el resto del evento
+            logger.warning(f"Error registrando QUEUED de {record['s3']['object']['key']}: {e}")
+    
+    failed = enqueue_records(records)
+    if failed:
+        # Error: la invocación asíncrona de S3 se reintenta
+        raise RuntimeError(f"No se pudieron encolar: {failed}")
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'message': f"{len(records)} archivos encolados", 'en_espera': waiting})
+    }
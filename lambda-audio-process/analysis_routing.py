@@ -0,0 +1,190 @@
+"""
+Enrutado del análisis: elige por transcripción el modelo y el presupuesto de tokens de salida,
+o un resumen por plantilla sin llamar al LLM para grabaciones vacías o muy breves. Acumula por
+ruta las llamadas, los tokens, la latencia y el coste estimado para ajustar las reglas
+"""
+import threading
+from datetime import datetime
+
+# Precios de Anthropic en USD por millón de tokens (entrada, salida); la escritura en la caché de
+# prompts cuesta 1,25 veces la entrada y la lectura 0,1 veces
+MODEL_PRICES_PER_MTOK = {
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-haiku-4-5-20251001": (1.00, 5.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+    "claude-3-7-sonnet-20250219": (3.00, 15.00),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "claude-sonnet-4-5-20250929": (3.00, 15.00)
+}
+CACHE_WRITE_PRICE_FACTOR = 1.25
+CACHE_READ_PRICE_FACTOR = 0.1
+
+TEMPLATE_ROUTE = "plantilla"
+TEMPLATE_HIGHLIGHTS = 3
+
+def transcript_features(transcription, chars_per_token):
+    """Variables de decisión: palabras, tokens estimados, duración (s) e intervenciones"""
+    text = transcription.get('text') or ''
+    return {
+        "palabras": len(text.split()),
+        "tokens_estimados": len(text) // chars_per_token + 1 if text else 0,
+        "duracion_segundos": transcription.get('audio_duration') or 0,
+        "intervenciones": len(transcription.get('utterances') or [])
+    }
+
+def estimate_cost(model, input_tokens, output_tokens, cache_write_tokens=0, cache_read_tokens=0, prices=None):
+    """Coste estimado en USD de una llamada (None si el modelo no tiene precio conocido)"""
+    price = (prices or MODEL_PRICES_PER_MTOK).get(model)
+    if price is None:
+        return None
+    input_price, output_price = price
+    return (
+        input_tokens * input_price
+        + cache_write_tokens * input_price * CACHE_WRITE_PRICE_FACTOR
+        + cache_read_tokens * input_price * CACHE_READ_PRICE_FACTOR
+        + output_tokens * output_price
+    ) / 1_000_000
+
+def format_duration(seconds):
+    if not seconds:
+        return "No determinada"
+    if seconds < 60:
+        return f"{round(seconds)} segundos"
+    return f"{max(1, round(seconds / 60))} minutos"
+
+def template_analysis(transcription, features):
+    """
+    Análisis con el esquema de Claude construido sin LLM: el texto completo como resumen y
+    las primeras intervenciones como puntos destacados
+    """
+    text = (transcription.get('text') or '').strip()
+    if not text:
+        summary = "La grabación no contiene voz transcrita."
+        highlights = []
+    else:
+        summary = f"Grabación breve ({features['palabras']} palabras): «{text}»"
+        highlights = [
+            f"Hablante {utterance['speaker']}: {utterance['text']}" if utterance.get('speaker') else utterance['text']
+            for utterance in (transcription.get('utterances') or [])[:TEMPLATE_HIGHLIGHTS] if utterance.get('text')
+        ] or [text]
+    return {
+        "resumen": summary,
+        "puntos_destacados": highlights,
+        "temas_principales": [],
+        "duracion_estimada": format_duration(features['duracion_segundos']),
+        "tono_general": "No determinado",
+        "timestamp_analisis": datetime.now().isoformat(),
+        "tokens_utilizados": 0,
+        "tokens_cache_escritura": 0,
+        "tokens_cache_lectura": 0,
+        "modelo_usado": None
+    }
+
+class AnalysisUsage:
+    """Uso acumulado de un análisis: varias llamadas, en paralelo, si se analiza por fragmentos"""
+
+    def __init__(self, prices=None):
+        self.prices = prices
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_write_tokens = 0
+        self.cache_read_tokens = 0
+        self.cost_usd = 0.0
+        self.cost_known = True
+
+    def add(self, model, usage):
+        """Sumar el `usage` de una respuesta de messages.create"""
+        cache_write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+        cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+        cost = estimate_cost(model, usage.input_tokens, usage.output_tokens, cache_write, cache_read, self.prices)
+        with self.lock:
+            self.calls += 1
+            self.input_tokens += usage.input_tokens
+            self.output_tokens += usage.output_tokens
+            self.cache_write_tokens += cache_write
+            self.cache_read_tokens += cache_read
+            if cost is None:
+                self.cost_known = False
+            else:
+                self.cost_usd += cost
+
+class AnalysisRouter:
+    """
+    Reglas de enrutado, evaluadas en orden:
+    1. plantilla: como mucho `template_max_words` palabras (incluye las transcripciones vacías);
+       con `template_max_words` None la regla no se aplica y todas las transcripciones van al LLM
+    2. extensa: más de `long_min_tokens` tokens, `long_min_seconds` de audio o `long_min_utterances` intervenciones
+    3. breve: hasta `short_max_tokens` tokens y `short_max_seconds` de audio
+    4. estandar: el resto
+    `routes` asocia cada ruta LLM con {"modelo", "max_tokens"}
+    """
+
+    def __init__(self, routes, template_max_words, short_max_tokens, short_max_seconds,
+                 long_min_tokens, long_min_seconds, long_min_utterances, prices=None):
+        self.routes = routes
+        self.template_max_words = template_max_words
+        self.short_max_tokens = short_max_tokens
+        self.short_max_seconds = short_max_seconds
+        self.long_min_tokens = long_min_tokens
+        self.long_min_seconds = long_min_seconds
+        self.long_min_utterances = long_min_utterances
+        self.prices = prices or MODEL_PRICES_PER_MTOK
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def choose(self, features):
+        """Ruta para las variables de una transcripción: {"ruta", "motivo", "modelo", "max_tokens"}"""
+        words, tokens = features['palabras'], features['tokens_estimados']
+        seconds, utterances = features['duracion_segundos'], features['intervenciones']
+        if self.template_max_words is not None and words <= self.template_max_words:
+            name, reason = TEMPLATE_ROUTE, "sin texto" if not words else f"{words} palabras"
+        elif tokens > self.long_min_tokens:
+            name, reason = "extensa", f"{tokens} tokens estimados"
+        elif seconds >= self.long_min_seconds:
+            name, reason = "extensa", f"{round(seconds)} s de audio"
+        elif utterances >= self.long_min_utterances:
+            name, reason = "extensa", f"{utterances} intervenciones"
+        elif tokens <= self.short_max_tokens and seconds <= self.short_max_seconds:
+            name, reason = "breve", f"{tokens} tokens estimados y {round(seconds)} s de audio"
+        else:
+            name, reason = "estandar", f"{tokens} tokens estimados"
+
+        route = {"ruta": name, "motivo": reason, "modelo": None, "max_tokens": 0}
+        route.update(self.routes.get(name, {}))
+        return route
+
+    def record(self, route, usage, latency_ms):
+        """
+        Acumular un análisis en los contadores de su ruta; devuelve el resumen que se guarda en
+        el resultado (analisis.enrutado)
+        """
+        cost = round(usage.cost_usd, 6) if usage and usage.cost_known else (0.0 if not usage else None)
+        summary = {
+            "ruta": route['ruta'],
+            "motivo": route['motivo'],
+            "modelo": route['modelo'],
+            "max_tokens": route['max_tokens'],
+            "llamadas_llm": usage.calls if usage else 0,
+            "tokens_entrada": usage.input_tokens if usage else 0,
+            "tokens_salida": usage.output_tokens if usage else 0,
+            "latencia_ms": round(latency_ms, 2),
+            "coste_estimado_usd": cost
+        }
+        with self.lock:
+            counters = self.counters.setdefault(route['ruta'], {
+                "analisis": 0, "llamadas_llm": 0, "tokens_entrada": 0, "tokens_salida": 0,
+                "latencia_ms": 0.0, "coste_estimado_usd": 0.0
+            })
+            counters["analisis"] += 1
+            for field in ("llamadas_llm", "tokens_entrada", "tokens_salida", "latencia_ms"):
+                counters[field] += summary[field]
+            counters["coste_estimado_usd"] += cost or 0.0
+        return summary
+
+    def snapshot(self):
+        """Contadores acumulados por ruta en el contenedor"""
+        with self.lock:
+            return {name: dict(counters) for name, counters in self.counters.items()}
@@ -0,0 +1,411 @@
+"""
+Preprocesado de audio antes de la transcripción
+Decodifica WAV/AIFF en bloques, recorta el silencio inicial y final, mezcla a mono,
+remuestrea a 16kHz y escribe un WAV PCM de 16 bits con memoria acotada.
+También divide el resultado en segmentos por pausas para transcribirlos en paralelo.
+"""
+import struct
+import numpy as np
+
+BLOCK_FRAMES = 65536
+FILTER_TAPS = 63
+WAV_HEADER_SIZE = 44
+ENERGY_WINDOW_MS = 20
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def read_exact(stream, size):
+    """Leer exactamente `size` bytes (menos solo al final del stream)"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+def skip_bytes(stream, size):
+    """Descartar `size` bytes del stream sin cargarlos de una vez"""
+    while size > 0:
+        chunk = stream.read(min(size, 1 << 16))
+        if not chunk:
+            break
+        size -= len(chunk)
+
+def parse_extended_float(data):
+    """Convertir un float IEEE de 80 bits (frecuencia de muestreo AIFF)"""
+    exponent = ((data[0] & 0x7F) << 8) | data[1]
+    mantissa = int.from_bytes(data[2:10], 'big')
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    value = mantissa * 2.0 ** (exponent - 16383 - 63)
+    return -value if data[0] & 0x80 else value
+
+def read_wav_header(stream):
+    """Leer cabecera WAV hasta el chunk de datos; None si la codificación no es PCM/float"""
+    fmt = None
+    while True:
+        header = read_exact(stream, 8)
+        if len(header) < 8:
+            return None
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+        if chunk_id == b'fmt ':
+            body = read_exact(stream, chunk_size + (chunk_size & 1))
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                format_tag = struct.unpack('<H', body[24:26])[0]
+            if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+                return None
+            fmt = {
+                "channels": channels,
+                "sample_rate": sample_rate,
+                "bits": bits,
+                "block_align": block_align,
+                "float": format_tag == WAVE_FORMAT_IEEE_FLOAT,
+                "byte_order": '<',
+                "signed_8bit": False
+            }
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            # Tamaño 0 o 0xFFFFFFFF: WAV escrito en streaming, leer hasta el final
+            fmt["data_size"] = None if chunk_size in (0, 0xFFFFFFFF) else chunk_size
+            return fmt
+        else:
+            skip_bytes(stream, chunk_size + (chunk_size & 1))
+
+def read_aiff_header(stream, is_aifc):
+    """Leer cabecera AIFF/AIFC hasta el chunk SSND; None si la compresión no está soportada"""
+    fmt = None
+    while True:
+        header = read_exact(stream, 8)
+        if len(header) < 8:
+            return None
+        chunk_id, chunk_size = struct.unpack('>4sI', header)
+
+        if chunk_id == b'COMM':
+            body = read_exact(stream, chunk_size + (chunk_size & 1))
+            channels, _, bits = struct.unpack('>hIh', body[:8])
+            compression = body[18:22] if is_aifc else b'NONE'
+            if compression not in (b'NONE', b'sowt', b'fl32', b'FL32'):
+                return None
+            is_float = compression in (b'fl32', b'FL32')
+            fmt = {
+                "channels": channels,
+                "sample_rate": parse_extended_float(body[8:18]),
+                "bits": 32 if is_float else bits,
+                "block_align": channels * ((32 if is_float else bits) + 7) // 8,
+                "float": is_float,
+                "byte_order": '<' if compression == b'sowt' else '>',
+                "signed_8bit": True
+            }
+        elif chunk_id == b'SSND':
+            if fmt is None:
+                return None
+            offset, _ = struct.unpack('>II', read_exact(stream, 8))
+            skip_bytes(stream, offset)
+            fmt["data_size"] = chunk_size - 8 - offset
+            return fmt
+        else:
+            skip_bytes(stream, chunk_size + (chunk_size & 1))
+
+def read_audio_header(stream):
+    """Detectar el contenedor y devolver el formato de las muestras, o None si no está soportado"""
+    header = read_exact(stream, 12)
+    if len(header) < 12:
+        return None
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        fmt = read_wav_header(stream)
+    elif header[:4] == b'FORM' and header[8:12] in (b'AIFF', b'AIFC'):
+        fmt = read_aiff_header(stream, header[8:12] == b'AIFC')
+    else:
+        return None
+
+    if not fmt or fmt["channels"] < 1 or fmt["sample_rate"] <= 0 or fmt["bits"] not in (8, 16, 24, 32, 64):
+        return None
+    return fmt
+
+def decode_samples(raw, fmt):
+    """Convertir bytes de un bloque a muestras mono float32 en [-1, 1]"""
+    channels = fmt["channels"]
+    width = fmt["block_align"] // channels
+    order = fmt["byte_order"]
+    usable = len(raw) - len(raw) % fmt["block_align"]
+    raw = raw[:usable]
+
+    if fmt["float"]:
+        samples = np.frombuffer(raw, dtype=f'{order}f{width}').astype(np.float32)
+    elif width == 1:
+        if fmt["signed_8bit"]:
+            samples = np.frombuffer(raw, dtype=np.int8).astype(np.float32) / 128.0
+        else:
+            samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 3:
+        # 24 bits: colocar los 3 bytes en la parte alta de un int32 y desplazar con signo
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        if order == '<':
+            values = (triplets[:, 0] << 8) | (triplets[:, 1] << 16) | (triplets[:, 2] << 24)
+        else:
+            values = (triplets[:, 2] << 8) | (triplets[:, 1] << 16) | (triplets[:, 0] << 24)
+        samples = (values >> 8).astype(np.float32) / 8388608.0
+    else:
+        samples = np.frombuffer(raw, dtype=f'{order}i{width}').astype(np.float32) / float(2 ** (8 * width - 1))
+
+    # Mezcla a mono: promedio de canales
+    return samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+class StreamingResampler:
+    """Remuestreo por interpolación lineal con filtro antialias FIR, conservando estado entre bloques"""
+
+    def __init__(self, source_rate, target_rate):
+        self.ratio = source_rate / target_rate
+        # position: índice (en el buffer tail + bloque) de la siguiente muestra de salida
+        self.position = 1.0
+        self.tail = np.zeros(1, dtype=np.float32)
+        self.taps = None
+        if self.ratio > 1:
+            # Paso bajo (sinc con ventana de Hamming) al 90% de la nueva frecuencia de Nyquist
+            cutoff = 0.45 / self.ratio
+            n = np.arange(FILTER_TAPS) - (FILTER_TAPS - 1) / 2
+            taps = np.sinc(2 * cutoff * n) * np.hamming(FILTER_TAPS)
+            self.taps = (taps / taps.sum()).astype(np.float32)
+            self.history = np.zeros(FILTER_TAPS - 1, dtype=np.float32)
+
+    def process(self, samples):
+        if self.ratio == 1:
+            return samples
+
+        if self.taps is not None:
+            padded = np.concatenate([self.history, samples])
+            self.history = padded[-(FILTER_TAPS - 1):]
+            samples = np.convolve(padded, self.taps, mode='valid').astype(np.float32)
+
+        buffer = np.concatenate([self.tail, samples])
+        last = len(buffer) - 1
+        if last < self.position:
+            self.tail = buffer[-1:]
+            self.position -= len(samples)
+            return np.zeros(0, dtype=np.float32)
+
+        count = int((last - self.position) // self.ratio) + 1
+        positions = self.position + self.ratio * np.arange(count)
+        index = positions.astype(np.int64)
+        fraction = (positions - index).astype(np.float32)
+        following = np.minimum(index + 1, last)
+        output = buffer[index] * (1 - fraction) + buffer[following] * fraction
+
+        self.position = self.position + self.ratio * count - last
+        self.tail = buffer[-1:]
+        return output
+
+class SilenceTrimmer:
+    """Recorte de silencio inicial y final por RMS en ventanas de 20ms, con margen de voz"""
+
+    def __init__(self, sample_rate, threshold_db, padding_ms, window_ms=20):
+        self.window = max(1, int(sample_rate * window_ms / 1000))
+        self.padding = int(sample_rate * padding_ms / 1000)
+        self.threshold = 10 ** (threshold_db / 20)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.lead = np.zeros(0, dtype=np.float32)
+        self.started = False
+        self.skipped = 0
+        self.emitted = 0
+        self.last_voiced_end = 0
+
+    def process(self, samples):
+        """Devolver las muestras a escribir; el silencio inicial se descarta salvo el margen"""
+        buffer = np.concatenate([self.pending, samples])
+        full = len(buffer) - len(buffer) % self.window
+        self.pending = buffer[full:]
+        chunk = buffer[:full]
+        if not full:
+            return chunk
+
+        windows = chunk.reshape(-1, self.window)
+        voiced = np.sqrt(np.mean(windows * windows, axis=1)) >= self.threshold
+
+        if not self.started:
+            if not voiced.any():
+                self._keep_lead(chunk)
+                return np.zeros(0, dtype=np.float32)
+            first = int(np.argmax(voiced)) * self.window
+            self._keep_lead(chunk[:first])
+            output = np.concatenate([self.lead, chunk[first:]])
+            self.lead = np.zeros(0, dtype=np.float32)
+            self.started = True
+        else:
+            output = chunk
+
+        if voiced.any():
+            last = int(np.flatnonzero(voiced)[-1])
+            self.last_voiced_end = self.emitted + len(output) - (full - (last + 1) * self.window)
+        self.emitted += len(output)
+        return output
+
+    def finish(self):
+        """Vaciar las muestras pendientes (menos de una ventana)"""
+        if not self.started:
+            return np.zeros(0, dtype=np.float32)
+        output = self.pending
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.emitted += len(output)
+        return output
+
+    def trimmed_length(self):
+        """Muestras a conservar: hasta la última ventana con voz más el margen"""
+        if not self.started:
+            return 0
+        return min(self.emitted, self.last_voiced_end + self.padding)
+
+    def _keep_lead(self, samples):
+        self.lead = np.concatenate([self.lead, samples])
+        drop = len(self.lead) - self.padding
+        if drop > 0:
+            self.skipped += drop
+            self.lead = self.lead[drop:]
+
+def wav_header(sample_rate, num_samples):
+    """Cabecera WAV PCM 16 bits mono"""
+    data_size = num_samples * 2
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, WAVE_FORMAT_PCM, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', data_size
+    )
+
+def to_pcm16(samples):
+    """Muestras float32 a bytes PCM 16 bits little-endian"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+def preprocess_audio(source, target, sample_rate=16000, silence_threshold_db=-45.0, padding_ms=250):
+    """
+    Decodificar `source` (stream de lectura) y escribir en `target` (archivo binario con seek)
+    un WAV mono PCM 16 bits a `sample_rate`, sin silencio inicial ni final.
+    Devuelve estadísticas del proceso, o None si el formato no está soportado o no hay voz.
+    """
+    fmt = read_audio_header(source)
+    if fmt is None:
+        return None
+
+    resampler = StreamingResampler(fmt["sample_rate"], sample_rate)
+    trimmer = SilenceTrimmer(sample_rate, silence_threshold_db, padding_ms)
+    block_bytes = BLOCK_FRAMES * fmt["block_align"]
+    remaining = fmt["data_size"]
+    source_frames = 0
+
+    target.seek(0)
+    target.truncate()
+    target.write(wav_header(sample_rate, 0))
+
+    while remaining is None or remaining > 0:
+        raw = read_exact(source, block_bytes if remaining is None else min(block_bytes, remaining))
+        if not raw:
+            break
+        if remaining is not None:
+            remaining -= len(raw)
+
+        samples = decode_samples(raw, fmt)
+        source_frames += len(samples)
+        output = trimmer.process(resampler.process(samples))
+        target.write(to_pcm16(output))
+
+    target.write(to_pcm16(trimmer.finish()))
+
+    kept = trimmer.trimmed_length()
+    if not kept:
+        return None
+
+    # Recorte final: truncar tras la última voz y reescribir la cabecera
+    target.truncate(WAV_HEADER_SIZE + kept * 2)
+    target.seek(0)
+    target.write(wav_header(sample_rate, kept))
+    target.seek(0)
+
+    return {
+        "canales_original": fmt["channels"],
+        "frecuencia_original": int(fmt["sample_rate"]),
+        "duracion_original_ms": int(source_frames * 1000 / fmt["sample_rate"]),
+        "duracion_procesada_ms": int(kept * 1000 / sample_rate),
+        "recorte_inicio_ms": int(trimmer.skipped * 1000 / sample_rate),
+        "bytes_procesado": WAV_HEADER_SIZE + kept * 2
+    }
+
+def window_energy(source, sample_rate, window_ms=ENERGY_WINDOW_MS):
+    """RMS por ventana de un WAV generado por preprocess_audio, leído por bloques"""
+    window = max(1, int(sample_rate * window_ms / 1000))
+    block_bytes = (BLOCK_FRAMES // window) * window * 2
+    energy = []
+    pending = np.zeros(0, dtype=np.float32)
+
+    source.seek(WAV_HEADER_SIZE)
+    while True:
+        raw = source.read(block_bytes)
+        if not raw:
+            break
+        samples = np.concatenate([pending, np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0])
+        full = len(samples) - len(samples) % window
+        pending = samples[full:]
+        windows = samples[:full].reshape(-1, window)
+        energy.append(np.sqrt(np.mean(windows * windows, axis=1)))
+
+    return np.concatenate(energy) if energy else np.zeros(0, dtype=np.float32)
+
+def plan_segments(energy, max_segments, min_segment_ms, overlap_ms, window_ms=ENERGY_WINDOW_MS,
+                  search_ms=15000, pause_ms=300):
+    """
+    Elegir cortes en las pausas más largas cerca de divisiones equitativas del audio.
+    Cada segmento incluye `overlap_ms` del vecino a cada lado; los cortes nominales
+    (corte_inicio_ms/corte_fin_ms) deciden qué palabras aporta cada segmento al unirlos.
+    """
+    total_ms = len(energy) * window_ms
+    count = int(min(max_segments, total_ms // max(min_segment_ms, 1)))
+    if count < 2:
+        return []
+
+    # Energía media en ventanas de `pause_ms`: el mínimo cae en pausas, no en consonantes sordas
+    pause_windows = max(1, pause_ms // window_ms)
+    smoothed = np.convolve(energy, np.ones(pause_windows) / pause_windows, mode='same')
+    search = search_ms // window_ms
+
+    cuts = [0]
+    for index in range(1, count):
+        ideal = len(energy) * index // count
+        low = max(cuts[-1] + 1, ideal - search)
+        high = min(len(energy) - 1, ideal + search)
+        cuts.append(low + int(np.argmin(smoothed[low:high])) if high > low else ideal)
+    cuts.append(len(energy))
+
+    return [
+        {
+            "corte_inicio_ms": start * window_ms,
+            "corte_fin_ms": end * window_ms,
+            "inicio_ms": max(0, start * window_ms - overlap_ms),
+            "fin_ms": min(total_ms, end * window_ms + overlap_ms)
+        }
+        for start, end in zip(cuts[:-1], cuts[1:])
+    ]
+
+def write_wav_segment(source, target, sample_rate, start_ms, end_ms):
+    """Copiar un tramo de un WAV generado por preprocess_audio a `target` como WAV independiente"""
+    first = int(start_ms * sample_rate / 1000)
+    count = int(end_ms * sample_rate / 1000) - first
+
+    target.seek(0)
+    target.truncate()
+    target.write(wav_header(sample_rate, count))
+    source.seek(WAV_HEADER_SIZE + first * 2)
+    remaining = count * 2
+    while remaining > 0:
+        chunk = source.read(min(remaining, BLOCK_FRAMES * 2))
+        if not chunk:
+            break
+        target.write(chunk)
+        remaining -= len(chunk)
+    target.seek(0)
@@ -0,0 +1,197 @@
+"""
+Métricas de conversación deterministas a partir de los tiempos por palabra de AssemblyAI
+Carga las palabras en arrays de NumPy y calcula en pasadas vectorizadas el tiempo de habla y
+las palabras por minuto de cada hablante, interrupciones y solapamientos, la proporción de
+silencio, los tramos de baja confianza y los histogramas de turnos. Todos los tiempos en ms.
+"""
+from operator import itemgetter
+import numpy as np
+
+# Límites (ms) de los histogramas: duración de los turnos y hueco entre un turno y el siguiente
+# (los cambios de turno solapados se cuentan aparte en "solapamientos")
+TURN_DURATION_BINS_MS = (0, 1000, 2000, 5000, 10000, 30000, 60000)
+TURN_GAP_BINS_MS = (0, 200, 500, 1000, 2000, 5000)
+SENTENCE_END = ('.', '?', '!', '…')
+
+def load_words(transcription):
+    """
+    Arrays de la transcripción: inicio, fin, confianza, hablante (índice en `speakers`) y palabras
+    por unidad, ordenados por inicio, más los textos para detectar los finales de frase. Usa las
+    palabras de data.words; sin ellas (transcripción en vivo) cada utterance es una unidad con su
+    número de palabras y confianza desconocida (NaN)
+    """
+    data = transcription.get('data') or {}
+    words = data.get('words')
+    if words:
+        units, counts = words, None
+    else:
+        units = transcription.get('utterances') or []
+        counts = np.fromiter((len((unit.get('text') or '').split()) for unit in units), dtype=np.int64, count=len(units))
+
+    total = len(units)
+    if not total:
+        empty = np.zeros(0, dtype=np.int64)
+        return {"start": empty, "end": empty, "confidence": np.zeros(0), "speaker": empty, "count": empty,
+                "texts": [], "speakers": []}
+
+    # Una pasada por columna con itemgetter y np.fromiter: la conversión de los dicts es el coste
+    # dominante en transcripciones largas, y así no se crean tuplas intermedias por palabra
+    def column(key, default, dtype=None):
+        try:
+            values = map(itemgetter(key), units)
+            return np.fromiter(values, dtype=dtype, count=total) if dtype else list(values)
+        except KeyError:
+            values = (unit.get(key, default) for unit in units)
+            return np.fromiter(values, dtype=dtype, count=total) if dtype else list(values)
+
+    start = column('start', 0, np.int64)
+    end = column('end', 0, np.int64)
+    confidence = column('confidence', np.nan, np.float64) if counts is None else np.full(total, np.nan)
+    texts = [text or '' for text in column('text', '')]
+
+    # Códigos de hablante por orden de aparición, renumerados después por orden alfabético
+    codes = {}
+    speaker = np.fromiter((codes.setdefault(label or '', len(codes)) for label in column('speaker', None)),
+                          dtype=np.int64, count=total)
+    speakers = sorted(codes)
+    speaker = np.array([speakers.index(label) for label in codes], dtype=np.int64)[speaker]
+    counts = np.ones(total, dtype=np.int64) if counts is None else counts
+
+    # AssemblyAI las entrega en orden; las transcripciones unidas por segmentos también
+    if (np.diff(start) < 0).any():
+        order = np.argsort(start, kind='stable')
+        start, end, confidence, speaker, counts = start[order], end[order], confidence[order], speaker[order], counts[order]
+        texts = [texts[index] for index in order]
+
+    return {
+        "start": start,
+        "end": np.maximum(end, start),
+        "confidence": confidence,
+        "speaker": speaker,
+        "count": counts,
+        "texts": texts,
+        "speakers": [label or None for label in speakers]
+    }
+
+def histogram(values, edges):
+    """Conteos por intervalo [edges[i], edges[i+1]); el último intervalo no tiene límite superior"""
+    counts = np.bincount(np.searchsorted(np.asarray(edges[1:]), values, side='right'), minlength=len(edges))
+    return [
+        {"desde_ms": int(low), "hasta_ms": int(high) if high is not None else None, "cantidad": int(count)}
+        for low, high, count in zip(edges, list(edges[1:]) + [None], counts)
+    ]
+
+def low_confidence_spans(words, threshold, min_words, max_spans):
+    """Tramos de al menos `min_words` palabras consecutivas con confianza menor que `threshold`"""
+    low = np.nan_to_num(words['confidence'], nan=1.0) < threshold
+    edges = np.diff(np.concatenate(([0], low.astype(np.int8), [0])))
+    starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = (stops - starts) >= min_words
+    starts, stops = starts[keep], stops[keep]
+
+    # Suma acumulada: la confianza media de cada tramo sin recorrer sus palabras
+    cumulative = np.concatenate(([0.0], np.cumsum(np.nan_to_num(words['confidence'], nan=1.0))))
+    means = (cumulative[stops] - cumulative[starts]) / (stops - starts)
+    worst = np.argsort(means, kind='stable')[:max_spans]
+    worst = worst[np.argsort(starts[worst], kind='stable')]
+    return len(starts), [
+        {
+            "inicio_ms": int(words['start'][starts[index]]),
+            "fin_ms": int(words['end'][stops[index] - 1]),
+            "palabras": int(stops[index] - starts[index]),
+            "confianza_media": round(float(means[index]), 3),
+            "hablante": words['speakers'][words['speaker'][starts[index]]] if words['speakers'] else None
+        }
+        for index in worst
+    ]
+
+def compute_conversation_metrics(transcription, audio_duration_ms=None, **options):
+    """Métricas de la conversación de una transcripción (ver metrics_from_words)"""
+    return metrics_from_words(load_words(transcription), audio_duration_ms, **options)
+
+def metrics_from_words(words, audio_duration_ms=None, interruption_gap_ms=200, long_pause_ms=2000,
+                       low_confidence=0.5, low_confidence_min_words=3, max_spans=20):
+    """
+    Métricas de la conversación (ms). Un turno es una racha de palabras del mismo hablante.
+    Un solapamiento es un cambio de hablante que empieza antes de que termine la palabra anterior;
+    una interrupción, un cambio con un hueco menor que `interruption_gap_ms` cuando el turno
+    anterior no termina en fin de frase (se atribuye a quien toma la palabra)
+    """
+    start, end, speaker, count = words['start'], words['end'], words['speaker'], words['count']
+    speakers = words['speakers']
+    total = len(start)
+    duration = int(audio_duration_ms or (end.max() if total else 0))
+    if not total:
+        return {"duracion_ms": duration, "palabras": 0, "proporcion_silencio": 1.0 if duration else 0.0,
+                "hablantes": {}, "turnos": 0}
+
+    # Voz: unión de los intervalos de las palabras (el máximo acumulado de los finales cubre solapes)
+    covered_until = np.maximum.accumulate(end)
+    gaps = start[1:] - covered_until[:-1]
+    pauses = gaps[gaps > 0]
+    speech_ms = int(covered_until[-1] - start[0] - pauses.sum())
+    silence_ms = max(0, duration - speech_ms)
+
+    # Turnos: rachas del mismo hablante
+    change = np.flatnonzero(speaker[1:] != speaker[:-1]) + 1
+    turn_first = np.concatenate(([0], change))
+    turn_last = np.concatenate((change - 1, [total - 1]))
+    turn_speaker = speaker[turn_first]
+    turn_duration = end[turn_last] - start[turn_first]
+    turn_words = np.add.reduceat(count, turn_first)
+
+    # Transiciones entre turnos: hueco (negativo si se solapan)
+    transition_gap = start[turn_first[1:]] - end[turn_last[:-1]]
+    overlap = transition_gap < 0
+    # Solo se inspecciona el texto de la última palabra de cada turno
+    sentence_end = np.array([words['texts'][index].rstrip().endswith(SENTENCE_END) for index in turn_last[:-1]], dtype=bool)
+    interrupted = (transition_gap < interruption_gap_ms) & ~sentence_end
+    interrupter = turn_speaker[1:]
+
+    speaker_count = len(speakers)
+    talk_ms = np.bincount(turn_speaker, weights=turn_duration, minlength=speaker_count)
+    speaker_words = np.bincount(turn_speaker, weights=turn_words, minlength=speaker_count)
+    speaker_turns = np.bincount(turn_speaker, minlength=speaker_count)
+    interruptions = np.bincount(interrupter[interrupted], minlength=speaker_count)
+    interruptions_received = np.bincount(turn_speaker[:-1][interrupted], minlength=speaker_count)
+    overlaps = np.bincount(interrupter[overlap], minlength=speaker_count)
+    longest_turn = np.zeros(speaker_count, dtype=np.int64)
+    np.maximum.at(longest_turn, turn_speaker, turn_duration)
+    total_talk = talk_ms.sum()
+
+    span_count, spans = low_confidence_spans(words, low_confidence, low_confidence_min_words, max_spans)
+    has_confidence = not np.isnan(words['confidence']).all()
+
+    return {
+        "duracion_ms": duration,
+        "palabras": int(count.sum()),
+        "tiempo_voz_ms": speech_ms,
+        "tiempo_silencio_ms": silence_ms,
+        "proporcion_silencio": round(silence_ms / duration, 4) if duration else 0.0,
+        "pausas_largas": int((pauses >= long_pause_ms).sum()),
+        "turnos": int(len(turn_first)),
+        "solapamientos": int(overlap.sum()),
+        "tiempo_solapado_ms": int(-transition_gap[overlap].sum()),
+        "interrupciones": int(interrupted.sum()),
+        "hueco_medio_entre_turnos_ms": round(float(transition_gap[~overlap].mean()), 1) if (~overlap).any() else None,
+        "hablantes": {
+            (speakers[index] or "desconocido"): {
+                "tiempo_habla_ms": int(talk_ms[index]),
+                "proporcion_habla": round(float(talk_ms[index] / total_talk), 4) if total_talk else 0.0,
+                "palabras": int(speaker_words[index]),
+                "palabras_por_minuto": round(float(speaker_words[index] * 60000 / talk_ms[index]), 1) if talk_ms[index] else None,
+                "turnos": int(speaker_turns[index]),
+                "turno_medio_ms": int(talk_ms[index] // speaker_turns[index]) if speaker_turns[index] else 0,
+                "turno_mas_largo_ms": int(longest_turn[index]),
+                "interrupciones": int(interruptions[index]),
+                "interrupciones_recibidas": int(interruptions_received[index]),
+                "solapamientos": int(overlaps[index])
+            }
+            for index in range(speaker_count)
+        },
+        "histograma_duracion_turnos": histogram(turn_duration, TURN_DURATION_BINS_MS),
+        "histograma_huecos_entre_turnos": histogram(transition_gap[~overlap], TURN_GAP_BINS_MS),
+        "tramos_baja_confianza": spans if has_confidence else [],
+        "tramos_baja_confianza_total": span_count if has_confidence else None,
+        "umbral_baja_confianza": low_confidence
+    }
@@ -0,0 +1,49 @@
+"""
+Registro de trabajos terminados: cada estado final (COMPLETED o ERROR) deja una línea en
+jobs/pending/, particionada por día y hora UTC, que lambda-job-history compacta en segmentos
+por hora y archivos diarios para consultar el historial sin listar los estados uno a uno
+"""
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+
+PENDING_PREFIX = "jobs/pending/"
+MAX_ERROR_CHARS = 500
+
+def partition(ts_ms):
+    """Día y hora UTC de un instante en ms: ("2024-05-01", "13")"""
+    moment = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
+    return moment.strftime('%Y-%m-%d'), moment.strftime('%H')
+
+def build_job_record(file_key, status_data, finished_at=None):
+    """
+    Registro del trabajo a partir de su estado final. El id es el mismo para reescrituras del
+    mismo estado final (mismo token de idempotencia) y distinto para cada reprocesado; el token
+    queda en el registro para que el historial muestre solo el último estado final de la subida
+    """
+    ts_ms = int((finished_at or time.time()) * 1000)
+    status = status_data.get('status')
+    attempt = status_data.get('idempotency_token') or status_data.get('timestamp') or str(ts_ms)
+    record = {
+        "id": hashlib.sha256(f"{file_key}|{status}|{attempt}".encode('utf-8')).hexdigest()[:16],
+        "ts": ts_ms,
+        "file_key": file_key,
+        "status": status,
+        "origen": "live" if file_key.startswith('live/') else "upload",
+        "tiempo_total_s": status_data.get('tiempo_total'),
+        "cache_hit": bool(status_data.get('cache_hit')),
+        "resultado_key": status_data.get('resultado_key'),
+        "idempotency_token": status_data.get('idempotency_token')
+    }
+    if status == "ERROR":
+        record["error"] = (status_data.get('message') or '')[:MAX_ERROR_CHARS]
+    return record
+
+def pending_key(record):
+    """jobs/pending/dt=<día>/hh=<hora>/<ms>_<id>.json: la compactación y las consultas listan solo su partición"""
+    day, hour = partition(record['ts'])
+    return f"{PENDING_PREFIX}dt={day}/hh={hour}/{record['ts']}_{record['id']}.json"
+
+def encode_record(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
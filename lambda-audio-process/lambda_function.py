@@ -8,9 +8,28 @@ import boto3
 import os
 import time
 import logging
+import threading
+import base64
+import hashlib
+import gzip
+import tempfile
+import importlib
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlencode
 from datetime import datetime
-import assemblyai as aai
-import anthropic
+from decimal import Decimal
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import search_index
+import live_transcription
+import analysis_routing
+import job_manifest
+from rate_limiting import (
+    TokenBucket, DynamoDBTokenBucket, ProviderThrottledError, call_with_backoff, find_cause
+)
 
 # Configurar logging
 logger = logging.getLogger()
@@ -41,128 +60,704 @@ Responde en formato JSON con esta estructura:
 Transcripción a analizar:
 """
 
+# Prompt de combinación para transcripciones largas analizadas por fragmentos
+MERGE_PROMPT = """
+Los siguientes son análisis parciales (en JSON) de fragmentos consecutivos de una misma transcripción de audio.
+Combínalos en un único análisis de la conversación completa, sin repetir puntos ni temas.
+
+Responde en formato JSON con esta estructura:
+{
+    "resumen": "texto del resumen (2-3 oraciones)",
+    "puntos_destacados": ["punto 1", "punto 2", "punto 3"],
+    "temas_principales": ["tema 1", "tema 2"],
+    "duracion_estimada": "X minutos",
+    "tono_general": "descripción del tono",
+    "timestamp_analisis": "fecha y hora del análisis"
+}
+
+Análisis parciales a combinar:
+"""
+
 # =============================================================================
 # CONFIGURACIÓN
 # =============================================================================
 SECRET_NAME = "bdat/demo"
 RESULTS_BUCKET_PREFIX = "results/"
 PROCESSING_BUCKET_PREFIX = "processing/"
+SECRETS_TTL_SECONDS = int(os.environ.get('SECRETS_TTL_SECONDS', '300'))
+MAX_CONCURRENT_RECORDS = int(os.environ.get('MAX_CONCURRENT_RECORDS', '4'))
+
+# Escrituras a S3 en paralelo: estados intermedios en segundo plano (en orden por archivo)
+# y resultados en paralelo sobre un pool de conexiones compartido
+ASYNC_STATUS_WRITES = os.environ.get('ASYNC_STATUS_WRITES', 'true').lower() == 'true'
+WRITE_MAX_WORKERS = int(os.environ.get('WRITE_MAX_WORKERS', '8'))
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '50'))
+ANALYSIS_MODEL = os.environ.get('ANALYSIS_MODEL', 'claude-3-haiku-20240307')
+ANALYSIS_MAX_TOKENS = int(os.environ.get('ANALYSIS_MAX_TOKENS', '1000'))
+
+# Límite de peticiones por proveedor (token bucket) y reintentos con backoff para 429/5xx
+# RATE_LIMIT_STORE: "local" (por contenedor) o "dynamodb" (compartido entre contenedores)
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'local')
+RATE_LIMIT_TABLE_NAME = os.environ.get('RATE_LIMIT_TABLE_NAME', '')
+PROVIDER_RATE_LIMITS = {
+    "assemblyai": (
+        float(os.environ.get('ASSEMBLYAI_RATE_PER_SECOND', '5')),
+        int(os.environ.get('ASSEMBLYAI_BURST', '10'))
+    ),
+    "anthropic": (
+        float(os.environ.get('ANTHROPIC_RATE_PER_SECOND', '1')),
+        int(os.environ.get('ANTHROPIC_BURST', '5'))
+    )
+}
+PROVIDER_MAX_RETRIES = int(os.environ.get('PROVIDER_MAX_RETRIES', '5'))
+PROVIDER_BACKOFF_BASE_SECONDS = float(os.environ.get('PROVIDER_BACKOFF_BASE_SECONDS', '1'))
+PROVIDER_BACKOFF_MAX_SECONDS = float(os.environ.get('PROVIDER_BACKOFF_MAX_SECONDS', '30'))
+
+# Ingesta por cola (SQS): un trabajo limitado por el proveedor vuelve a la cola con estado QUEUED
+# en lugar de terminar en ERROR, hasta QUEUE_MAX_ATTEMPTS entregas del mensaje
+QUEUE_MAX_ATTEMPTS = int(os.environ.get('QUEUE_MAX_ATTEMPTS', '5'))
 
-def get_secrets():
-    """Obtener secrets de AWS Secrets Manager"""
+# Parámetros de transcripción (mismos que el original)
+TRANSCRIPTION_SETTINGS = {
+    "speaker_labels": True,
+    "speakers_expected": 2,
+    "language_code": "es",
+    "format_text": True,
+    "punctuate": True
+}
+
+# Preprocesado local del audio (WAV/AIFF): recorte de silencio, mono y 16kHz antes de transcribir
+AUDIO_PREPROCESSING_ENABLED = os.environ.get('AUDIO_PREPROCESSING_ENABLED', 'false').lower() == 'true'
+PREPROCESS_SAMPLE_RATE = int(os.environ.get('PREPROCESS_SAMPLE_RATE', '16000'))
+SILENCE_THRESHOLD_DB = float(os.environ.get('SILENCE_THRESHOLD_DB', '-45'))
+SILENCE_PADDING_MS = int(os.environ.get('SILENCE_PADDING_MS', '250'))
+PREPROCESS_EXTENSIONS = ('wav', 'aiff', 'aif', 'aifc')
+PREPROCESSED_BUCKET_PREFIX = f"{PROCESSING_BUCKET_PREFIX}preprocessed/"
+
+# Transcripción por segmentos (modo sync, requiere preprocesado): el audio se divide en pausas
+# y los segmentos se transcriben en paralelo. TRANSCRIPTION_MAX_SEGMENTS=1 lo desactiva
+TRANSCRIPTION_MAX_SEGMENTS = int(os.environ.get('TRANSCRIPTION_MAX_SEGMENTS', '1'))
+TRANSCRIPTION_SEGMENT_MIN_SECONDS = int(os.environ.get('TRANSCRIPTION_SEGMENT_MIN_SECONDS', '300'))
+TRANSCRIPTION_SEGMENT_OVERLAP_MS = int(os.environ.get('TRANSCRIPTION_SEGMENT_OVERLAP_MS', '3000'))
+
+# Caché de resultados por contenido: audios repetidos reutilizan resultados previos
+DEDUP_CACHE_ENABLED = os.environ.get('DEDUP_CACHE_ENABLED', 'true').lower() == 'true'
+DEDUP_CACHE_TTL_DAYS = int(os.environ.get('DEDUP_CACHE_TTL_DAYS', '30'))
+CACHE_BUCKET_PREFIX = f"{PROCESSING_BUCKET_PREFIX}cache/"
+
+# Checkpoints por etapa (envío y resultado de la transcripción, análisis, guardado) en
+# processing/checkpoints/<archivo>/: un reintento o una entrega duplicada del evento S3 reanuda
+# desde la última etapa completada. Requiere escrituras condicionales de S3 (boto3 >= 1.35)
+CHECKPOINTS_ENABLED = os.environ.get('CHECKPOINTS_ENABLED', 'true').lower() == 'true'
+CHECKPOINTS_BUCKET_PREFIX = f"{PROCESSING_BUCKET_PREFIX}checkpoints/"
+LEASE_DEFAULT_SECONDS = 900
+
+# Indexado para búsqueda: cada resultado deja un delta en index/pending/ que lambda-search
+# fusiona en los segmentos del índice invertido
+SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+INDEX_PENDING_PREFIX = "index/pending/"
+
+# Manifiesto de trabajos: cada estado final deja un registro en jobs/pending/ que lambda-job-history
+# compacta en segmentos por hora y archivos diarios
+JOB_MANIFEST_ENABLED = os.environ.get('JOB_MANIFEST_ENABLED', 'true').lower() == 'true'
+
+# Formato de resultados: "legacy" (resultado y transcripción en dos JSON indentados) o
+# "compact" (un solo objeto gzip con la transcripción como rango de bytes independiente)
+RESULT_STORAGE_FORMAT = os.environ.get('RESULT_STORAGE_FORMAT', 'legacy')
+WORD_FIELDS = ("text", "start", "end", "confidence", "speaker")
+
+# Análisis por fragmentos (map-reduce) para transcripciones largas
+ANALYSIS_CHUNK_TOKENS = int(os.environ.get('ANALYSIS_CHUNK_TOKENS', '8000'))
+ANALYSIS_MAX_CONCURRENCY = int(os.environ.get('ANALYSIS_MAX_CONCURRENCY', '4'))
+CHARS_PER_TOKEN = 4
+
+# Enrutado del análisis: modelo y tokens de salida según la longitud de la transcripción, la
+# duración del audio y el número de intervenciones. Con ROUTING_TEMPLATE_ENABLED (opt-in) las
+# grabaciones vacías o muy breves reciben un resumen por plantilla sin llamar al LLM. Las
+# transcripciones que se analizan por fragmentos (más de ANALYSIS_CHUNK_TOKENS) siempre van por
+# la ruta "extensa"
+ANALYSIS_ROUTING_ENABLED = os.environ.get('ANALYSIS_ROUTING_ENABLED', 'true').lower() == 'true'
+ROUTING_TEMPLATE_ENABLED = os.environ.get('ROUTING_TEMPLATE_ENABLED', 'false').lower() == 'true'
+ROUTING_TEMPLATE_MAX_WORDS = int(os.environ.get('ROUTING_TEMPLATE_MAX_WORDS', '40'))
+ROUTING_SHORT_MAX_TOKENS = int(os.environ.get('ROUTING_SHORT_MAX_TOKENS', '1500'))
+ROUTING_SHORT_MAX_SECONDS = int(os.environ.get('ROUTING_SHORT_MAX_SECONDS', '600'))
+ROUTING_LONG_MIN_SECONDS = int(os.environ.get('ROUTING_LONG_MIN_SECONDS', '1800'))
+ROUTING_LONG_MIN_UTTERANCES = int(os.environ.get('ROUTING_LONG_MIN_UTTERANCES', '300'))
+ANALYSIS_ROUTES = {
+    "breve": {
+        "modelo": os.environ.get('ROUTING_SHORT_MODEL') or ANALYSIS_MODEL,
+        "max_tokens": int(os.environ.get('ROUTING_SHORT_MAX_OUTPUT_TOKENS') or ANALYSIS_MAX_TOKENS)
+    },
+    "estandar": {"modelo": ANALYSIS_MODEL, "max_tokens": ANALYSIS_MAX_TOKENS},
+    "extensa": {
+        "modelo": os.environ.get('ROUTING_LONG_MODEL') or ANALYSIS_MODEL,
+        "max_tokens": int(os.environ.get('ROUTING_LONG_MAX_OUTPUT_TOKENS', '1500'))
+    }
+}
+# Precios adicionales o corregidos, en USD por millón de tokens: {"modelo": [entrada, salida]}
+MODEL_PRICES_PER_MTOK = {
+    **analysis_routing.MODEL_PRICES_PER_MTOK,
+    **{model: tuple(price) for model, price in json.loads(os.environ.get('ROUTING_MODEL_PRICES') or '{}').items()}
+}
+
+# Métricas de conversación deterministas (NumPy, sin LLM) a partir de los tiempos por palabra:
+# se guardan en analisis.metricas_conversacion
+CONVERSATION_ANALYTICS_ENABLED = os.environ.get('CONVERSATION_ANALYTICS_ENABLED', 'true').lower() == 'true'
+ANALYTICS_INTERRUPTION_GAP_MS = int(os.environ.get('ANALYTICS_INTERRUPTION_GAP_MS', '200'))
+ANALYTICS_LONG_PAUSE_MS = int(os.environ.get('ANALYTICS_LONG_PAUSE_MS', '2000'))
+ANALYTICS_LOW_CONFIDENCE = float(os.environ.get('ANALYTICS_LOW_CONFIDENCE', '0.5'))
+ANALYTICS_LOW_CONFIDENCE_MIN_WORDS = int(os.environ.get('ANALYTICS_LOW_CONFIDENCE_MIN_WORDS', '3'))
+ANALYTICS_MAX_SPANS = int(os.environ.get('ANALYTICS_MAX_SPANS', '20'))
+
+# Modo de análisis: "text" (prompt como texto, respuesta JSON libre) o "structured"
+# (instrucciones en bloque system cacheable y salida con esquema vía herramienta)
+ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'text')
+ANALYSIS_TOOL = {
+    "name": "registrar_analisis",
+    "description": "Registra el análisis estructurado de la transcripción.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "resumen": {"type": "string", "description": "Resumen breve (2-3 oraciones)"},
+            "puntos_destacados": {"type": "array", "items": {"type": "string"}},
+            "temas_principales": {"type": "array", "items": {"type": "string"}},
+            "duracion_estimada": {"type": "string", "description": "Duración estimada, ej. 'X minutos'"},
+            "tono_general": {"type": "string"}
+        },
+        "required": ["resumen", "puntos_destacados", "temas_principales", "duracion_estimada", "tono_general"]
+    }
+}
+
+# Transcripción asíncrona: "sync" espera el resultado, "webhook" envía el trabajo
+# y lo completa transcription_webhook_handler cuando AssemblyAI notifica
+TRANSCRIPTION_MODE = os.environ.get('TRANSCRIPTION_MODE', 'sync')
+TRANSCRIPTION_WEBHOOK_URL = os.environ.get('TRANSCRIPTION_WEBHOOK_URL', '')
+TRANSCRIPTION_WEBHOOK_SECRET = os.environ.get('TRANSCRIPTION_WEBHOOK_SECRET', '')
+WEBHOOK_AUTH_HEADER_NAME = "X-Webhook-Secret"
+
+# Canal de estado en tiempo real: endpoint de API Gateway WebSocket (o sustituto local)
+# al que se envían los cambios de estado para los clientes suscritos
+STATUS_WEBSOCKET_ENDPOINT = os.environ.get('STATUS_WEBSOCKET_ENDPOINT', '')
+SUBSCRIPTIONS_PREFIX = f"{PROCESSING_BUCKET_PREFIX}subscriptions/"
+
+# Almacén de estados: "s3" (JSON en processing/, por defecto) o "dynamodb" (tabla clave-valor
+# con clave de partición "status_key"; AWS_ENDPOINT_URL_DYNAMODB permite usar DynamoDB Local)
+STATUS_STORE = os.environ.get('STATUS_STORE', 's3')
+STATUS_TABLE_NAME = os.environ.get('STATUS_TABLE_NAME', '')
+
+# Permite apuntar a un sustituto local de la API de AssemblyAI
+ASSEMBLYAI_BASE_URL = os.environ.get('ASSEMBLYAI_BASE_URL') or None
+
+# Transcripción en vivo: el cliente sube fragmentos PCM 16 bits mono en live/<session_id>/ y el
+# primero dispara una invocación que los envía a AssemblyAI Streaming mientras llegan.
+# ASSEMBLYAI_STREAMING_HOST acepta un host ("streaming.assemblyai.com") o una URL ws:// de un sustituto local
+ASSEMBLYAI_STREAMING_HOST = os.environ.get('ASSEMBLYAI_STREAMING_HOST', 'streaming.assemblyai.com')
+LIVE_SAMPLE_RATE = int(os.environ.get('LIVE_SAMPLE_RATE', '16000'))
+LIVE_FRAME_MS = 100
+LIVE_FORMAT_TURNS = os.environ.get('LIVE_FORMAT_TURNS', 'true').lower() == 'true'
+LIVE_MAX_SEND_SPEED = float(os.environ.get('LIVE_MAX_SEND_SPEED', '1.0'))  # múltiplo del tiempo real; 0 sin límite
+LIVE_CHUNK_POLL_SECONDS = float(os.environ.get('LIVE_CHUNK_POLL_SECONDS', '0.25'))
+LIVE_IDLE_TIMEOUT_SECONDS = int(os.environ.get('LIVE_IDLE_TIMEOUT_SECONDS', '30'))
+LIVE_STATUS_INTERVAL_SECONDS = float(os.environ.get('LIVE_STATUS_INTERVAL_SECONDS', '1'))
+LIVE_STATUS_UTTERANCES = int(os.environ.get('LIVE_STATUS_UTTERANCES', '50'))
+LIVE_ANALYSIS_INTERVAL_SECONDS = float(os.environ.get('LIVE_ANALYSIS_INTERVAL_SECONDS', '60'))
+LIVE_FINALIZE_MARGIN_SECONDS = int(os.environ.get('LIVE_FINALIZE_MARGIN_SECONDS', '120'))
+LIVE_SAVE_AUDIO = os.environ.get('LIVE_SAVE_AUDIO', 'true').lower() == 'true'
+
+# Permite apuntar a un sustituto local de la API de Anthropic para pruebas
+ANTHROPIC_BASE_URL = os.environ.get('ANTHROPIC_BASE_URL') or None
+
+# Pre-inicialización durante el init: "auto" solo con SnapStart o concurrencia aprovisionada
+# (AWS_LAMBDA_INITIALIZATION_TYPE), donde el init no cuenta en la latencia de la primera petición;
+# "true" / "false" para forzarla o desactivarla
+PREINITIALIZE = os.environ.get('PREINITIALIZE', 'auto').lower()
+PREINITIALIZED_INIT_TYPES = ('snap-start', 'provisioned-concurrency')
+
+# =============================================================================
+# INSTRUMENTACIÓN: SPANS POR ETAPA Y MÉTRICAS EN FORMATO EMF DE CLOUDWATCH
+# =============================================================================
+# METRICS_SINK: "stdout" (líneas EMF en los logs de CloudWatch), "memory" (se acumulan
+# en collected_metrics, para pruebas locales) o "none"
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DemoS3/AudioProcessing')
+METRICS_SINK = os.environ.get('METRICS_SINK', 'stdout')
+FUNCTION_NAME = "lambda-audio-process"
+collected_metrics = []
+_trace = threading.local()
+
+def start_trace(file_key):
+    """Iniciar la traza de spans del archivo procesado en el hilo actual"""
+    _trace.file_key = file_key
+    _trace.spans = []
+
+def get_trace_spans():
+    """Spans registrados en el hilo actual"""
+    return list(getattr(_trace, 'spans', []))
+
+def emit_metric(stage, duration_ms, success):
+    """Emitir la latencia de una etapa como línea EMF"""
+    if METRICS_SINK == 'none':
+        return
+    
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Function", "Stage"]],
+                "Metrics": [{"Name": "StageLatency", "Unit": "Milliseconds"}]
+            }]
+        },
+        "Function": FUNCTION_NAME,
+        "Stage": stage,
+        "StageLatency": duration_ms,
+        "success": success,
+        "file_key": getattr(_trace, 'file_key', None)
+    }
+    publish_metric(record)
+
+def emit_route_metrics(route_summary):
+    """Emitir tokens, latencia y coste de un análisis como línea EMF con la dimensión Route"""
+    if METRICS_SINK == 'none':
+        return
+    
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Function", "Route"]],
+                "Metrics": [
+                    {"Name": "AnalysisCount", "Unit": "Count"},
+                    {"Name": "AnalysisLLMCalls", "Unit": "Count"},
+                    {"Name": "AnalysisInputTokens", "Unit": "Count"},
+                    {"Name": "AnalysisOutputTokens", "Unit": "Count"},
+                    {"Name": "AnalysisLatency", "Unit": "Milliseconds"},
+                    {"Name": "AnalysisCostUSD", "Unit": "None"}
+                ]
+            }]
+        },
+        "Function": FUNCTION_NAME,
+        "Route": route_summary['ruta'],
+        "AnalysisCount": 1,
+        "AnalysisLLMCalls": route_summary['llamadas_llm'],
+        "AnalysisInputTokens": route_summary['tokens_entrada'],
+        "AnalysisOutputTokens": route_summary['tokens_salida'],
+        "AnalysisLatency": route_summary['latencia_ms'],
+        "AnalysisCostUSD": route_summary['coste_estimado_usd'] or 0.0,
+        "model": route_summary['modelo'],
+        "file_key": getattr(_trace, 'file_key', None)
+    }
+    publish_metric(record)
+
+def publish_metric(record):
+    """Escribir una línea EMF en el destino configurado en METRICS_SINK"""
+    if METRICS_SINK == 'memory':
+        collected_metrics.append(record)
+    else:
+        print(json.dumps(record, ensure_ascii=False))
+
+@contextmanager
+def span(stage):
+    """Medir la duración de una etapa, registrarla en la traza y emitirla como métrica"""
+    start = time.perf_counter()
+    success = True
     try:
-        client = boto3.client('secretsmanager')
-        get_secret_value_response = client.get_secret_value(SecretId=SECRET_NAME)
-        secret_string = get_secret_value_response['SecretString']
-        secret_dict = json.loads(secret_string)
-        
-        assemblyai_key = secret_dict.get('ASSEMBLYAI_API_KEY', '')
-        anthropic_key = secret_dict.get('ANTHROPIC_API_KEY', '')
+        yield
+    except Exception:
+        success = False
+        raise
+    finally:
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        spans = getattr(_trace, 'spans', None)
+        if spans is not None:
+            spans.append({"etapa": stage, "duracion_ms": duration_ms, "exito": success})
+        emit_metric(stage, duration_ms, success)
+
+# =============================================================================
+# CLIENTES Y SECRETS REUTILIZABLES ENTRE INVOCACIONES (CONTENEDOR CALIENTE)
+# =============================================================================
+_boto_session = boto3.session.Session()
+_clients = {}
+_clients_lock = threading.Lock()
+_lazy_modules = {}
+_imports_lock = threading.Lock()
+_secrets_cache = {"keys": None, "expires_at": 0.0}
+_analysis_router = analysis_routing.AnalysisRouter(
+    ANALYSIS_ROUTES, ROUTING_TEMPLATE_MAX_WORDS if ROUTING_TEMPLATE_ENABLED else None,
+    ROUTING_SHORT_MAX_TOKENS, ROUTING_SHORT_MAX_SECONDS, ANALYSIS_CHUNK_TOKENS, ROUTING_LONG_MIN_SECONDS, ROUTING_LONG_MIN_UTTERANCES, prices=MODEL_PRICES_PER_MTOK
+)
+_secrets_lock = threading.Lock()
+
+# Pool de escrituras y canales de estado por archivo:
+# {file_key: {"lock": Lock, "seq": último número asignado, "written": último escrito, "pending": [futures],
+#             "users": registros en curso del archivo}}
+_write_executor = ThreadPoolExecutor(max_workers=WRITE_MAX_WORKERS, thread_name_prefix="s3-write")
+_status_channels = {}
+_status_channels_lock = threading.Lock()
+
+AUTH_ERROR_MARKERS = ("unauthorized", "authentication", "invalid api key", "invalid x-api-key")
+
+def get_aws_client(service_name, endpoint_url=None):
+    """Obtener cliente boto3 reutilizable (mantiene el pool de conexiones entre invocaciones)"""
+    cache_key = (service_name, endpoint_url) if endpoint_url else service_name
+    client = _clients.get(cache_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(cache_key)
+            if client is None:
+                client = _boto_session.client(
+                    service_name,
+                    endpoint_url=endpoint_url,
+                    config=Config(max_pool_connections=AWS_MAX_POOL_CONNECTIONS)
+                )
+                _clients[cache_key] = client
+    return client
+
+def lazy_import(module_name):
+    """
+    Importar un módulo pesado (SDKs de AssemblyAI y Anthropic, NumPy) en su primer uso en lugar
+    de al cargar la función: un evento que termina antes no paga su importación en el arranque en frío
+    """
+    module = _lazy_modules.get(module_name)
+    if module is None:
+        with _imports_lock:
+            module = _lazy_modules.get(module_name)
+            if module is None:
+                with span(f"import_{module_name}"):
+                    module = importlib.import_module(module_name)
+                if module_name == 'assemblyai' and ASSEMBLYAI_BASE_URL:
+                    module.settings.base_url = ASSEMBLYAI_BASE_URL
+                _lazy_modules[module_name] = module
+    return module
+
+def get_anthropic_client(anthropic_key):
+    """Obtener cliente de Anthropic reutilizable para la API key dada"""
+    cache_key = ("anthropic", anthropic_key)
+    client = _clients.get(cache_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(cache_key)
+            if client is None:
+                # Sin reintentos del SDK: los gestiona call_provider con el límite compartido
+                anthropic = lazy_import('anthropic')
+                client = anthropic.Anthropic(api_key=anthropic_key, base_url=ANTHROPIC_BASE_URL, max_retries=0)
+                _clients[cache_key] = client
+    return client
+
+def get_rate_limiter(provider):
+    """Token bucket del proveedor, compartido por los hilos del contenedor (o entre contenedores)"""
+    cache_key = ("rate_limiter", provider)
+    limiter = _clients.get(cache_key)
+    if limiter is None:
+        with _clients_lock:
+            limiter = _clients.get(cache_key)
+            if limiter is None:
+                rate, burst = PROVIDER_RATE_LIMITS[provider]
+                if RATE_LIMIT_STORE == 'dynamodb':
+                    limiter = DynamoDBTokenBucket(get_aws_client('dynamodb'), RATE_LIMIT_TABLE_NAME, provider, rate, burst)
+                else:
+                    limiter = TokenBucket(rate, burst)
+                _clients[cache_key] = limiter
+    return limiter
+
+def call_provider(provider, func, *args, **kwargs):
+    """Llamada a AssemblyAI o Anthropic con límite de peticiones y reintentos con backoff"""
+    return call_with_backoff(
+        provider, get_rate_limiter(provider),
+        PROVIDER_MAX_RETRIES, PROVIDER_BACKOFF_BASE_SECONDS, PROVIDER_BACKOFF_MAX_SECONDS,
+        func, *args, **kwargs
+    )
+
+def get_secrets(force_refresh=False):
+    """Obtener secrets de AWS Secrets Manager (cacheados durante SECRETS_TTL_SECONDS)"""
+    cached = _secrets_cache["keys"]
+    if cached and not force_refresh and time.time() < _secrets_cache["expires_at"]:
+        return cached
+    
+    with _secrets_lock:
+        cached = _secrets_cache["keys"]
+        if cached and not force_refresh and time.time() < _secrets_cache["expires_at"]:
+            return cached
         
-        if not assemblyai_key or not anthropic_key:
-            raise ValueError("API keys not found in secrets")
+        try:
+            client = get_aws_client('secretsmanager')
+            get_secret_value_response = client.get_secret_value(SecretId=SECRET_NAME)
+            secret_string = get_secret_value_response['SecretString']
+            secret_dict = json.loads(secret_string)
             
-        return assemblyai_key, anthropic_key
-        
+            assemblyai_key = secret_dict.get('ASSEMBLYAI_API_KEY', '')
+            anthropic_key = secret_dict.get('ANTHROPIC_API_KEY', '')
+            
+            if not assemblyai_key or not anthropic_key:
+                raise ValueError("API keys not found in secrets")
+            
+            _secrets_cache["keys"] = (assemblyai_key, anthropic_key)
+            _secrets_cache["expires_at"] = time.time() + SECRETS_TTL_SECONDS
+            logger.info(f"Secrets obtenidos de Secrets Manager (TTL {SECRETS_TTL_SECONDS}s)")
+            return _secrets_cache["keys"]
+            
+        except Exception as e:
+            logger.error(f"Error getting secrets: {e}")
+            raise
+
+def invalidate_secrets():
+    """Descartar secrets cacheados y los clientes construidos con ellos"""
+    with _secrets_lock:
+        _secrets_cache["keys"] = None
+        _secrets_cache["expires_at"] = 0.0
+    with _clients_lock:
+        for cache_key in [k for k in _clients if isinstance(k, tuple) and k[0] in ('anthropic', 'assemblyai')]:
+            del _clients[cache_key]
+
+def is_auth_error(error):
+    """Determinar si un error corresponde a una API key rechazada"""
+    while error is not None:
+        if getattr(error, 'status_code', None) in (401, 403):
+            return True
+        message = str(error).lower()
+        if any(marker in message for marker in AUTH_ERROR_MARKERS):
+            return True
+        error = error.__cause__
+    return False
+
+def call_with_secret_refresh(func, *args, key_index):
+    """Ejecutar func(*args, api_key) refrescando los secrets una vez si la key es rechazada"""
+    api_key = get_secrets()[key_index]
+    try:
+        return func(*args, api_key)
     except Exception as e:
-        logger.error(f"Error getting secrets: {e}")
-        raise
+        if not is_auth_error(e):
+            raise
+        logger.warning(f"API key rechazada, refrescando secrets: {e}")
+        invalidate_secrets()
+        api_key = get_secrets(force_refresh=True)[key_index]
+        return func(*args, api_key)
 
-def get_transcriber():
+def get_transcriber(assemblyai_key=None):
     """
     Inicializa y retorna el transcriptor de AssemblyAI.
-    Compatible con código original.
+    Compatible con código original. Se reutiliza mientras la API key no cambie.
+    """
+    aai = lazy_import('assemblyai')
+    if assemblyai_key is None:
+        return aai.Transcriber()
+    
+    cache_key = ("assemblyai", assemblyai_key)
+    transcriber = _clients.get(cache_key)
+    if transcriber is None:
+        with _clients_lock:
+            transcriber = _clients.get(cache_key)
+            if transcriber is None:
+                aai.settings.api_key = assemblyai_key
+                transcriber = aai.Transcriber()
+                _clients[cache_key] = transcriber
+    return transcriber
+
+def build_transcription_config():
+    """Parámetros de transcripción (mismos que el original)"""
+    aai = lazy_import('assemblyai')
+    return aai.TranscriptionConfig(**TRANSCRIPTION_SETTINGS)
+
+def format_transcript(transcript, audio_url):
+    """Formatear un transcript de AssemblyAI al resultado compatible con el procesador original"""
+    aai = lazy_import('assemblyai')
+    if transcript.status == aai.TranscriptStatus.error:
+        error_msg = f"Error en transcripción AssemblyAI: {transcript.error}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    
+    # Usar json_response como en el código original
+    json_response = transcript.json_response
+    
+    # Formatear resultado compatible con el procesador original
+    result = {
+        "success": True,
+        "data": json_response,
+        "file_name": audio_url.split('/')[-1],  # Extraer nombre del archivo de la URL
+        "id": transcript.id,
+        "text": transcript.text,
+        "audio_duration": transcript.audio_duration
+    }
+    
+    # Agregar utterances si están disponibles
+    utterances = []
+    if transcript.utterances:
+        for utterance in transcript.utterances:
+            utterances.append({
+                "speaker": utterance.speaker,
+                "text": utterance.text,
+                "start": utterance.start,
+                "end": utterance.end
+            })
+    result["utterances"] = utterances
+    
+    logger.info(f"Transcripción completada. Duración: {transcript.audio_duration}ms, Utterances: {len(utterances)}")
+    return result
+
+def get_transcript(transcript_id):
+    """
+    Estado actual de un transcript con un solo GET. Transcript.get_by_id del SDK espera a que
+    termine, así que cada consulta pasaría minutos dentro de un único intento de call_provider
     """
-    return aai.Transcriber()
+    aai = lazy_import('assemblyai')
+    client = aai.Client.get_default()
+    response = aai.api.get_transcript(client.http_client, transcript_id)
+    return aai.Transcript.from_response(client=client, response=response)
 
-def transcribe_audio(audio_url, assemblyai_key):
-    """Transcribir audio usando AssemblyAI - Compatible con código original"""
+def wait_for_transcript(transcript, pending_states):
+    """Consultar el transcript cada polling_interval hasta que deje los estados indicados"""
+    aai = lazy_import('assemblyai')
+    while transcript.status in pending_states:
+        time.sleep(aai.settings.polling_interval)
+        transcript = call_provider("assemblyai", get_transcript, transcript.id)
+    return transcript
+
+def transcribe_audio(audio_url, assemblyai_key, transcript_id=None, on_submit=None):
+    """
+    Transcribir audio usando AssemblyAI - Compatible con código original.
+    Con transcript_id se espera una transcripción ya enviada en lugar de enviarla de nuevo;
+    on_submit recibe el ID de una transcripción recién enviada
+    """
+    aai = lazy_import('assemblyai')
     try:
         # Configurar AssemblyAI
         aai.settings.api_key = assemblyai_key
-        transcriber = get_transcriber()
-        
-        # Configurar parámetros de transcripción (mismo que el original)
-        config = aai.TranscriptionConfig(
-            speaker_labels=True,
-            speakers_expected=2,
-            language_code="es",
-            format_text=True,
-            punctuate=True
-        )
+        transcriber = get_transcriber(assemblyai_key)
+        
+        transcript = None
+        if transcript_id:
+            transcript = call_provider("assemblyai", get_transcript, transcript_id)
+            if transcript.status == aai.TranscriptStatus.error:
+                logger.warning(f"Transcripción {transcript_id} terminó con error, se envía de nuevo: {transcript.error}")
+                transcript = None
+            else:
+                logger.info(f"Reanudando transcripción {transcript_id}")
+        
+        if transcript is None:
+            logger.info(f"Iniciando transcripción de: {audio_url[:100]}...")
+            
+            # Transcribir: enviar y esperar, separando tiempo en cola y tiempo de procesamiento
+            with span("transcription_submit"):
+                transcript = call_provider("assemblyai", transcriber.submit, audio_url, config=build_transcription_config())
+            if on_submit:
+                on_submit(transcript.id)
+        with span("transcription_queue"):
+            transcript = wait_for_transcript(transcript, (aai.TranscriptStatus.queued,))
+        with span("transcription_processing"):
+            transcript = wait_for_transcript(transcript, (aai.TranscriptStatus.queued, aai.TranscriptStatus.processing))
+        return format_transcript(transcript, audio_url)
+        
+    except Exception as e:
+        error_msg = f"Error en transcripción: {str(e)}"
+        logger.error(error_msg)
+        raise Exception(error_msg) from e
+
+def build_webhook_url(bucket, file_key):
+    """URL de webhook con el archivo de origen como parámetros de consulta"""
+    separator = '&' if '?' in TRANSCRIPTION_WEBHOOK_URL else '?'
+    return f"{TRANSCRIPTION_WEBHOOK_URL}{separator}{urlencode({'bucket': bucket, 'file_key': file_key})}"
+
+def submit_transcription(audio_url, webhook_url, assemblyai_key):
+    """Enviar transcripción a AssemblyAI sin esperar el resultado (notifica vía webhook)"""
+    aai = lazy_import('assemblyai')
+    try:
+        aai.settings.api_key = assemblyai_key
+        transcriber = get_transcriber(assemblyai_key)
         
-        logger.info(f"Iniciando transcripción de: {audio_url[:100]}...")
+        config = build_transcription_config()
+        config.set_webhook(
+            webhook_url,
+            WEBHOOK_AUTH_HEADER_NAME if TRANSCRIPTION_WEBHOOK_SECRET else None,
+            TRANSCRIPTION_WEBHOOK_SECRET or None
+        )
         
-        # Transcribir
-        transcript = transcriber.transcribe(audio_url, config=config)
+        logger.info(f"Enviando transcripción asíncrona de: {audio_url[:100]}...")
+        transcript = call_provider("assemblyai", transcriber.submit, audio_url, config=config)
         
         if transcript.status == aai.TranscriptStatus.error:
-            error_msg = f"Error en transcripción AssemblyAI: {transcript.error}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
-        
-        # Usar json_response como en el código original
-        json_response = transcript.json_response
-        
-        # Formatear resultado compatible con el procesador original
-        result = {
-            "success": True,
-            "data": json_response,
-            "file_name": audio_url.split('/')[-1],  # Extraer nombre del archivo de la URL
-            "id": transcript.id,
-            "text": transcript.text,
-            "audio_duration": transcript.audio_duration
-        }
+            raise Exception(f"Error en transcripción AssemblyAI: {transcript.error}")
         
-        # Agregar utterances si están disponibles
-        utterances = []
-        if transcript.utterances:
-            for utterance in transcript.utterances:
-                utterances.append({
-                    "speaker": utterance.speaker,
-                    "text": utterance.text,
-                    "start": utterance.start,
-                    "end": utterance.end
-                })
-        result["utterances"] = utterances
-        
-        logger.info(f"Transcripción completada. Duración: {transcript.audio_duration}ms, Utterances: {len(utterances)}")
-        return result
+        logger.info(f"Transcripción enviada. ID: {transcript.id}")
+        return transcript.id
         
     except Exception as e:
-        error_msg = f"Error en transcripción: {str(e)}"
+        error_msg = f"Error enviando transcripción: {str(e)}"
         logger.error(error_msg)
-        raise Exception(error_msg)
+        raise Exception(error_msg) from e
 
-def analyze_with_ai(transcript_text, anthropic_key):
-    """Analizar transcripción con Claude"""
+def fetch_transcript(transcript_id, assemblyai_key):
+    """Obtener una transcripción terminada por su ID"""
+    aai = lazy_import('assemblyai')
     try:
-        # Configurar Anthropic
-        client = anthropic.Anthropic(api_key=anthropic_key)
+        aai.settings.api_key = assemblyai_key
+        transcript = call_provider("assemblyai", get_transcript, transcript_id)
+        return format_transcript(transcript, transcript.audio_url or transcript_id)
         
-        # Preparar prompt completo
-        full_prompt = ANALYSIS_PROMPT + "\n\n" + transcript_text
+    except Exception as e:
+        error_msg = f"Error obteniendo transcripción {transcript_id}: {str(e)}"
+        logger.error(error_msg)
+        raise Exception(error_msg) from e
+
+def build_analysis_request(transcript_text, prompt):
+    """Parámetros de messages.create según ANALYSIS_MODE"""
+    if ANALYSIS_MODE != 'structured':
+        return {
+            "messages": [{
+                "role": "user",
+                "content": prompt + "\n\n" + transcript_text
+            }]
+        }
+    
+    # Instrucciones fijas en un bloque system cacheable y salida como herramienta con esquema
+    return {
+        "system": [{
+            "type": "text",
+            "text": prompt,
+            "cache_control": {"type": "ephemeral"}
+        }],
+        "tools": [ANALYSIS_TOOL],
+        "tool_choice": {"type": "tool", "name": ANALYSIS_TOOL["name"]},
+        "messages": [{
+            "role": "user",
+            "content": transcript_text
+        }]
+    }
+
+def parse_analysis_response(response):
+    """Extraer el análisis de la respuesta (bloque tool_use o texto JSON)"""
+    for block in response.content:
+        if getattr(block, 'type', None) == 'tool_use':
+            return dict(block.input), None
+    
+    analysis_text = ''.join(getattr(block, 'text', '') for block in response.content)
+    try:
+        return json.loads(analysis_text), analysis_text
+    except json.JSONDecodeError:
+        return None, analysis_text
+
+def analyze_with_ai(transcript_text, anthropic_key, prompt=ANALYSIS_PROMPT, route=None, usage=None):
+    """Analizar transcripción con Claude; `route` fija modelo y max_tokens y `usage` acumula el consumo"""
+    model = route['modelo'] if route else ANALYSIS_MODEL
+    max_tokens = route['max_tokens'] if route else ANALYSIS_MAX_TOKENS
+    try:
+        # Configurar Anthropic (cliente reutilizado entre invocaciones)
+        client = get_anthropic_client(anthropic_key)
         
-        logger.info("Iniciando análisis con Claude")
+        logger.info(f"Iniciando análisis con Claude (modo {ANALYSIS_MODE}, modelo {model}, max_tokens {max_tokens})")
         
         # Llamar a Claude
-        response = client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=1000,
+        response = call_provider(
+            "anthropic", client.messages.create,
+            model=model,
+            max_tokens=max_tokens,
             temperature=0.1,
-            messages=[{
-                "role": "user",
-                "content": full_prompt
-            }]
+            **build_analysis_request(transcript_text, prompt)
         )
         
         # Extraer respuesta
-        analysis_text = response.content[0].text
+        analysis_json, analysis_text = parse_analysis_response(response)
         
-        # Intentar parsear como JSON
-        try:
-            analysis_json = json.loads(analysis_text)
-        except json.JSONDecodeError:
+        if analysis_json is None:
             # Si no es JSON válido, crear estructura básica
             analysis_json = {
                 "resumen": "Análisis disponible en texto plano",
@@ -179,20 +774,395 @@ def analyze_with_ai(transcript_text, anthropic_key):
             analysis_json["timestamp_analisis"] = datetime.now().isoformat()
         
         # Agregar metadata
-        analysis_json["tokens_utilizados"] = response.usage.input_tokens + response.usage.output_tokens
-        analysis_json["modelo_usado"] = "claude-3-haiku-20240307"
+        response_usage = response.usage
+        if usage is not None:
+            usage.add(model, response_usage)
+        analysis_json["tokens_utilizados"] = response_usage.input_tokens + response_usage.output_tokens
+        analysis_json["tokens_cache_escritura"] = getattr(response_usage, 'cache_creation_input_tokens', None) or 0
+        analysis_json["tokens_cache_lectura"] = getattr(response_usage, 'cache_read_input_tokens', None) or 0
+        analysis_json["modelo_usado"] = model
         
-        logger.info(f"Análisis completado. Tokens: {analysis_json['tokens_utilizados']}")
+        logger.info(
+            f"Análisis completado. Tokens: {analysis_json['tokens_utilizados']} "
+            f"(caché escritura: {analysis_json['tokens_cache_escritura']}, lectura: {analysis_json['tokens_cache_lectura']})"
+        )
         return analysis_json
         
     except Exception as e:
         logger.error(f"Error en análisis AI: {e}")
         raise
 
+def estimate_tokens(text):
+    """Estimación rápida de tokens a partir de la longitud del texto"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def format_utterance(utterance):
+    """Línea de transcripción con hablante y marca de tiempo"""
+    if utterance.get('speaker') is None:
+        return utterance['text']
+    minutes, seconds = divmod(int(utterance.get('start', 0)) // 1000, 60)
+    return f"[{minutes:02d}:{seconds:02d}] Hablante {utterance['speaker']}: {utterance['text']}"
+
+def split_into_chunks(transcription, max_tokens=None):
+    """Dividir la transcripción en fragmentos acotados en tokens respetando los turnos de cada hablante"""
+    max_tokens = max_tokens or ANALYSIS_CHUNK_TOKENS
+    utterances = transcription.get('utterances') or [
+        {"speaker": None, "text": sentence.strip() + '.'}
+        for sentence in (transcription.get('text') or '').split('. ') if sentence.strip()
+    ]
+    
+    chunks = []
+    current, current_tokens = [], 0
+    for utterance in utterances:
+        line = format_utterance(utterance)
+        line_tokens = estimate_tokens(line)
+        
+        # Un turno más largo que el límite se parte por palabras
+        if line_tokens > max_tokens:
+            words = line.split()
+            step = max(1, len(words) * max_tokens // line_tokens)
+            pieces = [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            pieces = [line]
+        
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append('\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+def merge_partial_analyses(partials, transcription):
+    """Combinar análisis parciales sin LLM (respaldo si falla la combinación con Claude)"""
+    def unique(values):
+        seen, merged = set(), []
+        for value in values:
+            if value and value.lower() not in seen:
+                seen.add(value.lower())
+                merged.append(value)
+        return merged
+    
+    topics = Counter(t for p in partials for t in p.get('temas_principales', []))
+    tones = Counter(p.get('tono_general') for p in partials if p.get('tono_general'))
+    duration_seconds = transcription.get('audio_duration')
+    
+    return {
+        "resumen": ' '.join(p.get('resumen', '') for p in partials).strip(),
+        "puntos_destacados": unique(x for p in partials for x in p.get('puntos_destacados', []))[:10],
+        "temas_principales": [t for t, _ in topics.most_common(8)],
+        "duracion_estimada": f"{max(1, round(duration_seconds / 60))} minutos" if duration_seconds else "No determinada",
+        "tono_general": tones.most_common(1)[0][0] if tones else "No determinado",
+        "timestamp_analisis": datetime.now().isoformat()
+    }
+
+def analyze_transcription(transcription, anthropic_key, route=None, usage=None):
+    """Analizar una transcripción; las largas se analizan por fragmentos en paralelo y se combinan"""
+    text = transcription['text']
+    if estimate_tokens(text) <= ANALYSIS_CHUNK_TOKENS:
+        return analyze_with_ai(text, anthropic_key, route=route, usage=usage)
+    
+    chunks = split_into_chunks(transcription)
+    if len(chunks) == 1:
+        return analyze_with_ai(chunks[0], anthropic_key, route=route, usage=usage)
+    
+    logger.info(f"Transcripción larga: analizando {len(chunks)} fragmentos en paralelo")
+    
+    # Map: analizar fragmentos en paralelo
+    with ThreadPoolExecutor(max_workers=max(1, min(ANALYSIS_MAX_CONCURRENCY, len(chunks)))) as executor:
+        futures = [
+            executor.submit(analyze_with_ai, f"(Fragmento {i + 1} de {len(chunks)})\n{chunk}", anthropic_key,
+                            route=route, usage=usage)
+            for i, chunk in enumerate(chunks)
+        ]
+        partials = [future.result() for future in futures]
+    usage_fields = ('tokens_utilizados', 'tokens_cache_escritura', 'tokens_cache_lectura')
+    totals = {field: sum(p.get(field, 0) for p in partials) for field in usage_fields}
+    
+    # Reduce: combinar los análisis parciales en el esquema original
+    summaries = [
+        {k: p.get(k) for k in ('resumen', 'puntos_destacados', 'temas_principales', 'tono_general')}
+        for p in partials
+    ]
+    merged = analyze_with_ai(json.dumps(summaries, ensure_ascii=False), anthropic_key, prompt=MERGE_PROMPT,
+                             route=route, usage=usage)
+    for field in usage_fields:
+        totals[field] += merged.get(field, 0)
+    
+    if 'analisis_texto' in merged:
+        logger.warning("Combinación con Claude no devolvió JSON válido, combinando localmente")
+        merged = merge_partial_analyses(partials, transcription)
+    
+    merged.update(totals)
+    merged["modelo_usado"] = route['modelo'] if route else ANALYSIS_MODEL
+    merged["fragmentos_analizados"] = len(chunks)
+    return merged
+
+def route_and_analyze(transcription):
+    """
+    Analizar por la ruta que corresponde a la transcripción: resumen por plantilla o Claude con el
+    modelo y max_tokens de la ruta. La decisión y su consumo se guardan en analisis.enrutado, se
+    acumulan por ruta en el contenedor y se emiten como métricas EMF
+    """
+    if not ANALYSIS_ROUTING_ENABLED:
+        return call_with_secret_refresh(analyze_transcription, transcription, key_index=1)
+    
+    features = analysis_routing.transcript_features(transcription, CHARS_PER_TOKEN)
+    route = _analysis_router.choose(features)
+    logger.info(f"Ruta de análisis: {route['ruta']} ({route['motivo']})")
+    
+    start = time.perf_counter()
+    if route['modelo'] is None:
+        analysis, usage = analysis_routing.template_analysis(transcription, features), None
+    else:
+        usage = analysis_routing.AnalysisUsage(MODEL_PRICES_PER_MTOK)
+        analysis = call_with_secret_refresh(
+            lambda anthropic_key: analyze_transcription(transcription, anthropic_key, route, usage), key_index=1
+        )
+    analysis["enrutado"] = _analysis_router.record(route, usage, (time.perf_counter() - start) * 1000)
+    emit_route_metrics(analysis["enrutado"])
+    return analysis
+
+def compute_conversation_analytics(transcription):
+    """Métricas de conversación de la transcripción (tiempos en ms), calculadas en local sin llamar al LLM"""
+    conversation_analytics = lazy_import('conversation_analytics')
+    duration = transcription.get('audio_duration')
+    return conversation_analytics.compute_conversation_metrics(
+        transcription,
+        audio_duration_ms=int(duration * 1000) if duration else None,
+        interruption_gap_ms=ANALYTICS_INTERRUPTION_GAP_MS,
+        long_pause_ms=ANALYTICS_LONG_PAUSE_MS,
+        low_confidence=ANALYTICS_LOW_CONFIDENCE,
+        low_confidence_min_words=ANALYTICS_LOW_CONFIDENCE_MIN_WORDS,
+        max_spans=ANALYTICS_MAX_SPANS
+    )
+
+def preprocess_for_transcription(bucket, file_key):
+    """Generar un derivado WAV mono 16kHz sin silencios; (None, None) si no aplica o no reduce el tamaño"""
+    if file_key.rsplit('.', 1)[-1].lower() not in PREPROCESS_EXTENSIONS:
+        return None, None
+    
+    audio_preprocessing = lazy_import('audio_preprocessing')
+    s3 = get_aws_client('s3')
+    response = s3.get_object(Bucket=bucket, Key=file_key)
+    
+    # El audio se decodifica por bloques y el derivado se escribe en /tmp: memoria acotada
+    with tempfile.TemporaryFile() as derivative:
+        try:
+            info = audio_preprocessing.preprocess_audio(
+                response['Body'], derivative,
+                sample_rate=PREPROCESS_SAMPLE_RATE,
+                silence_threshold_db=SILENCE_THRESHOLD_DB,
+                padding_ms=SILENCE_PADDING_MS
+            )
+        finally:
+            response['Body'].close()
+        
+        if not info:
+            logger.info(f"Preprocesado no aplicable a {file_key} (formato no soportado o sin voz)")
+            return None, None
+        
+        info["bytes_original"] = response['ContentLength']
+        if info["bytes_procesado"] >= info["bytes_original"]:
+            logger.info("Preprocesado descartado: el derivado no es menor que el original")
+            return None, None
+        
+        base_name = file_key.replace('uploads/', '').split('.')[0]
+        derivative_key = f"{PREPROCESSED_BUCKET_PREFIX}{base_name}.wav"
+        segments = []
+        if TRANSCRIPTION_MAX_SEGMENTS > 1 and TRANSCRIPTION_MODE != 'webhook':
+            segments = split_for_transcription(bucket, base_name, derivative)
+        if segments:
+            info["segmentos"] = segments
+        else:
+            s3.upload_fileobj(derivative, bucket, derivative_key, ExtraArgs={'ContentType': 'audio/wav'})
+    
+    logger.info(
+        f"Audio preprocesado: {info['duracion_original_ms']}ms -> {info['duracion_procesada_ms']}ms, "
+        f"{info['bytes_original']} -> {info['bytes_procesado']} bytes"
+    )
+    # Con segmentos se transcriben las partes, no el derivado completo
+    return (None if segments else derivative_key), info
+
+def split_for_transcription(bucket, base_name, derivative):
+    """Dividir el audio preprocesado en pausas y subir los segmentos; [] si es demasiado corto"""
+    audio_preprocessing = lazy_import('audio_preprocessing')
+    energy = audio_preprocessing.window_energy(derivative, PREPROCESS_SAMPLE_RATE)
+    segments = audio_preprocessing.plan_segments(
+        energy,
+        max_segments=TRANSCRIPTION_MAX_SEGMENTS,
+        min_segment_ms=TRANSCRIPTION_SEGMENT_MIN_SECONDS * 1000,
+        overlap_ms=TRANSCRIPTION_SEGMENT_OVERLAP_MS
+    )
+    if not segments:
+        return []
+    
+    s3 = get_aws_client('s3')
+    parts = []
+    try:
+        # El corte es local y secuencial; las subidas van en paralelo
+        for index, segment in enumerate(segments):
+            part = tempfile.TemporaryFile()
+            parts.append(part)
+            audio_preprocessing.write_wav_segment(
+                derivative, part, PREPROCESS_SAMPLE_RATE, segment['inicio_ms'], segment['fin_ms']
+            )
+            segment['key'] = f"{PREPROCESSED_BUCKET_PREFIX}{base_name}_seg{index:03d}.wav"
+        
+        uploads = [
+            _write_executor.submit(s3.upload_fileobj, part, bucket, segment['key'], ExtraArgs={'ContentType': 'audio/wav'})
+            for part, segment in zip(parts, segments)
+        ]
+        for future in uploads:
+            future.result()
+    finally:
+        for part in parts:
+            part.close()
+    
+    logger.info(f"Audio dividido en {len(segments)} segmentos: {[s['corte_fin_ms'] for s in segments]}")
+    return segments
+
+def map_segment_speakers(previous_words, overlap_words, labels, known_speakers):
+    """
+    Traducir las etiquetas de hablante de un segmento a las ya usadas, votando con las
+    palabras del solapamiento que ambos segmentos transcribieron (mismo texto, tiempo cercano)
+    """
+    votes = Counter()
+    for word in overlap_words:
+        for previous in previous_words:
+            if (word.get('speaker') and previous.get('speaker')
+                    and abs(word['start'] - previous['start']) <= 500
+                    and word['text'].lower().strip('.,;:?!¿¡') == previous['text'].lower().strip('.,;:?!¿¡')):
+                votes[(word['speaker'], previous['speaker'])] += 1
+                break
+    
+    mapping = {}
+    for (label, previous_label), _ in votes.most_common():
+        if label not in mapping and previous_label not in mapping.values():
+            mapping[label] = previous_label
+    
+    # Etiquetas sin votos: hablantes conocidos aún no asignados, después etiquetas nuevas
+    free = [speaker for speaker in known_speakers if speaker not in mapping.values()]
+    for label in sorted(set(labels) - set(mapping)):
+        if free:
+            mapping[label] = free.pop(0)
+        else:
+            mapping[label] = chr(ord('A') + len(known_speakers))
+            known_speakers.append(mapping[label])
+    return mapping
+
+def merge_segment_transcripts(transcripts, segments):
+    """Unir transcripciones de segmentos al formato de format_transcript con tiempos absolutos"""
+    merged_words = []
+    merged_utterances = []
+    known_speakers = []
+    
+    for transcript, segment in zip(transcripts, segments):
+        offset = segment['inicio_ms']
+        data = transcript.get('data') or {}
+        
+        def absolute(word):
+            return dict(word, start=word['start'] + offset, end=word['end'] + offset)
+        
+        # Cada segmento aporta solo las palabras cuyo centro cae entre sus cortes nominales
+        def keep(word):
+            return segment['corte_inicio_ms'] <= (word['start'] + word['end']) / 2 < segment['corte_fin_ms']
+        
+        words = [absolute(w) for w in data.get('words') or []]
+        mapping = map_segment_speakers(
+            [w for w in merged_words if w['start'] >= offset],
+            [w for w in words if w['start'] < segment['corte_inicio_ms']],
+            [w['speaker'] for w in words if w.get('speaker')] + [u['speaker'] for u in data.get('utterances') or [] if u.get('speaker')],
+            known_speakers
+        )
+        
+        merged_words.extend(dict(w, speaker=mapping.get(w.get('speaker'))) for w in words if keep(w))
+        
+        first_utterance = True
+        for utterance in data.get('utterances') or []:
+            kept = [
+                dict(w, speaker=mapping.get(w.get('speaker')))
+                for w in map(absolute, utterance.get('words') or []) if keep(w)
+            ]
+            if not kept:
+                continue
+            speaker = mapping.get(utterance.get('speaker'))
+            continues_turn = first_utterance and merged_utterances and merged_utterances[-1]['speaker'] == speaker
+            first_utterance = False
+            
+            # Un turno cortado por el límite del segmento se une al anterior del mismo hablante
+            if continues_turn:
+                previous = merged_utterances[-1]
+                previous['words'].extend(kept)
+                previous['text'] = " ".join(w['text'] for w in previous['words'])
+                previous['end'] = kept[-1]['end']
+                continue
+            
+            merged_utterances.append({
+                "speaker": speaker,
+                "text": " ".join(w['text'] for w in kept),
+                "start": kept[0]['start'],
+                "end": kept[-1]['end'],
+                "confidence": utterance.get('confidence'),
+                "words": kept
+            })
+    
+    text = " ".join(u['text'] for u in merged_utterances) or " ".join(w['text'] for w in merged_words)
+    first = transcripts[0]
+    return {
+        "success": True,
+        "data": {
+            **(first.get('data') or {}),
+            "text": text,
+            "words": merged_words,
+            "utterances": merged_utterances,
+            "audio_duration": round(segments[-1]['fin_ms'] / 1000),
+            "transcript_ids": [t['id'] for t in transcripts]
+        },
+        "file_name": first.get('file_name'),
+        "id": first['id'],
+        "text": text,
+        "audio_duration": round(segments[-1]['fin_ms'] / 1000),
+        "utterances": [
+            {"speaker": u['speaker'], "text": u['text'], "start": u['start'], "end": u['end']}
+            for u in merged_utterances
+        ]
+    }
+
+def transcribe_segments(bucket, segments, assemblyai_key):
+    """Transcribir los segmentos en paralelo y unir los resultados"""
+    audio_urls = [generate_presigned_url(bucket, segment['key'], expiration=900) for segment in segments]
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        transcripts = list(executor.map(lambda url: transcribe_audio(url, assemblyai_key), audio_urls))
+    
+    logger.info(f"{len(segments)} segmentos transcritos, uniendo resultados")
+    return merge_segment_transcripts(transcripts, segments)
+
+def shift_transcript_timestamps(transcription, offset_ms):
+    """Desplazar los tiempos de palabras y utterances para que correspondan al audio original"""
+    if not offset_ms:
+        return transcription
+    
+    data = transcription.get('data') or {}
+    items = list(transcription.get('utterances') or []) + list(data.get('words') or [])
+    for utterance in data.get('utterances') or []:
+        items.append(utterance)
+        items.extend(utterance.get('words') or [])
+    
+    for item in items:
+        for field in ('start', 'end'):
+            if isinstance(item.get(field), (int, float)):
+                item[field] += offset_ms
+    return transcription
+
 def generate_presigned_url(bucket, key, expiration=900):
     """Generar URL prefirmada para acceso temporal a S3 (15 minutos por defecto)"""
     try:
-        s3 = boto3.client('s3')
+        s3 = get_aws_client('s3')
         
         presigned_url = s3.generate_presigned_url(
             'get_object',
@@ -210,7 +1180,7 @@ def generate_presigned_url(bucket, key, expiration=900):
 def save_to_s3(bucket, key, data, content_type="application/json"):
     """Guardar datos en S3"""
     try:
-        s3 = boto3.client('s3')
+        s3 = get_aws_client('s3')
         
         if isinstance(data, dict):
             body = json.dumps(data, indent=2, ensure_ascii=False)
@@ -232,13 +1202,193 @@ def save_to_s3(bucket, key, data, content_type="application/json"):
         logger.error(f"Error guardando en S3: {e}")
         raise
 
-def update_processing_status(bucket, file_key, status, message="", progress=0):
-    """Actualizar estado de procesamiento"""
+def get_status_key(file_key):
+    """Clave del archivo de estado en processing/ para un archivo subido"""
+    base_name = file_key.replace('uploads/', '').split('.')[0]
+    return f"{PROCESSING_BUCKET_PREFIX}{base_name}_status.json"
+
+def get_subscription_prefix(file_key):
+    """Prefijo de las suscripciones WebSocket de un archivo"""
+    base_name = file_key.replace('uploads/', '').split('.')[0]
+    return f"{SUBSCRIPTIONS_PREFIX}{base_name}/"
+
+def to_dynamodb_item(data):
+    """Serializar un dict a formato DynamoDB (floats como Decimal)"""
+    serializer = TypeSerializer()
+    data = json.loads(json.dumps(data), parse_float=Decimal)
+    return {k: serializer.serialize(v) for k, v in data.items()}
+
+def from_dynamodb_item(item):
+    """Deserializar un item DynamoDB a tipos JSON nativos"""
+    deserializer = TypeDeserializer()
+    data = {k: deserializer.deserialize(v) for k, v in item.items()}
+    return json.loads(json.dumps(data, default=lambda d: int(d) if d % 1 == 0 else float(d)))
+
+def save_status_dynamodb(status_key, status_data):
+    """Actualizar campos del estado de forma atómica; el progreso solo avanza dentro de un intento"""
+    names, values, assignments = {}, {}, []
+    for i, (field, value) in enumerate(status_data.items()):
+        names[f"#f{i}"] = field
+        values[f":v{i}"] = value
+        assignments.append(f"#f{i} = :v{i}")
+    values[":one"] = 1
+    
+    # STARTING (nuevo intento), QUEUED (reencolado) y ERROR pueden retroceder el progreso, salvo sobre un COMPLETED
+    if status_data['status'] in ('STARTING', 'QUEUED', 'ERROR'):
+        condition = "attribute_not_exists(#status) OR #status <> :completed"
+        names["#status"] = "status"
+        values[":completed"] = "COMPLETED"
+    else:
+        condition = "attribute_not_exists(#progress) OR #progress <= :progress"
+        names["#progress"] = "progress"
+        values[":progress"] = status_data['progress']
+    
+    dynamodb = get_aws_client('dynamodb')
     try:
-        # Crear nombre del archivo de estado
-        base_name = file_key.replace('uploads/', '').split('.')[0]
-        status_key = f"{PROCESSING_BUCKET_PREFIX}{base_name}_status.json"
+        dynamodb.update_item(
+            TableName=STATUS_TABLE_NAME,
+            Key={"status_key": {"S": status_key}},
+            UpdateExpression=f"SET {', '.join(assignments)} ADD version :one",
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=to_dynamodb_item(values)
+        )
+        return True
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        logger.info(f"Estado {status_data['status']} descartado: el estado almacenado es más reciente")
+        return False
+
+def save_status(bucket, file_key, status_data):
+    """Guardar el estado en el almacén configurado (STATUS_STORE)"""
+    status_key = get_status_key(file_key)
+    with span("status_write"):
+        if STATUS_STORE == 'dynamodb':
+            return save_status_dynamodb(status_key, status_data)
         
+        save_to_s3(bucket, status_key, status_data)
+        return True
+
+def load_processing_status(bucket, file_key):
+    """Leer el estado de procesamiento actual (None si no existe)"""
+    status_key = get_status_key(file_key)
+    if STATUS_STORE == 'dynamodb':
+        response = get_aws_client('dynamodb').get_item(
+            TableName=STATUS_TABLE_NAME,
+            Key={"status_key": {"S": status_key}},
+            ConsistentRead=True
+        )
+        return from_dynamodb_item(response['Item']) if 'Item' in response else None
+    
+    s3 = get_aws_client('s3')
+    try:
+        response = s3.get_object(Bucket=bucket, Key=status_key)
+        return json.loads(response['Body'].read().decode('utf-8'))
+    except s3.exceptions.NoSuchKey:
+        return None
+
+def compact_transcription(transcription):
+    """Transcripción sin duplicados: palabras en arrays paralelos y utterances sin palabras anidadas"""
+    data = {k: v for k, v in (transcription.get('data') or {}).items() if v is not None}
+    words = data.pop('words', None) or []
+    data['words_columnar'] = {field: [word.get(field) for word in words] for field in WORD_FIELDS}
+    if data.get('utterances'):
+        data['utterances'] = [{k: v for k, v in u.items() if k != 'words'} for u in data['utterances']]
+    return {**transcription, 'data': data}
+
+def save_compact_result(bucket, key, result):
+    """Guardar el resultado completo una sola vez, comprimido con gzip en tres miembros.
+    
+    El segundo miembro es la transcripción sola: una petición Range sobre ese rango
+    devuelve un gzip válido con la vista de transcripción. Retorna el rango (inicio, fin).
+    """
+    def to_json(data):
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    
+    rest = to_json({k: v for k, v in result.items() if k != 'transcripcion'})
+    members = [
+        gzip.compress(b'{"transcripcion":'),
+        gzip.compress(to_json(compact_transcription(result['transcripcion']))),
+        gzip.compress(b',' + rest[1:] if len(rest) > 2 else b'}')
+    ]
+    body = b''.join(members)
+    
+    s3 = get_aws_client('s3')
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=body,
+        ContentType='application/json',
+        ContentEncoding='gzip',
+        ServerSideEncryption='AES256'
+    )
+    
+    start = len(members[0])
+    logger.info(f"Resultado compacto guardado en S3: s3://{bucket}/{key} ({len(body)} bytes)")
+    return start, start + len(members[1]) - 1
+
+def get_status_channel(file_key):
+    """Canal de escrituras de estado del archivo (orden y escrituras pendientes); llamar con _status_channels_lock"""
+    channel = _status_channels.get(file_key)
+    if channel is None:
+        channel = {"lock": threading.Lock(), "seq": 0, "written": 0, "pending": [], "users": 0}
+        _status_channels[file_key] = channel
+    return channel
+
+def begin_writes(file_key):
+    """Registrar un registro en curso del archivo: su canal vive hasta que termina el último (finish_writes)"""
+    with _status_channels_lock:
+        get_status_channel(file_key)["users"] += 1
+
+def write_status_ordered(bucket, file_key, status_data, channel, seq):
+    """Escribir un estado solo si no se escribió ya uno posterior del mismo archivo"""
+    try:
+        with channel["lock"]:
+            if seq <= channel["written"]:
+                logger.info(f"Estado {status_data['status']} descartado: ya se escribió un estado posterior")
+                return
+            if save_status(bucket, file_key, status_data):
+                publish_status(bucket, file_key, status_data)
+            channel["written"] = seq
+    except Exception as e:
+        logger.warning(f"Error actualizando estado: {e}")
+
+def write_status(bucket, file_key, status_data, background=False):
+    """Escribir un estado en orden; en segundo plano no bloquea el procesamiento"""
+    with _status_channels_lock:
+        channel = get_status_channel(file_key)
+        channel["seq"] += 1
+        seq = channel["seq"]
+        if background and ASYNC_STATUS_WRITES:
+            channel["pending"].append(_write_executor.submit(write_status_ordered, bucket, file_key, status_data, channel, seq))
+            return
+    
+    write_status_ordered(bucket, file_key, status_data, channel, seq)
+
+def submit_background_write(file_key, func, *args):
+    """Ejecutar una escritura no crítica en el pool; se espera al terminar el archivo"""
+    with _status_channels_lock:
+        get_status_channel(file_key)["pending"].append(_write_executor.submit(func, *args))
+
+def finish_writes(file_key):
+    """
+    Esperar las escrituras pendientes del archivo antes de terminar el registro. El canal solo se
+    elimina al terminar el último registro en curso del archivo: dos entregas simultáneas
+    comparten la secuencia de estados y ninguna descarta las escrituras de la otra
+    """
+    with _status_channels_lock:
+        channel = _status_channels.get(file_key)
+        if channel is None:
+            return
+        pending = list(channel["pending"])
+        channel["users"] -= 1
+        if channel["users"] <= 0:
+            _status_channels.pop(file_key)
+    if pending:
+        wait(pending)
+
+def update_processing_status(bucket, file_key, status, message="", progress=0, extra=None, background=True):
+    """Actualizar estado de procesamiento (los estados intermedios se escriben en segundo plano)"""
+    try:
         status_data = {
             "file_key": file_key,
             "status": status,
@@ -247,135 +1397,1037 @@ def update_processing_status(bucket, file_key, status, message="", progress=0):
             "timestamp": datetime.now().isoformat(),
             "lambda_request_id": os.environ.get('AWS_REQUEST_ID', 'unknown')
         }
+        if extra:
+            status_data.update(extra)
         
-        save_to_s3(bucket, status_key, status_data)
+        write_status(bucket, file_key, status_data, background=background and status != "ERROR")
         
     except Exception as e:
         logger.warning(f"Error actualizando estado: {e}")
 
-def lambda_handler(event, context):
-    """Handler principal de Lambda"""
-    start_time = time.time()
+def save_final_status(bucket, file_key, status_data):
+    """Guardar el estado final y notificarlo a los clientes suscritos"""
+    write_status(bucket, file_key, status_data)
+    if JOB_MANIFEST_ENABLED:
+        submit_background_write(file_key, record_job, bucket, file_key, status_data)
+
+def record_job(bucket, file_key, status_data):
+    """Guardar el registro del trabajo terminado para el manifiesto de lambda-job-history"""
+    try:
+        record = job_manifest.build_job_record(file_key, status_data)
+        get_aws_client('s3').put_object(
+            Bucket=bucket,
+            Key=job_manifest.pending_key(record),
+            Body=job_manifest.encode_record(record).encode('utf-8'),
+            ContentType='application/json',
+            ServerSideEncryption='AES256'
+        )
+    except Exception as e:
+        logger.warning(f"Error registrando el trabajo de {file_key} en el manifiesto: {e}")
+
+def publish_status(bucket, file_key, status_data):
+    """Enviar el estado a los clientes suscritos por WebSocket (si el canal está configurado)"""
+    if not STATUS_WEBSOCKET_ENDPOINT:
+        return
     
     try:
-        logger.info(f"Lambda iniciada. Event: {json.dumps(event)}")
+        s3 = get_aws_client('s3')
+        prefix = get_subscription_prefix(file_key)
+        response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
+        subscription_keys = [obj['Key'] for obj in response.get('Contents', [])]
+        if not subscription_keys:
+            return
         
-        # Extraer información del evento S3
-        s3_event = event['Records'][0]['s3']
-        bucket_name = s3_event['bucket']['name']
-        file_key = s3_event['object']['key']
+        message = dict(status_data)
+        if message.get('status') == 'COMPLETED':
+            # Mismas URLs de descarga que agrega lambda-get-status (5 minutos)
+            for key_field, url_field in (('resultado_key', 'resultado_download_url'), ('transcripcion_key', 'transcripcion_download_url')):
+                if key_field in message:
+                    message[url_field] = generate_presigned_url(bucket, message[key_field], expiration=300)
+        message['polling_recommended'] = message.get('status') not in ('COMPLETED', 'ERROR')
+        payload = json.dumps(message, ensure_ascii=False).encode('utf-8')
         
-        logger.info(f"Procesando archivo: s3://{bucket_name}/{file_key}")
+        gateway = get_aws_client('apigatewaymanagementapi', endpoint_url=STATUS_WEBSOCKET_ENDPOINT)
+        for subscription_key in subscription_keys:
+            connection_id = subscription_key[len(prefix):-len('.json')]
+            try:
+                gateway.post_to_connection(ConnectionId=connection_id, Data=payload)
+            except gateway.exceptions.GoneException:
+                # Cliente desconectado: eliminar suscripción
+                s3.delete_object(Bucket=bucket, Key=subscription_key)
+            except Exception as e:
+                logger.warning(f"Error enviando estado a la conexión {connection_id}: {e}")
         
-        # Verificar que es un archivo de upload
-        if not file_key.startswith('uploads/'):
-            logger.info("Archivo no está en carpeta uploads/, ignorando")
-            return {
-                'statusCode': 200,
-                'body': json.dumps('Archivo ignorado - no está en uploads/')
-            }
+        logger.info(f"Estado {status_data.get('status')} enviado a {len(subscription_keys)} suscriptores")
+        
+    except Exception as e:
+        logger.warning(f"Error publicando estado: {e}")
+
+def get_content_cache_key(bucket, file_key):
+    """Clave de caché: hash del contenido + configuración de transcripción + versión del prompt"""
+    s3 = get_aws_client('s3')
+    head = s3.head_object(Bucket=bucket, Key=file_key, ChecksumMode='ENABLED')
+    
+    # ChecksumSHA256 si el objeto lo tiene, si no el ETag (MD5 en subidas de una sola parte)
+    content_hash = head.get('ChecksumSHA256') or head['ETag'].strip('"')
+    fingerprint = json.dumps({
+        "content": content_hash,
+        "size": head['ContentLength'],
+        "transcription": TRANSCRIPTION_SETTINGS,
+        "prompt": hashlib.sha256((ANALYSIS_PROMPT + MERGE_PROMPT).encode('utf-8')).hexdigest(),
+        "model": ANALYSIS_MODEL,
+        "mode": ANALYSIS_MODE,
+        "routing": {
+            "routes": ANALYSIS_ROUTES,
+            "template_max_words": ROUTING_TEMPLATE_MAX_WORDS if ROUTING_TEMPLATE_ENABLED else None,
+            "short": [ROUTING_SHORT_MAX_TOKENS, ROUTING_SHORT_MAX_SECONDS],
+            "long": [ROUTING_LONG_MIN_SECONDS, ROUTING_LONG_MIN_UTTERANCES]
+        } if ANALYSIS_ROUTING_ENABLED else None
+    }, sort_keys=True)
+    
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+def lookup_cached_result(bucket, cache_key):
+    """Buscar resultados previos para la clave de caché (None si no hay o expiraron)"""
+    s3 = get_aws_client('s3')
+    entry_key = f"{CACHE_BUCKET_PREFIX}{cache_key}.json"
+    try:
+        response = s3.get_object(Bucket=bucket, Key=entry_key)
+        entry = json.loads(response['Body'].read().decode('utf-8'))
+    except s3.exceptions.NoSuchKey:
+        return None
+    
+    # Entradas expiradas o cuyos resultados ya no existen se descartan
+    try:
+        if entry.get('expires_at', 0) < time.time():
+            raise LookupError("entrada expirada")
+        s3.head_object(Bucket=bucket, Key=entry['resultado_key'])
+    except Exception as e:
+        logger.info(f"Entrada de caché {cache_key} descartada: {e}")
+        s3.delete_object(Bucket=bucket, Key=entry_key)
+        return None
+    
+    return entry
+
+def store_cached_result(bucket, cache_key, file_key, result_key, transcription_key, result_extra=None):
+    """Registrar resultados en el índice de caché por contenido"""
+    try:
+        save_to_s3(bucket, f"{CACHE_BUCKET_PREFIX}{cache_key}.json", {
+            "file_key": file_key,
+            "resultado_key": result_key,
+            "transcripcion_key": transcription_key,
+            "resultado_extra": result_extra or {},
+            "created_at": time.time(),
+            "expires_at": time.time() + DEDUP_CACHE_TTL_DAYS * 86400
+        })
+    except Exception as e:
+        logger.warning(f"Error guardando entrada de caché: {e}")
+
+def complete_from_cache(bucket_name, file_key, entry, start_time, checkpoint=None):
+    """Completar un archivo duplicado enlazando los resultados cacheados"""
+    final_status = {
+        "file_key": file_key,
+        "status": "COMPLETED",
+        "message": "Procesamiento completado (resultado reutilizado de un archivo idéntico)",
+        "progress": 100,
+        "timestamp": datetime.now().isoformat(),
+        "resultado_key": entry['resultado_key'],
+        "transcripcion_key": entry['transcripcion_key'],
+        **entry.get('resultado_extra', {}),
+        "cache_hit": True,
+        "archivo_origen_cache": entry['file_key'],
+        "tiempo_total": round(time.time() - start_time, 2),
+        "etapas": get_trace_spans()
+    }
+    if checkpoint:
+        final_status["idempotency_token"] = checkpoint['token']
+    save_final_status(bucket_name, file_key, final_status)
+    
+    if SEARCH_INDEX_ENABLED:
+        submit_background_write(file_key, index_cached_result, bucket_name, file_key, entry)
+    
+    logger.info(f"Resultado reutilizado desde caché ({entry['file_key']}) en {final_status['tiempo_total']} segundos")
+    
+    return {
+        'file_key': file_key,
+        'success': True,
+        'cache_hit': True,
+        'message': 'Procesamiento completado exitosamente',
+        'resultado_key': entry['resultado_key'],
+        'transcripcion_key': entry['transcripcion_key'],
+        'tiempo_procesamiento': final_status['tiempo_total']
+    }
+
+def get_idempotency_token(bucket, file_key):
+    """Token de idempotencia de la subida: igual para entregas duplicadas del mismo evento, distinto si se vuelve a subir"""
+    head = get_aws_client('s3').head_object(Bucket=bucket, Key=file_key)
+    identity = f"{bucket}/{file_key}/{head['ETag']}/{head.get('VersionId', '')}/{head['LastModified'].isoformat()}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+def get_checkpoint_prefix(file_key):
+    """Prefijo de los checkpoints y el lease del archivo"""
+    base_name = file_key.replace('uploads/', '').split('.')[0]
+    return f"{CHECKPOINTS_BUCKET_PREFIX}{base_name}/"
+
+def load_checkpoints(bucket, file_key, token):
+    """Cargar los checkpoints del archivo; los de otra subida (token distinto) se ignoran"""
+    checkpoint = {"file_key": file_key, "token": token, "stages": {}, "reused": []}
+    s3 = get_aws_client('s3')
+    prefix = get_checkpoint_prefix(file_key)
+    response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix)
+    
+    for obj in response.get('Contents', []):
+        if not obj['Key'].endswith('.json.gz'):
+            continue
+        body = s3.get_object(Bucket=bucket, Key=obj['Key'])['Body'].read()
+        stored = json.loads(gzip.decompress(body).decode('utf-8'))
+        if stored.get('token') == token:
+            checkpoint['stages'][stored['stage']] = stored['data']
+    
+    if checkpoint['stages']:
+        logger.info(f"Checkpoints encontrados para {file_key}: {', '.join(checkpoint['stages'])}")
+    return checkpoint
+
+def reuse_checkpoint(checkpoint, stage):
+    """Salida guardada de una etapa (None si no hay), registrando que se reutilizó"""
+    if not checkpoint or stage not in checkpoint['stages']:
+        return None
+    if stage not in checkpoint['reused']:
+        checkpoint['reused'].append(stage)
+    logger.info(f"Etapa {stage} reutilizada desde checkpoint")
+    return checkpoint['stages'][stage]
+
+def save_checkpoint(bucket, checkpoint, stage, data):
+    """Guardar la salida de una etapa; un fallo no interrumpe el procesamiento"""
+    if not checkpoint:
+        return
+    
+    try:
+        body = gzip.compress(json.dumps({
+            "token": checkpoint['token'],
+            "stage": stage,
+            "timestamp": datetime.now().isoformat(),
+            "data": data
+        }, ensure_ascii=False).encode('utf-8'))
+        get_aws_client('s3').put_object(
+            Bucket=bucket,
+            Key=f"{get_checkpoint_prefix(checkpoint['file_key'])}{stage}.json.gz",
+            Body=body,
+            ContentType='application/json',
+            ContentEncoding='gzip',
+            ServerSideEncryption='AES256'
+        )
+        checkpoint['stages'][stage] = data
+    except Exception as e:
+        logger.warning(f"Error guardando checkpoint {stage}: {e}")
+
+def discard_checkpoint(bucket, checkpoint, stage):
+    """Eliminar el checkpoint de una etapa para que el siguiente intento la repita"""
+    if not checkpoint or checkpoint['stages'].pop(stage, None) is None:
+        return
+    try:
+        get_aws_client('s3').delete_object(Bucket=bucket, Key=f"{get_checkpoint_prefix(checkpoint['file_key'])}{stage}.json.gz")
+    except Exception as e:
+        logger.warning(f"Error eliminando checkpoint {stage}: {e}")
+
+def clear_checkpoints(bucket, checkpoint):
+    """Eliminar los checkpoints de un archivo completado"""
+    stages = list(checkpoint['stages'])
+    if not stages:
+        return
+    prefix = get_checkpoint_prefix(checkpoint['file_key'])
+    try:
+        get_aws_client('s3').delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': f"{prefix}{stage}.json.gz"} for stage in stages], 'Quiet': True}
+        )
+    except Exception as e:
+        logger.warning(f"Error eliminando checkpoints: {e}")
+
+def invocation_deadline(context):
+    """Instante en que vence la invocación actual (expiración del lease)"""
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    return time.time() + (remaining() / 1000 if remaining else LEASE_DEFAULT_SECONDS)
+
+def is_condition_conflict(error):
+    """La escritura condicional falló porque el objeto cambió o ya no existe"""
+    return error.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict', 'NoSuchKey', '404')
+
+def acquire_lease(bucket, file_key, request_id, deadline=None):
+    """
+    Tomar el lease del archivo con escrituras condicionales de S3. Devuelve False si otra
+    invocación vigente lo tiene; un lease expirado (invocación que murió) o de la misma
+    invocación (reintento de Lambda con el mismo request_id) se reemplaza
+    """
+    s3 = get_aws_client('s3')
+    lease_key = f"{get_checkpoint_prefix(file_key)}lease.json"
+    body = json.dumps({
+        "request_id": request_id,
+        "expires_at": deadline or time.time() + LEASE_DEFAULT_SECONDS
+    })
+    
+    for _ in range(2):
+        try:
+            s3.put_object(Bucket=bucket, Key=lease_key, Body=body, ContentType='application/json', IfNoneMatch='*')
+            return True
+        except ClientError as e:
+            if not is_condition_conflict(e):
+                raise
+        
+        try:
+            response = s3.get_object(Bucket=bucket, Key=lease_key)
+        except s3.exceptions.NoSuchKey:
+            # Liberado entre ambas llamadas: volver a intentar la creación
+            continue
+        lease = json.loads(response['Body'].read().decode('utf-8'))
+        if lease.get('request_id') != request_id and lease.get('expires_at', 0) > time.time():
+            return False
+        
+        try:
+            s3.put_object(Bucket=bucket, Key=lease_key, Body=body, ContentType='application/json', IfMatch=response['ETag'])
+            logger.info(f"Lease de {file_key} tomado de la invocación {lease.get('request_id')}")
+            return True
+        except ClientError as e:
+            if not is_condition_conflict(e):
+                raise
+            return False
+    
+    return False
+
+def release_lease(bucket, file_key, request_id):
+    """Liberar el lease del archivo si sigue siendo de esta invocación"""
+    s3 = get_aws_client('s3')
+    lease_key = f"{get_checkpoint_prefix(file_key)}lease.json"
+    try:
+        response = s3.get_object(Bucket=bucket, Key=lease_key)
+        if json.loads(response['Body'].read().decode('utf-8')).get('request_id') == request_id:
+            s3.delete_object(Bucket=bucket, Key=lease_key)
+    except s3.exceptions.NoSuchKey:
+        pass
+    except Exception as e:
+        logger.warning(f"Error liberando lease de {file_key}: {e}")
+
+def find_duplicate_delivery(bucket, file_key, token):
+    """Resultado para una entrega duplicada de una subida ya completada o ya enviada por webhook (None si no lo es)"""
+    status_data = load_processing_status(bucket, file_key) or {}
+    if status_data.get('idempotency_token') != token:
+        return None
+    
+    if status_data.get('status') == 'COMPLETED':
+        logger.info(f"Evento duplicado: {file_key} ya fue procesado")
+        return {
+            'file_key': file_key,
+            'success': True,
+            'duplicate': True,
+            'message': 'Evento duplicado: el archivo ya fue procesado',
+            'resultado_key': status_data.get('resultado_key'),
+            'transcripcion_key': status_data.get('transcripcion_key')
+        }
+    if status_data.get('status') == 'TRANSCRIBING' and status_data.get('transcript_id'):
+        logger.info(f"Evento duplicado: {file_key} ya está pendiente de webhook")
+        return {
+            'file_key': file_key,
+            'success': True,
+            'duplicate': True,
+            'pending': True,
+            'message': 'Evento duplicado: transcripción ya enviada, pendiente de webhook',
+            'transcript_id': status_data['transcript_id']
+        }
+    return None
+
+def index_result(bucket, file_key, result_key, transcription_key, result):
+    """Guardar el delta de índice del resultado para que lambda-search lo incorpore"""
+    try:
+        delta = search_index.build_index_delta(file_key, result_key, transcription_key, result)
+        base_name = file_key.replace('uploads/', '').split('.')[0]
+        body = gzip.compress(json.dumps(delta, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        get_aws_client('s3').put_object(
+            Bucket=bucket,
+            Key=f"{INDEX_PENDING_PREFIX}{int(delta['doc']['indexed_at'] * 1000)}_{base_name}.json.gz",
+            Body=body,
+            ContentType='application/json',
+            ContentEncoding='gzip',
+            ServerSideEncryption='AES256'
+        )
+        logger.info(f"Delta de índice guardado: {len(delta['postings'])} términos")
+    except Exception as e:
+        logger.warning(f"Error indexando resultado de {file_key}: {e}")
+
+def index_cached_result(bucket, file_key, entry):
+    """Indexar un archivo completado desde la caché con el resultado del archivo de origen"""
+    try:
+        response = get_aws_client('s3').get_object(Bucket=bucket, Key=entry['resultado_key'])
+        body = response['Body'].read()
+        if response.get('ContentEncoding') == 'gzip':
+            # Formato compacto: miembros gzip concatenados que forman un único JSON
+            body = gzip.decompress(body)
+        result = json.loads(body.decode('utf-8'))
+    except Exception as e:
+        logger.warning(f"Error leyendo resultado cacheado para indexar {file_key}: {e}")
+        return
+    index_result(bucket, file_key, entry['resultado_key'], entry['transcripcion_key'], result)
+
+def extract_s3_records(event):
+    """
+    Extraer (item_id, bucket, file_key, attempt) de un evento S3 directo o de mensajes SQS con eventos S3.
+    attempt es el número de entrega del mensaje SQS (None en eventos S3 directos, que no se reencolan)
+    """
+    items = []
+    for index, record in enumerate(event.get('Records', [])):
+        if record.get('eventSource') == 'aws:sqs':
+            # Mensaje SQS con notificación S3 en el body
+            body = json.loads(record['body'])
+            attempt = int(record.get('attributes', {}).get('ApproximateReceiveCount', 1))
+            for s3_record in body.get('Records', []):
+                s3_event = s3_record['s3']
+                items.append((record['messageId'], s3_event['bucket']['name'], s3_event['object']['key'], attempt))
+        else:
+            s3_event = record['s3']
+            items.append((str(index), s3_event['bucket']['name'], s3_event['object']['key'], None))
+    return items
+
+def complete_processing(bucket_name, file_key, transcription, request_id, start_time, cache_key=None, checkpoint=None):
+    """Analizar una transcripción terminada y guardar resultados y estado final"""
+    persisted = reuse_checkpoint(checkpoint, "persist")
+    if persisted:
+        # Resultados ya guardados por un intento anterior: solo falta el estado final
+        result_key, transcription_key, result_extra = (
+            persisted['resultado_key'], persisted['transcripcion_key'], persisted['resultado_extra']
+        )
+    else:
+        result_key, transcription_key, result_extra = persist_results(
+            bucket_name, file_key, transcription, request_id, start_time, checkpoint
+        )
+    
+    # Actualizar estado: Completado
+    final_status = {
+        "file_key": file_key,
+        "status": "COMPLETED",
+        "message": "Procesamiento completado exitosamente",
+        "progress": 100,
+        "timestamp": datetime.now().isoformat(),
+        "resultado_key": result_key,
+        "transcripcion_key": transcription_key,
+        **result_extra,
+        "tiempo_total": round(time.time() - start_time, 2),
+        "etapas": get_trace_spans()
+    }
+    if checkpoint:
+        final_status["idempotency_token"] = checkpoint['token']
+        final_status["etapas_reutilizadas"] = checkpoint['reused']
+    
+    save_final_status(bucket_name, file_key, final_status)
+    
+    if cache_key:
+        submit_background_write(
+            file_key, store_cached_result,
+            bucket_name, cache_key, file_key, result_key, transcription_key, result_extra
+        )
+    if checkpoint:
+        submit_background_write(file_key, clear_checkpoints, bucket_name, checkpoint)
+    
+    logger.info(f"Procesamiento completado exitosamente en {final_status['tiempo_total']} segundos")
+    
+    return {
+        'file_key': file_key,
+        'success': True,
+        'message': 'Procesamiento completado exitosamente',
+        'resultado_key': result_key,
+        'transcripcion_key': transcription_key,
+        'tiempo_procesamiento': final_status['tiempo_total']
+    }
+
+def persist_results(bucket_name, file_key, transcription, request_id, start_time, checkpoint=None):
+    """Analizar la transcripción y guardar los resultados; devuelve (result_key, transcription_key, result_extra)"""
+    # Actualizar estado: Transcripción completa
+    update_processing_status(bucket_name, file_key, "TRANSCRIPTION_COMPLETED", "Transcripción completada", 60)
+    
+    # Verificar que hay texto para analizar (con la ruta de plantilla, una transcripción vacía recibe el resumen por plantilla)
+    if not transcription.get('text') and not (ANALYSIS_ROUTING_ENABLED and ROUTING_TEMPLATE_ENABLED):
+        raise Exception("No se obtuvo texto de la transcripción")
+    
+    # Actualizar estado: Analizando
+    update_processing_status(bucket_name, file_key, "ANALYZING", "Analizando contenido con IA", 80)
+    
+    # Analizar con IA
+    analysis = reuse_checkpoint(checkpoint, "analysis")
+    if analysis is None:
+        logger.info("Iniciando análisis con IA...")
+        with span("analysis"):
+            analysis = route_and_analyze(transcription)
+        save_checkpoint(bucket_name, checkpoint, "analysis", analysis)
+    
+    # Métricas deterministas junto al análisis de Claude; un fallo no impide guardar el resultado
+    if CONVERSATION_ANALYTICS_ENABLED and "metricas_conversacion" not in analysis:
+        try:
+            with span("conversation_analytics"):
+                analysis["metricas_conversacion"] = compute_conversation_analytics(transcription)
+        except Exception as e:
+            logger.warning(f"Error calculando métricas de conversación: {e}")
+    
+    # Crear resultado final
+    base_name = file_key.replace('uploads/', '').split('.')[0]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    result = {
+        "metadata": {
+            "file_original": file_key,
+            "bucket": bucket_name,
+            "timestamp_procesamiento": datetime.now().isoformat(),
+            "lambda_request_id": request_id,
+            "tiempo_procesamiento_segundos": round(time.time() - start_time, 2),
+            "etapas": get_trace_spans()
+        },
+        "transcripcion": transcription,
+        "analisis": analysis
+    }
+    
+    # Guardar resultado completo
+    result_key = f"{RESULTS_BUCKET_PREFIX}{base_name}_{timestamp}_resultado.json"
+    result_extra = {}
+    if RESULT_STORAGE_FORMAT == 'compact':
+        # Una sola escritura: la transcripción se sirve como rango de bytes del resultado
+        with span("save_result"):
+            start, end = save_compact_result(bucket_name, result_key, result)
+        transcription_key = result_key
+        result_extra = {"formato_resultado": "compact", "transcripcion_rango_bytes": f"bytes={start}-{end}"}
+    else:
+        # Guardar resultado y transcripción en paralelo
+        transcription_key = f"{RESULTS_BUCKET_PREFIX}{base_name}_{timestamp}_transcripcion.json"
+        with span("save_result"):
+            writes = [
+                _write_executor.submit(save_to_s3, bucket_name, result_key, result),
+                _write_executor.submit(save_to_s3, bucket_name, transcription_key, transcription)
+            ]
+            for future in writes:
+                future.result()
+    
+    if SEARCH_INDEX_ENABLED:
+        submit_background_write(file_key, index_result, bucket_name, file_key, result_key, transcription_key, result)
+    
+    save_checkpoint(bucket_name, checkpoint, "persist", {
+        "resultado_key": result_key,
+        "transcripcion_key": transcription_key,
+        "resultado_extra": result_extra
+    })
+    return result_key, transcription_key, result_extra
+
+def mark_processing_error(bucket_name, file_key, error_msg, start_time=None, token=None):
+    """
+    Registrar el error en el estado y construir el resultado fallido. Con el token de idempotencia
+    de la subida, cada nueva entrega que falla reescribe el mismo registro de trabajo en lugar de
+    añadir otro
+    """
+    logger.error(f"Error en procesamiento de {file_key}: {error_msg}")
+    
+    # Intentar actualizar estado de error
+    try:
+        update_processing_status(
+            bucket_name, 
+            file_key, 
+            "ERROR", 
+            f"Error: {error_msg}", 
+            0
+        )
+    except:
+        pass
+    
+    if JOB_MANIFEST_ENABLED:
+        submit_background_write(file_key, record_job, bucket_name, file_key, {
+            "status": "ERROR",
+            "message": error_msg,
+            "timestamp": datetime.now().isoformat(),
+            "idempotency_token": token,
+            "tiempo_total": round(time.time() - start_time, 2) if start_time else None
+        })
+    
+    return {
+        'file_key': file_key,
+        'success': False,
+        'error': error_msg,
+        'message': 'Error durante el procesamiento'
+    }
+
+def requeue_processing(bucket_name, file_key, error, attempt):
+    """Devolver el trabajo a la cola tras agotar los reintentos contra un proveedor limitado"""
+    message = f"En cola: límite de {error.provider} alcanzado, reintento {attempt + 1} de {QUEUE_MAX_ATTEMPTS}"
+    logger.warning(f"{message}: {error}")
+    update_processing_status(bucket_name, file_key, "QUEUED", message, 5, extra={"intento": attempt}, background=False)
+    
+    return {
+        'file_key': file_key,
+        'success': False,
+        'retry': True,
+        'error': str(error),
+        'message': message
+    }
+
+def process_file(bucket_name, file_key, request_id, attempt=None, deadline=None, lease_owner=None):
+    """
+    Procesar un archivo subido: transcripción, análisis y guardado de resultados. lease_owner
+    identifica el registro dentro de la invocación (por defecto request_id)
+    """
+    lease_owner = lease_owner or request_id
+    # Primer fragmento de una sesión en vivo: la invocación transcribe la sesión completa
+    session_id = live_transcription.parse_first_chunk_key(file_key)
+    if session_id:
+        return process_live_session(bucket_name, session_id, request_id, deadline, lease_owner)
+    
+    start_time = time.time()
+    start_trace(file_key)
+    
+    logger.info(f"Procesando archivo: s3://{bucket_name}/{file_key}")
+    
+    # Verificar que es un archivo de upload
+    if not file_key.startswith('uploads/'):
+        logger.info("Archivo no está en carpeta uploads/, ignorando")
+        return {
+            'file_key': file_key,
+            'success': True,
+            'ignored': True,
+            'message': 'Archivo ignorado - no está en uploads/'
+        }
+    
+    begin_writes(file_key)
+    lease_acquired, token = False, None
+    try:
+        # Idempotencia: una entrega duplicada del evento no repite trabajo ya hecho o en curso
+        checkpoint = None
+        if CHECKPOINTS_ENABLED:
+            with span("idempotency"):
+                token = get_idempotency_token(bucket_name, file_key)
+                duplicate = find_duplicate_delivery(bucket_name, file_key, token)
+                if duplicate:
+                    return duplicate
+                
+                lease_acquired = acquire_lease(bucket_name, file_key, lease_owner, deadline)
+                if not lease_acquired:
+                    logger.info(f"Evento duplicado: {file_key} se está procesando en otra invocación")
+                    return {
+                        'file_key': file_key,
+                        'success': True,
+                        'duplicate': True,
+                        'message': 'Evento duplicado: el archivo se está procesando en otra invocación'
+                    }
+                checkpoint = load_checkpoints(bucket_name, file_key, token)
+        
+        # Buscar resultados de un archivo idéntico ya procesado
+        cache_key = None
+        if DEDUP_CACHE_ENABLED:
+            try:
+                with span("cache_lookup"):
+                    cache_key = get_content_cache_key(bucket_name, file_key)
+                    entry = lookup_cached_result(bucket_name, cache_key)
+                if entry:
+                    return complete_from_cache(bucket_name, file_key, entry, start_time, checkpoint)
+            except Exception as e:
+                logger.warning(f"Error consultando caché de resultados: {e}")
         
         # Actualizar estado: Iniciando
-        update_processing_status(bucket_name, file_key, "STARTING", "Iniciando procesamiento", 10)
+        update_processing_status(
+            bucket_name, file_key, "STARTING", "Iniciando procesamiento", 10,
+            extra={"idempotency_token": checkpoint['token']} if checkpoint else None
+        )
         
-        # Obtener secrets
+        # Obtener secrets (cacheados en contenedor caliente)
         logger.info("Obteniendo API keys...")
-        assemblyai_key, anthropic_key = get_secrets()
+        with span("secrets"):
+            get_secrets()
         
-        # Generar URL prefirmada para AssemblyAI (15 minutos de acceso)
-        logger.info(f"Generando URL prefirmada para: {file_key}")
-        audio_url = generate_presigned_url(bucket_name, file_key, expiration=900)
+        # Reanudar desde la última etapa completada por un intento anterior
+        transcription = reuse_checkpoint(checkpoint, "transcription")
+        if transcription is None:
+            transcription = transcribe_upload(bucket_name, file_key, start_time, cache_key, checkpoint)
+            if TRANSCRIPTION_MODE == 'webhook':
+                return transcription
+            save_checkpoint(bucket_name, checkpoint, "transcription", transcription)
         
-        # Actualizar estado: Transcribiendo
-        update_processing_status(bucket_name, file_key, "TRANSCRIBING", "Transcribiendo audio con AssemblyAI", 30)
+        return complete_processing(bucket_name, file_key, transcription, request_id, start_time, cache_key, checkpoint)
         
-        # Transcribir audio
-        logger.info(f"Iniciando transcripción con URL prefirmada...")
-        logger.info(f"URL (primeros 100 chars): {audio_url[:100]}...")
-        transcription = transcribe_audio(audio_url, assemblyai_key)
+    except Exception as e:
+        # Proveedor saturado: SQS vuelve a entregar el mensaje tras el visibility timeout
+        throttled = find_cause(e, ProviderThrottledError)
+        if throttled and attempt is not None and attempt < QUEUE_MAX_ATTEMPTS:
+            return requeue_processing(bucket_name, file_key, throttled, attempt)
+        return mark_processing_error(bucket_name, file_key, str(e), start_time, token)
+    
+    finally:
+        # No dejar escrituras en curso cuando Lambda congele el contenedor
+        finish_writes(file_key)
+        if lease_acquired:
+            release_lease(bucket_name, file_key, lease_owner)
+
+def transcribe_upload(bucket_name, file_key, start_time, cache_key=None, checkpoint=None):
+    """
+    Preprocesar y transcribir el archivo. En modo webhook envía la transcripción y devuelve
+    el resultado pendiente ({'pending': True, ...}) para terminar la invocación
+    """
+    # Una transcripción ya enviada por un intento anterior se espera en lugar de reenviarse
+    submitted = reuse_checkpoint(checkpoint, "transcription_submit")
+    
+    # Preprocesar el audio: AssemblyAI recibe el derivado en lugar del original
+    audio_key, preprocessing = file_key, None
+    if submitted:
+        audio_key, preprocessing = submitted['audio_key'], submitted['preprocesamiento']
+    elif AUDIO_PREPROCESSING_ENABLED:
+        try:
+            with span("preprocess"):
+                derivative_key, preprocessing = preprocess_for_transcription(bucket_name, file_key)
+            audio_key = derivative_key or file_key
+        except Exception as e:
+            logger.warning(f"Error preprocesando audio, se transcribe el original: {e}")
+    
+    # Generar URL prefirmada para AssemblyAI (15 minutos de acceso); no se guarda en checkpoint porque expira
+    logger.info(f"Generando URL prefirmada para: {audio_key}")
+    with span("presign"):
+        audio_url = generate_presigned_url(bucket_name, audio_key, expiration=900)
+    
+    def record_submit(transcript_id):
+        save_checkpoint(bucket_name, checkpoint, "transcription_submit", {
+            "transcript_id": transcript_id,
+            "audio_key": audio_key,
+            "preprocesamiento": preprocessing
+        })
+    
+    if TRANSCRIPTION_MODE == 'webhook':
+        # Fase 1: enviar y terminar; transcription_webhook_handler completa el proceso
+        if submitted:
+            transcript_id = submitted['transcript_id']
+        else:
+            webhook_url = build_webhook_url(bucket_name, file_key)
+            with span("transcription_submit"):
+                transcript_id = call_with_secret_refresh(submit_transcription, audio_url, webhook_url, key_index=0)
+            record_submit(transcript_id)
+        update_processing_status(
+            bucket_name, file_key, "TRANSCRIBING", "Transcribiendo audio con AssemblyAI", 30,
+            extra={
+                "transcript_id": transcript_id,
+                "inicio_procesamiento": start_time,
+                "cache_key": cache_key,
+                "preprocesamiento": preprocessing,
+                "idempotency_token": checkpoint['token'] if checkpoint else None
+            }
+        )
+        return {
+            'file_key': file_key,
+            'success': True,
+            'pending': True,
+            'message': 'Transcripción enviada, pendiente de webhook',
+            'transcript_id': transcript_id
+        }
+    
+    # Actualizar estado: Transcribiendo
+    update_processing_status(bucket_name, file_key, "TRANSCRIBING", "Transcribiendo audio con AssemblyAI", 30)
+    
+    # Transcribir audio
+    logger.info(f"Iniciando transcripción con URL prefirmada...")
+    logger.info(f"URL (primeros 100 chars): {audio_url[:100]}...")
+    if preprocessing and preprocessing.get('segmentos'):
+        with span("transcription_segments"):
+            transcription = call_with_secret_refresh(
+                transcribe_segments, bucket_name, preprocessing['segmentos'], key_index=0
+            )
+    else:
+        transcript_id = submitted['transcript_id'] if submitted else None
+        transcription = call_with_secret_refresh(
+            lambda url, key: transcribe_audio(url, key, transcript_id=transcript_id, on_submit=record_submit),
+            audio_url, key_index=0
+        )
+    if preprocessing:
+        transcription = shift_transcript_timestamps(transcription, preprocessing['recorte_inicio_ms'])
+        transcription['preprocesamiento'] = preprocessing
+    
+    return transcription
+
+# =============================================================================
+# TRANSCRIPCIÓN EN VIVO (ASSEMBLYAI STREAMING)
+# =============================================================================
+def read_live_chunk(bucket, key):
+    """Contenido de un fragmento de la sesión (None si todavía no se subió)"""
+    s3 = get_aws_client('s3')
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except s3.exceptions.NoSuchKey:
+        return None
+
+def live_session_ended(bucket, session_id):
+    """El cliente subió el marcador de fin de la sesión"""
+    try:
+        get_aws_client('s3').head_object(Bucket=bucket, Key=live_transcription.end_marker_key(session_id))
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+def save_live_audio(bucket, file_key, audio_file, num_samples):
+    """Guardar el audio de la sesión como WAV en file_key (escritura en segundo plano al terminar)"""
+    audio_preprocessing = lazy_import('audio_preprocessing')
+    try:
+        audio_file.seek(0)
+        audio_file.write(audio_preprocessing.wav_header(LIVE_SAMPLE_RATE, num_samples))
+        audio_file.seek(0)
+        get_aws_client('s3').upload_fileobj(
+            audio_file, bucket, file_key,
+            ExtraArgs={'ContentType': 'audio/wav', 'ServerSideEncryption': 'AES256'}
+        )
+        logger.info(f"Audio de la sesión guardado en S3: s3://{bucket}/{file_key}")
+    except Exception as e:
+        logger.warning(f"Error guardando audio de la sesión: {e}")
+    finally:
+        audio_file.close()
+
+def analyze_live_increment(previous, new_utterances, anthropic_key):
+    """
+    Análisis parcial de una sesión en vivo: solo se envía el texto nuevo (acotado a
+    ANALYSIS_CHUNK_TOKENS) junto con el resumen y los temas del análisis anterior, para
+    que el coste de cada actualización no crezca con la duración de la sesión
+    """
+    text = "\n".join(format_utterance(utterance) for utterance in new_utterances)
+    text = text[-ANALYSIS_CHUNK_TOKENS * CHARS_PER_TOKEN:]
+    if previous:
+        text = (
+            f"Resumen de la conversación hasta ahora: {previous.get('resumen', '')}\n"
+            f"Temas hasta ahora: {', '.join(previous.get('temas_principales', []))}\n\n"
+            f"Continuación de la transcripción:\n{text}"
+        )
+    return analyze_with_ai(text, anthropic_key)
+
+def stream_live_session(bucket_name, session_id, stop_at, assemblyai_key):
+    """
+    Enviar los fragmentos de la sesión a AssemblyAI Streaming a medida que se suben y escribir
+    en el estado los turnos transcritos y un análisis parcial periódico. Termina con el marcador
+    de fin, tras LIVE_IDLE_TIMEOUT_SECONDS sin fragmentos nuevos o al llegar a `stop_at`
+    (transcripción truncada); devuelve la transcripción en el formato de format_transcript
+    """
+    streaming = lazy_import('assemblyai.streaming.v3')
+    file_key = live_transcription.session_file_key(session_id)
+    live = live_transcription.LiveTranscript(session_id, format_turns=LIVE_FORMAT_TURNS)
+    pacer = live_transcription.SendPacer(LIVE_SAMPLE_RATE, LIVE_MAX_SEND_SPEED)
+    frame_bytes = LIVE_SAMPLE_RATE * live_transcription.BYTES_PER_SAMPLE * LIVE_FRAME_MS // 1000
+    audio_file = tempfile.TemporaryFile() if LIVE_SAVE_AUDIO else None
+    if audio_file:
+        audio_file.write(b"\0" * 44)  # Cabecera WAV, se completa al terminar
+    
+    # Escrituras de estado cada LIVE_STATUS_INTERVAL_SECONDS como máximo y análisis parcial en un
+    # hilo propio cada LIVE_ANALYSIS_INTERVAL_SECONDS, sin frenar el envío de audio
+    progress = {
+        "written_version": -1, "written_at": 0.0, "chunks": 0, "truncado": False,
+        "analysis": None, "analysis_future": None, "analyzed": 0, "analysis_at": time.monotonic()
+    }
+    analysis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="live-analysis")
+    
+    def report(force=False):
+        now = time.monotonic()
+        future = progress["analysis_future"]
+        if future is not None and future.done():
+            progress["analysis_future"] = None
+            try:
+                progress["analysis"] = future.result()
+                progress["written_version"] = -1
+            except Exception as e:
+                logger.warning(f"Error en análisis parcial de la sesión: {e}")
         
-        # Actualizar estado: Transcripción completa
-        update_processing_status(bucket_name, file_key, "TRANSCRIPTION_COMPLETED", "Transcripción completada", 60)
+        utterances = live.utterances()
+        if (progress["analysis_future"] is None and len(utterances) > progress["analyzed"]
+                and now - progress["analysis_at"] >= LIVE_ANALYSIS_INTERVAL_SECONDS):
+            progress["analysis_future"] = analysis_executor.submit(
+                call_with_secret_refresh, analyze_live_increment,
+                progress["analysis"], utterances[progress["analyzed"]:], key_index=1
+            )
+            progress["analyzed"], progress["analysis_at"] = len(utterances), now
         
-        # Verificar que hay texto para analizar
-        if not transcription.get('text'):
-            raise Exception("No se obtuvo texto de la transcripción")
+        snapshot, version = live.snapshot(LIVE_STATUS_UTTERANCES)
+        if version == progress["written_version"] and not force:
+            return
+        if now - progress["written_at"] < LIVE_STATUS_INTERVAL_SECONDS and not force:
+            return
+        progress["written_version"], progress["written_at"] = version, now
+        update_processing_status(
+            bucket_name, file_key, "TRANSCRIBING",
+            f"Transcripción en vivo: {snapshot['utterances_total']} intervenciones, {pacer.sent_ms // 1000} s de audio", 30,
+            extra={
+                "modo": "live",
+                "session_id": session_id,
+                "audio_recibido_ms": pacer.sent_ms,
+                **snapshot,
+                "analisis_parcial": progress["analysis"]
+            }
+        )
+    
+    def audio_frames():
+        seq, remainder = 0, b""
+        last_chunk_at = time.monotonic()
+        while live.error is None:
+            if time.time() >= stop_at:
+                logger.warning(f"Sesión {session_id} truncada: se alcanzó el tiempo máximo de la invocación")
+                progress["truncado"] = True
+                break
+            
+            data = read_live_chunk(bucket_name, live_transcription.chunk_key(session_id, seq))
+            if data is None:
+                if live_session_ended(bucket_name, session_id):
+                    # El marcador se sube después del último fragmento: volver a leerlo por si llegó entre ambas lecturas
+                    data = read_live_chunk(bucket_name, live_transcription.chunk_key(session_id, seq))
+                    if data is None:
+                        break
+                elif time.monotonic() - last_chunk_at > LIVE_IDLE_TIMEOUT_SECONDS:
+                    logger.warning(f"Sesión {session_id} sin fragmentos nuevos en {LIVE_IDLE_TIMEOUT_SECONDS} s, se da por terminada")
+                    break
+                else:
+                    report()
+                    time.sleep(LIVE_CHUNK_POLL_SECONDS)
+                    continue
+            
+            seq, last_chunk_at = seq + 1, time.monotonic()
+            progress["chunks"] = seq
+            if audio_file:
+                audio_file.write(data)
+            frames, remainder = live_transcription.split_frames(data, frame_bytes, remainder)
+            for frame in frames:
+                pacer.wait(len(frame))
+                yield frame
+                report()
         
-        # Actualizar estado: Analizando
-        update_processing_status(bucket_name, file_key, "ANALYZING", "Analizando contenido con IA", 80)
+        # Última trama incompleta, sin partir una muestra
+        remainder = remainder[:len(remainder) - len(remainder) % live_transcription.BYTES_PER_SAMPLE]
+        if remainder and live.error is None:
+            pacer.wait(len(remainder))
+            yield remainder
+    
+    client = streaming.StreamingClient(
+        streaming.StreamingClientOptions(api_key=assemblyai_key, api_host=ASSEMBLYAI_STREAMING_HOST)
+    )
+    client.on(streaming.StreamingEvents.Begin, lambda _, event: live.on_begin(event))
+    client.on(streaming.StreamingEvents.Turn, lambda _, event: live.on_turn(event))
+    client.on(streaming.StreamingEvents.Termination, lambda _, event: live.on_termination(event))
+    client.on(streaming.StreamingEvents.Error, lambda _, error: live.on_error(error))
+    
+    try:
+        client.connect(streaming.StreamingParameters(
+            sample_rate=LIVE_SAMPLE_RATE, encoding="pcm_s16le", format_turns=LIVE_FORMAT_TURNS,
+            speaker_labels=TRANSCRIPTION_SETTINGS['speaker_labels']
+        ))
+        if live.error is not None:
+            raise Exception(f"Error conectando con AssemblyAI Streaming: {live.error}")
+        logger.info(f"Sesión {session_id} conectada a AssemblyAI Streaming")
         
-        # Analizar con IA
-        logger.info("Iniciando análisis con IA...")
-        analysis = analyze_with_ai(transcription['text'], anthropic_key)
+        client.stream(audio_frames())
+        client.disconnect(terminate=True)
+        if live.error is not None and not live.utterances():
+            raise Exception(f"Error en AssemblyAI Streaming: {live.error}")
+        if live.error is not None:
+            logger.warning(f"Sesión {session_id} interrumpida, se conserva lo transcrito: {live.error}")
         
-        # Crear resultado final
-        base_name = file_key.replace('uploads/', '').split('.')[0]
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        result = {
-            "metadata": {
-                "file_original": file_key,
-                "bucket": bucket_name,
-                "timestamp_procesamiento": datetime.now().isoformat(),
-                "lambda_request_id": context.aws_request_id,
-                "tiempo_procesamiento_segundos": round(time.time() - start_time, 2)
-            },
-            "transcripcion": transcription,
-            "analisis": analysis
-        }
+        # Estado con los últimos turnos (los recibidos tras el último fragmento) antes de finalizar
+        report(force=True)
+    finally:
+        analysis_executor.shutdown(wait=True)
+        if audio_file and live.error is None and pacer.sent_bytes:
+            submit_background_write(
+                file_key, save_live_audio,
+                bucket_name, file_key, audio_file, pacer.sent_bytes // live_transcription.BYTES_PER_SAMPLE
+            )
+        elif audio_file:
+            audio_file.close()
+    
+    logger.info(f"Sesión {session_id}: {progress['chunks']} fragmentos, {pacer.sent_ms} ms de audio")
+    return live.build_transcription(f"{session_id}.wav", pacer.sent_ms, truncated=progress["truncado"])
+
+def process_live_session(bucket_name, session_id, request_id, deadline=None, lease_owner=None):
+    """Procesar una sesión en vivo: transcripción por streaming y, al terminar, análisis y resultados"""
+    lease_owner = lease_owner or request_id
+    start_time = time.time()
+    file_key = live_transcription.session_file_key(session_id)
+    start_trace(file_key)
+    
+    logger.info(f"Procesando sesión en vivo: {session_id}")
+    
+    begin_writes(file_key)
+    lease_acquired = False
+    try:
+        # Una entrega repetida del evento del primer fragmento no vuelve a transcribir la sesión
+        status_data = load_processing_status(bucket_name, file_key) or {}
+        if status_data.get('status') == 'COMPLETED':
+            logger.info(f"Evento duplicado: la sesión {session_id} ya fue procesada")
+            return {
+                'file_key': file_key,
+                'success': True,
+                'duplicate': True,
+                'message': 'Evento duplicado: la sesión ya fue procesada',
+                'resultado_key': status_data.get('resultado_key'),
+                'transcripcion_key': status_data.get('transcripcion_key')
+            }
+        if CHECKPOINTS_ENABLED:
+            lease_acquired = acquire_lease(bucket_name, file_key, lease_owner, deadline)
+            if not lease_acquired:
+                logger.info(f"Evento duplicado: la sesión {session_id} se está procesando en otra invocación")
+                return {
+                    'file_key': file_key,
+                    'success': True,
+                    'duplicate': True,
+                    'message': 'Evento duplicado: la sesión se está procesando en otra invocación'
+                }
         
-        # Guardar resultado completo
-        result_key = f"{RESULTS_BUCKET_PREFIX}{base_name}_{timestamp}_resultado.json"
-        save_to_s3(bucket_name, result_key, result)
+        update_processing_status(
+            bucket_name, file_key, "STARTING", "Iniciando sesión en vivo", 10,
+            extra={"modo": "live", "session_id": session_id}
+        )
         
-        # Guardar solo transcripción
-        transcription_key = f"{RESULTS_BUCKET_PREFIX}{base_name}_{timestamp}_transcripcion.json"
-        save_to_s3(bucket_name, transcription_key, transcription)
+        with span("secrets"):
+            get_secrets()
         
-        # Actualizar estado: Completado
-        final_status = {
-            "file_key": file_key,
-            "status": "COMPLETED",
-            "message": "Procesamiento completado exitosamente",
-            "progress": 100,
-            "timestamp": datetime.now().isoformat(),
-            "resultado_key": result_key,
-            "transcripcion_key": transcription_key,
-            "tiempo_total": round(time.time() - start_time, 2)
-        }
+        # Reservar tiempo para el análisis completo y el guardado de resultados
+        stop_at = (deadline or time.time() + LEASE_DEFAULT_SECONDS) - LIVE_FINALIZE_MARGIN_SECONDS
+        with span("live_transcription"):
+            transcription = call_with_secret_refresh(stream_live_session, bucket_name, session_id, stop_at, key_index=0)
         
-        status_key = f"{PROCESSING_BUCKET_PREFIX}{base_name}_status.json"
-        save_to_s3(bucket_name, status_key, final_status)
+        return complete_processing(bucket_name, file_key, transcription, request_id, start_time)
+        
+    except Exception as e:
+        return mark_processing_error(bucket_name, file_key, str(e), start_time)
+    
+    finally:
+        finish_writes(file_key)
+        if lease_acquired:
+            release_lease(bucket_name, file_key, lease_owner)
+
+def process_records(items, request_id, deadline=None):
+    """
+    Procesar varios registros en paralelo respetando MAX_CONCURRENT_RECORDS. Cada registro toma el
+    lease con su propio dueño (request_id:índice): dos entregas del mismo archivo en un lote no
+    comparten el lease, y un reintento de la misma invocación (mismo lote) lo recupera
+    """
+    if len(items) == 1:
+        _, bucket_name, file_key, attempt = items[0]
+        return [process_file(bucket_name, file_key, request_id, attempt, deadline, f"{request_id}:0")]
+    
+    max_workers = max(1, min(MAX_CONCURRENT_RECORDS, len(items)))
+    logger.info(f"Procesando lote de {len(items)} registros con concurrencia {max_workers}")
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(process_file, bucket_name, file_key, request_id, attempt, deadline, f"{request_id}:{index}")
+            for index, (_, bucket_name, file_key, attempt) in enumerate(items)
+        ]
+        return [future.result() for future in futures]
+
+def lambda_handler(event, context):
+    """Handler principal de Lambda"""
+    try:
+        logger.info(f"Lambda iniciada. Event: {json.dumps(event)}")
         
-        logger.info(f"Procesamiento completado exitosamente en {final_status['tiempo_total']} segundos")
+        # Extraer registros del evento (S3 directo o SQS)
+        items = extract_s3_records(event)
+        if not items:
+            raise ValueError("El evento no contiene registros S3")
         
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Procesamiento completado exitosamente',
-                'resultado_key': result_key,
-                'transcripcion_key': transcription_key,
-                'tiempo_procesamiento': final_status['tiempo_total']
-            })
-        }
+        results = process_records(items, context.aws_request_id, invocation_deadline(context))
         
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error en procesamiento: {error_msg}")
         
-        # Intentar actualizar estado de error
-        try:
-            if 'file_key' in locals() and 'bucket_name' in locals():
-                update_processing_status(
-                    bucket_name, 
-                    file_key, 
-                    "ERROR", 
-                    f"Error: {error_msg}", 
-                    0
-                )
-        except:
-            pass
-        
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -383,3 +2435,147 @@ def lambda_handler(event, context):
                 'message': 'Error durante el procesamiento'
             })
         }
+    
+    # Reportar fallos parciales: SQS solo reintenta los mensajes fallidos
+    failed_ids = []
+    for (item_id, _, _, _), result in zip(items, results):
+        if not result['success'] and item_id not in failed_ids:
+            failed_ids.append(item_id)
+    
+    # Evento de un solo archivo: mantener el formato de respuesta original
+    if len(results) == 1:
+        result = results[0]
+        if result.get('ignored'):
+            body = result['message']
+        elif result['success']:
+            body = {k: v for k, v in result.items() if k in ('message', 'resultado_key', 'transcripcion_key', 'tiempo_procesamiento', 'transcript_id', 'cache_hit', 'duplicate')}
+        else:
+            body = {'error': result['error'], 'message': result['message']}
+        response = {
+            'statusCode': 200 if result['success'] else 500,
+            'body': json.dumps(body)
+        }
+    else:
+        succeeded = len([r for r in results if r['success']])
+        response = {
+            'statusCode': 200 if not failed_ids else 207,
+            'body': json.dumps({
+                'message': f"Procesados {succeeded} de {len(results)} archivos",
+                'resultados': results
+            })
+        }
+    
+    response['batchItemFailures'] = [{'itemIdentifier': item_id} for item_id in failed_ids]
+    return response
+
+def webhook_response(status_code, body):
+    """Respuesta HTTP para API Gateway"""
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(body, ensure_ascii=False)
+    }
+
+def transcription_webhook_handler(event, context):
+    """Handler del webhook de AssemblyAI: completa análisis y guardado de una transcripción asíncrona"""
+    try:
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        if TRANSCRIPTION_WEBHOOK_SECRET and headers.get(WEBHOOK_AUTH_HEADER_NAME.lower()) != TRANSCRIPTION_WEBHOOK_SECRET:
+            logger.warning("Webhook rechazado: secreto inválido")
+            return webhook_response(401, {'error': 'No autorizado'})
+        
+        body = event.get('body') or '{}'
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
+        payload = json.loads(body)
+        params = event.get('queryStringParameters') or {}
+        
+        transcript_id = payload['transcript_id']
+        bucket_name = params['bucket']
+        file_key = params['file_key']
+        
+    except (KeyError, ValueError) as e:
+        logger.error(f"Webhook inválido: {e}")
+        return webhook_response(400, {'error': 'Webhook inválido'})
+    
+    logger.info(f"Webhook recibido para transcript {transcript_id} ({payload.get('status')}): {file_key}")
+    
+    # Validar contra el estado persistido (evita webhooks duplicados u obsoletos)
+    status_data = load_processing_status(bucket_name, file_key) or {}
+    if status_data.get('transcript_id') != transcript_id or status_data.get('status') == 'COMPLETED':
+        logger.warning(f"Transcript {transcript_id} no corresponde al estado actual de {file_key}, ignorando")
+        return webhook_response(200, {'message': 'Webhook ignorado'})
+    
+    start_time = status_data.get('inicio_procesamiento', time.time())
+    start_trace(file_key)
+    
+    # Checkpoints de la subida: un webhook reintentado reanuda desde la última etapa completada
+    token = status_data.get('idempotency_token')
+    checkpoint, lease_acquired, transcription = None, False, None
+    if CHECKPOINTS_ENABLED and token:
+        lease_acquired = acquire_lease(bucket_name, file_key, context.aws_request_id, invocation_deadline(context))
+        if not lease_acquired:
+            logger.info(f"Webhook duplicado: {file_key} se está procesando en otra invocación")
+            return webhook_response(200, {'message': 'Webhook duplicado, procesamiento en curso'})
+    
+    begin_writes(file_key)
+    try:
+        if lease_acquired:
+            checkpoint = load_checkpoints(bucket_name, file_key, token)
+        transcription = reuse_checkpoint(checkpoint, "transcription")
+        if transcription is None:
+            with span("transcription_fetch"):
+                transcription = call_with_secret_refresh(fetch_transcript, transcript_id, key_index=0)
+            preprocessing = status_data.get('preprocesamiento')
+            if preprocessing:
+                transcription = shift_transcript_timestamps(transcription, preprocessing['recorte_inicio_ms'])
+                transcription['preprocesamiento'] = preprocessing
+            save_checkpoint(bucket_name, checkpoint, "transcription", transcription)
+        result = complete_processing(
+            bucket_name, file_key, transcription, context.aws_request_id, start_time,
+            status_data.get('cache_key'), checkpoint
+        )
+    except Exception as e:
+        # Una nueva entrega del evento debe volver a enviar la transcripción, no esperar este webhook
+        if transcription is None:
+            discard_checkpoint(bucket_name, checkpoint, "transcription_submit")
+        result = mark_processing_error(bucket_name, file_key, str(e), start_time, token)
+    finally:
+        finish_writes(file_key)
+        if lease_acquired:
+            release_lease(bucket_name, file_key, context.aws_request_id)
+    
+    # Responder 200 también en error: el estado ERROR ya quedó registrado y reintentar no ayuda
+    return webhook_response(200, result)
+
+# =============================================================================
+# PRE-INICIALIZACIÓN (SNAPSTART / CONCURRENCIA APROVISIONADA)
+# =============================================================================
+def should_preinitialize():
+    """Pre-inicializar solo si el init ocurre fuera de la ruta de una petición"""
+    if PREINITIALIZE in ('true', 'false'):
+        return PREINITIALIZE == 'true'
+    return os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE', 'on-demand') in PREINITIALIZED_INIT_TYPES
+
+def preinitialize():
+    """
+    Importar los SDKs y crear los clientes de AWS durante el init. Los secrets no se cargan:
+    quedarían en la instantánea de SnapStart y caducarían antes de usarse
+    """
+    lazy_import('assemblyai')
+    lazy_import('anthropic')
+    if AUDIO_PREPROCESSING_ENABLED:
+        lazy_import('audio_preprocessing')
+    if CONVERSATION_ANALYTICS_ENABLED:
+        lazy_import('conversation_analytics')
+    get_aws_client('s3')
+    if STATUS_STORE == 'dynamodb' or RATE_LIMIT_STORE == 'dynamodb':
+        get_aws_client('dynamodb')
+
+if should_preinitialize():
+    try:
+        preinitialize()
+        logger.info(f"Pre-inicialización completada ({os.environ.get('AWS_LAMBDA_INITIALIZATION_TYPE', 'on-demand')})")
+    except Exception as e:
+        # Lo que falte se inicializa en el primer uso
+        logger.warning(f"Pre-inicialización incompleta: {str(e)}")
@@ -0,0 +1,169 @@
+"""
+Transcripción en vivo: acumula los turnos de AssemblyAI Streaming (v3) a medida que llegan,
+divide los fragmentos de audio PCM en tramas para el envío y construye la transcripción final
+en el mismo formato que format_transcript, para que el resultado conserve su esquema
+"""
+import threading
+import time
+
+# Fragmentos de una sesión: live/<session_id>/000000.pcm, 000001.pcm, ... y el marcador "end"
+LIVE_PREFIX = "live/"
+FIRST_CHUNK_NAME = "000000.pcm"
+END_MARKER_NAME = "end"
+BYTES_PER_SAMPLE = 2  # PCM 16 bits little-endian, mono
+
+def parse_first_chunk_key(file_key):
+    """session_id si la clave es el primer fragmento de una sesión en vivo (None si no lo es)"""
+    if not file_key.startswith(LIVE_PREFIX) or not file_key.endswith(f"/{FIRST_CHUNK_NAME}"):
+        return None
+    session_id = file_key[len(LIVE_PREFIX):-len(FIRST_CHUNK_NAME) - 1]
+    if not session_id or '/' in session_id or '.' in session_id:
+        return None
+    return session_id
+
+def chunk_key(session_id, seq):
+    """Clave S3 del fragmento número `seq` de la sesión"""
+    return f"{LIVE_PREFIX}{session_id}/{seq:06d}.pcm"
+
+def end_marker_key(session_id):
+    """Clave S3 del marcador de fin que sube el cliente al terminar de grabar"""
+    return f"{LIVE_PREFIX}{session_id}/{END_MARKER_NAME}"
+
+def session_file_key(session_id):
+    """file_key de la sesión: identifica su estado y resultados, y guarda el audio completo como WAV"""
+    return f"{LIVE_PREFIX}{session_id}.wav"
+
+def split_frames(data, frame_bytes, remainder=b""):
+    """
+    Dividir `remainder + data` en tramas de `frame_bytes`; devuelve (tramas, resto). El resto
+    (una trama incompleta) se completa con el siguiente fragmento para no partir muestras
+    """
+    buffer = remainder + data
+    complete = len(buffer) - len(buffer) % frame_bytes
+    frames = [buffer[offset:offset + frame_bytes] for offset in range(0, complete, frame_bytes)]
+    return frames, buffer[complete:]
+
+class SendPacer:
+    """
+    Ritmo de envío del audio: como máximo `speed` veces el tiempo real desde el inicio del
+    envío (AssemblyAI espera audio en tiempo real). speed <= 0 envía sin esperas
+    """
+
+    def __init__(self, sample_rate, speed):
+        self.bytes_per_second = sample_rate * BYTES_PER_SAMPLE
+        self.speed = speed
+        self.started_at = None
+        self.sent_bytes = 0
+
+    def wait(self, frame_size):
+        """Esperar hasta que toque enviar una trama de `frame_size` bytes"""
+        now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = now
+        if self.speed > 0:
+            due = self.started_at + self.sent_bytes / self.bytes_per_second / self.speed
+            if due > now:
+                time.sleep(due - now)
+        self.sent_bytes += frame_size
+
+    @property
+    def sent_ms(self):
+        return self.sent_bytes * 1000 // self.bytes_per_second
+
+class LiveTranscript:
+    """
+    Estado de una sesión en vivo, actualizado desde el hilo de lectura del SDK de streaming:
+    turnos finales (end_of_turn) por turn_order, texto parcial del turno en curso y errores.
+    `version` crece con cada cambio para saber si hay algo nuevo que escribir en el estado
+    """
+
+    def __init__(self, session_id, format_turns=True):
+        self.session_id = session_id
+        self.format_turns = format_turns
+        self.lock = threading.Lock()
+        self.turns = {}
+        self.partial = ""
+        self.version = 0
+        self.stream_id = None
+        self.audio_duration_seconds = None
+        self.terminated = threading.Event()
+        self.error = None
+
+    def on_begin(self, event):
+        with self.lock:
+            self.stream_id = event.id
+
+    def on_turn(self, event):
+        """Un turno final se guarda (el formateado reemplaza al sin formato); uno parcial solo actualiza `partial`"""
+        final = event.end_of_turn and (event.turn_is_formatted or not self.format_turns)
+        with self.lock:
+            if final:
+                words = event.words or []
+                self.turns[event.turn_order] = {
+                    "speaker": getattr(event, 'speaker_label', None) or "A",
+                    "text": event.transcript,
+                    "start": words[0].start if words else 0,
+                    "end": words[-1].end if words else 0
+                }
+                self.partial = ""
+            elif not event.end_of_turn:
+                self.partial = event.transcript
+            self.version += 1
+
+    def on_termination(self, event):
+        with self.lock:
+            self.audio_duration_seconds = event.audio_duration_seconds
+        self.terminated.set()
+
+    def on_error(self, error):
+        with self.lock:
+            self.error = str(error)
+        self.terminated.set()
+
+    def utterances(self):
+        """Turnos finales en orden"""
+        with self.lock:
+            return [self.turns[order] for order in sorted(self.turns)]
+
+    def snapshot(self, recent):
+        """
+        Vista del estado para los clientes: los `recent` últimos turnos, el índice del primero
+        incluido (para detectar huecos entre consultas) y el texto parcial en curso
+        """
+        utterances = self.utterances()
+        first = max(0, len(utterances) - recent)
+        with self.lock:
+            partial, version = self.partial, self.version
+        return {
+            "utterances_total": len(utterances),
+            "utterances_desde": first,
+            "utterances_recientes": utterances[first:],
+            "parcial": partial
+        }, version
+
+    def build_transcription(self, file_name, audio_duration_ms, truncated=False):
+        """Transcripción final con las mismas claves que format_transcript"""
+        utterances = self.utterances()
+        text = " ".join(utterance['text'] for utterance in utterances if utterance['text'])
+        audio_duration = (
+            self.audio_duration_seconds if self.audio_duration_seconds is not None
+            else round(audio_duration_ms / 1000)
+        )
+        return {
+            "success": True,
+            "data": {
+                "id": self.stream_id,
+                "status": "completed",
+                "modo": "live",
+                "session_id": self.session_id,
+                "truncado": truncated,
+                "text": text,
+                "audio_duration": audio_duration,
+                "utterances": utterances
+            },
+            "file_name": file_name,
+            "id": self.stream_id,
+            "text": text,
+            "audio_duration": audio_duration,
+            "utterances": utterances
+        }
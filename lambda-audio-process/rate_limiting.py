@@ -0,0 +1,147 @@
+"""
+Límite de peticiones por proveedor (token bucket) y reintentos con backoff exponencial
+para respuestas 429/5xx de AssemblyAI y Anthropic
+"""
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger()
+
+# Mensajes de error sin código HTTP (p. ej. excepciones del SDK de AssemblyAI) que indican saturación
+RETRYABLE_MARKERS = (
+    "too many requests", "rate limit", "throttl", "overloaded",
+    "internal server error", "bad gateway", "service unavailable", "gateway timeout"
+)
+RETRYABLE_ERROR_TYPES = ("APIConnectionError", "APITimeoutError", "ConnectError", "ConnectTimeout", "ReadTimeout")
+
+class ProviderThrottledError(Exception):
+    """El proveedor siguió limitando o fallando tras agotar los reintentos"""
+
+    def __init__(self, provider, error):
+        super().__init__(f"{provider}: límite de peticiones o error temporal tras reintentos ({error})")
+        self.provider = provider
+
+class TokenBucket:
+    """Token bucket compartido por los hilos del contenedor"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """Tomar un token; devuelve 0 si se obtuvo o los segundos a esperar antes de reintentar"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+class DynamoDBTokenBucket(TokenBucket):
+    """
+    Token bucket compartido entre contenedores: el estado vive en un item de DynamoDB
+    ({provider, tokens, updated_at}) y se actualiza con escritura condicional optimista
+    """
+
+    def __init__(self, client, table_name, provider, rate, burst):
+        super().__init__(rate, burst)
+        self.client = client
+        self.table_name = table_name
+        self.provider = provider
+
+    def try_acquire(self):
+        now = time.time()
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={"provider": {"S": self.provider}},
+            ConsistentRead=True
+        )
+        item = response.get('Item')
+        previous = item['updated_at']['N'] if item else None
+        stored = float(item['tokens']['N']) if item else float(self.burst)
+        elapsed = max(0.0, now - float(previous)) if previous else 0.0
+        tokens = min(self.burst, stored + elapsed * self.rate)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+
+        condition = "attribute_not_exists(provider)" if previous is None else "updated_at = :previous"
+        values = {":tokens": {"N": repr(tokens - 1)}, ":now": {"N": repr(now)}}
+        if previous is not None:
+            values[":previous"] = {"N": previous}
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={"provider": {"S": self.provider}},
+                UpdateExpression="SET tokens = :tokens, updated_at = :now",
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values
+            )
+            return 0
+        except self.client.exceptions.ConditionalCheckFailedException:
+            # Otro contenedor tomó un token a la vez: reintentar enseguida con el estado nuevo
+            return random.uniform(0.005, 0.05)
+
+def error_status_code(error):
+    """Código HTTP de una excepción de los SDKs, si lo tiene"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def is_retryable_error(error):
+    """429, 5xx, errores de conexión o mensajes de saturación del proveedor"""
+    status = error_status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    if type(error).__name__ in RETRYABLE_ERROR_TYPES:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+def retry_after_seconds(error):
+    """Valor del header Retry-After de la respuesta, si existe"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def call_with_backoff(provider, limiter, max_retries, base_delay, max_delay, func, *args, **kwargs):
+    """Llamar a func respetando el límite del proveedor y reintentando 429/5xx con backoff exponencial"""
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable_error(e):
+                raise
+            if attempt == max_retries:
+                raise ProviderThrottledError(provider, e) from e
+
+            # Backoff exponencial con jitter; Retry-After manda si el proveedor lo envía
+            delay = retry_after_seconds(e) or min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"{provider}: error temporal ({e}), reintento {attempt + 1}/{max_retries} en {delay:.1f}s")
+            time.sleep(delay)
+
+def find_cause(error, error_type):
+    """Buscar una excepción del tipo dado en la cadena de causas"""
+    while error is not None:
+        if isinstance(error, error_type):
+            return error
+        error = error.__cause__ or error.__context__
+    return None
@@ -0,0 +1,87 @@
+"""
+Etapa de indexado para búsqueda: convierte un resultado procesado en un delta de índice invertido
+(términos -> apariciones por utterance) que lambda-search fusiona en los segmentos del índice
+"""
+import re
+import time
+import unicodedata
+
+INDEX_FORMAT_VERSION = 1
+
+# Campos de una aparición: texto completo (sin utterances), utterance con hablante y tiempos, o tema del análisis
+FIELD_TEXT = 0
+FIELD_UTTERANCE = 1
+FIELD_TOPIC = 2
+NO_SPEAKER = -1
+
+# Palabras demasiado frecuentes para distinguir grabaciones (español e inglés)
+STOPWORDS = frozenset("""
+    de la que el en y a los del se las por un para con no una su al lo como mas pero sus le ya o este
+    si porque esta entre cuando muy sin sobre tambien me hasta hay donde quien desde todo nos durante
+    todos uno les ni contra otros ese eso ante ellos e esto mi antes algunos unos yo otro otras otra
+    tanto esa estos mucho quienes nada muchos cual poco ella estar estas algunas algo nosotros
+    es son fue ser ha han he eh bueno pues vale entonces asi
+    the and of to in is it that for on was with as be at by this are or an from but not you we they
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """
+    Términos normalizados de un texto: minúsculas, sin acentos ni signos, sin stopwords.
+    Debe coincidir con tokenize de lambda-search, que normaliza las consultas (lo comprueba
+    tests/test_tokenizer.py, junto con STOPWORDS y TOKEN_PATTERN)
+    """
+    normalized = unicodedata.normalize('NFKD', (text or '').lower())
+    normalized = ''.join(char for char in normalized if not unicodedata.combining(char))
+    return [term for term in TOKEN_PATTERN.findall(normalized) if len(term) > 1 and term not in STOPWORDS]
+
+def build_index_delta(file_key, result_key, transcription_key, result):
+    """
+    Delta de índice de un resultado:
+    {"version", "doc": {metadatos}, "postings": {término: [[campo, inicio_ms, fin_ms, hablante], ...]}}
+    Cada término aparece una vez por utterance; el hablante es el índice en doc["speakers"]
+    """
+    transcription = result.get('transcripcion') or {}
+    analysis = result.get('analisis') or {}
+    speakers = []
+    postings = {}
+
+    def add(terms, entry):
+        for term in set(terms):
+            postings.setdefault(term, []).append(entry)
+
+    utterances = transcription.get('utterances') or []
+    for utterance in utterances:
+        speaker = utterance.get('speaker')
+        if speaker is None:
+            speaker_index = NO_SPEAKER
+        else:
+            if speaker not in speakers:
+                speakers.append(speaker)
+            speaker_index = speakers.index(speaker)
+        add(tokenize(utterance.get('text')), [FIELD_UTTERANCE, utterance.get('start') or 0, utterance.get('end') or 0, speaker_index])
+
+    # Sin utterances (p. ej. sin diarización) solo queda el texto completo, sin tiempos
+    if not utterances:
+        add(tokenize(transcription.get('text')), [FIELD_TEXT, 0, 0, NO_SPEAKER])
+
+    topics = analysis.get('temas_principales') or []
+    for topic in topics:
+        add(tokenize(topic), [FIELD_TOPIC, 0, 0, NO_SPEAKER])
+
+    duration = max((utterance.get('end') or 0 for utterance in utterances), default=0)
+    return {
+        "version": INDEX_FORMAT_VERSION,
+        "doc": {
+            "id": file_key,
+            "file_key": file_key,
+            "resultado_key": result_key,
+            "transcripcion_key": transcription_key,
+            "temas": topics,
+            "speakers": speakers,
+            "duracion_ms": duration,
+            "indexed_at": time.time()
+        },
+        "postings": postings
+    }
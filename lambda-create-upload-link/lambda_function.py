@@ -2,8 +2,13 @@ import json
 import boto3
 import os
 import re
+import time
 import uuid
-from datetime import datetime
+import math
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 # Configuración
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
@@ -15,7 +20,67 @@ ALLOWED_AUDIO_TYPES = [
 ]
 SAFE_FILENAME = re.compile(r'^[a-zA-Z0-9._\-\s()]+$')
 
-def validate_request(file_name, content_type, file_size):
+# Subida multiparte: partes en paralelo y reanudables para archivos grandes o redes inestables.
+# Cada URL de parte va firmada con su tamaño exacto: S3 rechaza un PUT con otro Content-Length
+MULTIPART_MAX_FILE_SIZE = int(os.environ.get('MULTIPART_MAX_FILE_SIZE', str(500 * 1024 * 1024)))  # 500MB
+MULTIPART_PART_SIZE = max(5 * 1024 * 1024, int(os.environ.get('MULTIPART_PART_SIZE', str(8 * 1024 * 1024))))
+MULTIPART_URL_EXPIRATION = int(os.environ.get('MULTIPART_URL_EXPIRATION', '3600'))
+ABANDONED_UPLOAD_HOURS = int(os.environ.get('ABANDONED_UPLOAD_HOURS', '24'))
+FUNCTION_NAME = "lambda-create-upload-link"
+
+# Sesiones en vivo: fragmentos PCM 16 bits mono subidos en live/<session_id>/ durante la grabación
+LIVE_MAX_CHUNK_SIZE = int(os.environ.get('LIVE_MAX_CHUNK_SIZE', str(1024 * 1024)))  # 1MB (~30 s a 16 kHz)
+LIVE_SAMPLE_RATE = int(os.environ.get('LIVE_SAMPLE_RATE', '16000'))
+LIVE_URL_EXPIRATION = int(os.environ.get('LIVE_URL_EXPIRATION', '3600'))
+
+# Cliente reutilizado entre invocaciones y entre los archivos de un lote. Firma SigV4 para que
+# las URLs de las partes incluyan Content-Length entre las cabeceras firmadas
+s3_client = boto3.client('s3', config=Config(signature_version='s3v4'))
+
+# Lote: varias URLs de subida en una sola petición
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', '100'))
+
+# Instrumentación: latencia por etapa en formato EMF de CloudWatch
+# METRICS_SINK: "stdout" (logs de CloudWatch), "memory" (collected_metrics, para pruebas) o "none"
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DemoS3/AudioProcessing')
+METRICS_SINK = os.environ.get('METRICS_SINK', 'stdout')
+collected_metrics = []
+
+# span() es idéntico en lambda-create-upload-link, lambda-get-status, lambda-search y
+# lambda-job-history: cada función se despliega como un único lambda_function.py, sin capa
+# compartida. tests/test_span.py comprueba que las copias no divergen
+@contextmanager
+def span(stage):
+    """Medir la duración de una etapa y emitirla como métrica EMF"""
+    start = time.perf_counter()
+    success = True
+    try:
+        yield
+    except Exception:
+        success = False
+        raise
+    finally:
+        if METRICS_SINK != 'none':
+            record = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [["Function", "Stage"]],
+                        "Metrics": [{"Name": "StageLatency", "Unit": "Milliseconds"}]
+                    }]
+                },
+                "Function": FUNCTION_NAME,
+                "Stage": stage,
+                "StageLatency": round((time.perf_counter() - start) * 1000, 2),
+                "success": success
+            }
+            if METRICS_SINK == 'memory':
+                collected_metrics.append(record)
+            else:
+                print(json.dumps(record))
+
+def validate_request(file_name, content_type, file_size, max_size=MAX_FILE_SIZE):
     """Validar archivo de audio"""
     if not file_name or len(file_name) > 100:
         return False, "Nombre de archivo inválido"
@@ -26,15 +91,13 @@ def validate_request(file_name, content_type, file_size):
     if content_type not in ALLOWED_AUDIO_TYPES:
         return False, "Solo se permiten archivos de audio"
     
-    if file_size > MAX_FILE_SIZE:
-        return False, "Archivo muy grande, máximo 20MB"
+    if file_size > max_size:
+        return False, f"Archivo muy grande, máximo {max_size // (1024 * 1024)}MB"
     
     return True, "Válido"
 
-def generate_upload_url(bucket_name, file_name, content_type):
-    """Generar URL temporal para subir archivo"""
-    s3_client = boto3.client('s3')
-    
+def build_upload_key(file_name, content_type):
+    """Clave S3 única en uploads/ con la extensión del tipo de contenido"""
     file_id = str(uuid.uuid4())[:8]
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     
@@ -53,7 +116,11 @@ def generate_upload_url(bucket_name, file_name, content_type):
     if clean_name.lower().endswith(f'.{extension}'):
         clean_name = clean_name[:-len(f'.{extension}')]
     
-    s3_key = f"uploads/{timestamp}_{file_id}_{clean_name}.{extension}"
+    return f"uploads/{timestamp}_{file_id}_{clean_name}.{extension}"
+
+def generate_upload_url(bucket_name, file_name, content_type):
+    """Generar URL temporal para subir archivo"""
+    s3_key = build_upload_key(file_name, content_type)
     
     presigned_post = s3_client.generate_presigned_post(
         Bucket=bucket_name,
@@ -76,30 +143,272 @@ def generate_upload_url(bucket_name, file_name, content_type):
         "file_key": s3_key
     }
 
+def start_live_session(bucket_name):
+    """
+    Iniciar una sesión en vivo: una sola política POST permite subir los fragmentos numerados
+    (000000.pcm, 000001.pcm, ...) y el marcador de fin ("end") bajo live/<session_id>/
+    """
+    session_id = uuid.uuid4().hex
+    prefix = f"live/{session_id}/"
+    
+    presigned_post = s3_client.generate_presigned_post(
+        Bucket=bucket_name,
+        Key=prefix + "${filename}",
+        Conditions=[
+            {"bucket": bucket_name},
+            ["starts-with", "$key", prefix],
+            ["content-length-range", 0, LIVE_MAX_CHUNK_SIZE]
+        ],
+        ExpiresIn=LIVE_URL_EXPIRATION
+    )
+    
+    return {
+        "success": True,
+        "session_id": session_id,
+        "file_key": f"live/{session_id}.wav",
+        "chunk_prefix": prefix,
+        "upload_url": presigned_post['url'],
+        "fields": presigned_post['fields'],
+        "audio_format": {"encoding": "pcm_s16le", "sample_rate": LIVE_SAMPLE_RATE, "channels": 1},
+        "chunk_name_format": "{seq:06d}.pcm",
+        "end_marker": "end",
+        "max_chunk_size": LIVE_MAX_CHUNK_SIZE,
+        "expires_in_seconds": LIVE_URL_EXPIRATION
+    }
+
+def generate_upload_urls(bucket_name, files):
+    """Validar y firmar cada archivo del lote; el resultado de cada uno es independiente"""
+    results = []
+    for item in files:
+        file_name = item.get('file_name') if isinstance(item, dict) else None
+        try:
+            if not file_name or not item.get('content_type'):
+                raise ValueError("file_name y content_type son requeridos")
+            
+            is_valid, message = validate_request(file_name, item['content_type'], int(item.get('file_size', 0)))
+            if not is_valid:
+                raise ValueError(message)
+            
+            results.append({"file_name": file_name, **generate_upload_url(bucket_name, file_name, item['content_type'])})
+        except (ValueError, TypeError) as e:
+            results.append({"file_name": file_name, "success": False, "error": str(e)})
+    
+    succeeded = len([r for r in results if r['success']])
+    return {
+        "success": True,
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded
+    }
+
+def validate_upload_reference(file_key, upload_id):
+    """Validar los identificadores de una subida multiparte enviados por el cliente"""
+    if not file_key or not upload_id:
+        raise ValueError("file_key y upload_id son requeridos")
+    if not file_key.startswith('uploads/') or '..' in file_key:
+        raise ValueError("file_key inválido")
+
+def part_sizes(file_size):
+    """Tamaño de cada parte: MULTIPART_PART_SIZE salvo la última, que lleva el resto"""
+    part_count = max(1, math.ceil(file_size / MULTIPART_PART_SIZE))
+    return {
+        number: min(MULTIPART_PART_SIZE, file_size - (number - 1) * MULTIPART_PART_SIZE)
+        for number in range(1, part_count + 1)
+    }
+
+def presign_part_urls(bucket_name, file_key, upload_id, sizes):
+    """URLs prefirmadas (PUT) para las partes indicadas ({número: tamaño}), firmadas con su Content-Length"""
+    return [
+        {
+            "part_number": part_number,
+            "size": size,
+            "upload_url": s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': bucket_name, 'Key': file_key, 'UploadId': upload_id,
+                    'PartNumber': part_number, 'ContentLength': size
+                },
+                ExpiresIn=MULTIPART_URL_EXPIRATION
+            )
+        }
+        for part_number, size in sorted(sizes.items())
+    ]
+
+def list_uploaded_parts(bucket_name, file_key, upload_id):
+    """Partes ya subidas de una subida multiparte"""
+    parts = []
+    paginator = s3_client.get_paginator('list_parts')
+    for page in paginator.paginate(Bucket=bucket_name, Key=file_key, UploadId=upload_id):
+        parts.extend(page.get('Parts', []))
+    return parts
+
+def start_multipart_upload(bucket_name, file_name, content_type, file_size):
+    """Iniciar una subida multiparte y devolver una URL por parte"""
+    s3_key = build_upload_key(file_name, content_type)
+    upload = s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key, ContentType=content_type)
+    sizes = part_sizes(file_size)
+    
+    return {
+        "success": True,
+        "upload_id": upload['UploadId'],
+        "file_key": s3_key,
+        "part_size": MULTIPART_PART_SIZE,
+        "part_count": len(sizes),
+        "parts": presign_part_urls(bucket_name, s3_key, upload['UploadId'], sizes),
+        "expires_in_seconds": MULTIPART_URL_EXPIRATION
+    }
+
+def resume_multipart_upload(bucket_name, file_key, upload_id, part_count, file_size):
+    """Reanudar una subida: partes ya subidas y URLs nuevas para las que faltan"""
+    sizes = part_sizes(file_size)
+    if len(sizes) != part_count:
+        raise ValueError(f"part_count no corresponde a file_size: se esperaban {len(sizes)} partes")
+    uploaded = list_uploaded_parts(bucket_name, file_key, upload_id)
+    done = {part['PartNumber'] for part in uploaded}
+    missing = {number: size for number, size in sizes.items() if number not in done}
+    
+    return {
+        "success": True,
+        "upload_id": upload_id,
+        "file_key": file_key,
+        "part_size": MULTIPART_PART_SIZE,
+        "part_count": part_count,
+        "uploaded_parts": [
+            {"part_number": part['PartNumber'], "etag": part['ETag'], "size": part['Size']}
+            for part in uploaded
+        ],
+        "parts": presign_part_urls(bucket_name, file_key, upload_id, missing),
+        "expires_in_seconds": MULTIPART_URL_EXPIRATION
+    }
+
+def complete_multipart_upload(bucket_name, file_key, upload_id, part_count):
+    """
+    Completar la subida con las partes registradas en S3 (el cliente no necesita leer ETags).
+    Las partes listadas deben ser exactamente 1..part_count
+    """
+    uploaded = list_uploaded_parts(bucket_name, file_key, upload_id)
+    if not uploaded:
+        raise ValueError("La subida no tiene partes")
+    numbers = {part['PartNumber'] for part in uploaded}
+    expected = set(range(1, part_count + 1))
+    if numbers - expected:
+        raise ValueError(f"Partes fuera de rango: {sorted(numbers - expected)} (part_count {part_count})")
+    if len(numbers) < part_count:
+        raise ValueError(f"Faltan partes: {len(numbers)} de {part_count} subidas")
+    
+    total_size = sum(part['Size'] for part in uploaded)
+    if total_size > MULTIPART_MAX_FILE_SIZE:
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=file_key, UploadId=upload_id)
+        raise ValueError(f"Archivo muy grande, máximo {MULTIPART_MAX_FILE_SIZE // (1024 * 1024)}MB")
+    
+    s3_client.complete_multipart_upload(
+        Bucket=bucket_name,
+        Key=file_key,
+        UploadId=upload_id,
+        MultipartUpload={'Parts': [
+            {'PartNumber': part['PartNumber'], 'ETag': part['ETag']}
+            for part in sorted(uploaded, key=lambda p: p['PartNumber'])
+        ]}
+    )
+    
+    return {"success": True, "file_key": file_key, "file_size": total_size}
+
+def abort_multipart_upload(bucket_name, file_key, upload_id):
+    """Cancelar una subida multiparte y liberar sus partes"""
+    s3_client.abort_multipart_upload(Bucket=bucket_name, Key=file_key, UploadId=upload_id)
+    return {"success": True, "file_key": file_key, "aborted": True}
+
+def cleanup_abandoned_uploads(bucket_name, max_age_hours=ABANDONED_UPLOAD_HOURS):
+    """Cancelar las subidas multiparte de uploads/ iniciadas hace más de max_age_hours"""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+    aborted = []
+    
+    paginator = s3_client.get_paginator('list_multipart_uploads')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix='uploads/'):
+        for upload in page.get('Uploads', []):
+            if upload['Initiated'] < cutoff:
+                s3_client.abort_multipart_upload(Bucket=bucket_name, Key=upload['Key'], UploadId=upload['UploadId'])
+                aborted.append(upload['Key'])
+    
+    print(json.dumps({"message": "Subidas abandonadas canceladas", "count": len(aborted)}))
+    return {"success": True, "aborted": aborted}
+
 def lambda_handler(event, context):
     """Handler principal"""
     try:
+        bucket_name = os.environ.get('S3_BUCKET_NAME')
+        if not bucket_name:
+            raise ValueError("S3_BUCKET_NAME no configurado")
+        
+        # Regla programada de EventBridge: limpiar subidas multiparte abandonadas
+        if event.get('source') == 'aws.events':
+            with span("cleanup"):
+                return cleanup_abandoned_uploads(bucket_name)
+        
         if 'body' in event and event['body']:
             body = json.loads(event['body'])
         else:
             body = event
         
+        action = body.get('action') or 'upload'
         file_name = body.get('file_name')
         content_type = body.get('content_type')
         file_size = int(body.get('file_size', 0))
-        bucket_name = os.environ.get('S3_BUCKET_NAME')
         
-        if not bucket_name:
-            raise ValueError("S3_BUCKET_NAME no configurado")
+        if action in ('multipart_parts', 'multipart_complete', 'multipart_abort'):
+            file_key = body.get('file_key')
+            upload_id = body.get('upload_id')
+            validate_upload_reference(file_key, upload_id)
+            part_count = int(body.get('part_count', 0))
+            if action != 'multipart_abort' and part_count < 1:
+                raise ValueError("part_count es requerido")
+            
+            if action == 'multipart_parts':
+                if file_size < 1 or file_size > MULTIPART_MAX_FILE_SIZE:
+                    raise ValueError("file_size es requerido y no puede superar MULTIPART_MAX_FILE_SIZE")
+                with span("presign"):
+                    result = resume_multipart_upload(bucket_name, file_key, upload_id, part_count, file_size)
+            elif action == 'multipart_complete':
+                with span("complete"):
+                    result = complete_multipart_upload(bucket_name, file_key, upload_id, part_count)
+            else:
+                with span("abort"):
+                    result = abort_multipart_upload(bucket_name, file_key, upload_id)
+        
+        elif action == 'live_init':
+            with span("presign"):
+                result = start_live_session(bucket_name)
         
-        if not file_name or not content_type:
-            raise ValueError("file_name y content_type son requeridos")
+        elif action == 'upload' and 'files' in body:
+            files = body['files']
+            if not isinstance(files, list) or not files:
+                raise ValueError("files debe ser una lista no vacía")
+            if len(files) > MAX_BATCH_ITEMS:
+                raise ValueError(f"Máximo {MAX_BATCH_ITEMS} archivos por petición")
+            
+            with span("presign_batch"):
+                result = generate_upload_urls(bucket_name, files)
         
-        is_valid, message = validate_request(file_name, content_type, file_size)
-        if not is_valid:
-            raise ValueError(message)
+        elif action in ('upload', 'multipart_init'):
+            if not file_name or not content_type:
+                raise ValueError("file_name y content_type son requeridos")
+            
+            max_size = MULTIPART_MAX_FILE_SIZE if action == 'multipart_init' else MAX_FILE_SIZE
+            with span("validate"):
+                is_valid, message = validate_request(file_name, content_type, file_size, max_size)
+            if not is_valid:
+                raise ValueError(message)
+            
+            with span("presign"):
+                if action == 'multipart_init':
+                    if file_size < 1:
+                        raise ValueError("file_size es requerido")
+                    result = start_multipart_upload(bucket_name, file_name, content_type, file_size)
+                else:
+                    result = generate_upload_url(bucket_name, file_name, content_type)
         
-        result = generate_upload_url(bucket_name, file_name, content_type)
+        else:
+            raise ValueError(f"Acción no soportada: {action}")
         
         return {
             'statusCode': 200,
@@ -114,6 +423,27 @@ def lambda_handler(event, context):
             'body': json.dumps({'success': False, 'error': str(e)})
         }
     
+    except ClientError as e:
+        # upload_id inexistente, ya completado o cancelado
+        if e.response['Error']['Code'] == 'NoSuchUpload':
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': False, 'error': 'Subida no encontrada'})
+            }
+        # Partes rechazadas al completar: menores de 5MB salvo la última, o ETag que no coincide
+        if e.response['Error']['Code'] in ('EntityTooSmall', 'InvalidPart', 'InvalidPartOrder'):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': False, 'error': f"Partes inválidas: {e.response['Error']['Code']}"})
+            }
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'error': 'Error interno'})
+        }
+    
     except Exception as e:
         return {
             'statusCode': 500,
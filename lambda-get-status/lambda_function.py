@@ -1,8 +1,13 @@
 import boto3
 import json
 import os
+import time
 import logging
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -10,8 +15,78 @@ logger.setLevel(logging.INFO)
 s3_client = boto3.client('s3')
 
 BUCKET_NAME = os.environ.get('BUCKET_NAME')
+
+# Almacén de estados: "s3" (JSON en processing/, por defecto) o "dynamodb" (mismo que lambda-audio-process)
+STATUS_STORE = os.environ.get('STATUS_STORE', 's3')
+STATUS_TABLE_NAME = os.environ.get('STATUS_TABLE_NAME', '')
+dynamodb_client = boto3.client('dynamodb') if STATUS_STORE == 'dynamodb' else None
 PROCESSING_PREFIX = 'processing/'
 RESULTS_PREFIX = 'results/'
+TERMINAL_STATES = ['COMPLETED', 'ERROR']
+
+# Long-poll: la petición espera un cambio de estado en lugar de responder de inmediato
+LONG_POLL_MAX_SECONDS = int(os.environ.get('LONG_POLL_MAX_SECONDS', '25'))
+LONG_POLL_INTERVAL_SECONDS = float(os.environ.get('LONG_POLL_INTERVAL_SECONDS', '1'))
+
+# Caché LRU por contenedor de estados decodificados: {status_key: (etag, status_data, cached_at)}
+# COMPLETED se sirve sin consultar S3; el resto se revalida con GET condicional. ERROR no se
+# sirve desde la caché: lambda-audio-ingest y los reintentos de SQS pueden devolver el trabajo a QUEUED
+STATUS_CACHE_SIZE = int(os.environ.get('STATUS_CACHE_SIZE', '512'))
+TERMINAL_CACHE_TTL_SECONDS = int(os.environ.get('TERMINAL_CACHE_TTL_SECONDS', '300'))
+CACHEABLE_STATES = ['COMPLETED']
+_status_cache = OrderedDict()
+
+# El cliente ya tiene la versión actual del estado (GET condicional con su ETag respondió 304)
+NOT_MODIFIED = object()
+
+FUNCTION_NAME = "lambda-get-status"
+
+# Instrumentación: latencia por etapa en formato EMF de CloudWatch
+# METRICS_SINK: "stdout" (logs de CloudWatch), "memory" (collected_metrics, para pruebas) o "none"
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DemoS3/AudioProcessing')
+METRICS_SINK = os.environ.get('METRICS_SINK', 'stdout')
+collected_metrics = []
+
+# span() es idéntico en lambda-create-upload-link, lambda-get-status, lambda-search y
+# lambda-job-history: cada función se despliega como un único lambda_function.py, sin capa
+# compartida. tests/test_span.py comprueba que las copias no divergen
+@contextmanager
+def span(stage):
+    """Medir la duración de una etapa y emitirla como métrica EMF"""
+    start = time.perf_counter()
+    success = True
+    try:
+        yield
+    except Exception:
+        success = False
+        raise
+    finally:
+        if METRICS_SINK != 'none':
+            record = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [["Function", "Stage"]],
+                        "Metrics": [{"Name": "StageLatency", "Unit": "Milliseconds"}]
+                    }]
+                },
+                "Function": FUNCTION_NAME,
+                "Stage": stage,
+                "StageLatency": round((time.perf_counter() - start) * 1000, 2),
+                "success": success
+            }
+            if METRICS_SINK == 'memory':
+                collected_metrics.append(record)
+            else:
+                print(json.dumps(record))
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
+    'Access-Control-Expose-Headers': 'ETag'
+}
 
 def generate_presigned_url(bucket, key, expiration=300):
     """Generar URL prefirmada para descargar resultados (5 minutos por defecto)"""
@@ -26,6 +101,97 @@ def generate_presigned_url(bucket, key, expiration=300):
         logger.error(f"Error generando URL prefirmada para {key}: {e}")
         return None
 
+def cache_status(status_key, etag, status_data):
+    """Guardar un estado decodificado en la caché LRU"""
+    _status_cache[status_key] = (etag, status_data, time.time())
+    _status_cache.move_to_end(status_key)
+    while len(_status_cache) > STATUS_CACHE_SIZE:
+        _status_cache.popitem(last=False)
+
+def fetch_status_s3(status_key, cached, client_etag=None):
+    """
+    Leer el estado desde S3 con GET condicional contra la versión en caché o, sin caché, contra
+    el ETag del cliente: (NOT_MODIFIED, etag) si el cliente ya la tiene, sin leer el cuerpo
+    """
+    params = {'Bucket': BUCKET_NAME, 'Key': status_key}
+    if cached:
+        params['IfNoneMatch'] = cached[0]
+    elif client_etag:
+        params['IfNoneMatch'] = client_etag
+    
+    try:
+        response = s3_client.get_object(**params)
+    except s3_client.exceptions.NoSuchKey:
+        return None, None
+    except ClientError as e:
+        # 304: el estado no cambió, usar la versión decodificada en caché
+        if e.response['Error']['Code'] in ('304', 'NotModified') and 'IfNoneMatch' in params:
+            return (cached[1], cached[0]) if cached else (NOT_MODIFIED, client_etag)
+        raise
+    
+    content = response['Body'].read().decode('utf-8')
+    return json.loads(content), response['ETag']
+
+def fetch_status_dynamodb(status_key):
+    """Leer el estado desde DynamoDB; la versión del item se usa como ETag"""
+    response = dynamodb_client.get_item(
+        TableName=STATUS_TABLE_NAME,
+        Key={'status_key': {'S': status_key}},
+        ConsistentRead=True
+    )
+    if 'Item' not in response:
+        return None, None
+    
+    deserializer = TypeDeserializer()
+    item = {k: deserializer.deserialize(v) for k, v in response['Item'].items()}
+    item.pop('status_key', None)
+    status_data = json.loads(json.dumps(item, default=lambda d: int(d) if d % 1 == 0 else float(d)))
+    return status_data, f'"{status_data.pop("version", 0)}"'
+
+def read_status(status_key, client_etag=None):
+    """
+    Leer el archivo de estado como (status_data, etag); (None, None) si el proceso no ha comenzado
+    y (NOT_MODIFIED, etag) si coincide con el ETag del cliente y no estaba en la caché
+    """
+    cached = _status_cache.get(status_key)
+    if cached:
+        _status_cache.move_to_end(status_key)
+        etag, status_data, cached_at = cached
+        
+        # COMPLETED no cambia (salvo al volver a subir el archivo), se sirve desde la caché
+        if status_data.get('status') in CACHEABLE_STATES and time.time() - cached_at < TERMINAL_CACHE_TTL_SECONDS:
+            return dict(status_data), etag
+    
+    if STATUS_STORE == 'dynamodb':
+        status_data, etag = fetch_status_dynamodb(status_key)
+    else:
+        status_data, etag = fetch_status_s3(status_key, cached, client_etag)
+    
+    if status_data is NOT_MODIFIED:
+        return NOT_MODIFIED, etag
+    if status_data is None:
+        _status_cache.pop(status_key, None)
+        return None, None
+    
+    cache_status(status_key, etag, status_data)
+    return dict(status_data), etag
+
+def wait_for_status_change(status_key, since, wait_seconds):
+    """Esperar hasta que el estado cambie respecto al timestamp `since` o se agote el tiempo"""
+    deadline = time.time() + min(wait_seconds, LONG_POLL_MAX_SECONDS)
+    
+    while True:
+        status_data, etag = read_status(status_key)
+        current = status_data.get('timestamp') if status_data else None
+        
+        if current != since or (status_data and status_data.get('status') in TERMINAL_STATES):
+            return status_data, etag
+        if time.time() + LONG_POLL_INTERVAL_SECONDS > deadline:
+            logger.info("Long-poll sin cambios, tiempo agotado")
+            return status_data, etag
+        
+        time.sleep(LONG_POLL_INTERVAL_SECONDS)
+
 def lambda_handler(event, context):
     try:
         logger.info(f"Consultando estado. Event: {json.dumps(event)}")
@@ -40,63 +206,95 @@ def lambda_handler(event, context):
         
         logger.info(f"Buscando archivo de estado: {status_key}")
 
+        # Parámetros opcionales de long-poll: ?wait=<segundos>&since=<timestamp del último estado>
+        query = event.get('queryStringParameters') or {}
         try:
-            # Intentar obtener el archivo de estado
-            response = s3_client.get_object(Bucket=BUCKET_NAME, Key=status_key)
-            content = response['Body'].read().decode('utf-8')
-            status_data = json.loads(content)
+            # Un valor negativo equivale a no esperar
+            wait_seconds = max(0, int(query.get('wait') or 0))
+        except ValueError:
+            logger.warning(f"Parámetro wait inválido: {query.get('wait')!r}")
+            return {
+                'statusCode': 400,
+                'headers': {**CORS_HEADERS, 'Content-Type': 'application/json'},
+                'body': json.dumps({
+                    'error': 'Parámetro wait inválido',
+                    'message': 'wait debe ser un número entero de segundos'
+                }, ensure_ascii=False)
+            }
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        client_etag = headers.get('if-none-match')
+        
+        if wait_seconds > 0:
+            with span("long_poll"):
+                status_data, etag = wait_for_status_change(status_key, query.get('since') or None, wait_seconds)
+        else:
+            with span("read_status"):
+                status_data, etag = read_status(status_key, client_etag)
+        
+        if status_data is not None:
+            # El cliente ya tiene esta versión del estado (sin caché, S3 respondió 304 sin enviar el cuerpo)
+            if status_data is NOT_MODIFIED or client_etag == etag:
+                logger.info("Estado sin cambios (ETag coincide), respondiendo 304")
+                return {
+                    'statusCode': 304,
+                    'headers': {**CORS_HEADERS, 'ETag': etag},
+                    'body': ''
+                }
             
             logger.info(f"Estado encontrado: {status_data.get('status', 'UNKNOWN')}")
             
             # Si el procesamiento está completado, agregar URLs de descarga
             if status_data.get('status') == 'COMPLETED':
-                # Generar URLs prefirmadas para los resultados
-                if 'resultado_key' in status_data:
-                    resultado_url = generate_presigned_url(BUCKET_NAME, status_data['resultado_key'])
-                    if resultado_url:
-                        status_data['resultado_download_url'] = resultado_url
+                with span("presign"):
+                    # Generar URLs prefirmadas para los resultados
+                    if 'resultado_key' in status_data:
+                        resultado_url = generate_presigned_url(BUCKET_NAME, status_data['resultado_key'])
+                        if resultado_url:
+                            status_data['resultado_download_url'] = resultado_url
                 
-                if 'transcripcion_key' in status_data:
-                    transcripcion_url = generate_presigned_url(BUCKET_NAME, status_data['transcripcion_key'])
-                    if transcripcion_url:
-                        status_data['transcripcion_download_url'] = transcripcion_url
+                    if 'transcripcion_key' in status_data:
+                        # Formato compacto: la transcripción es un rango de bytes del mismo objeto
+                        if status_data['transcripcion_key'] == status_data.get('resultado_key'):
+                            transcripcion_url = status_data.get('resultado_download_url')
+                        else:
+                            transcripcion_url = generate_presigned_url(BUCKET_NAME, status_data['transcripcion_key'])
+                        if transcripcion_url:
+                            status_data['transcripcion_download_url'] = transcripcion_url
             
             # Agregar información útil para el cliente
-            status_data['polling_recommended'] = status_data.get('status') not in ['COMPLETED', 'ERROR']
+            status_data['polling_recommended'] = status_data.get('status') not in TERMINAL_STATES
             status_data['timestamp_consulta'] = datetime.now().isoformat()
             
             return {
                 'statusCode': 200,
                 'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                    'Content-Type': 'application/json'
+                    **CORS_HEADERS,
+                    'Content-Type': 'application/json',
+                    'Cache-Control': 'no-cache',
+                    'ETag': etag
                 },
                 'body': json.dumps(status_data, ensure_ascii=False)
             }
-            
-        except s3_client.exceptions.NoSuchKey:
-            # Archivo de estado no existe, el proceso no ha comenzado
-            logger.info("Archivo de estado no encontrado, proceso no iniciado")
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                    'Content-Type': 'application/json'
-                },
-                'body': json.dumps({
-                    'file_key': original_file_key,
-                    'status': 'PENDING',
-                    'message': 'El archivo está en cola para procesamiento',
-                    'progress': 0,
-                    'timestamp': datetime.now().isoformat(),
-                    'polling_recommended': True,
-                    'timestamp_consulta': datetime.now().isoformat()
-                }, ensure_ascii=False)
-            }
+        
+        # Archivo de estado no existe, el proceso no ha comenzado
+        logger.info("Archivo de estado no encontrado, proceso no iniciado")
+        return {
+            'statusCode': 200,
+            'headers': {
+                **CORS_HEADERS,
+                'Content-Type': 'application/json',
+                'Cache-Control': 'no-cache'
+            },
+            'body': json.dumps({
+                'file_key': original_file_key,
+                'status': 'PENDING',
+                'message': 'El archivo está en cola para procesamiento',
+                'progress': 0,
+                'timestamp': datetime.now().isoformat(),
+                'polling_recommended': True,
+                'timestamp_consulta': datetime.now().isoformat()
+            }, ensure_ascii=False)
+        }
 
     except KeyError as e:
         logger.error(f"Parámetro faltante en request: {e}")
@@ -0,0 +1,474 @@
+import boto3
+import json
+import os
+import time
+import gzip
+import uuid
+import logging
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3_client = boto3.client('s3', config=Config(max_pool_connections=32))
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
+
+# Manifiesto de trabajos en S3, particionado por día y hora UTC de finalización:
+#   jobs/pending/dt=<día>/hh=<hora>/<ms>_<id>.json             un registro por trabajo (lambda-audio-process, job_manifest.py)
+#   jobs/hourly/dt=<día>/hh=<hora>/g<gen>-<ejecución>.jsonl.gz  segmento por hora, compactado (inmutable)
+#   jobs/daily/dt=<día>/g<gen>-<ejecución>.jsonl.gz             archivo diario, tras cerrar el día (inmutable)
+#   jobs/manifest.json                                          segmentos vigentes (escritura condicional)
+PENDING_PREFIX = 'jobs/pending/'
+HOURLY_PREFIX = 'jobs/hourly/'
+DAILY_PREFIX = 'jobs/daily/'
+MANIFEST_KEY = 'jobs/manifest.json'
+MANIFEST_VERSION = 1
+
+# Compactación: registros pendientes por ejecución, espera tras el fin del día antes de generar el
+# archivo diario (para los registros que llegan tarde) y vida de los segmentos reemplazados
+JOB_COMPACTION_BATCH = int(os.environ.get('JOB_COMPACTION_BATCH', '5000'))
+DAILY_COMPACTION_DELAY_SECONDS = int(os.environ.get('DAILY_COMPACTION_DELAY_SECONDS', '3600'))
+OBSOLETE_SEGMENT_GRACE_SECONDS = int(os.environ.get('OBSOLETE_SEGMENT_GRACE_SECONDS', '3600'))
+
+# Consultas: rango por defecto y máximo, trabajos devueltos y cachés por contenedor
+HISTORY_DEFAULT_HOURS = 24
+HISTORY_MAX_DAYS = int(os.environ.get('HISTORY_MAX_DAYS', '31'))
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = int(os.environ.get('HISTORY_MAX_LIMIT', '500'))
+SEGMENT_CACHE_SIZE = int(os.environ.get('SEGMENT_CACHE_SIZE', '128'))
+PENDING_CACHE_SIZE = int(os.environ.get('PENDING_CACHE_SIZE', '5000'))
+QUERY_MAX_WORKERS = 16
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+FUNCTION_NAME = "lambda-job-history"
+
+# Instrumentación: latencia por etapa en formato EMF de CloudWatch
+# METRICS_SINK: "stdout" (logs de CloudWatch), "memory" (collected_metrics, para pruebas) o "none"
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DemoS3/AudioProcessing')
+METRICS_SINK = os.environ.get('METRICS_SINK', 'stdout')
+collected_metrics = []
+
+# span() es idéntico en lambda-create-upload-link, lambda-get-status, lambda-search y
+# lambda-job-history: cada función se despliega como un único lambda_function.py, sin capa
+# compartida. tests/test_span.py comprueba que las copias no divergen
+@contextmanager
+def span(stage):
+    """Medir la duración de una etapa y emitirla como métrica EMF"""
+    start = time.perf_counter()
+    success = True
+    try:
+        yield
+    except Exception:
+        success = False
+        raise
+    finally:
+        if METRICS_SINK != 'none':
+            record = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [["Function", "Stage"]],
+                        "Metrics": [{"Name": "StageLatency", "Unit": "Milliseconds"}]
+                    }]
+                },
+                "Function": FUNCTION_NAME,
+                "Stage": stage,
+                "StageLatency": round((time.perf_counter() - start) * 1000, 2),
+                "success": success
+            }
+            if METRICS_SINK == 'memory':
+                collected_metrics.append(record)
+            else:
+                print(json.dumps(record))
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+_manifest_cache = {}
+_segment_cache = OrderedDict()
+_pending_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# =============================================================================
+# PARTICIONES Y SEGMENTOS
+# =============================================================================
+def hour_id(day, hour):
+    return f"{day}T{hour}"
+
+def day_start_ms(day):
+    return int(datetime.strptime(day, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def parse_pending_key(key):
+    """(día, hora, ms) de jobs/pending/dt=<día>/hh=<hora>/<ms>_<id>.json"""
+    day_part, hour_part, name = key[len(PENDING_PREFIX):].split('/')
+    return day_part[len('dt='):], hour_part[len('hh='):], int(name.split('_', 1)[0])
+
+def encode_segment(records):
+    lines = '\n'.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) for record in records)
+    return gzip.compress(lines.encode('utf-8'))
+
+def decode_segment(body):
+    text = gzip.decompress(body).decode('utf-8')
+    return [json.loads(line) for line in text.split('\n') if line]
+
+def upload_id(record):
+    """Subida del registro: (archivo, token de idempotencia), o el id en registros sin token"""
+    token = record.get('idempotency_token')
+    return (record['file_key'], token) if token else record['id']
+
+def merge_records(*groups):
+    """
+    Unir registros dejando el último estado final de cada subida (un ERROR reescrito por cada
+    reentrega o seguido de un COMPLETED cuenta una vez), ordenados por instante de finalización
+    """
+    merged = {}
+    for group in groups:
+        for record in group:
+            current = merged.get(upload_id(record))
+            if current is None or (record['ts'], record['id']) > (current['ts'], current['id']):
+                merged[upload_id(record)] = record
+    return sorted(merged.values(), key=lambda record: (record['ts'], record['id']))
+
+def segment_entry(key, records):
+    return {"key": key, "count": len(records), "ts_min": records[0]['ts'], "ts_max": records[-1]['ts']}
+
+def cache_put(cache, key, value, max_items):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_items:
+            cache.popitem(last=False)
+
+def read_segment(key):
+    """Registros de un segmento horario o diario (inmutable, se cachea en el contenedor)"""
+    records = _segment_cache.get(key)
+    if records is None:
+        records = decode_segment(s3_client.get_object(Bucket=BUCKET_NAME, Key=key)['Body'].read())
+        cache_put(_segment_cache, key, records, SEGMENT_CACHE_SIZE)
+    return records
+
+def read_pending(key):
+    """Registro pendiente (None si la compactación ya lo incorporó y eliminó)"""
+    record = _pending_cache.get(key)
+    if record is None:
+        try:
+            body = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)['Body'].read()
+        except s3_client.exceptions.NoSuchKey:
+            return None
+        record = json.loads(body.decode('utf-8'))
+        cache_put(_pending_cache, key, record, PENDING_CACHE_SIZE)
+    return record
+
+def write_segment(key, records):
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=key,
+        Body=encode_segment(records),
+        ContentType='application/x-ndjson',
+        ContentEncoding='gzip',
+        ServerSideEncryption='AES256'
+    )
+
+def list_keys(prefix, limit=None):
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        if limit and len(keys) >= limit:
+            break
+    return keys[:limit] if limit else keys
+
+def delete_keys(keys):
+    for offset in range(0, len(keys), 1000):
+        s3_client.delete_objects(
+            Bucket=BUCKET_NAME,
+            Delete={'Objects': [{'Key': key} for key in keys[offset:offset + 1000]], 'Quiet': True}
+        )
+
+# =============================================================================
+# MANIFIESTO
+# =============================================================================
+def empty_manifest():
+    return {"version": MANIFEST_VERSION, "generation": 0, "hours": {}, "days": {}, "obsolete": [], "updated_at": None}
+
+def load_manifest():
+    """Manifiesto y su ETag, revalidando con GET condicional la versión en caché"""
+    cached = _manifest_cache.get('current')
+    params = {'Bucket': BUCKET_NAME, 'Key': MANIFEST_KEY}
+    if cached:
+        params['IfNoneMatch'] = cached[0]
+
+    try:
+        response = s3_client.get_object(**params)
+    except s3_client.exceptions.NoSuchKey:
+        return empty_manifest(), None
+    except ClientError as e:
+        # 304: el manifiesto no cambió
+        if cached and e.response['Error']['Code'] in ('304', 'NotModified'):
+            return cached[1], cached[0]
+        raise
+
+    manifest = json.loads(response['Body'].read().decode('utf-8'))
+    _manifest_cache['current'] = (response['ETag'], manifest)
+    return manifest, response['ETag']
+
+def save_manifest(manifest, etag):
+    """Publicar el manifiesto solo si nadie lo cambió desde que se leyó (False si hubo conflicto)"""
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    try:
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=MANIFEST_KEY,
+            Body=json.dumps(manifest, ensure_ascii=False),
+            ContentType='application/json',
+            **condition
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            return False
+        raise
+
+# =============================================================================
+# COMPACTACIÓN (ejecución programada)
+# =============================================================================
+def compact_jobs():
+    """
+    Incorporar los registros pendientes: cada hora con registros nuevos se reescribe como un
+    segmento horario, y los días cerrados hace más de DAILY_COMPACTION_DELAY_SECONDS se funden
+    en un archivo diario que reemplaza a sus segmentos horarios
+    """
+    manifest, etag = load_manifest()
+    generation = manifest['generation'] + 1
+    # Id de la ejecución en las claves: dos compactaciones con la misma generación no se pisan los segmentos
+    run_id = uuid.uuid4().hex[:8]
+    now = time.time()
+
+    # Segmentos reemplazados en compactaciones anteriores: se borran cuando ninguna consulta en curso los usa
+    expired = [entry for entry in manifest['obsolete'] if now - entry['removed_at'] > OBSOLETE_SEGMENT_GRACE_SECONDS]
+
+    pending_keys = list_keys(PENDING_PREFIX, JOB_COMPACTION_BATCH)
+    with ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS) as executor:
+        loaded = list(executor.map(read_pending, pending_keys))
+    pending = defaultdict(list)
+    for key, record in zip(pending_keys, loaded):
+        if record is not None:
+            day, hour, _ = parse_pending_key(key)
+            pending[(day, hour)].append(record)
+
+    hours, days = dict(manifest['hours']), dict(manifest['days'])
+    candidate_days = {hour_key.split('T')[0] for hour_key in hours} | {day for day, _ in pending}
+    closed = {day for day in candidate_days if day_start_ms(day) / 1000 + 86400 + DAILY_COMPACTION_DELAY_SECONDS < now}
+    if not pending and not closed and not expired:
+        logger.info("Sin registros pendientes")
+        return {'compacted': 0, 'generation': manifest['generation']}
+
+    written, removed = [], []
+    with span("compaction_write"):
+        # Horas de días abiertos: segmento horario anterior + registros nuevos
+        for (day, hour), records in sorted(pending.items()):
+            if day in closed:
+                continue
+            current = hours.get(hour_id(day, hour))
+            merged = merge_records(read_segment(current['key']) if current else [], records)
+            key = f"{HOURLY_PREFIX}dt={day}/hh={hour}/g{generation:06d}-{run_id}.jsonl.gz"
+            write_segment(key, merged)
+            written.append(key)
+            if current:
+                removed.append(current['key'])
+            hours[hour_id(day, hour)] = segment_entry(key, merged)
+
+        # Días cerrados: archivo diario anterior + segmentos horarios + registros nuevos
+        for day in sorted(closed):
+            day_hours = sorted(hour_key for hour_key in hours if hour_key.startswith(f"{day}T"))
+            groups = [read_segment(days[day]['key'])] if day in days else []
+            groups += [read_segment(hours[hour_key]['key']) for hour_key in day_hours]
+            groups += [records for (pending_day, _), records in pending.items() if pending_day == day]
+            merged = merge_records(*groups)
+            key = f"{DAILY_PREFIX}dt={day}/g{generation:06d}-{run_id}.jsonl.gz"
+            write_segment(key, merged)
+            written.append(key)
+            removed.extend(([days[day]['key']] if day in days else []) + [hours.pop(hour_key)['key'] for hour_key in day_hours])
+            days[day] = segment_entry(key, merged)
+
+    expired_keys = {entry['key'] for entry in expired}
+    updated = {
+        "version": MANIFEST_VERSION,
+        "generation": generation,
+        "hours": hours,
+        "days": days,
+        "obsolete": [entry for entry in manifest['obsolete'] if entry['key'] not in expired_keys]
+                    + [{"key": key, "removed_at": now} for key in removed],
+        "updated_at": now
+    }
+
+    if not save_manifest(updated, etag):
+        # Otra compactación publicó antes: descartar lo escrito, los pendientes se incorporan en la siguiente
+        logger.warning("Manifiesto modificado por otra ejecución, se descarta esta compactación")
+        delete_keys(written)
+        return {'compacted': 0, 'conflict': True}
+
+    delete_keys([key for key, record in zip(pending_keys, loaded) if record is not None])
+    delete_keys(sorted(expired_keys))
+
+    compacted = sum(len(records) for records in pending.values())
+    logger.info(
+        f"Generación {generation} publicada: {compacted} registros, {len(written)} segmentos escritos, "
+        f"{len(closed)} días cerrados"
+    )
+    return {'compacted': compacted, 'generation': generation, 'segments_written': len(written), 'days_closed': len(closed)}
+
+# =============================================================================
+# CONSULTAS
+# =============================================================================
+def parse_time(value):
+    """Instante en ms a partir de segundos epoch o ISO 8601 (UTC si no lleva zona)"""
+    try:
+        return int(float(value) * 1000)
+    except ValueError:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp() * 1000)
+
+def format_time(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def partitions_for(manifest, start_ms, end_ms):
+    """
+    Particiones que cubren [start_ms, end_ms): el archivo diario de los días cerrados y, en los
+    días abiertos, las horas del rango (su segmento horario y sus pendientes)
+    """
+    segments, open_hours = [], []
+    day = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day.timestamp() * 1000 < end_ms:
+        day_name = day.strftime('%Y-%m-%d')
+        if day_name in manifest['days']:
+            segments.append(("diaria", manifest['days'][day_name]))
+        else:
+            for hour in range(24):
+                hour_start = day.timestamp() * 1000 + hour * 3600000
+                if hour_start < end_ms and hour_start + 3600000 > start_ms:
+                    open_hours.append((day_name, f"{hour:02d}"))
+                    entry = manifest['hours'].get(hour_id(day_name, f"{hour:02d}"))
+                    if entry:
+                        segments.append(("horaria", entry))
+        day += timedelta(days=1)
+    return segments, open_hours
+
+def pending_in_range(open_hours, start_ms, end_ms):
+    """
+    Registros todavía no compactados de las horas abiertas del rango: se lista solo el prefijo de
+    cada hora, no el del día completo, y se filtra por el instante del nombre en las horas de los extremos
+    """
+    with ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS) as executor:
+        listings = executor.map(lambda item: list_keys(f"{PENDING_PREFIX}dt={item[0]}/hh={item[1]}/"), open_hours)
+        keys = [key for listing in listings for key in listing if start_ms <= parse_pending_key(key)[2] < end_ms]
+        return keys, [record for record in executor.map(read_pending, keys) if record is not None]
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def latency_summary(records):
+    latencies = sorted(record['tiempo_total_s'] for record in records if record.get('tiempo_total_s') is not None)
+    if not latencies:
+        return {"n": 0}
+    summary = {"n": len(latencies), "media": round(sum(latencies) / len(latencies), 2), "max": latencies[-1]}
+    summary.update({f"p{round(fraction * 100)}": percentile(latencies, fraction) for fraction in PERCENTILES})
+    return summary
+
+def query_jobs(start_ms, end_ms, status=None, origin=None, limit=HISTORY_DEFAULT_LIMIT):
+    """Historial, conteos por estado, latencias y trabajos por hora leyendo solo las particiones del rango"""
+    manifest, _ = load_manifest()
+    segments, open_hours = partitions_for(manifest, start_ms, end_ms)
+
+    with span("read_segments"):
+        with ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS) as executor:
+            groups = list(executor.map(lambda item: read_segment(item[1]['key']), segments))
+    with span("read_pending"):
+        pending_keys, pending = pending_in_range(open_hours, start_ms, end_ms)
+
+    # Un registro puede estar en un segmento y todavía en pendientes si la compactación terminó durante
+    # la consulta, y una subida puede tener estados finales en particiones distintas: se unen antes de filtrar
+    records = [
+        record for record in merge_records(*groups, pending)
+        if start_ms <= record['ts'] < end_ms
+        and (not status or record['status'] == status) and (not origin or record.get('origen') == origin)
+    ]
+    records.sort(key=lambda record: record['ts'], reverse=True)
+
+    by_status = Counter(record['status'] for record in records)
+    by_hour = defaultdict(Counter)
+    for record in records:
+        by_hour[record['ts'] // 3600000 * 3600000][record['status']] += 1
+
+    return {
+        "desde": format_time(start_ms),
+        "hasta": format_time(end_ms),
+        "total": len(records),
+        "por_estado": dict(by_status),
+        "tasa_error": round(by_status.get('ERROR', 0) / len(records), 4) if records else None,
+        "latencia_s": latency_summary([record for record in records if record['status'] == 'COMPLETED']),
+        "por_hora": [
+            {"hora": format_time(hour), "total": sum(counts.values()), "por_estado": dict(counts)}
+            for hour, counts in sorted(by_hour.items())
+        ],
+        "trabajos": records[:limit],
+        "particiones": {
+            "diarias": sum(1 for kind, _ in segments if kind == "diaria"),
+            "horarias": sum(1 for kind, _ in segments if kind == "horaria"),
+            "pendientes": len(pending_keys)
+        }
+    }
+
+def history_response(status_code, body):
+    return {
+        'statusCode': status_code,
+        'headers': {**CORS_HEADERS, 'Content-Type': 'application/json', 'Cache-Control': 'no-cache'},
+        'body': json.dumps(body, ensure_ascii=False)
+    }
+
+def lambda_handler(event, context):
+    """Consultas del historial de trabajos (API Gateway) y compactación del manifiesto (regla programada de EventBridge)"""
+    if event.get('source') == 'aws.events':
+        with span("compaction"):
+            return compact_jobs()
+
+    start_time = time.perf_counter()
+    try:
+        # ?desde=<ISO o epoch>&hasta=<ISO o epoch>&status=<COMPLETED|ERROR>&origen=<upload|live>&limit=<n>
+        query = event.get('queryStringParameters') or {}
+        end_ms = parse_time(query['hasta']) if query.get('hasta') else int(time.time() * 1000)
+        start_ms = parse_time(query['desde']) if query.get('desde') else end_ms - HISTORY_DEFAULT_HOURS * 3600000
+        if start_ms >= end_ms:
+            raise ValueError("desde debe ser anterior a hasta")
+        if end_ms - start_ms > HISTORY_MAX_DAYS * 86400000:
+            raise ValueError(f"El rango máximo es de {HISTORY_MAX_DAYS} días")
+        limit = min(int(query.get('limit') or HISTORY_DEFAULT_LIMIT), HISTORY_MAX_LIMIT)
+
+        with span("query"):
+            result = query_jobs(start_ms, end_ms, query.get('status') or None, query.get('origen') or None, limit)
+
+    except ValueError as e:
+        return history_response(400, {'error': 'Consulta inválida', 'message': str(e)})
+    except Exception as e:
+        logger.error(f"Error inesperado consultando el historial: {e}")
+        return history_response(500, {
+            'error': 'Error interno del servidor',
+            'message': 'No se pudo consultar el historial de trabajos'
+        })
+
+    result['tiempo_ms'] = round((time.perf_counter() - start_time) * 1000, 2)
+    logger.info(f"Historial {result['desde']} - {result['hasta']}: {result['total']} trabajos en {result['tiempo_ms']}ms")
+    return history_response(200, result)
@@ -0,0 +1,774 @@
+import boto3
+import json
+import os
+import re
+import time
+import gzip
+import mmap
+import heapq
+import struct
+import hashlib
+import uuid
+import logging
+import tempfile
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3_client = boto3.client('s3', config=Config(max_pool_connections=64))
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
+
+# Índice invertido en S3:
+#   index/pending/<ms>_<archivo>.json.gz              deltas escritos por lambda-audio-process (search_index.py)
+#   index/shards/<shard>/<generación>-<ejecución>.seg  segmentos inmutables, un conjunto por shard de términos
+#   index/manifest.json                               segmentos vigentes de cada shard (escritura condicional)
+PENDING_PREFIX = 'index/pending/'
+SHARDS_PREFIX = 'index/shards/'
+MANIFEST_KEY = 'index/manifest.json'
+
+# INDEX_SHARDS solo se usa al crear el índice; después manda el valor guardado en el manifiesto
+INDEX_SHARDS = int(os.environ.get('INDEX_SHARDS', '16'))
+INDEX_MAX_SEGMENTS = int(os.environ.get('INDEX_MAX_SEGMENTS', '8'))
+INDEX_MERGE_BATCH = int(os.environ.get('INDEX_MERGE_BATCH', '1000'))
+OBSOLETE_SEGMENT_GRACE_SECONDS = int(os.environ.get('OBSOLETE_SEGMENT_GRACE_SECONDS', '3600'))
+
+# Consultas: límite de resultados, deltas pendientes que se consultan y cachés por contenedor
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = int(os.environ.get('SEARCH_MAX_LIMIT', '100'))
+MAX_MATCHES_PER_DOC = 5
+TOPIC_MATCH_WEIGHT = 3
+PENDING_QUERY_LIMIT = int(os.environ.get('PENDING_QUERY_LIMIT', '200'))
+SEGMENT_CACHE_SIZE = int(os.environ.get('SEGMENT_CACHE_SIZE', '256'))
+POSTINGS_CACHE_MB = int(os.environ.get('POSTINGS_CACHE_MB', '128'))
+QUERY_MAX_WORKERS = 32
+
+FUNCTION_NAME = "lambda-search"
+
+# Instrumentación: latencia por etapa en formato EMF de CloudWatch
+# METRICS_SINK: "stdout" (logs de CloudWatch), "memory" (collected_metrics, para pruebas) o "none"
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DemoS3/AudioProcessing')
+METRICS_SINK = os.environ.get('METRICS_SINK', 'stdout')
+collected_metrics = []
+
+# span() es idéntico en lambda-create-upload-link, lambda-get-status, lambda-search y
+# lambda-job-history: cada función se despliega como un único lambda_function.py, sin capa
+# compartida. tests/test_span.py comprueba que las copias no divergen
+@contextmanager
+def span(stage):
+    """Medir la duración de una etapa y emitirla como métrica EMF"""
+    start = time.perf_counter()
+    success = True
+    try:
+        yield
+    except Exception:
+        success = False
+        raise
+    finally:
+        if METRICS_SINK != 'none':
+            record = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [["Function", "Stage"]],
+                        "Metrics": [{"Name": "StageLatency", "Unit": "Milliseconds"}]
+                    }]
+                },
+                "Function": FUNCTION_NAME,
+                "Stage": stage,
+                "StageLatency": round((time.perf_counter() - start) * 1000, 2),
+                "success": success
+            }
+            if METRICS_SINK == 'memory':
+                collected_metrics.append(record)
+            else:
+                print(json.dumps(record))
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+# =============================================================================
+# NORMALIZACIÓN DE TÉRMINOS (debe coincidir con search_index.py de lambda-audio-process)
+# =============================================================================
+FIELD_TEXT = 0
+FIELD_UTTERANCE = 1
+FIELD_TOPIC = 2
+FIELD_NAMES = {FIELD_TEXT: "texto", FIELD_UTTERANCE: "utterance", FIELD_TOPIC: "tema"}
+
+# STOPWORDS, TOKEN_PATTERN y tokenize son copia de lambda-audio-process/search_index.py, que indexa
+# con los mismos términos que aquí se consultan. tests/test_tokenizer.py comprueba que no divergen
+STOPWORDS = frozenset("""
+    de la que el en y a los del se las por un para con no una su al lo como mas pero sus le ya o este
+    si porque esta entre cuando muy sin sobre tambien me hasta hay donde quien desde todo nos durante
+    todos uno les ni contra otros ese eso ante ellos e esto mi antes algunos unos yo otro otras otra
+    tanto esa estos mucho quienes nada muchos cual poco ella estar estas algunas algo nosotros
+    es son fue ser ha han he eh bueno pues vale entonces asi
+    the and of to in is it that for on was with as be at by this are or an from but not you we they
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Términos normalizados: minúsculas, sin acentos ni signos, sin stopwords"""
+    normalized = unicodedata.normalize('NFKD', (text or '').lower())
+    normalized = ''.join(char for char in normalized if not unicodedata.combining(char))
+    return [term for term in TOKEN_PATTERN.findall(normalized) if len(term) > 1 and term not in STOPWORDS]
+
+def shard_for(term, shards):
+    """Shard de un término (hash estable entre ejecuciones)"""
+    digest = hashlib.blake2b(term.encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(digest, 'little') % shards
+
+# =============================================================================
+# FORMATO DE SEGMENTO
+# =============================================================================
+# Cabecera | tabla de documentos (JSON gzip) | diccionario | cadenas de términos | apariciones
+# El diccionario y las apariciones son registros de tamaño fijo: el archivo se puede mapear en
+# memoria (mmap) o leer por rangos, y la búsqueda de un término es binaria sobre el diccionario
+SEGMENT_MAGIC = b'SIDX'
+SEGMENT_VERSION = 1
+# magic, versión, reservado, nº términos, nº documentos, offsets de documentos, diccionario, cadenas y apariciones
+HEADER = struct.Struct('<4sHHIIQQQQ')
+# Entrada del diccionario (ordenado por bytes UTF-8): offset y longitud de la cadena, primera aparición y número
+TERM_ENTRY = struct.Struct('<IIII')
+# Aparición: documento (índice en la tabla del segmento), inicio_ms, fin_ms, hablante, campo
+POSTING = struct.Struct('<IIIHBx')
+FIELD_OFFSET = 14
+TOPIC_FIELD_BYTE = bytes([FIELD_TOPIC])
+NO_SPEAKER = 0xFFFF
+
+def encode_segment(docs, terms):
+    """
+    Serializar un segmento. `terms` produce (término en bytes, registros de apariciones ya
+    empaquetados con POSTING) en orden creciente de término
+    """
+    doc_table = gzip.compress(json.dumps(docs, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    entries, strings, records = bytearray(), bytearray(), bytearray()
+    count = 0
+    for term, term_records in terms:
+        entries += TERM_ENTRY.pack(len(strings), len(term), count, len(term_records) // POSTING.size)
+        strings += term
+        records += term_records
+        count += len(term_records) // POSTING.size
+
+    docs_offset = HEADER.size
+    terms_offset = docs_offset + len(doc_table)
+    strings_offset = terms_offset + len(entries)
+    postings_offset = strings_offset + len(strings)
+    header = HEADER.pack(
+        SEGMENT_MAGIC, SEGMENT_VERSION, 0, len(entries) // TERM_ENTRY.size, len(docs),
+        docs_offset, terms_offset, strings_offset, postings_offset
+    )
+    return b''.join([header, doc_table, entries, strings, records]), postings_offset
+
+class Segment:
+    """
+    Segmento abierto: cabecera, documentos y diccionario en memoria. Las apariciones se leen con
+    read_range(inicio, tamaño), sobre el archivo completo (mmap) o con GET por rangos a S3
+    """
+
+    def __init__(self, key, prefix, read_range):
+        (magic, version, _, self.n_terms, self.n_docs,
+         docs_offset, terms_offset, strings_offset, self.postings_offset) = HEADER.unpack_from(prefix)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            raise ValueError(f"Segmento {key} con formato desconocido")
+        self.key = key
+        self.docs = json.loads(gzip.decompress(prefix[docs_offset:terms_offset]).decode('utf-8'))
+        self.entries = memoryview(prefix)[terms_offset:strings_offset]
+        self.strings = memoryview(prefix)[strings_offset:self.postings_offset]
+        self.read_range = read_range
+
+    def entry(self, index):
+        return TERM_ENTRY.unpack_from(self.entries, index * TERM_ENTRY.size)
+
+    def term_at(self, index):
+        offset, length, _, _ = self.entry(index)
+        return bytes(self.strings[offset:offset + length])
+
+    def find(self, term):
+        """Búsqueda binaria del término: (primera aparición, número de apariciones) o None"""
+        target = term.encode('utf-8')
+        low, high = 0, self.n_terms
+        while low < high:
+            middle = (low + high) // 2
+            if self.term_at(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.n_terms and self.term_at(low) == target:
+            _, _, first, count = self.entry(low)
+            return first, count
+        return None
+
+    def posting_records(self, first, count):
+        return self.read_range(self.postings_offset + first * POSTING.size, count * POSTING.size)
+
+    def records(self, term):
+        """Registros POSTING del término (vacío si no aparece en el segmento)"""
+        found = self.find(term)
+        return self.posting_records(*found) if found else b''
+
+    def iter_terms(self):
+        """(término en bytes, primera aparición, número) en orden del diccionario"""
+        for index in range(self.n_terms):
+            offset, length, first, count = self.entry(index)
+            yield bytes(self.strings[offset:offset + length]), first, count
+
+# =============================================================================
+# MANIFIESTO
+# =============================================================================
+_manifest_cache = {}
+_cache_lock = threading.Lock()
+
+def empty_manifest():
+    return {
+        "version": SEGMENT_VERSION,
+        "shards": INDEX_SHARDS,
+        "generation": 0,
+        "segments": {str(shard): [] for shard in range(INDEX_SHARDS)},
+        "obsolete": [],
+        "updated_at": None
+    }
+
+def load_manifest():
+    """Manifiesto y su ETag, revalidando con GET condicional la versión en caché"""
+    cached = _manifest_cache.get('current')
+    params = {'Bucket': BUCKET_NAME, 'Key': MANIFEST_KEY}
+    if cached:
+        params['IfNoneMatch'] = cached[0]
+
+    try:
+        response = s3_client.get_object(**params)
+    except s3_client.exceptions.NoSuchKey:
+        return empty_manifest(), None
+    except ClientError as e:
+        # 304: el manifiesto no cambió
+        if cached and e.response['Error']['Code'] in ('304', 'NotModified'):
+            return cached[1], cached[0]
+        raise
+
+    manifest = json.loads(response['Body'].read().decode('utf-8'))
+    _manifest_cache['current'] = (response['ETag'], manifest)
+    return manifest, response['ETag']
+
+def save_manifest(manifest, etag):
+    """Publicar el manifiesto solo si nadie lo cambió desde que se leyó (False si hubo conflicto)"""
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    try:
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=MANIFEST_KEY,
+            Body=json.dumps(manifest, ensure_ascii=False),
+            ContentType='application/json',
+            **condition
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            return False
+        raise
+
+# =============================================================================
+# FUSIÓN DE DELTAS Y SEGMENTOS (ejecución programada)
+# =============================================================================
+def list_pending(limit):
+    """Claves de deltas pendientes, las más antiguas primero (el nombre empieza por el timestamp)"""
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=PENDING_PREFIX):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        if len(keys) >= limit:
+            break
+    return keys[:limit]
+
+def load_delta(key):
+    """Leer un delta pendiente (None si ya se fusionó y eliminó)"""
+    try:
+        body = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)['Body'].read()
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    # boto3 no descomprime Content-Encoding: gzip
+    return json.loads(gzip.decompress(body).decode('utf-8'))
+
+def pack_postings(entries, doc_index, speaker_count):
+    """Registros POSTING de las apariciones de un delta ([campo, inicio_ms, fin_ms, hablante])"""
+    records = bytearray()
+    for field, start, end, speaker in entries:
+        speaker = speaker if 0 <= speaker < speaker_count else NO_SPEAKER
+        records += POSTING.pack(doc_index, int(start), int(end), speaker, field)
+    return records
+
+def build_delta_segments(deltas, shards):
+    """Un segmento por shard con los documentos de los deltas; todos los shards llevan la tabla completa"""
+    docs = [delta['doc'] for delta in deltas]
+    shard_terms = [{} for _ in range(shards)]
+    for doc_index, delta in enumerate(deltas):
+        speaker_count = len(delta['doc'].get('speakers') or [])
+        for term, entries in delta['postings'].items():
+            records = shard_terms[shard_for(term, shards)].setdefault(term.encode('utf-8'), bytearray())
+            records += pack_postings(entries, doc_index, speaker_count)
+
+    return [
+        encode_segment(docs, ((term, terms[term]) for term in sorted(terms)))
+        for terms in shard_terms
+    ]
+
+def open_local_segment(key, path):
+    """Abrir un segmento descargado mapeándolo en memoria"""
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Segment(key, mapped, lambda start, size: mapped[start:start + size])
+
+def merge_segments(entries, workdir):
+    """
+    Fusionar varios segmentos de un shard en uno. Por cada documento se conserva la versión
+    indexada más reciente; los términos se recorren en orden con una fusión k-way
+    """
+    segments = []
+    for index, entry in enumerate(entries):
+        path = os.path.join(workdir, f"{index}.seg")
+        s3_client.download_file(BUCKET_NAME, entry['key'], path)
+        segments.append(open_local_segment(entry['key'], path))
+
+    # Tabla de documentos fusionada y traducción (segmento, documento local) -> documento nuevo
+    latest = {}
+    for seg_index, segment in enumerate(segments):
+        for doc_index, doc in enumerate(segment.docs):
+            current = latest.get(doc['id'])
+            if current is None or doc['indexed_at'] > current[0]:
+                latest[doc['id']] = (doc['indexed_at'], seg_index, doc_index)
+    docs, remap = [], [dict() for _ in segments]
+    for _, seg_index, doc_index in sorted(latest.values()):
+        remap[seg_index][doc_index] = len(docs)
+        docs.append(segments[seg_index].docs[doc_index])
+
+    def term_stream(seg_index):
+        for term, first, count in segments[seg_index].iter_terms():
+            yield term, seg_index, first, count
+
+    def merged_terms():
+        streams = [term_stream(seg_index) for seg_index in range(len(segments))]
+        current, records = None, bytearray()
+        for term, seg_index, first, count in heapq.merge(*streams):
+            if term != current:
+                if records:
+                    yield current, records
+                current, records = term, bytearray()
+            data = segments[seg_index].posting_records(first, count)
+            for doc, start, end, speaker, field in POSTING.iter_unpack(data):
+                new_doc = remap[seg_index].get(doc)
+                if new_doc is not None:
+                    records += POSTING.pack(new_doc, start, end, speaker, field)
+        if records:
+            yield current, records
+
+    data, postings_offset = encode_segment(docs, merged_terms())
+    return data, postings_offset, len(docs)
+
+def segment_entry(key, data, postings_offset, docs, generation):
+    return {"key": key, "generation": generation, "docs": docs, "bytes": len(data), "prefix_bytes": postings_offset}
+
+def upload_segment(key, data):
+    s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=data, ContentType='application/octet-stream')
+
+def merge_shard(shard, segments, delta_segment, generation, doc_count, run_id):
+    """
+    Añadir el segmento del lote al shard y fusionar los más pequeños si se supera INDEX_MAX_SEGMENTS.
+    Las claves llevan el id de la ejecución: dos fusiones con la misma generación no se pisan los segmentos
+    """
+    written, removed = [], []
+    if delta_segment:
+        data, postings_offset = delta_segment
+        key = f"{SHARDS_PREFIX}{shard:03d}/{generation:08d}-{run_id}.seg"
+        upload_segment(key, data)
+        written.append(key)
+        segments = segments + [segment_entry(key, data, postings_offset, doc_count, generation)]
+
+    if len(segments) > INDEX_MAX_SEGMENTS:
+        # Fusión por niveles: solo los segmentos más pequeños, los grandes se reescriben rara vez
+        ordered = sorted(segments, key=lambda entry: entry['docs'])
+        to_merge = ordered[:len(segments) - INDEX_MAX_SEGMENTS + 1]
+        with tempfile.TemporaryDirectory() as workdir:
+            data, postings_offset, merged_docs = merge_segments(to_merge, workdir)
+        key = f"{SHARDS_PREFIX}{shard:03d}/{generation:08d}-{run_id}-m.seg"
+        upload_segment(key, data)
+        written.append(key)
+        merged_keys = {entry['key'] for entry in to_merge}
+        segments = [entry for entry in segments if entry['key'] not in merged_keys]
+        segments.append(segment_entry(key, data, postings_offset, merged_docs, generation))
+        removed = to_merge
+
+    return segments, written, removed
+
+def delete_keys(keys):
+    for offset in range(0, len(keys), 1000):
+        s3_client.delete_objects(
+            Bucket=BUCKET_NAME,
+            Delete={'Objects': [{'Key': key} for key in keys[offset:offset + 1000]], 'Quiet': True}
+        )
+
+def merge_index():
+    """Incorporar los deltas pendientes: un segmento nuevo por shard y fusión de los más pequeños"""
+    manifest, etag = load_manifest()
+    shards = manifest['shards']
+    generation = manifest['generation'] + 1
+    run_id = uuid.uuid4().hex[:8]
+    now = time.time()
+
+    # Segmentos reemplazados en fusiones anteriores: se borran cuando ninguna consulta en curso los usa
+    expired = [entry for entry in manifest['obsolete'] if now - entry['removed_at'] > OBSOLETE_SEGMENT_GRACE_SECONDS]
+
+    pending_keys = list_pending(INDEX_MERGE_BATCH)
+    if not pending_keys and not expired:
+        logger.info("Sin deltas pendientes")
+        return {'merged': 0, 'generation': manifest['generation']}
+
+    with ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS) as executor:
+        loaded = list(executor.map(load_delta, pending_keys))
+    deltas = [delta for delta in loaded if delta is not None]
+    logger.info(f"Fusionando {len(deltas)} deltas en la generación {generation}")
+
+    with span("merge_build"):
+        delta_segments = build_delta_segments(deltas, shards) if deltas else [None] * shards
+
+    written, removed = [], []
+    with span("merge_write"):
+        with ThreadPoolExecutor(max_workers=min(shards, QUERY_MAX_WORKERS)) as executor:
+            futures = {
+                shard: executor.submit(
+                    merge_shard, shard, manifest['segments'][str(shard)], delta_segments[shard], generation,
+                    len(deltas), run_id
+                )
+                for shard in range(shards)
+            }
+            segments = {}
+            for shard, future in futures.items():
+                segments[str(shard)], shard_written, shard_removed = future.result()
+                written.extend(shard_written)
+                removed.extend(shard_removed)
+
+    expired_keys = {entry['key'] for entry in expired}
+    updated = dict(manifest)
+    updated.update({
+        "generation": generation,
+        "segments": segments,
+        "obsolete": [entry for entry in manifest['obsolete'] if entry['key'] not in expired_keys]
+                    + [{"key": entry['key'], "removed_at": now} for entry in removed],
+        "updated_at": now
+    })
+
+    if not save_manifest(updated, etag):
+        # Otra fusión publicó antes: descartar lo escrito, los deltas se fusionan en la siguiente
+        logger.warning("Manifiesto modificado por otra ejecución, se descarta esta fusión")
+        delete_keys(written)
+        return {'merged': 0, 'conflict': True}
+
+    delete_keys([key for key, delta in zip(pending_keys, loaded) if delta is not None])
+    delete_keys(sorted(expired_keys))
+
+    logger.info(f"Generación {generation} publicada: {len(deltas)} documentos, {len(removed)} segmentos fusionados")
+    return {'merged': len(deltas), 'generation': generation, 'segments_merged': len(removed)}
+
+# =============================================================================
+# CONSULTAS
+# =============================================================================
+_segment_cache = OrderedDict()
+_postings_cache = OrderedDict()
+_postings_cache_bytes = [0]
+_delta_cache = OrderedDict()
+_current_versions_cache = {}
+
+def read_object_range(key, start, size):
+    response = s3_client.get_object(Bucket=BUCKET_NAME, Key=key, Range=f"bytes={start}-{start + size - 1}")
+    return response['Body'].read()
+
+def cache_put(cache, key, value, max_items):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_items:
+            cache.popitem(last=False)
+
+def open_segment(entry):
+    """Segmento del manifiesto: cabecera, documentos y diccionario con un solo GET por rango (inmutable, se cachea)"""
+    segment = _segment_cache.get(entry['key'])
+    if segment is None:
+        key = entry['key']
+        prefix = read_object_range(key, 0, entry['prefix_bytes'])
+        segment = Segment(key, prefix, lambda start, size: read_object_range(key, start, size))
+        cache_put(_segment_cache, key, segment, SEGMENT_CACHE_SIZE)
+    return segment
+
+def segment_records(entry, term):
+    """Registros de apariciones de un término en un segmento, con caché LRU limitada por bytes"""
+    cache_key = (entry['key'], term)
+    records = _postings_cache.get(cache_key)
+    if records is None:
+        records = open_segment(entry).records(term)
+        with _cache_lock:
+            _postings_cache[cache_key] = records
+            _postings_cache_bytes[0] += len(records)
+            while _postings_cache_bytes[0] > POSTINGS_CACHE_MB * 1024 * 1024 and _postings_cache:
+                _, evicted = _postings_cache.popitem(last=False)
+                _postings_cache_bytes[0] -= len(evicted)
+    return records
+
+def load_pending_deltas():
+    """Deltas todavía no fusionados, para que los resultados recientes aparezcan sin esperar la fusión"""
+    keys = list_pending(PENDING_QUERY_LIMIT)
+    missing = [key for key in keys if key not in _delta_cache]
+    if missing:
+        with ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS) as executor:
+            for key, delta in zip(missing, executor.map(load_delta, missing)):
+                if delta is not None:
+                    cache_put(_delta_cache, key, delta, PENDING_QUERY_LIMIT * 2)
+    return [(key, _delta_cache[key]) for key in keys if key in _delta_cache]
+
+def current_versions(etag, entries):
+    """
+    Versión vigente (indexed_at) de cada documento. Basta con los segmentos de un shard:
+    todos los shards tienen la tabla de documentos completa de cada lote
+    """
+    versions = _current_versions_cache.get(etag)
+    if versions is None:
+        versions = {}
+        for entry in entries:
+            for doc in open_segment(entry).docs:
+                if doc['indexed_at'] > versions.get(doc['id'], 0):
+                    versions[doc['id']] = doc['indexed_at']
+        _current_versions_cache.clear()
+        _current_versions_cache[etag] = versions
+    return versions
+
+def speaker_label(doc, speaker_index):
+    speakers = doc.get('speakers') or []
+    return speakers[speaker_index] if speaker_index < len(speakers) else None
+
+def posting_matches(field, start, end, label, filters):
+    """Filtros (hablante, desde_ms, hasta_ms): solo las utterances pueden cumplirlos"""
+    if not filters:
+        return True
+    speaker, start_ms, end_ms = filters
+    if field != FIELD_UTTERANCE:
+        return False
+    if speaker is not None and (label or '').lower() != speaker.lower():
+        return False
+    if start_ms is not None and end < start_ms:
+        return False
+    if end_ms is not None and start > end_ms:
+        return False
+    return True
+
+def score_records(records, docs, filters):
+    """
+    Puntuación por documento local de los registros de un término. Sin filtros se cuenta sobre la
+    columna de documentos de los registros sin decodificarlos uno a uno
+    """
+    if not filters:
+        doc_column = memoryview(records).cast('I')[::POSTING.size // 4]
+        scores = Counter(doc_column)
+        # Las coincidencias en temas cuentan TOPIC_MATCH_WEIGHT veces
+        fields = bytes(memoryview(records)[FIELD_OFFSET::POSTING.size])
+        position = fields.find(TOPIC_FIELD_BYTE)
+        while position != -1:
+            scores[doc_column[position]] += TOPIC_MATCH_WEIGHT - 1
+            position = fields.find(TOPIC_FIELD_BYTE, position + 1)
+        return scores
+
+    scores = Counter()
+    for doc_index, start, end, speaker_index, field in POSTING.iter_unpack(records):
+        if posting_matches(field, start, end, speaker_label(docs[doc_index], speaker_index), filters):
+            scores[doc_index] += 1
+    return scores
+
+def collect_matches(records, docs, wanted, filters):
+    """Apariciones de los documentos locales `wanted`: {documento: [(campo, inicio, fin, hablante)]}"""
+    found = {}
+    for position, doc_index in enumerate(memoryview(records).cast('I')[::POSTING.size // 4]):
+        if doc_index in wanted:
+            _, start, end, speaker_index, field = POSTING.unpack_from(records, position * POSTING.size)
+            label = speaker_label(docs[doc_index], speaker_index)
+            if posting_matches(field, start, end, label, filters):
+                found.setdefault(doc_index, []).append((field, start, end, label))
+    return found
+
+def search(query_text, speaker=None, start_ms=None, end_ms=None, limit=SEARCH_DEFAULT_LIMIT):
+    """Documentos que contienen todos los términos de la consulta, ordenados por número de coincidencias"""
+    terms = list(dict.fromkeys(tokenize(query_text)))
+    if not terms:
+        raise ValueError("La consulta no contiene términos indexables")
+    filters = (speaker, start_ms, end_ms) if (speaker, start_ms, end_ms) != (None, None, None) else None
+
+    with span("search_pending"):
+        pending = load_pending_deltas()
+    with span("search_manifest"):
+        manifest, etag = load_manifest()
+    shards = manifest['shards']
+
+    # Cada término vive en un solo shard: se consultan solo los segmentos de ese shard
+    tasks = [
+        (term, entry)
+        for term in terms
+        for entry in manifest['segments'][str(shard_for(term, shards))]
+    ]
+    with span("search_segments"):
+        with ThreadPoolExecutor(max_workers=QUERY_MAX_WORKERS) as executor:
+            records = list(executor.map(lambda task: segment_records(task[1], task[0]), tasks))
+        first_shard = str(shard_for(terms[0], shards))
+        versions = dict(current_versions(etag, manifest['segments'][first_shard]))
+
+    # Los deltas pendientes reemplazan versiones anteriores del mismo archivo
+    for _, delta in pending:
+        doc = delta['doc']
+        if doc['indexed_at'] > versions.get(doc['id'], 0):
+            versions[doc['id']] = doc['indexed_at']
+
+    # Puntuación de la versión vigente de cada documento: {id: {término: puntos}}. Un delta recién
+    # fusionado puede verse a la vez como pendiente y en un segmento: se cuenta una sola vez
+    scores, docs_by_id, sources = {}, {}, {}
+
+    def add_score(source, doc_index, doc, term, points):
+        if doc['indexed_at'] != versions.get(doc['id']) or term in scores.get(doc['id'], {}):
+            return
+        scores.setdefault(doc['id'], {})[term] = points
+        docs_by_id[doc['id']] = doc
+        sources.setdefault(doc['id'], {})[term] = (source, doc_index)
+
+    with span("search_score"):
+        for task_index, ((term, entry), term_records) in enumerate(zip(tasks, records)):
+            if not term_records:
+                continue
+            docs = open_segment(entry).docs
+            for doc_index, points in score_records(term_records, docs, filters).items():
+                if points:
+                    add_score(task_index, doc_index, docs[doc_index], term, points)
+
+        pending_matches = {}
+        for key, delta in pending:
+            doc = delta['doc']
+            for term in terms:
+                occurrences = [
+                    (field, start, end, speaker_label(doc, speaker_index) if speaker_index >= 0 else None)
+                    for field, start, end, speaker_index in delta['postings'].get(term, [])
+                ]
+                occurrences = [item for item in occurrences if posting_matches(*item, filters)]
+                if occurrences:
+                    pending_matches[(key, term)] = occurrences
+                    points = sum(TOPIC_MATCH_WEIGHT if item[0] == FIELD_TOPIC else 1 for item in occurrences)
+                    add_score(key, 0, doc, term, points)
+
+        # Todos los términos deben aparecer; el detalle de coincidencias solo se decodifica para los primeros
+        ranked = [
+            (sum(term_scores.values()), docs_by_id[doc_id]['indexed_at'], doc_id)
+            for doc_id, term_scores in scores.items()
+            if len(term_scores) == len(terms)
+        ]
+        top = heapq.nlargest(limit, ranked)
+
+    wanted = {}
+    for _, _, doc_id in top:
+        for term, (source, doc_index) in sources[doc_id].items():
+            if not isinstance(source, str):
+                wanted.setdefault(source, set()).add(doc_index)
+    segment_matches = {
+        task_index: collect_matches(records[task_index], open_segment(tasks[task_index][1]).docs, doc_indexes, filters)
+        for task_index, doc_indexes in wanted.items()
+    }
+
+    results = []
+    for score, indexed_at, doc_id in top:
+        doc = docs_by_id[doc_id]
+
+        # Agrupar por utterance los términos encontrados en ella
+        grouped = {}
+        for term, (source, doc_index) in sources[doc_id].items():
+            if isinstance(source, str):
+                occurrences = pending_matches[(source, term)]
+            else:
+                occurrences = segment_matches[source].get(doc_index, [])
+            for occurrence in occurrences:
+                grouped.setdefault(occurrence, []).append(term)
+        ordered = sorted(grouped.items(), key=lambda item: (item[0][0] != FIELD_UTTERANCE, item[0][1]))
+
+        results.append({
+            "file_key": doc['file_key'],
+            "resultado_key": doc['resultado_key'],
+            "transcripcion_key": doc['transcripcion_key'],
+            "temas": doc.get('temas', []),
+            "duracion_ms": doc.get('duracion_ms'),
+            "indexado": indexed_at,
+            "puntuacion": score,
+            "coincidencias": [
+                {
+                    "campo": FIELD_NAMES[field],
+                    "terminos": sorted(found),
+                    "speaker": label,
+                    "inicio_ms": start,
+                    "fin_ms": end
+                }
+                for (field, start, end, label), found in ordered[:MAX_MATCHES_PER_DOC]
+            ]
+        })
+
+    return {
+        "terminos": terms,
+        "total": len(ranked),
+        "resultados": results,
+        "generacion_indice": manifest['generation'],
+        "pendientes": len(pending)
+    }
+
+def search_response(status_code, body):
+    return {
+        'statusCode': status_code,
+        'headers': {**CORS_HEADERS, 'Content-Type': 'application/json', 'Cache-Control': 'no-cache'},
+        'body': json.dumps(body, ensure_ascii=False)
+    }
+
+def lambda_handler(event, context):
+    """Consultas de búsqueda (API Gateway) y fusión del índice (regla programada de EventBridge)"""
+    if event.get('source') == 'aws.events':
+        with span("merge"):
+            return merge_index()
+
+    start_time = time.perf_counter()
+    try:
+        # ?q=<palabras>&speaker=<etiqueta>&desde=<segundos>&hasta=<segundos>&limit=<n>
+        query = event.get('queryStringParameters') or {}
+        query_text = query['q']
+        start_ms = int(float(query['desde']) * 1000) if query.get('desde') else None
+        end_ms = int(float(query['hasta']) * 1000) if query.get('hasta') else None
+        limit = min(int(query.get('limit') or SEARCH_DEFAULT_LIMIT), SEARCH_MAX_LIMIT)
+
+        with span("search"):
+            result = search(query_text, query.get('speaker') or None, start_ms, end_ms, limit)
+
+    except KeyError:
+        return search_response(400, {
+            'error': 'Parámetro q requerido',
+            'message': 'Debe indicar las palabras a buscar'
+        })
+    except ValueError as e:
+        return search_response(400, {'error': 'Consulta inválida', 'message': str(e)})
+    except Exception as e:
+        logger.error(f"Error inesperado en búsqueda: {e}")
+        return search_response(500, {
+            'error': 'Error interno del servidor',
+            'message': 'No se pudo completar la búsqueda'
+        })
+
+    result['consulta'] = query_text
+    result['tiempo_ms'] = round((time.perf_counter() - start_time) * 1000, 2)
+    logger.info(f"Búsqueda '{query_text}': {result['total']} resultados en {result['tiempo_ms']}ms")
+    return search_response(200, result)
@@ -0,0 +1,189 @@
+import boto3
+import json
+import os
+import logging
+from datetime import datetime
+from boto3.dynamodb.types import TypeDeserializer
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3_client = boto3.client('s3')
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
+# Endpoint de la API de conexiones (API Gateway WebSocket o sustituto local);
+# si no se configura se deriva del dominio y stage de la petición
+WEBSOCKET_ENDPOINT = os.environ.get('STATUS_WEBSOCKET_ENDPOINT', '')
+PROCESSING_PREFIX = 'processing/'
+SUBSCRIPTIONS_PREFIX = f"{PROCESSING_PREFIX}subscriptions/"
+CONNECTIONS_PREFIX = f"{PROCESSING_PREFIX}connections/"
+
+# Almacén de estados: "s3" (JSON en processing/, por defecto) o "dynamodb" (mismo que lambda-audio-process)
+STATUS_STORE = os.environ.get('STATUS_STORE', 's3')
+STATUS_TABLE_NAME = os.environ.get('STATUS_TABLE_NAME', '')
+dynamodb_client = boto3.client('dynamodb') if STATUS_STORE == 'dynamodb' else None
+
+def get_base_name(file_key):
+    """Nombre base del archivo (mismo criterio que lambda-audio-process)"""
+    return file_key.replace('uploads/', '').split('.')[0]
+
+def get_gateway_client(event):
+    """Cliente de la API de conexiones para responder al cliente WebSocket"""
+    endpoint = WEBSOCKET_ENDPOINT
+    if not endpoint:
+        request_context = event['requestContext']
+        endpoint = f"https://{request_context['domainName']}/{request_context['stage']}"
+    return boto3.client('apigatewaymanagementapi', endpoint_url=endpoint)
+
+def generate_presigned_url(bucket, key, expiration=300):
+    """Generar URL prefirmada para descargar resultados (5 minutos por defecto)"""
+    try:
+        return s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=expiration
+        )
+    except Exception as e:
+        logger.error(f"Error generando URL prefirmada para {key}: {e}")
+        return None
+
+def read_status(status_key):
+    """Leer el estado del almacén configurado (None si no existe)"""
+    if STATUS_STORE == 'dynamodb':
+        response = dynamodb_client.get_item(
+            TableName=STATUS_TABLE_NAME,
+            Key={'status_key': {'S': status_key}},
+            ConsistentRead=True
+        )
+        if 'Item' not in response:
+            return None
+        deserializer = TypeDeserializer()
+        item = {k: deserializer.deserialize(v) for k, v in response['Item'].items()}
+        item.pop('version', None)
+        item.pop('status_key', None)
+        return json.loads(json.dumps(item, default=lambda d: int(d) if d % 1 == 0 else float(d)))
+    
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=status_key)
+        return json.loads(response['Body'].read().decode('utf-8'))
+    except s3_client.exceptions.NoSuchKey:
+        return None
+
+def get_current_status(file_key):
+    """Estado actual del archivo, con URLs de descarga si está completado"""
+    status_key = f"{PROCESSING_PREFIX}{get_base_name(file_key)}_status.json"
+    status_data = read_status(status_key)
+    if status_data is None:
+        status_data = {
+            'file_key': file_key,
+            'status': 'PENDING',
+            'message': 'El archivo está en cola para procesamiento',
+            'progress': 0,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    if status_data.get('status') == 'COMPLETED':
+        for key_field, url_field in (('resultado_key', 'resultado_download_url'), ('transcripcion_key', 'transcripcion_download_url')):
+            if key_field in status_data:
+                url = generate_presigned_url(BUCKET_NAME, status_data[key_field])
+                if url:
+                    status_data[url_field] = url
+    
+    status_data['polling_recommended'] = status_data.get('status') not in ['COMPLETED', 'ERROR']
+    return status_data
+
+def load_connection(connection_id):
+    """Archivos a los que está suscrita una conexión"""
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=f"{CONNECTIONS_PREFIX}{connection_id}.json")
+        return json.loads(response['Body'].read().decode('utf-8'))
+    except s3_client.exceptions.NoSuchKey:
+        return {'connection_id': connection_id, 'file_keys': []}
+
+def subscribe(event, connection_id, file_key):
+    """Registrar la suscripción y enviar el estado actual al cliente"""
+    subscription_key = f"{SUBSCRIPTIONS_PREFIX}{get_base_name(file_key)}/{connection_id}.json"
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=subscription_key,
+        Body=json.dumps({'connection_id': connection_id, 'file_key': file_key, 'timestamp': datetime.now().isoformat()}),
+        ContentType='application/json',
+        ServerSideEncryption='AES256'
+    )
+    
+    # Índice inverso para limpiar las suscripciones al desconectar
+    connection = load_connection(connection_id)
+    if file_key not in connection['file_keys']:
+        connection['file_keys'].append(file_key)
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=f"{CONNECTIONS_PREFIX}{connection_id}.json",
+            Body=json.dumps(connection),
+            ContentType='application/json',
+            ServerSideEncryption='AES256'
+        )
+    
+    logger.info(f"Conexión {connection_id} suscrita a {file_key}")
+    
+    # Enviar estado actual para no perder cambios anteriores a la suscripción
+    status_data = get_current_status(file_key)
+    get_gateway_client(event).post_to_connection(
+        ConnectionId=connection_id,
+        Data=json.dumps(status_data, ensure_ascii=False).encode('utf-8')
+    )
+
+def disconnect(connection_id):
+    """Eliminar todas las suscripciones de la conexión"""
+    connection = load_connection(connection_id)
+    for file_key in connection['file_keys']:
+        s3_client.delete_object(
+            Bucket=BUCKET_NAME,
+            Key=f"{SUBSCRIPTIONS_PREFIX}{get_base_name(file_key)}/{connection_id}.json"
+        )
+    s3_client.delete_object(Bucket=BUCKET_NAME, Key=f"{CONNECTIONS_PREFIX}{connection_id}.json")
+    logger.info(f"Conexión {connection_id} cerrada, {len(connection['file_keys'])} suscripciones eliminadas")
+
+def lambda_handler(event, context):
+    """Handler de las rutas $connect, $disconnect y subscribe de la API WebSocket"""
+    try:
+        request_context = event['requestContext']
+        route_key = request_context['routeKey']
+        connection_id = request_context['connectionId']
+        
+        logger.info(f"Ruta WebSocket {route_key} para conexión {connection_id}")
+        
+        if route_key == '$connect':
+            return {'statusCode': 200}
+        
+        if route_key == '$disconnect':
+            disconnect(connection_id)
+            return {'statusCode': 200}
+        
+        # subscribe / $default: {"action": "subscribe", "file_key": "uploads/archivo.mp3"}
+        body = json.loads(event.get('body') or '{}')
+        file_key = body['file_key']
+        if not file_key.startswith('uploads/'):
+            file_key = f"uploads/{file_key}"
+        
+        subscribe(event, connection_id, file_key)
+        return {'statusCode': 200}
+    
+    except (KeyError, ValueError) as e:
+        logger.error(f"Mensaje WebSocket inválido: {e}")
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': 'Parámetro file_key requerido',
+                'message': 'Debe enviar {"action": "subscribe", "file_key": "..."}'
+            }, ensure_ascii=False)
+        }
+    
+    except Exception as e:
+        logger.error(f"Error inesperado: {e}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'error': 'Error interno del servidor',
+                'message': 'No se pudo registrar la suscripción'
+            }, ensure_ascii=False)
+        }
@@ -0,0 +1,103 @@
+"""
+Apoyo de las pruebas: el emulador de S3 de benchmarks/local_services.py y la carga de cada Lambda
+con su propio nombre de módulo (las variables de entorno se leen al importar)
+"""
+import os
+import sys
+import threading
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from local_services import LocalAWS  # noqa: E402
+from end_to_end import load_lambda  # noqa: E402
+
+_aws = None
+
+def local_aws():
+    """Emulador de S3 compartido por todas las pruebas del proceso; cada prueba usa su propio bucket"""
+    global _aws
+    if _aws is None:
+        _aws = LocalAWS(0).start()
+        os.environ.update({
+            'AWS_ENDPOINT_URL_S3': _aws.url,
+            'METRICS_SINK': 'none',
+            'AWS_EC2_METADATA_DISABLED': 'true',
+        })
+        for name, value in (('AWS_DEFAULT_REGION', 'us-east-1'), ('AWS_ACCESS_KEY_ID', 'test'),
+                            ('AWS_SECRET_ACCESS_KEY', 'test')):
+            os.environ.setdefault(name, value)
+    return _aws
+
+def load(name, folder, **env):
+    """Importar lambda_function de la carpeta con las variables de entorno indicadas"""
+    local_aws()
+    os.environ.update(env)
+    return load_lambda(name, folder)
+
+class FakeDynamoDB:
+    """
+    Tabla de DynamoDB en memoria con las expresiones que usan los almacenes de estados: SET y ADD
+    en UpdateExpression, y condiciones attribute_(not_)exists y comparaciones unidas por OR
+    """
+
+    class ConditionalCheckFailedException(Exception):
+        pass
+
+    OPERATORS = {
+        '=': lambda a, b: a == b, '<>': lambda a, b: a != b, '<': lambda a, b: a < b,
+        '<=': lambda a, b: a <= b, '>': lambda a, b: a > b, '>=': lambda a, b: a >= b,
+    }
+
+    def __init__(self):
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+        self.items = {}
+        self.lock = threading.Lock()
+        self.exceptions = self
+        self.serializer, self.deserializer = TypeSerializer(), TypeDeserializer()
+
+    def _key(self, Key):
+        return Key['status_key']['S']
+
+    def _decode(self, item):
+        return {name: self.deserializer.deserialize(value) for name, value in item.items()}
+
+    def _matches(self, condition, item, names, values):
+        for clause in condition.split(' OR '):
+            clause = clause.strip()
+            if clause.startswith(('attribute_not_exists(', 'attribute_exists(')):
+                name = names.get(clause[clause.index('(') + 1:-1], clause[clause.index('(') + 1:-1])
+                if (name in item) != clause.startswith('attribute_not_exists('):
+                    return True
+                continue
+            left, operator, right = clause.split()
+            name = names.get(left, left)
+            if name in item and self.OPERATORS[operator](item[name], values[right]):
+                return True
+        return False
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues,
+                    ExpressionAttributeNames=None, ConditionExpression=None):
+        names = ExpressionAttributeNames or {}
+        values = self._decode(ExpressionAttributeValues)
+        set_part, _, add_part = UpdateExpression.partition(' ADD ')
+        with self.lock:
+            current = self.items.get(self._key(Key), {})
+            if ConditionExpression and not self._matches(ConditionExpression, current, names, values):
+                raise self.ConditionalCheckFailedException(ConditionExpression)
+            item = self.items.setdefault(self._key(Key), {'status_key': self._key(Key)})
+            for assignment in set_part[len('SET '):].split(','):
+                name, value = (part.strip() for part in assignment.split('='))
+                item[names.get(name, name)] = values[value]
+            if add_part:
+                name, value = add_part.split()
+                item[names.get(name, name)] = item.get(names.get(name, name), 0) + values[value]
+        return {}
+
+    def get_item(self, TableName, Key, ConsistentRead=False, ProjectionExpression=None,
+                 ExpressionAttributeNames=None):
+        with self.lock:
+            item = self.items.get(self._key(Key))
+            if item is None:
+                return {}
+            return {'Item': {name: self.serializer.serialize(value) for name, value in item.items()}}
@@ -0,0 +1,134 @@
+import json
+import unittest
+
+from support import FakeDynamoDB, load, local_aws
+
+BUCKET = "ingest-test"
+
+class FakeSQS:
+    """send_message_batch que rechaza los Id indicados en cada llamada"""
+
+    def __init__(self, rejections=(), sender_fault=False):
+        self.rejections = list(rejections)
+        self.sender_fault = sender_fault
+        self.calls = []
+
+    def get_queue_attributes(self, **kwargs):
+        return {'Attributes': {'ApproximateNumberOfMessages': '0'}}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls.append(sorted(entry['Id'] for entry in Entries))
+        rejected = self.rejections.pop(0) if self.rejections else []
+        return {'Failed': [{'Id': entry_id, 'SenderFault': self.sender_fault} for entry_id in rejected]}
+
+def s3_record(key):
+    return {'s3': {'bucket': {'name': BUCKET}, 'object': {'key': key}}}
+
+class IngestStatusTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.aws = local_aws()
+        cls.ingest = load("ingest_s3", "lambda-audio-ingest", PROCESSING_QUEUE_URL="queue", STATUS_STORE="s3")
+        cls.ingest.SQS_RETRY_BASE_SECONDS = 0
+
+    def setUp(self):
+        self.aws.store(BUCKET, 'uploads/nota.mp3', b'audio', 'audio/mpeg', {})
+        self.aws.objects.pop((BUCKET, 'processing/nota_status.json'), None)
+
+    def status(self):
+        return json.loads(self.aws.objects[(BUCKET, 'processing/nota_status.json')]['data'])
+
+    def test_queued_status_carries_the_upload_token(self):
+        status = self.ingest.save_queued_status(BUCKET, 'uploads/nota.mp3', 3)
+        self.assertEqual(status['status'], "QUEUED")
+        self.assertEqual(status['posicion_cola'], 3)
+        self.assertEqual(self.status()['idempotency_token'],
+                         self.ingest.get_idempotency_token(BUCKET, 'uploads/nota.mp3'))
+
+    def test_repeated_delivery_keeps_the_status(self):
+        self.ingest.save_queued_status(BUCKET, 'uploads/nota.mp3', 1)
+        completed = dict(self.status(), status="COMPLETED")
+        self.aws.store(BUCKET, 'processing/nota_status.json', json.dumps(completed).encode(), 'application/json', {})
+
+        self.assertIsNone(self.ingest.save_queued_status(BUCKET, 'uploads/nota.mp3', 1))
+        self.assertEqual(self.status()['status'], "COMPLETED")
+
+    def test_new_upload_replaces_the_status(self):
+        self.ingest.save_queued_status(BUCKET, 'uploads/nota.mp3', 1)
+        first_token = self.status()['idempotency_token']
+        self.aws.store(BUCKET, 'uploads/nota.mp3', b'otro audio', 'audio/mpeg', {})
+
+        self.assertEqual(self.ingest.save_queued_status(BUCKET, 'uploads/nota.mp3', 1)['status'], "QUEUED")
+        self.assertNotEqual(self.status()['idempotency_token'], first_token)
+
+    def test_conditional_write_rejects_stale_revision(self):
+        status_key = 'processing/nota_status.json'
+        self.assertTrue(self.ingest.write_queued_status(BUCKET, status_key, {"status": "QUEUED"}, False, None))
+        # Ya existe: una escritura que espera crearlo pierde
+        self.assertFalse(self.ingest.write_queued_status(BUCKET, status_key, {"status": "QUEUED"}, False, None))
+
+        _, revision = self.ingest.load_status(BUCKET, status_key)
+        self.aws.store(BUCKET, status_key, b'{"status": "TRANSCRIBING"}', 'application/json', {})
+        self.assertFalse(self.ingest.write_queued_status(BUCKET, status_key, {"status": "QUEUED"}, True, revision))
+        self.assertEqual(self.status()['status'], "TRANSCRIBING")
+
+class IngestDynamoDBStatusTest(unittest.TestCase):
+    """Estados en DynamoDB (tabla en memoria); la subida sigue en el emulador de S3"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.aws = local_aws()
+        cls.ingest = load("ingest_dynamodb", "lambda-audio-ingest", PROCESSING_QUEUE_URL="queue", STATUS_STORE="s3")
+        cls.ingest.STATUS_STORE = 'dynamodb'
+        cls.ingest.STATUS_TABLE_NAME = 'status-test'
+
+    def setUp(self):
+        self.aws.store(BUCKET, 'uploads/tabla.mp3', b'audio', 'audio/mpeg', {})
+        self.ddb = self.ingest.dynamodb_client = FakeDynamoDB()
+
+    def item(self):
+        return self.ddb.items['processing/tabla_status.json']
+
+    def test_versions_and_repeated_delivery(self):
+        self.assertEqual(self.ingest.save_queued_status(BUCKET, 'uploads/tabla.mp3', 2)['status'], "QUEUED")
+        self.assertEqual(self.item()['version'], 1)
+        self.assertIsNone(self.ingest.save_queued_status(BUCKET, 'uploads/tabla.mp3', 2))
+        self.assertEqual(self.item()['version'], 1)
+
+    def test_stale_version_is_a_conflict_not_an_error(self):
+        self.ingest.save_queued_status(BUCKET, 'uploads/tabla.mp3', 2)
+        status_key = 'processing/tabla_status.json'
+        self.assertFalse(self.ingest.write_queued_status(BUCKET, status_key, {"status": "QUEUED"}, True, 7))
+        self.assertFalse(self.ingest.write_queued_status(BUCKET, status_key, {"status": "QUEUED"}, False, None))
+        self.assertTrue(self.ingest.write_queued_status(BUCKET, status_key, {"status": "QUEUED"}, True, 1))
+        self.assertEqual(self.item()['version'], 2)
+
+class EnqueueTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        local_aws()
+        cls.ingest = load("ingest_sqs", "lambda-audio-ingest", PROCESSING_QUEUE_URL="queue", STATUS_STORE="s3")
+        cls.ingest.SQS_RETRY_BASE_SECONDS = 0
+
+    def test_only_rejected_entries_are_resent(self):
+        self.ingest.sqs_client = FakeSQS([['1', '3'], ['3']])
+        records = [s3_record(f'uploads/{name}.mp3') for name in "abcd"]
+        self.assertEqual(self.ingest.enqueue_records(records), [])
+        self.assertEqual(self.ingest.sqs_client.calls, [['0', '1', '2', '3'], ['1', '3'], ['3']])
+
+    def test_sender_faults_are_not_retried(self):
+        self.ingest.sqs_client = FakeSQS([['2']], sender_fault=True)
+        records = [s3_record(f'uploads/{name}.mp3') for name in "abc"]
+        self.assertEqual(self.ingest.enqueue_records(records), ['uploads/c.mp3'])
+        self.assertEqual(len(self.ingest.sqs_client.calls), 1)
+
+    def test_handler_fails_when_retries_run_out(self):
+        self.ingest.sqs_client = FakeSQS([['0']] * self.ingest.SQS_SEND_ATTEMPTS)
+        event = {'Records': [s3_record('uploads/sin-estado.mp3')]}
+        # El HEAD del estado falla (no existe la subida) pero el registro se intenta encolar igualmente
+        with self.assertRaises(RuntimeError):
+            self.ingest.lambda_handler(event, None)
+        self.assertEqual(len(self.ingest.sqs_client.calls), self.ingest.SQS_SEND_ATTEMPTS)
+
+if __name__ == '__main__':
+    unittest.main()
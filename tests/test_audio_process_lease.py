@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+import unittest
+
+from support import load, local_aws
+
+BUCKET = "lease-test"
+FILE_KEY = 'uploads/reunion.mp3'
+
+class LeaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.aws = local_aws()
+        cls.process = load("audio_process", "lambda-audio-process", DEDUP_CACHE_ENABLED="false")
+        cls.lease_key = f"{cls.process.get_checkpoint_prefix(FILE_KEY)}lease.json"
+
+    def setUp(self):
+        self.aws.objects.pop((BUCKET, self.lease_key), None)
+
+    def lease(self):
+        entry = self.aws.objects.get((BUCKET, self.lease_key))
+        return json.loads(entry['data']) if entry else None
+
+    def test_live_lease_excludes_other_invocations(self):
+        self.assertTrue(self.process.acquire_lease(BUCKET, FILE_KEY, "req-a"))
+        self.assertFalse(self.process.acquire_lease(BUCKET, FILE_KEY, "req-b"))
+        # Reintento de Lambda con el mismo request_id
+        self.assertTrue(self.process.acquire_lease(BUCKET, FILE_KEY, "req-a"))
+        self.assertEqual(self.lease()['request_id'], "req-a")
+
+    def test_expired_lease_is_taken_over(self):
+        self.assertTrue(self.process.acquire_lease(BUCKET, FILE_KEY, "req-a", deadline=time.time() - 1))
+        self.assertTrue(self.process.acquire_lease(BUCKET, FILE_KEY, "req-b"))
+        self.assertEqual(self.lease()['request_id'], "req-b")
+
+    def test_release_only_by_owner(self):
+        self.process.acquire_lease(BUCKET, FILE_KEY, "req-a")
+        self.process.release_lease(BUCKET, FILE_KEY, "req-b")
+        self.assertEqual(self.lease()['request_id'], "req-a")
+        self.process.release_lease(BUCKET, FILE_KEY, "req-a")
+        self.assertIsNone(self.lease())
+        self.assertTrue(self.process.acquire_lease(BUCKET, FILE_KEY, "req-b"))
+
+    def test_same_batch_duplicates_do_not_both_run(self):
+        self.aws.store(BUCKET, FILE_KEY, b"audio", 'audio/mpeg', {})
+        calls = []
+        # Los dos registros intentan el lease antes de que cualquiera lo libere
+        barrier = threading.Barrier(2)
+        acquire_lease = self.process.acquire_lease
+
+        def acquire(*args):
+            acquired = acquire_lease(*args)
+            barrier.wait(timeout=5)
+            return acquired
+
+        def transcribe(bucket_name, file_key, *args):
+            calls.append(file_key)
+            return {'file_key': file_key, 'success': True, 'pending': True}
+
+        for name, value in (('acquire_lease', acquire), ('transcribe_upload', transcribe),
+                            ('get_secrets', lambda: None), ('TRANSCRIPTION_MODE', 'webhook')):
+            self.addCleanup(setattr, self.process, name, getattr(self.process, name))
+            setattr(self.process, name, value)
+
+        items = [("m1", BUCKET, FILE_KEY, 1), ("m2", BUCKET, FILE_KEY, 1)]
+        results = self.process.process_records(items, "req-a")
+        self.assertEqual(calls, [FILE_KEY])
+        self.assertEqual(sorted(bool(result.get('duplicate')) for result in results), [False, True])
+        self.assertIsNone(self.lease())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import unittest
+
+from support import load, local_aws
+
+BUCKET = "status-test"
+STATUS_KEY = 'processing/nota_status.json'
+
+def status_event(etag=None, query=None):
+    return {'pathParameters': {'fileKey': 'uploads/nota.mp3'}, 'headers': {'If-None-Match': etag} if etag else {},
+            'queryStringParameters': query}
+
+class ConditionalStatusTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.aws = local_aws()
+        cls.status = load("get_status", "lambda-get-status", BUCKET_NAME=BUCKET, STATUS_STORE="s3")
+
+    def setUp(self):
+        self.status._status_cache.clear()
+
+    def store(self, state):
+        self.aws.store(BUCKET, STATUS_KEY, json.dumps({"status": state, "progress": 50}).encode(),
+                       'application/json', {})
+
+    def test_client_etag_is_sent_to_s3_on_a_cold_container(self):
+        self.store("TRANSCRIBING")
+        etag = self.status.lambda_handler(status_event(), None)['headers']['ETag']
+        self.status._status_cache.clear()
+        self.aws.requests.clear()
+
+        response = self.status.lambda_handler(status_event(etag), None)
+        self.assertEqual(response['statusCode'], 304)
+        self.assertEqual(self.aws.requests['GetObject'], 1)
+
+    def test_only_completed_is_served_without_revalidation(self):
+        self.store("ERROR")
+        self.status.lambda_handler(status_event(), None)
+
+        # Un reintento vuelve a encolar el archivo: el cambio se ve sin esperar a que caduque la caché
+        self.store("QUEUED")
+        self.assertEqual(json.loads(self.status.lambda_handler(status_event(), None)['body'])['status'], "QUEUED")
+
+        self.store("COMPLETED")
+        self.status.lambda_handler(status_event(), None)
+        self.aws.requests.clear()
+        self.assertEqual(json.loads(self.status.lambda_handler(status_event(), None)['body'])['status'], "COMPLETED")
+        self.assertEqual(self.aws.requests['GetObject'], 0)
+
+    def test_wait_parameter_is_validated(self):
+        self.store("TRANSCRIBING")
+        for value in ("abc", "1.5"):
+            with self.subTest(wait=value):
+                self.assertEqual(self.status.lambda_handler(status_event(query={'wait': value}), None)['statusCode'], 400)
+        # Un valor negativo responde de inmediato
+        self.assertEqual(self.status.lambda_handler(status_event(query={'wait': '-5'}), None)['statusCode'], 200)
+
+if __name__ == '__main__':
+    unittest.main()
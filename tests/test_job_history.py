@@ -0,0 +1,97 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timezone
+
+from support import ROOT, load, local_aws
+
+sys.path.insert(0, os.path.join(ROOT, 'lambda-audio-process'))
+import job_manifest  # noqa: E402
+
+BUCKET = "jobs-test"
+
+class JobHistoryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.aws = local_aws()
+        cls.history = load("job_history", "lambda-job-history", BUCKET_NAME=BUCKET)
+
+    def setUp(self):
+        for key in [key for key in self.aws.objects if key[0] == BUCKET]:
+            del self.aws.objects[key]
+        for cache in (self.history._manifest_cache, self.history._segment_cache, self.history._pending_cache):
+            cache.clear()
+        # Mediodía de hoy: las horas de la prueba quedan en un día abierto
+        self.noon = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0).timestamp()
+
+    def add_job(self, name, finished_at, status="COMPLETED", token=None):
+        status_data = {"status": status, "timestamp": datetime.fromtimestamp(finished_at, tz=timezone.utc).isoformat(),
+                       "tiempo_total": 30.0, "idempotency_token": token}
+        record = job_manifest.build_job_record(f"uploads/{name}.mp3", status_data, finished_at)
+        self.aws.store(BUCKET, job_manifest.pending_key(record), job_manifest.encode_record(record).encode('utf-8'),
+                       'application/json', {})
+
+    def keys(self, prefix):
+        return sorted(key for bucket, key in self.aws.objects if bucket == BUCKET and key.startswith(prefix))
+
+    def query(self, start, end):
+        return self.history.query_jobs(int(start * 1000), int(end * 1000))
+
+    def test_pending_listing_covers_only_requested_hours(self):
+        self.add_job("a", self.noon + 60)
+        self.add_job("b", self.noon + 3600 + 60)
+        self.add_job("c", self.noon - 3600 + 60)
+        self.aws.requests.clear()
+
+        result = self.query(self.noon, self.noon + 3600)
+        self.assertEqual([job['file_key'] for job in result['trabajos']], ["uploads/a.mp3"])
+        self.assertEqual(self.aws.requests['ListObjectsV2'], 1)
+
+    def test_compaction_and_pending_are_both_read(self):
+        self.add_job("a", self.noon + 60)
+        self.add_job("b", self.noon + 120, status="ERROR")
+        self.assertEqual(self.history.compact_jobs()['compacted'], 2)
+        self.add_job("c", self.noon + 180)
+
+        result = self.query(self.noon, self.noon + 3600)
+        self.assertEqual(result['total'], 3)
+        self.assertEqual(result['por_estado'], {"COMPLETED": 2, "ERROR": 1})
+        self.assertEqual((result['particiones']['horarias'], result['particiones']['pendientes']), (1, 1))
+
+    def test_only_the_last_final_state_of_an_upload_counts(self):
+        # Dos entregas que fallan y una tercera que termina, con el mismo token de la subida
+        self.add_job("a", self.noon + 60, status="ERROR", token="t1")
+        self.add_job("a", self.noon + 120, status="ERROR", token="t1")
+        self.history.compact_jobs()
+        self.add_job("a", self.noon + 3600 + 60, token="t1")
+        # Una nueva subida del mismo archivo es otro trabajo
+        self.add_job("a", self.noon + 3600 + 120, status="ERROR", token="t2")
+
+        result = self.query(self.noon, self.noon + 7200)
+        self.assertEqual(result['por_estado'], {"COMPLETED": 1, "ERROR": 1})
+        # Los dos errores de la primera hora quedaron en un solo registro del segmento
+        manifest, _ = self.history.load_manifest()
+        first_hour = self.history.hour_id(*job_manifest.partition(int(self.noon * 1000)))
+        self.assertEqual(manifest['hours'][first_hour]['count'], 1)
+        self.assertEqual(self.history.compact_jobs()['compacted'], 2)
+        self.assertEqual(self.query(self.noon, self.noon + 7200)['por_estado'], {"COMPLETED": 1, "ERROR": 1})
+
+    def test_concurrent_compaction_keeps_published_segments(self):
+        self.add_job("a", self.noon + 60)
+        stale = self.history.load_manifest()
+        self.history.compact_jobs()
+        published = self.keys(self.history.HOURLY_PREFIX)
+
+        # Una segunda compactación que leyó el manifiesto antes de la publicación anterior
+        self.add_job("b", self.noon + 120)
+        original = self.history.load_manifest
+        self.history.load_manifest = lambda: stale
+        self.addCleanup(setattr, self.history, 'load_manifest', original)
+
+        self.assertEqual(self.history.compact_jobs(), {'compacted': 0, 'conflict': True})
+        self.assertEqual(self.keys(self.history.HOURLY_PREFIX), published)
+        self.history.load_manifest = original
+        self.assertEqual(self.query(self.noon, self.noon + 3600)['total'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+import sys
+import unittest
+
+from support import ROOT, load, local_aws
+
+sys.path.insert(0, os.path.join(ROOT, 'lambda-audio-process'))
+import search_index  # noqa: E402
+
+BUCKET = "search-test"
+
+def result_for(text, topic):
+    return {
+        "transcripcion": {"text": text, "utterances": [{"speaker": "A", "text": text, "start": 1000, "end": 4000}]},
+        "analisis": {"temas_principales": [topic]}
+    }
+
+class MergeIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.aws = local_aws()
+        cls.search = load("search", "lambda-search", BUCKET_NAME=BUCKET, INDEX_SHARDS="2")
+
+    def setUp(self):
+        for key in [key for key in self.aws.objects if key[0] == BUCKET]:
+            del self.aws.objects[key]
+        for cache in (self.search._manifest_cache, self.search._segment_cache, self.search._postings_cache,
+                      self.search._delta_cache, self.search._current_versions_cache):
+            cache.clear()
+        self.search._postings_cache_bytes[0] = 0
+        self.sequence = 0
+
+    def add_delta(self, name, text, topic="general"):
+        self.sequence += 1
+        delta = search_index.build_index_delta(f"uploads/{name}.mp3", f"results/{name}_resultado.json",
+                                               f"results/{name}_transcripcion.json", result_for(text, topic))
+        key = f"{self.search.PENDING_PREFIX}{self.sequence:013d}_{name}.json.gz"
+        self.aws.store(BUCKET, key, gzip.compress(json.dumps(delta).encode('utf-8')), 'application/json', {})
+
+    def keys(self, prefix):
+        return sorted(key for bucket, key in self.aws.objects if bucket == BUCKET and key.startswith(prefix))
+
+    def found(self, query):
+        return sorted(result['file_key'] for result in self.search.search(query)['resultados'])
+
+    def test_merge_moves_pending_deltas_into_segments(self):
+        self.add_delta("llamada", "revisamos el presupuesto del proyecto", "presupuesto")
+        self.add_delta("reunion", "el calendario de entregas del proyecto")
+
+        summary = self.search.merge_index()
+        self.assertEqual((summary['merged'], summary['generation']), (2, 1))
+        self.assertEqual(self.keys(self.search.PENDING_PREFIX), [])
+        self.assertEqual(self.found("proyecto"), ["uploads/llamada.mp3", "uploads/reunion.mp3"])
+        self.assertEqual(self.found("presupuesto"), ["uploads/llamada.mp3"])
+
+    def test_small_segments_are_folded(self):
+        self.search.INDEX_MAX_SEGMENTS = 2
+        self.addCleanup(setattr, self.search, 'INDEX_MAX_SEGMENTS', 8)
+        for index in range(4):
+            self.add_delta(f"nota{index}", f"recordatorio numero {index} del proyecto")
+            self.search.merge_index()
+
+        manifest, _ = self.search.load_manifest()
+        self.assertEqual(manifest['generation'], 4)
+        self.assertTrue(all(len(segments) <= 2 for segments in manifest['segments'].values()))
+        self.assertTrue(manifest['obsolete'])
+        self.assertEqual(len(self.found("recordatorio")), 4)
+
+    def test_concurrent_merge_discards_its_segments(self):
+        self.add_delta("primera", "primera grabacion del proyecto")
+        stale = self.search.load_manifest()
+        self.search.merge_index()
+        published = self.keys(self.search.SHARDS_PREFIX)
+
+        # Una segunda fusión que leyó el manifiesto antes de la publicación anterior
+        self.add_delta("segunda", "segunda grabacion del proyecto")
+        original = self.search.load_manifest
+        self.search.load_manifest = lambda: stale
+        self.addCleanup(setattr, self.search, 'load_manifest', original)
+
+        self.assertEqual(self.search.merge_index(), {'merged': 0, 'conflict': True})
+        self.assertEqual(self.keys(self.search.SHARDS_PREFIX), published)
+        self.assertEqual(len(self.keys(self.search.PENDING_PREFIX)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
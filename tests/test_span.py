@@ -0,0 +1,38 @@
+import ast
+import os
+import unittest
+
+from support import ROOT, load
+
+# Funciones de un solo archivo con su propia copia de span()
+SPAN_COPIES = ("lambda-create-upload-link", "lambda-get-status", "lambda-search", "lambda-job-history")
+
+def span_source(folder):
+    with open(os.path.join(ROOT, folder, 'lambda_function.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    node = next(node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == 'span')
+    return ast.dump(node)
+
+class SpanCopiesTest(unittest.TestCase):
+    def test_copies_are_identical(self):
+        reference = span_source(SPAN_COPIES[0])
+        for folder in SPAN_COPIES[1:]:
+            with self.subTest(folder=folder):
+                self.assertEqual(span_source(folder), reference)
+
+    def test_emits_latency_and_failure(self):
+        module = load("span_upload_link", "lambda-create-upload-link", S3_BUCKET_NAME="span-test")
+        module.METRICS_SINK = 'memory'
+        with module.span("validate"):
+            pass
+        with self.assertRaises(ValueError):
+            with module.span("presign"):
+                raise ValueError("fallo")
+
+        records = module.collected_metrics
+        self.assertEqual([(r['Stage'], r['success']) for r in records], [("validate", True), ("presign", False)])
+        self.assertEqual(records[0]['Function'], "lambda-create-upload-link")
+        self.assertEqual(records[0]['_aws']['CloudWatchMetrics'][0]['Metrics'][0]['Name'], "StageLatency")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import threading
+import unittest
+
+from support import FakeDynamoDB, load
+
+FILE_KEY = 'uploads/entrevista.mp3'
+
+class DynamoDBStatusStoreTest(unittest.TestCase):
+    """Almacén de estados en DynamoDB de lambda-audio-process, contra una tabla en memoria"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.process = load("audio_process_status", "lambda-audio-process", DEDUP_CACHE_ENABLED="false")
+        cls.process.STATUS_STORE = 'dynamodb'
+        cls.process.STATUS_TABLE_NAME = 'status-test'
+
+    def setUp(self):
+        self.table = FakeDynamoDB()
+        self.process._clients['dynamodb'] = self.table
+        self.addCleanup(self.process._clients.pop, 'dynamodb', None)
+
+    def save(self, status, progress, **extra):
+        return self.process.save_status('bucket', FILE_KEY, {"status": status, "progress": progress, **extra})
+
+    def stored(self):
+        return self.process.load_processing_status('bucket', FILE_KEY)
+
+    def test_progress_only_moves_forward_within_an_attempt(self):
+        self.assertTrue(self.save("STARTING", 10))
+        self.assertTrue(self.save("ANALYZING", 80))
+        # Escritura en segundo plano que llega tarde
+        self.assertFalse(self.save("TRANSCRIBING", 30))
+        self.assertEqual((self.stored()['status'], self.stored()['progress']), ("ANALYZING", 80))
+        self.assertEqual(self.stored()['version'], 2)
+
+    def test_new_attempt_and_error_can_lower_progress_but_not_undo_completed(self):
+        self.save("ANALYZING", 80)
+        self.assertTrue(self.save("ERROR", 0))
+        self.assertTrue(self.save("STARTING", 10))
+        self.assertTrue(self.save("COMPLETED", 100, tiempo_total=12.5))
+
+        for status in ("QUEUED", "STARTING", "ERROR"):
+            with self.subTest(status=status):
+                self.assertFalse(self.save(status, 0))
+        self.assertEqual(self.stored()['status'], "COMPLETED")
+        self.assertEqual(self.stored()['tiempo_total'], 12.5)
+
+    def test_concurrent_writers_keep_the_highest_progress(self):
+        progress_values = list(range(20, 100, 5))
+        threads = [threading.Thread(target=self.save, args=("TRANSCRIBING", value)) for value in reversed(progress_values)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.stored()['progress'], max(progress_values))
+
+if __name__ == '__main__':
+    unittest.main()
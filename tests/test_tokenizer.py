@@ -0,0 +1,38 @@
+import ast
+import os
+import sys
+import unittest
+
+from support import ROOT, load
+
+sys.path.insert(0, os.path.join(ROOT, 'lambda-audio-process'))
+import search_index  # noqa: E402
+
+def tokenize_body(path):
+    """Cuerpo de tokenize sin el docstring, que sí puede diferir entre las copias"""
+    with open(os.path.join(ROOT, path), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    node = next(node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == 'tokenize')
+    return [ast.dump(statement) for statement in node.body[1:]]
+
+class TokenizerCopiesTest(unittest.TestCase):
+    """El indexado (search_index.py) y las consultas (lambda-search) deben normalizar igual los términos"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.search = load("search_tokenizer", "lambda-search", BUCKET_NAME="tokenizer-test")
+
+    def test_copies_are_identical(self):
+        self.assertEqual(self.search.STOPWORDS, search_index.STOPWORDS)
+        self.assertEqual(self.search.TOKEN_PATTERN.pattern, search_index.TOKEN_PATTERN.pattern)
+        self.assertEqual(tokenize_body('lambda-search/lambda_function.py'),
+                         tokenize_body('lambda-audio-process/search_index.py'))
+
+    def test_same_terms_for_a_sample(self):
+        text = "¿Revisamos el PRESUPUESTO del año 2024? Sí, y la reunión con el equipo de diseño."
+        self.assertEqual(self.search.tokenize(text), search_index.tokenize(text))
+        self.assertEqual(search_index.tokenize(text),
+                         ["revisamos", "presupuesto", "ano", "2024", "reunion", "equipo", "diseno"])
+
+if __name__ == '__main__':
+    unittest.main()